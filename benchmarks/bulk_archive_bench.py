@@ -0,0 +1,58 @@
+"""
+대량 보관 벤치마크 (로컬 MySQL / MariaDB, 서버에 local_infile=ON 필요)
+
+    BENCH_MYSQL_HOST=127.0.0.1 BENCH_MYSQL_USER=root BENCH_MYSQL_PASSWORD= \
+        python benchmarks/bulk_archive_bench.py --rows 200000 --chunk-rows 100000
+
+- per-message : 기존 process_sqs_message 방식 (SELECT COUNT + INSERT + COMMIT 을 쿠폰마다, --per-message-rows 건만 측정)
+- batch       : coupon_core.archive.write_coupons (SQS 배치 모드, 청크별 SELECT + 다중 행 INSERT IGNORE)
+- bulk        : coupon_core.bulk_archive (gzip TSV 스풀 + LOAD DATA LOCAL INFILE + INSERT IGNORE ... SELECT)
+Redis 읽기 / 삭제는 포함하지 않고 Aurora 쓰기만 비교한다.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import archive, bulk_archive  # noqa: E402
+import expired_db_insert_bench as db_bench  # noqa: E402
+
+
+def bulk(connection, coupons, chunk_rows):
+    for start in range(0, len(coupons), chunk_rows):
+        spool = bulk_archive.Spool()
+        try:
+            for coupon_id, member_id in coupons[start:start + chunk_rows]:
+                spool.write(coupon_id, member_id)
+            bulk_archive.load_spool(connection, spool)
+        finally:
+            spool.remove()
+
+
+def run(name, fn, coupons):
+    db_bench.reset_table()
+    connection = db_bench.connect(db_bench.BENCH_DATABASE, local_infile=True)
+    started = time.perf_counter()
+    fn(connection, coupons)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    print(f"{name:<20} rows={len(coupons):>8} elapsed={elapsed:8.3f}s rows/s={len(coupons) / elapsed:12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--per-message-rows", type=int, default=20000)
+    parser.add_argument("--chunk-rows", type=int, default=bulk_archive.LOAD_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    coupons = db_bench.make_coupons(args.rows)
+    run("per-message", db_bench.per_message, coupons[:args.per_message_rows])
+    run("batch chunk=500", lambda connection, rows: archive.write_coupons(connection, rows, 500), coupons)
+    run(f"bulk chunk={args.chunk_rows}", lambda connection, rows: bulk(connection, rows, args.chunk_rows), coupons)
+
+
+if __name__ == "__main__":
+    main()
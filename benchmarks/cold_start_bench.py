@@ -0,0 +1,117 @@
+"""
+Lambda 콜드 스타트 벤치마크 (모듈 로드 / 첫 호출 / 웜 호출)
+
+    python benchmarks/cold_start_bench.py --runs 5
+    git worktree add /tmp/before HEAD~1 && python benchmarks/cold_start_bench.py --root /tmp/before
+
+Lambda 마다 새 파이썬 프로세스를 띄워 콜드 컨테이너처럼 측정한다.
+- import : lambda_function 모듈 로드 시간 (Lambda 의 초기화 단계)
+- first  : 첫 호출 지연 (연결 생성, 스크립트 / 타임존 / 재고 버전 캐시가 비어 있는 상태)
+- warm   : 두 번째 호출 지연
+- loaded : 모듈 로드 직후 이미 올라와 있는 무거운 모듈 (boto3 / pymysql / asyncio)
+Redis / SQS / DB 는 benchmarks/standins.py 의 프로세스 내 대체 구현을 쓰므로 네트워크 연결 시간은 빠진다.
+--root 로 다른 작업 트리(예: 이전 커밋의 git worktree)의 Lambda 를 같은 방식으로 측정해 비교할 수 있다.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY_MODULES = ("boto3", "pymysql", "asyncio")
+
+
+def measure(name, path, root):
+    """자식 프로세스 안에서 Lambda 한 개를 로드하고 두 번 호출"""
+    sys.path.insert(0, root)
+    started = time.perf_counter()
+    module = load_module(os.path.join(root, path))
+    import_ms = (time.perf_counter() - started) * 1000
+    loaded = [heavy for heavy in HEAVY_MODULES if heavy in sys.modules]
+
+    import standins
+    cluster = standins.LocalRedisCluster(nodes=3)
+    cluster.set("online", 1000)
+    cluster.set("offline", 1000)
+    module.get_redis_client = lambda: cluster
+    if hasattr(module, "metrics"):
+        module.metrics.collector.enabled = False
+    if hasattr(module, "sqs_client"):
+        module.sqs_client = standins.LocalSQS()
+    if hasattr(module, "get_db_connection"):
+        db = standins.SQLiteConnection()
+        module.get_db_connection = lambda: db
+
+    latencies = []
+    for invocation in range(2):
+        event = build_event(name, cluster, invocation)
+        started = time.perf_counter()
+        module.lambda_handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {"import_ms": import_ms, "first_ms": latencies[0], "warm_ms": latencies[1], "loaded": loaded}
+
+
+def load_module(path):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("lambda_function", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_event(name, cluster, invocation):
+    if name.startswith("coupon_issue_"):
+        body = {"member_id": str(100000 + invocation), "timezone": "Asia/Seoul"}
+    elif name == "coupon_expired_db":
+        coupon_id = f"{{online}}-cold-start-{invocation}"
+        cluster.set(f"coupon:{coupon_id}", json.dumps({"member_id": str(100000 + invocation), "used": False,
+                                                       "issued_at": "2026-01-01T00:00:00+09:00",
+                                                       "timezone": "Asia/Seoul"}))
+        body = {"coupon_id": coupon_id, "member_id": str(100000 + invocation)}
+    else:
+        return {}
+    return {"Records": [{"messageId": f"cold-start-{invocation}", "receiptHandle": "local-receipt-handle",
+                         "body": json.dumps(body)}]}
+
+
+def run_child(name, path, root):
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "ap-northeast-2")  # boto3 클라이언트 생성용 (호출은 하지 않음)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--path", path, "--root", root],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    # 핸들러 로그 뒤 마지막 줄이 결과
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=ROOT, help="측정할 작업 트리 (기본: 이 저장소)")
+    parser.add_argument("--runs", type=int, default=5, help="Lambda 마다 띄울 프로세스 수 (중앙값 출력)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.path, root)))
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from flash_sale_harness import LAMBDA_FILES
+    print(f"root={root}")
+    for name, path in LAMBDA_FILES.items():
+        results = [run_child(name, path, root) for _ in range(args.runs)]
+        print(f"{name:22s} "
+              f"import={statistics.median(result['import_ms'] for result in results):7.1f}ms "
+              f"first={statistics.median(result['first_ms'] for result in results):7.1f}ms "
+              f"warm={statistics.median(result['warm_ms'] for result in results):6.2f}ms "
+              f"loaded={','.join(results[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
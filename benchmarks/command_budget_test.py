@@ -0,0 +1,254 @@
+"""
+핸들러별 Redis / SQS / DB 명령 예산 회귀 테스트
+
+고정된 SQS 이벤트를 각 lambda_handler 에 흘려 메시지 1건당 명령 수 / 왕복 수 / cross-slot 묶음 수를
+coupon_core.recorder 로 세고 BUDGETS 를 넘으면 실패한다. 핫 패스에 왕복을 더하는 변경은 여기서 걸리므로
+의도한 증가라면 이유와 함께 예산을 올린다. 컨테이너가 데워진 뒤(스크립트 SHA / 버전 확인 캐시가 찬 상태)를 측정한다.
+"""
+import json
+import unittest
+
+import flash_sale_harness
+import standins
+from coupon_core import codec, dedup, idempotency, issuance, metrics, negative_cache, recorder
+
+# (핸들러, 시나리오) -> 메시지 1건당 최대값
+BUDGETS = {
+    # legacy 키는 해시 태그가 없어 쿠폰 기록 파이프라인 (기록 + 회원별 쿠폰 + 만료 인덱스) 이 여러 슬롯에 걸친다
+    ("issue", "legacy"): {"redis_commands": 9, "redis_round_trips": 7, "cross_slot": 1},
+    # 같은 회원의 재요청은 발급 회원 캐시에서 끝난다
+    ("issue", "legacy_duplicate"): {"redis_commands": 0, "redis_round_trips": 0, "cross_slot": 0},
+    ("issue", "script"): {"redis_commands": 1, "redis_round_trips": 1, "cross_slot": 0},
+    ("issue", "script_batch"): {"redis_commands": 1, "redis_round_trips": 0.1, "cross_slot": 0},
+    # 채널 간 중복 체크 (COUPON_DEDUP_SCOPE=global, 기본값은 channel): 전역 SET 확인 + 발급 + 기록
+    ("issue", "script_global"): {"redis_commands": 3, "redis_round_trips": 3, "cross_slot": 0},
+    ("issue", "script_batch_global"): {"redis_commands": 2.1, "redis_round_trips": 0.3, "cross_slot": 0},
+    ("issue", "script_member"): {"redis_commands": 2, "redis_round_trips": 2, "cross_slot": 0},
+    # 토큰 풀: 꺼내기 + 회원 묶기가 스크립트 한 번
+    ("issue", "script_tokens"): {"redis_commands": 1, "redis_round_trips": 1, "cross_slot": 0},
+    # 동기 발급 예약 (직접 호출): 예약 / 확정 각각 스크립트 한 번
+    ("issue", "reserve"): {"redis_commands": 1, "redis_round_trips": 1, "cross_slot": 0},
+    ("issue", "confirm"): {"redis_commands": 2, "redis_round_trips": 2, "cross_slot": 0},
+    # 멱등 원장: 조회 MGET + 발급 + 결과 SET, 재전송은 조회 한 번으로 끝난다
+    ("issue", "script_ledger"): {"redis_commands": 3, "redis_round_trips": 3, "cross_slot": 0},
+    ("issue", "ledger_replay"): {"redis_commands": 1, "redis_round_trips": 1, "cross_slot": 0},
+    # 내보내기 비용은 키가 놓인 슬롯 / 노드에 따라 조금씩 달라 여유를 둔다 (legacy 키는 해시 태그가 없어 MGET 이 키마다)
+    ("expired_read", "scan"): {"redis_commands": 1.3, "redis_round_trips": 0.25, "sqs_requests": 0.15},
+    # 실행마다 캠페인 목록 SMEMBERS 1회 (인덱스 태그)
+    ("expired_read", "index"): {"redis_commands": 3.1, "redis_round_trips": 0.17, "sqs_requests": 0.15},
+    # SQS 배치 10건: 청크 SELECT + 다중 행 INSERT + COMMIT
+    ("expired_db", "batch"): {"db_statements": 0.3},
+}
+
+
+def sqs_records(bodies):
+    return [{"messageId": f"budget-{index}", "receiptHandle": "local-receipt-handle", "body": json.dumps(body)}
+            for index, body in enumerate(bodies)]
+
+
+def issue_records(start, count):
+    return sqs_records({"member_id": str(start + index), "timezone": "Asia/Seoul"} for index in range(count))
+
+
+class TestCommandBudgets(unittest.TestCase):
+
+    def setUp(self):
+        self.cluster = standins.LocalRedisCluster(nodes=3)
+        self.sqs = standins.LocalSQS()
+        self.db = standins.SQLiteConnection()
+        metrics.collector.enabled = False
+        negative_cache.cache.clear()
+        self.negative_cache_settings = (negative_cache.cache.enabled, negative_cache.cache.version_check_interval)
+        negative_cache.cache.enabled = True
+        negative_cache.cache.version_check_interval = 3600
+        codec.RECORD_ENCODING = codec.ENCODING_JSON
+
+        self.lambdas = {name: flash_sale_harness.load_lambda(name) for name in flash_sale_harness.LAMBDA_FILES}
+        for module in self.lambdas.values():
+            module.get_redis_client = lambda: self.cluster
+        self.lambdas["coupon_expired_read"].sqs_client = self.sqs
+        self.lambdas["coupon_expired_read"].export_window = 2 * 24 * 60 * 60
+        self.lambdas["coupon_expired_db"].get_db_connection = lambda: self.db
+        self.lambdas["coupon_init"].lambda_handler({}, None)
+
+        self.recorder = recorder.Recorder(trace_dir="")
+        self.recorder.wrap_redis(self.cluster)
+        self.recorder.wrap_sqs(self.sqs)
+        self.recorder.wrap_db(self.db)
+
+    def tearDown(self):
+        self.recorder.restore()
+        negative_cache.cache.enabled, negative_cache.cache.version_check_interval = self.negative_cache_settings
+        negative_cache.cache.clear()
+
+    def issue_handler(self, issue_mode, batch_mode=False, record_layout=issuance.RECORD_LAYOUT_CHANNEL,
+                      dedup_scope=dedup.DEDUP_SCOPE_CHANNEL):
+        # 기본값인 channel 범위로 재고, global 범위의 전역 SET 비용은 test_issue_script 에서 따로 잰다
+        handler = self.lambdas["coupon_issue_online"]
+        handler.issue_mode = issue_mode
+        handler.batch_mode = batch_mode
+        handler.record_layout = record_layout
+        handler.dedup_scope = dedup_scope
+        # 웜 컨테이너 상태 (스크립트 로드, 재고 버전 확인)
+        handler.lambda_handler({"Records": issue_records(900000, 1)}, None)
+        return handler
+
+    def measure(self, handler, event, messages):
+        self.recorder.reset()
+        handler.lambda_handler(event, None)
+        return {name: value / messages for name, value in self.recorder.summary().items()}
+
+    def assert_within_budget(self, budget_key, per_message):
+        for name, limit in BUDGETS[budget_key].items():
+            self.assertLessEqual(per_message[name], limit,
+                                 f"{budget_key} {name} per message {per_message[name]} > budget {limit}")
+
+    def test_issue_legacy(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        self.assert_within_budget(("issue", "legacy"),
+                                  self.measure(handler, {"Records": issue_records(100000, 1)}, 1))
+        self.assert_within_budget(("issue", "legacy_duplicate"),
+                                  self.measure(handler, {"Records": issue_records(100000, 1)}, 1))
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_issue_script(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT)
+        self.assert_within_budget(("issue", "script"),
+                                  self.measure(handler, {"Records": issue_records(100000, 1)}, 1))
+
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT, batch_mode=True)
+        self.assert_within_budget(("issue", "script_batch"),
+                                  self.measure(handler, {"Records": issue_records(200000, 10)}, 10))
+
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT, dedup_scope=dedup.DEDUP_SCOPE_GLOBAL)
+        self.assert_within_budget(("issue", "script_global"),
+                                  self.measure(handler, {"Records": issue_records(300000, 1)}, 1))
+
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT, batch_mode=True, dedup_scope=dedup.DEDUP_SCOPE_GLOBAL)
+        self.assert_within_budget(("issue", "script_batch_global"),
+                                  self.measure(handler, {"Records": issue_records(400000, 10)}, 10))
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_issue_script_member_layout(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT, record_layout=issuance.RECORD_LAYOUT_MEMBER)
+        self.assert_within_budget(("issue", "script_member"),
+                                  self.measure(handler, {"Records": issue_records(100000, 1)}, 1))
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_issue_token_pool(self):
+        self.lambdas["coupon_init"].lambda_handler(
+            {"action": "mint_tokens", "pools": [{"channel": "online", "quantity": 100}]}, None)
+        self.lambdas["coupon_issue_online"].inventory_mode = issuance.INVENTORY_TOKENS
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        self.assert_within_budget(("issue", "script_tokens"),
+                                  self.measure(handler, {"Records": issue_records(100000, 1)}, 1))
+        self.assertEqual(self.cluster.llen("tokens:{online}"), 98)
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_reserve_and_confirm(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        # 예약 / 확정 스크립트 로드
+        handler.lambda_handler({"action": "reserve", "member_id": "900001"}, None)
+        handler.lambda_handler({"action": "confirm", "member_id": "900001"}, None)
+        reserve = {"action": "reserve", "member_id": "100000", "timezone": "Asia/Seoul"}
+        self.assert_within_budget(("issue", "reserve"), self.measure(handler, reserve, 1))
+        self.assert_within_budget(("issue", "confirm"),
+                                  self.measure(handler, {"action": "confirm", "member_id": "100000"}, 1))
+        self.assertIsNotNone(self.cluster.hget("member_coupons:{online}", "100000"))
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_released_reservation_can_reserve_again(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        reserve = {"action": "reserve", "member_id": "100000", "timezone": "Asia/Seoul"}
+        stock = int(self.cluster.get("online"))
+
+        self.assertEqual(handler.lambda_handler(reserve, None)["statusCode"], 200)
+        self.assertEqual(handler.lambda_handler({"action": "release", "member_id": "100000"}, None)["statusCode"], 200)
+        self.assertEqual(int(self.cluster.get("online")), stock)
+        # 취소한 예약은 발급 회원 캐시에 남지 않는다
+        self.assertEqual(handler.lambda_handler(reserve, None)["statusCode"], 200)
+        self.assertEqual(handler.lambda_handler({"action": "confirm", "member_id": "100000"}, None)["statusCode"], 200)
+        self.assertEqual(handler.lambda_handler(reserve, None)["statusCode"], 400)
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_release_invalidates_cached_sold_out(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        negative_cache.cache.version_check_interval = 0
+        self.cluster.set("online", 1)
+
+        self.assertEqual(handler.lambda_handler({"action": "reserve", "member_id": "100000"}, None)["statusCode"], 200)
+        self.assertEqual(handler.lambda_handler({"action": "reserve", "member_id": "100001"}, None)["body"],
+                         "No online coupons remaining")
+        self.assertEqual(negative_cache.cache.cached_result("online", "100001"), issuance.SOLD_OUT)
+
+        # 예약 해제로 되돌린 재고는 소진 캐시에 가려지지 않는다 (버전 키를 올려 모든 컨테이너의 캐시를 비움)
+        self.assertEqual(handler.lambda_handler({"action": "release", "member_id": "100000"}, None)["statusCode"], 200)
+        self.assertEqual(handler.lambda_handler({"action": "reserve", "member_id": "100001"}, None)["statusCode"], 200)
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_migrated_members_rejected_on_sharded_stock(self):
+        self.lambdas["coupon_init"].lambda_handler({"shards": 4}, None)
+        self.cluster.sadd(dedup.GLOBAL_RECEIVED_KEY, "100000")
+        self.lambdas["coupon_init"].lambda_handler({"action": "migrate_received_coupons", "shards": 4}, None)
+        handler = self.lambdas["coupon_issue_online"]
+        handler.stock_shards = 4
+        handler.issue_mode = issuance.ISSUE_MODE_SCRIPT
+        handler.dedup_scope = dedup.DEDUP_SCOPE_CHANNEL
+        self.addCleanup(setattr, handler, "stock_shards", 1)
+
+        self.assertEqual(handler.issue_coupon_with_script(self.cluster, "online", "100000", "Asia/Seoul"),
+                         (issuance.ALREADY_RECEIVED, None))
+        self.assertEqual(handler.issue_coupon_with_script(self.cluster, "online", "100001", "Asia/Seoul")[0],
+                         issuance.ISSUED)
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_issue_script_with_ledger(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_SCRIPT)
+        handler.ledger = idempotency.Ledger("coupon_issue_online", enabled=True)
+        event = {"Records": issue_records(100000, 1)}
+
+        self.recorder.reset()
+        first = handler.lambda_handler(event, None)
+        self.assert_within_budget(("issue", "script_ledger"), self.recorder.summary())
+
+        # 같은 messageId 의 재전송은 처음 응답 그대로 (발급 회원 캐시의 "이미 받음" 이 아니라)
+        self.recorder.reset()
+        self.assertEqual(handler.lambda_handler(event, None), first)
+        self.assert_within_budget(("issue", "ledger_replay"), self.recorder.summary())
+        self.assertEqual(first["statusCode"], 200)
+
+    def test_export_and_archive(self):
+        handler = self.issue_handler(issuance.ISSUE_MODE_LEGACY)
+        for start in range(100000, 100050):
+            handler.lambda_handler({"Records": issue_records(start, 1)}, None)
+        coupons = len(standins.coupon_records(self.cluster))
+
+        export = self.lambdas["coupon_expired_read"]
+        for source in ("scan", "index"):
+            export.export_source = source
+            self.sqs.messages.clear()
+            self.assert_within_budget(("expired_read", source), self.measure(export, {}, coupons))
+            self.assertEqual(len(self.sqs.messages), coupons)
+
+        archive = self.lambdas["coupon_expired_db"]
+        archive.batch_mode = True
+        archive.ledger = idempotency.Ledger("coupon_expired_db", enabled=True)
+        records = self.sqs.drain_records(batch_size=10)[0]
+        # 앞의 절반은 이미 만료된 쿠폰으로 (index 내보내기가 싣는 만료 시각)
+        for record in records[:5]:
+            record["body"] = json.dumps(dict(json.loads(record["body"]), expires_at=1))
+        self.assertTrue(all("expires_at" in json.loads(record["body"]) for record in records))
+        self.assert_within_budget(("expired_db", "batch"), self.measure(archive, {"Records": records}, len(records)))
+        # 커밋한 쿠폰 중 만료 시각이 지난 쿠폰만 Redis 에서 지우고, 아직 유효한 쿠폰은 남긴다
+        archived = [json.loads(record["body"])["coupon_id"] for record in records]
+        self.assertEqual([self.cluster.get(f"coupon:{coupon_id}") for coupon_id in archived[:5]], [None] * 5)
+        self.assertTrue(all(self.cluster.get(f"coupon:{coupon_id}") for coupon_id in archived[5:]))
+
+        # 기본 (비배치) 경로로 재전송되어도 원장에 있는 쿠폰은 Redis 에 다시 쓰지 않는다
+        archive.batch_mode = False
+        archive.lambda_handler({"Records": records}, None)
+        self.assertEqual([self.cluster.get(f"coupon:{coupon_id}") for coupon_id in archived[:5]], [None] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+쿠폰 정보 인코딩 벤치마크 (json vs packed)
+
+    python benchmarks/coupon_codec_bench.py --coupons 200000
+    BENCH_REDIS_HOST=127.0.0.1 python benchmarks/coupon_codec_bench.py --coupons 1000000 --memory
+
+- 값 크기          : 인코딩한 쿠폰 정보의 평균 바이트 수
+- encode / decode : 초당 처리 건수 (codec.encode / codec.decode, json 은 기존 json.dumps / json.loads 와 같음)
+- --memory        : 로컬 redis-server 에 쿠폰 키(coupon:{bench}-<n>, EXPIREAT 포함)를 적재해
+                    used_memory 증가분으로 쿠폰 100만 건당 메모리를 출력
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import codec, expiry  # noqa: E402
+
+BENCH_TAG = "bench"
+LOAD_CHUNK = 10000
+TIMEZONES = ("Asia/Seoul", "America/New_York", "Europe/London", "Asia/Tokyo")
+
+
+def build_coupons(count):
+    now = int(time.time())
+    coupons = []
+    for index in range(count):
+        timezone = random.choice(TIMEZONES)
+        coupons.append({
+            "member_id": str(100000 + index),
+            "used": False,
+            "issued_at": expiry.current_timestamp(timezone, now - random.randint(0, 3600)),
+            "timezone": timezone,
+        })
+    return coupons
+
+
+def throughput(encoding, coupons):
+    started = time.perf_counter()
+    values = [codec.encode(coupon, encoding) for coupon in coupons]
+    encode_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in values:
+        codec.decode(value)
+    decode_seconds = time.perf_counter() - started
+
+    average = sum(len(value) for value in values) / len(values)
+    print(f"{encoding:7s} value={average:6.1f}B encode={len(values) / encode_seconds:10.0f}/s "
+          f"decode={len(values) / decode_seconds:10.0f}/s")
+    return values
+
+
+def memory_per_million(client, values):
+    """쿠폰 키를 적재하기 전후 used_memory 차이 (100만 건 기준으로 환산)"""
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    expire_at = int(time.time()) + 24 * 60 * 60
+    for start in range(0, len(values), LOAD_CHUNK):
+        pipe = client.pipeline(transaction=False)
+        for index in range(start, min(start + LOAD_CHUNK, len(values))):
+            key = f"coupon:{{{BENCH_TAG}}}-{index}"
+            pipe.set(key, values[index])
+            pipe.expireat(key, expire_at)
+        pipe.execute()
+    used = client.info("memory")["used_memory"] - before
+    client.flushdb()
+    return used * 1000000 / len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--coupons", type=int, default=200000)
+    parser.add_argument("--memory", action="store_true", help="로컬 redis-server 에 적재해 메모리 측정 (DB 를 비움)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    coupons = build_coupons(args.coupons)
+    encoded = {encoding: throughput(encoding, coupons) for encoding in (codec.ENCODING_JSON, codec.ENCODING_PACKED)}
+
+    if args.memory:
+        import redis
+        client = redis.Redis(
+            host=os.environ.get("BENCH_REDIS_HOST", "127.0.0.1"),
+            port=int(os.environ.get("BENCH_REDIS_PORT", "6379")),
+        )
+        for encoding, values in encoded.items():
+            per_million = memory_per_million(client, values)
+            print(f"{encoding:7s} memory/1M={per_million / 1024 / 1024:8.2f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+쿠폰 ID 형식 벤치마크 (uuid vs ulid)
+
+    BENCH_REDIS_HOST=127.0.0.1 python benchmarks/coupon_id_bench.py --coupons 1000000 --redis
+    BENCH_MYSQL_HOST=127.0.0.1 BENCH_MYSQL_USER=root BENCH_MYSQL_PASSWORD= \
+        python benchmarks/coupon_id_bench.py --coupons 200000 --mysql
+
+- 키 길이  : coupon:{online}-<id> 키의 평균 바이트 수
+- --redis : 로컬 redis-server 에 쿠폰 키(EXPIREAT 포함)를 적재해 used_memory 증가분으로 쿠폰 100만 건당 메모리를 출력
+- --mysql : 로컬 MySQL / MariaDB 에 coupon_core.archive.write_coupons 로 적재해 초당 행 수를 출력
+            (uuid 는 PK 가 무작위라 페이지 분할이 잦고, ulid 는 시각 순이라 인덱스 끝에 붙는다)
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import archive, codec, coupon_ids, expiry  # noqa: E402
+import expired_db_insert_bench as db_bench  # noqa: E402
+
+ID_FORMATS = (coupon_ids.ID_FORMAT_UUID, coupon_ids.ID_FORMAT_ULID)
+LOAD_CHUNK = 10000
+
+
+def build_ids(id_format, count):
+    return [f"{{online}}-{coupon_ids.new_id(id_format)}" for _ in range(count)]
+
+
+def memory_per_million(client, keys, value):
+    """쿠폰 키를 적재하기 전후 used_memory 차이 (100만 건 기준으로 환산)"""
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    expire_at = int(time.time()) + 24 * 60 * 60
+    for start in range(0, len(keys), LOAD_CHUNK):
+        pipe = client.pipeline(transaction=False)
+        for coupon_id in keys[start:start + LOAD_CHUNK]:
+            pipe.set(f"coupon:{coupon_id}", value)
+            pipe.expireat(f"coupon:{coupon_id}", expire_at)
+        pipe.execute()
+    used = client.info("memory")["used_memory"] - before
+    client.flushdb()
+    return used * 1000000 / len(keys)
+
+
+def mysql_insert(keys, chunk_size):
+    db_bench.reset_table()
+    connection = db_bench.connect(db_bench.BENCH_DATABASE)
+    rows = [(coupon_id, f"member{index}") for index, coupon_id in enumerate(keys)]
+    started = time.perf_counter()
+    for start in range(0, len(rows), LOAD_CHUNK):
+        archive.write_coupons(connection, rows[start:start + LOAD_CHUNK], chunk_size)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return len(rows) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--coupons", type=int, default=200000)
+    parser.add_argument("--redis", action="store_true", help="로컬 redis-server 에 적재해 메모리 측정 (DB 를 비움)")
+    parser.add_argument("--mysql", action="store_true", help="로컬 MySQL 에 적재해 쓰기 속도 측정 (테이블을 다시 만듦)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    ids = {id_format: build_ids(id_format, args.coupons) for id_format in ID_FORMATS}
+    for id_format, values in ids.items():
+        average = sum(len(f"coupon:{value}") for value in values) / len(values)
+        print(f"{id_format:5s} key={average:5.1f}B")
+
+    if args.redis:
+        import redis
+        client = redis.Redis(
+            host=os.environ.get("BENCH_REDIS_HOST", "127.0.0.1"),
+            port=int(os.environ.get("BENCH_REDIS_PORT", "6379")),
+        )
+        value = codec.encode({"member_id": "100001", "used": False,
+                              "issued_at": expiry.current_timestamp("Asia/Seoul"), "timezone": "Asia/Seoul"})
+        for id_format, values in ids.items():
+            print(f"{id_format:5s} memory/1M={memory_per_million(client, values, value) / 1024 / 1024:8.2f}MB")
+
+    if args.mysql:
+        for id_format, values in ids.items():
+            print(f"{id_format:5s} rows/s={mysql_insert(values, args.chunk_size):12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+중복 발급 체크 인덱스 벤치마크 (로컬 redis-server, bloom 은 RedisBloom 모듈 또는 Valkey bloom 필요)
+
+    BENCH_REDIS_HOST=127.0.0.1 python benchmarks/dedup_index_bench.py --members 1000000 --lookups 20000
+
+- set    : received_coupons:{tag} SET (기존 방식, 태그마다 키 하나)
+- bitmap : received_bits:{tag:<구간>} 비트맵 (구간마다 다른 슬롯, 여러 슬롯에 나뉘는 것은 bitmap 뿐)
+- bloom  : received_bloom:{tag} 필터 (태그마다 하나, 양성일 때 확인하는 member_coupons HASH 는 모든 방식에 공통이라 제외)
+
+회원 100만 명당 인덱스 메모리(MEMORY USAGE 합계)와 조회 1회 평균 / p99 지연을 출력한다.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import dedup  # noqa: E402
+
+BENCH_TAG = "bench"
+LOAD_CHUNK = 10000
+
+
+def connect():
+    return redis.Redis(
+        host=os.environ.get("BENCH_REDIS_HOST", "127.0.0.1"),
+        port=int(os.environ.get("BENCH_REDIS_PORT", "6379")),
+    )
+
+
+def index_keys(client):
+    keys = []
+    for pattern in (f"received_coupons:{{{BENCH_TAG}}}", f"received_bits:{{{BENCH_TAG}:*}}",
+                    f"received_bloom:{{{BENCH_TAG}}}", f"member_coupons:{{{BENCH_TAG}}}"):
+        keys.extend(client.scan_iter(match=pattern, count=1000))
+    return keys
+
+
+def reset(client):
+    keys = index_keys(client)
+    if keys:
+        client.delete(*keys)
+
+
+def load(client, index, members):
+    """인덱스에 회원을 등록 (파이프라인으로 LOAD_CHUNK 씩)"""
+    for start in range(0, len(members), LOAD_CHUNK):
+        pipe = client.pipeline(transaction=False)
+        for member_id in members[start:start + LOAD_CHUNK]:
+            if index.name == dedup.DEDUP_SET:
+                pipe.sadd(index.key(BENCH_TAG, member_id), member_id)
+            elif index.name == dedup.DEDUP_BITMAP:
+                index.queue_claim(pipe, BENCH_TAG, member_id)
+            else:
+                pipe.execute_command("BF.ADD", index.key(BENCH_TAG, member_id), member_id)
+        pipe.execute()
+
+
+def memory_usage(client):
+    total = 0
+    for key in index_keys(client):
+        if key.startswith(b"member_coupons:"):
+            continue
+        total += client.memory_usage(key, samples=0) or 0
+    return total
+
+
+def lookup_latency(client, index, candidates):
+    timings = []
+    for member_id in candidates:
+        started = time.perf_counter()
+        index.contains(client, BENCH_TAG, member_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return sum(timings) / len(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def run(client, name, members, lookups):
+    index = dedup.get_dedup_index(name)
+    reset(client)
+    if name == dedup.DEDUP_BLOOM:
+        index.reserve(client, BENCH_TAG, capacity=len(members))
+
+    started = time.perf_counter()
+    load(client, index, members)
+    load_seconds = time.perf_counter() - started
+
+    per_million = memory_usage(client) * 1000000 / len(members)
+    # 절반은 등록된 회원, 절반은 미등록 회원 조회
+    unknown = [str(int(member_id) + len(members) * 2) for member_id in random.sample(members, lookups // 2)]
+    candidates = random.sample(members, lookups - len(unknown)) + unknown
+    random.shuffle(candidates)
+    mean_ms, p99_ms = lookup_latency(client, index, candidates)
+
+    print(f"{name:7s} load={load_seconds:6.2f}s memory/1M={per_million / 1024 / 1024:8.2f}MB "
+          f"lookup mean={mean_ms:.3f}ms p99={p99_ms:.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--backends", default="set,bitmap,bloom")
+    args = parser.parse_args()
+
+    client = connect()
+    members = [str(member_id) for member_id in range(1, args.members + 1)]
+    for name in args.backends.split(","):
+        try:
+            run(client, name, members, args.lookups)
+        except redis.ResponseError as e:
+            # RedisBloom 모듈이 없는 서버
+            print(f"{name:7s} skipped: {e}")
+    reset(client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+coupon_expired_db Aurora 쓰기 벤치마크 (로컬 MySQL / MariaDB)
+
+    BENCH_MYSQL_HOST=127.0.0.1 BENCH_MYSQL_USER=root BENCH_MYSQL_PASSWORD= \
+        python benchmarks/expired_db_insert_bench.py --rows 20000 --chunk-sizes 100,500,1000
+
+- per-message : 기존 process_sqs_message 방식 (SELECT COUNT + INSERT + COMMIT 을 쿠폰마다)
+- batch       : coupon_core.archive.write_coupons (청크별 SELECT + 다중 행 INSERT IGNORE, 트랜잭션 1개)
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import pymysql
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import archive  # noqa: E402
+
+BENCH_DATABASE = os.environ.get("BENCH_MYSQL_DATABASE", "coupon_bench")
+
+
+def connect(database=None, **options):
+    return pymysql.connect(
+        host=os.environ.get("BENCH_MYSQL_HOST", "127.0.0.1"),
+        port=int(os.environ.get("BENCH_MYSQL_PORT", "3306")),
+        user=os.environ.get("BENCH_MYSQL_USER", "root"),
+        password=os.environ.get("BENCH_MYSQL_PASSWORD", ""),
+        database=database,
+        **options,
+    )
+
+
+def reset_table():
+    connection = connect()
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {BENCH_DATABASE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_DATABASE}.coupon")
+        cursor.execute(
+            f"CREATE TABLE {BENCH_DATABASE}.coupon ("
+            " coupon_id VARCHAR(64) NOT NULL PRIMARY KEY,"
+            " member_id VARCHAR(64) NOT NULL"
+            ") ENGINE=InnoDB"
+        )
+    connection.commit()
+    connection.close()
+
+
+def make_coupons(rows):
+    return [(f"offline-{uuid.uuid4()}", f"member{index}") for index in range(rows)]
+
+
+def per_message(connection, coupons):
+    for coupon_id, member_id in coupons:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM coupon WHERE coupon_id = %s AND member_id = %s",
+                (coupon_id, member_id)
+            )
+            if cursor.fetchone()[0] > 0:
+                connection.rollback()
+                continue
+            cursor.execute("INSERT INTO coupon (coupon_id, member_id) VALUES (%s, %s)", (coupon_id, member_id))
+            connection.commit()
+
+
+def run(name, fn, coupons):
+    reset_table()
+    connection = connect(BENCH_DATABASE)
+    started = time.perf_counter()
+    fn(connection, coupons)
+    elapsed = time.perf_counter() - started
+    connection.close()
+    print(f"{name:<20} rows={len(coupons):>8} elapsed={elapsed:8.3f}s rows/s={len(coupons) / elapsed:12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--chunk-sizes", default="100,500,1000")
+    args = parser.parse_args()
+
+    coupons = make_coupons(args.rows)
+    run("per-message", per_message, coupons)
+    for chunk_size in (int(size) for size in args.chunk_sizes.split(",")):
+        run(f"batch chunk={chunk_size}",
+            lambda connection, rows: archive.write_coupons(connection, rows, chunk_size), coupons)
+
+
+if __name__ == "__main__":
+    main()
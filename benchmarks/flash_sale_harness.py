@@ -0,0 +1,262 @@
+"""
+선착순 발급 부하 하네스 (로컬 대체 구현으로 5개 Lambda 전체 흐름 실행)
+
+    python benchmarks/flash_sale_harness.py --members 5000 --rate 2000 --concurrency 64 --issue-mode legacy
+    python benchmarks/flash_sale_harness.py --issue-mode script --batch-size 10 --shards 4 --rtt-ms 0.5
+    python benchmarks/flash_sale_harness.py --issue-mode script --batch-size 10 --async-mode --rtt-ms 0.5
+
+1. coupon_init          : 채널별 재고 초기화
+2. coupon_issue_offline / coupon_issue_online
+                        : 초당 --rate 명의 회원 요청을 --concurrency 개 스레드로 발사 (--duplicates 비율만큼 재요청)
+3. coupon_expired_read  : 남은 쿠폰을 LocalSQS 로 내보내기
+4. coupon_expired_db    : LocalSQS 메시지를 배치 모드로 SQLite (또는 BENCH_MYSQL_HOST 의 MySQL) 에 저장
+
+발급 수 vs 재고(초과 발급 / 중복 발급), 핸들러 p50/p99 지연, 발급 1건당 Redis 명령 수 / 왕복 수를 출력한다.
+Redis 는 benchmarks/standins.py 의 프로세스 내 클러스터를 쓰며 --rtt-ms 로 명령 왕복 지연을 흉내 낸다.
+Lua 스크립트 경로(--issue-mode script, --batch-size > 1)는 lupa 패키지가 필요하다.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-2")  # boto3 클라이언트 생성용 (호출은 하지 않음)
+
+import standins  # noqa: E402
+from coupon_core import codec, coupon_ids, issuance, metrics, negative_cache  # noqa: E402
+
+CHANNELS = ("offline", "online")
+LAMBDA_FILES = {
+    "coupon_init": "coupon_init/lambda_function.py",
+    "coupon_issue_offline": "coupon_issue_offline/lambda_function.py",
+    "coupon_issue_online": "coupon_issue_online/lambda_function.py",
+    "coupon_expired_read": "coupon_expired_read/lambda_function.py",
+    "coupon_expired_db": "coupon_expired_db/lambda_fuction.py",
+}
+TIMEZONES = ("Asia/Seoul", "America/New_York", "Europe/London", "Asia/Tokyo")
+
+
+def load_lambda(name):
+    """Lambda 모듈을 파일 경로로 로드 (모듈 이름이 모두 lambda_function 이라 이름을 바꿔 로드)"""
+    spec = importlib.util.spec_from_file_location(f"harness_{name}", os.path.join(ROOT, LAMBDA_FILES[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def connect_db():
+    if os.environ.get("BENCH_MYSQL_HOST"):
+        import pymysql
+        connection = pymysql.connect(
+            host=os.environ["BENCH_MYSQL_HOST"],
+            port=int(os.environ.get("BENCH_MYSQL_PORT", "3306")),
+            user=os.environ.get("BENCH_MYSQL_USER", "root"),
+            password=os.environ.get("BENCH_MYSQL_PASSWORD", ""),
+            database=os.environ.get("BENCH_MYSQL_DATABASE", "coupon_bench"),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS coupon")
+            cursor.execute("CREATE TABLE coupon (coupon_id VARCHAR(64) PRIMARY KEY, member_id VARCHAR(64) NOT NULL)")
+        connection.commit()
+        return connection
+    return standins.SQLiteConnection()
+
+
+def count_db_coupons(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM coupon")
+        return cursor.fetchone()[0]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latency_summary(latencies):
+    return f"p50={percentile(latencies, 0.5):.2f}ms p99={percentile(latencies, 0.99):.2f}ms n={len(latencies)}"
+
+
+def build_requests(members, duplicates):
+    """(채널, member_id, timezone) 목록. duplicates 비율만큼 이미 요청한 회원이 다시 요청한다."""
+    requests = [(random.choice(CHANNELS), str(100000 + index), random.choice(TIMEZONES))
+                for index in range(members)]
+    requests.extend(random.sample(requests, int(members * duplicates)))
+    random.shuffle(requests)
+    return requests
+
+
+def fire(handlers, requests, rate, concurrency, batch_size):
+    """
+    요청을 초당 rate 명 속도로 예약해 스레드 풀에서 핸들러를 호출 (개방형 부하: 밀려도 예약 속도 유지).
+    batch_size > 1 이면 같은 채널 요청을 묶어 Records 하나로 보낸다. 호출별 지연(ms) 목록을 반환.
+    """
+    invocations = []
+    for channel in CHANNELS:
+        channel_requests = [request for request in requests if request[0] == channel]
+        for start in range(0, len(channel_requests), batch_size):
+            invocations.append((channel, channel_requests[start:start + batch_size]))
+    random.shuffle(invocations)
+
+    latencies = []
+    lock = threading.Lock()
+    message_ids = iter(range(len(requests)))
+    started = time.perf_counter()
+    per_invocation = batch_size / rate
+
+    def invoke(position, channel, batch):
+        delay = started + position * per_invocation - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        with lock:
+            records = [{
+                "messageId": f"issue-{next(message_ids)}",
+                "receiptHandle": "local-receipt-handle",
+                "body": json.dumps({"member_id": member_id, "timezone": timezone}),
+            } for _, member_id, timezone in batch]
+        call_started = time.perf_counter()
+        handlers[channel].lambda_handler({"Records": records}, None)
+        elapsed_ms = (time.perf_counter() - call_started) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(invoke, position, channel, batch)
+                   for position, (channel, batch) in enumerate(invocations)]
+        for future in futures:
+            future.result()
+    return latencies, time.perf_counter() - started
+
+
+def issue_report(cluster, inventory_total, remaining_total):
+    records = standins.coupon_records(cluster)
+    issued = len(records)
+    members = len(set(records.values()))
+    return {
+        "issued": issued,
+        "inventory": inventory_total,
+        "oversold": max(0, issued - inventory_total),
+        "double_issued_members": issued - members,
+        # 재고 차감과 발급 수가 맞지 않으면 차감 없이 발급됐거나 차감 후 발급되지 않은 경우
+        "stock_mismatch": (inventory_total - remaining_total) - issued,
+    }
+
+
+def run(args):
+    random.seed(args.seed)
+    cluster = standins.LocalRedisCluster(nodes=args.nodes, rtt=args.rtt_ms / 1000)
+    sqs = standins.LocalSQS()
+    db = connect_db()
+
+    metrics.collector.enabled = False  # 호출마다 찍는 EMF 로그는 지연 측정에서 제외
+    negative_cache.cache.clear()  # 이전 실행의 클러스터에서 기억한 소진 / 발급 회원은 버린다
+    codec.RECORD_ENCODING = args.record_encoding
+    coupon_ids.ID_FORMAT = args.id_format
+    lambdas = {name: load_lambda(name) for name in LAMBDA_FILES}
+    for module in lambdas.values():
+        module.get_redis_client = lambda: cluster
+    for channel in CHANNELS:
+        handler = lambdas[f"coupon_issue_{channel}"]
+        handler.issue_mode = args.issue_mode
+        handler.batch_mode = args.batch_size > 1 and not args.async_mode
+        handler.async_mode = args.async_mode
+        handler.async_concurrency = args.async_concurrency
+        handler.stock_shards = args.shards
+        handler.shard_strategy = args.shard_strategy
+        handler.dedup_backend = args.dedup_backend
+        handler.record_layout = args.record_layout
+    lambdas["coupon_expired_read"].sqs_client = sqs
+    lambdas["coupon_expired_read"].export_source = args.export_source
+    lambdas["coupon_expired_read"].export_window = 2 * 24 * 60 * 60  # 하네스에서는 오늘 만료 쿠폰 전체
+    lambdas["coupon_expired_read"].stock_shards = args.shards
+    lambdas["coupon_expired_read"].partition_workers = args.export_workers
+    lambdas["coupon_expired_db"].batch_mode = True
+    lambdas["coupon_expired_db"].get_db_connection = lambda: db
+
+    # 1. 재고 초기화
+    lambdas["coupon_init"].lambda_handler({"shards": args.shards}, None)
+    remaining = lambdas["coupon_init"].lambda_handler({"action": "remaining", "shards": args.shards}, None)["body"]
+    inventory_total = sum(remaining.values())
+
+    # 2. 발급
+    requests = build_requests(args.members, args.duplicates)
+    cluster.reset_stats()
+    latencies, elapsed = fire(
+        {channel: lambdas[f"coupon_issue_{channel}"] for channel in CHANNELS},
+        requests, args.rate, args.concurrency, args.batch_size,
+    )
+    issue_commands, issue_round_trips = sum(cluster.commands.values()), cluster.round_trips
+    issue_command_mix = dict(cluster.commands.most_common(8))
+    remaining = lambdas["coupon_init"].lambda_handler({"action": "remaining", "shards": args.shards}, None)["body"]
+    report = issue_report(cluster, inventory_total, sum(remaining.values()))
+    issued = max(report["issued"], 1)
+
+    print(f"issue  : mode={args.issue_mode} batch={args.batch_size} shards={args.shards} nodes={args.nodes} "
+          f"rtt={args.rtt_ms}ms requests={len(requests)} in {elapsed:.2f}s ({len(requests) / elapsed:.0f}/s)")
+    print(f"         {report}")
+    print(f"         handler {latency_summary(latencies)}")
+    print(f"         redis commands/issue={issue_commands / issued:.2f} round_trips/issue={issue_round_trips / issued:.2f} "
+          f"mix={issue_command_mix}")
+
+    # 3. 만료 쿠폰 내보내기
+    cluster.reset_stats()
+    started = time.perf_counter()
+    lambdas["coupon_expired_read"].lambda_handler({}, None)
+    export_ms = (time.perf_counter() - started) * 1000
+    exported = len(sqs.messages)
+    print(f"export : source={args.export_source} messages={exported} sqs_requests={sqs.requests} "
+          f"elapsed={export_ms:.1f}ms redis_commands={sum(cluster.commands.values())}")
+
+    # 4. Aurora 저장
+    db_latencies = []
+    failures = 0
+    for records in sqs.drain_records():
+        started = time.perf_counter()
+        response = lambdas["coupon_expired_db"].lambda_handler({"Records": records}, None)
+        db_latencies.append((time.perf_counter() - started) * 1000)
+        failures += len(response.get("batchItemFailures", []))
+    stored = count_db_coupons(db)
+    print(f"archive: stored={stored}/{exported} failures={failures} handler {latency_summary(db_latencies)}")
+
+    return dict(report, exported=exported, stored=stored, issue_p99_ms=percentile(latencies, 0.99))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=5000, help="요청하는 회원 수")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="같은 회원이 다시 요청하는 비율")
+    parser.add_argument("--rate", type=float, default=2000, help="초당 요청 수")
+    parser.add_argument("--concurrency", type=int, default=64, help="동시에 실행하는 핸들러 수")
+    parser.add_argument("--batch-size", type=int, default=1, help="호출당 Records 수 (> 1 이면 배치 모드)")
+    parser.add_argument("--async-mode", action="store_true",
+                        help="배치 모드 대신 비동기 엔진으로 Records 를 동시에 처리 (--issue-mode script 필요)")
+    parser.add_argument("--async-concurrency", type=int, default=16)
+    parser.add_argument("--issue-mode", default=issuance.ISSUE_MODE_LEGACY,
+                        choices=(issuance.ISSUE_MODE_LEGACY, issuance.ISSUE_MODE_SCRIPT))
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--shard-strategy", default="member")
+    parser.add_argument("--dedup-backend", default="set")
+    parser.add_argument("--record-layout", default="channel", choices=("channel", "member"))
+    parser.add_argument("--record-encoding", default="json", choices=("json", "packed"))
+    parser.add_argument("--id-format", default="uuid", choices=("uuid", "ulid"))
+    parser.add_argument("--export-source", default="scan", choices=("scan", "index"))
+    parser.add_argument("--export-workers", type=int, default=1, help="scan 내보내기에서 동시에 처리할 파티션(노드) 수")
+    parser.add_argument("--nodes", type=int, default=3, help="로컬 클러스터 마스터 노드 수")
+    parser.add_argument("--rtt-ms", type=float, default=0.2, help="Redis 명령 왕복 지연 (ms)")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,30 @@
+import unittest
+
+import flash_sale_harness
+import standins
+
+
+class TestFlashSaleHarness(unittest.TestCase):
+
+    @unittest.skipUnless(standins.lupa, "lupa 가 없으면 Lua 스크립트 경로를 실행할 수 없음")
+    def test_script_batch_path_never_oversells(self):
+        report = flash_sale_harness.run(flash_sale_harness.parse_args([
+            "--members", "2500", "--rate", "20000", "--rtt-ms", "0",
+            "--issue-mode", "script", "--batch-size", "10", "--shards", "4", "--export-source", "index",
+        ]))
+
+        self.assertEqual(report["issued"], report["inventory"])
+        self.assertEqual(report["oversold"], 0)
+        self.assertEqual(report["double_issued_members"], 0)
+        self.assertEqual(report["stock_mismatch"], 0)
+        self.assertEqual(report["stored"], report["exported"])
+
+    def test_cluster_rejects_cross_slot_scripts(self):
+        cluster = standins.LocalRedisCluster(nodes=3)
+        sha = cluster.script_load("return 1")
+        with self.assertRaises(standins.ResponseError):
+            cluster.evalsha(sha, 2, "{online}", "{offline}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+동기 발급 예약 지연 벤치마크 (coupon_issue_online 직접 호출 action=reserve / confirm)
+
+    BENCH_REDIS_HOST=127.0.0.1 python benchmarks/reservation_latency_bench.py --requests 20000 --concurrency 64
+    python benchmarks/reservation_latency_bench.py --rtt-ms 0.3
+
+--concurrency 개 스레드가 서로 다른 회원으로 lambda_handler 를 직접 호출해 재고 --stock 개를 두고 예약한 뒤
+예약된 회원을 모두 확정한다. 단계별 처리량과 요청당 p50 / p99 / 최대 지연, 예약 수 (재고를 넘지 않아야 함) 를 출력한다.
+BENCH_REDIS_HOST 가 없으면 benchmarks/standins.py 의 프로세스 내 클러스터로 측정한다 (--rtt-ms 로 왕복 지연을 흉내).
+대체 구현은 Lua 를 같은 프로세스의 GIL 아래에서 실행하므로 동시성이 높으면 꼬리 지연이 실제 Redis 보다 크게 나온다.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flash_sale_harness  # noqa: E402
+from coupon_core import issuance, metrics, negative_cache, reservations  # noqa: E402
+
+# 사용자 응답 목표 (한 자릿수 밀리초)
+TARGET_P99_MS = 10.0
+
+
+def connect(rtt_ms):
+    if os.environ.get("BENCH_REDIS_HOST"):
+        import redis
+        return redis.Redis(host=os.environ["BENCH_REDIS_HOST"], port=int(os.environ.get("BENCH_REDIS_PORT", "6379")),
+                           max_connections=256)
+    import standins
+    return standins.LocalRedisCluster(nodes=3, rtt=rtt_ms / 1000)
+
+
+def reset(client, stock):
+    client.delete(issuance.received_coupons_key("online"), issuance.member_coupons_key("online"),
+                  reservations.reservations_key("online"), reservations.outbox_key("online"))
+    client.set("online", stock)
+    negative_cache.cache.clear()
+
+
+def run_phase(handler, events, concurrency):
+    """이벤트를 동시에 호출하고 (초당 처리 수, 지연 목록 ms, 응답 목록) 반환"""
+    def invoke(event):
+        started = time.perf_counter()
+        response = handler.lambda_handler(event, None)
+        return (time.perf_counter() - started) * 1000, response
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(invoke, events))
+    elapsed = time.perf_counter() - started
+    return len(events) / elapsed, sorted(latency for latency, _ in results), [response for _, response in results]
+
+
+def percentile(latencies, fraction):
+    return latencies[max(int(len(latencies) * fraction) - 1, 0)]
+
+
+def report(name, throughput, latencies, suffix=""):
+    p99 = percentile(latencies, 0.99)
+    print(f"{name:8s} {throughput:9.0f} req/s p50={percentile(latencies, 0.5):.3f}ms p99={p99:.3f}ms "
+          f"max={latencies[-1]:.3f}ms {'OK' if p99 < TARGET_P99_MS else 'OVER'} {suffix}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000, help="예약 요청 수 (회원 수)")
+    parser.add_argument("--stock", type=int, default=0, help="재고 (기본: 요청의 절반)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="로컬 클러스터의 왕복 지연(ms)")
+    args = parser.parse_args()
+    metrics.collector.enabled = False
+    stock = args.stock or args.requests // 2
+
+    client = connect(args.rtt_ms)
+    handler = flash_sale_harness.load_lambda("coupon_issue_online")
+    handler.get_redis_client = lambda: client
+    reset(client, stock)
+    # 예약 / 확정 스크립트 로드 (웜 컨테이너)
+    handler.lambda_handler({"action": "reserve", "member_id": "0"}, None)
+    handler.lambda_handler({"action": "confirm", "member_id": "0"}, None)
+    reset(client, stock)
+
+    members = [str(member_id) for member_id in range(1, args.requests + 1)]
+    throughput, latencies, responses = run_phase(
+        handler, [{"action": "reserve", "member_id": member_id, "timezone": "Asia/Seoul"} for member_id in members],
+        args.concurrency)
+    reserved = [member_id for member_id, response in zip(members, responses) if response["statusCode"] == 200]
+    report("reserve", throughput, latencies, f"reserved={len(reserved)}/{stock}")
+
+    throughput, latencies, responses = run_phase(
+        handler, [{"action": "confirm", "member_id": member_id} for member_id in reserved], args.concurrency)
+    confirmed = sum(1 for response in responses if response["statusCode"] == 200)
+    report("confirm", throughput, latencies, f"confirmed={confirmed}/{len(reserved)}")
+    reset(client, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,850 @@
+"""
+부하 하네스용 로컬 대체 구현 (Redis Cluster / SQS / Aurora MySQL)
+
+- LocalRedisCluster : 슬롯을 노드에 나눠 담는 프로세스 내 Redis Cluster. 노드마다 락을 두고 명령 단위로
+                      실행하므로 개별 호출 사이의 경쟁(GET 후 DECRBY 초과 발급 등)이 그대로 재현된다.
+                      Lua 스크립트는 lupa 가 설치된 경우에만 실행할 수 있다. 파이프라인은 redis-py-cluster 의
+                      ClusterPipeline 이 막아 둔 명령 (evalsha, mget 등) 을 같은 예외로 막는다.
+- LocalSQS          : send_message_batch 를 받아 메모리에 쌓고 Lambda Records 형식으로 꺼내 준다.
+- SQLiteConnection  : coupon 테이블만 쓰는 pymysql 연결 대용 (%s 자리표시자, INSERT IGNORE 변환).
+"""
+import fnmatch
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+import pymysql
+from redis.client import Script
+from redis.connection import Encoder
+from redis.exceptions import NoScriptError, ResponseError
+from rediscluster.crc import crc16
+from rediscluster.exceptions import RedisClusterException
+from rediscluster.pipeline import ClusterPipeline
+
+from coupon_core import codec
+
+try:
+    import lupa
+except ImportError:  # Lua 스크립트 경로는 lupa 가 있어야 실행 가능
+    lupa = None
+
+SLOTS = 16384
+
+
+def keyslot(key):
+    """해시 태그를 반영한 클러스터 슬롯"""
+    if isinstance(key, str):
+        key = key.encode()
+    start = key.find(b"{")
+    if start > -1:
+        end = key.find(b"}", start + 1)
+        if end > -1 and end != start + 1:
+            key = key[start + 1:end]
+    return crc16(key) % SLOTS
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float):
+        return repr(value).encode()
+    return str(value).encode()
+
+
+class LocalRedisNode:
+    """마스터 노드 하나 (데이터, 만료 시각, 적재된 스크립트)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.data = {}
+        self.expires = {}
+        self.scripts = {}
+        self.lock = threading.RLock()
+        # encoding=None : Lua 문자열을 bytes 로 주고받아 바이너리 값도 그대로 다룬다
+        self._lua = lupa.LuaRuntime(unpack_returned_tuples=True, encoding=None) if lupa else None
+
+    def execute(self, args):
+        with self.lock:
+            command = args[0].upper() if isinstance(args[0], str) else args[0].decode().upper()
+            handler = getattr(self, "_" + command.replace(".", "_").replace(" ", "_").lower(), None)
+            if handler is None:
+                raise ResponseError(f"unknown command '{command}'")
+            return handler(*args[1:])
+
+    # 키 공간
+
+    def _get_value(self, key, default=None):
+        key = _encode(key)
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key, default)
+
+    def _container(self, key, factory):
+        value = self._get_value(key)
+        if value is None:
+            value = self.data[_encode(key)] = factory()
+        return value
+
+    def _exists(self, *keys):
+        return sum(1 for key in keys if self._get_value(key) is not None)
+
+    def _del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get_value(key) is not None:
+                self.data.pop(_encode(key))
+                self.expires.pop(_encode(key), None)
+                removed += 1
+        return removed
+
+    def _expireat(self, key, timestamp):
+        if self._get_value(key) is None:
+            return 0
+        self.expires[_encode(key)] = int(timestamp)
+        return 1
+
+    def _expire(self, key, seconds):
+        return self._pexpire(key, int(seconds) * 1000)
+
+    def _pexpire(self, key, milliseconds):
+        if self._get_value(key) is None:
+            return 0
+        self.expires[_encode(key)] = time.time() + int(milliseconds) / 1000
+        return 1
+
+    def _pttl(self, key):
+        if self._get_value(key) is None:
+            return -2
+        expires_at = self.expires.get(_encode(key))
+        return -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+
+    def _scan(self, cursor, *options):
+        options = dict(zip(options[::2], options[1::2]))
+        match = _encode(options.get("MATCH", "*")).decode()
+        count = int(options.get("COUNT", 10))
+        keys = sorted(self.data)
+        start = int(cursor)
+        page = keys[start:start + count]
+        next_cursor = start + count if start + count < len(keys) else 0
+        return [str(next_cursor).encode(), [key for key in page if fnmatch.fnmatchcase(key.decode(), match)]]
+
+    # STRING
+
+    def _get(self, key):
+        return self._get_value(key)
+
+    def _mget(self, *keys):
+        return [self._get_value(key) for key in keys]
+
+    def _set(self, key, value, *options):
+        self.data[_encode(key)] = _encode(value)
+        self.expires.pop(_encode(key), None)
+        options = [_encode(option).decode().upper() for option in options]
+        if "EX" in options:
+            self._expire(key, options[options.index("EX") + 1])
+        return b"OK"
+
+    def _incrby(self, key, amount):
+        value = int(self._get_value(key, b"0")) + int(amount)
+        self.data[_encode(key)] = _encode(value)
+        return value
+
+    def _decrby(self, key, amount):
+        return self._incrby(key, -int(amount))
+
+    def _setbit(self, key, offset, value):
+        bits = self._container(key, set)
+        offset = int(offset)
+        previous = int(offset in bits)
+        if int(value):
+            bits.add(offset)
+        else:
+            bits.discard(offset)
+        return previous
+
+    def _getbit(self, key, offset):
+        return int(int(offset) in self._get_value(key, set()))
+
+    # SET
+
+    def _sadd(self, key, *members):
+        members_set = self._container(key, set)
+        added = 0
+        for member in map(_encode, members):
+            if member not in members_set:
+                members_set.add(member)
+                added += 1
+        return added
+
+    def _srem(self, key, *members):
+        members_set = self._get_value(key, set())
+        removed = sum(1 for member in map(_encode, members) if member in members_set)
+        members_set.difference_update(map(_encode, members))
+        return removed
+
+    def _sismember(self, key, member):
+        return int(_encode(member) in self._get_value(key, set()))
+
+    def _smembers(self, key):
+        return set(self._get_value(key, set()))
+
+    def _scard(self, key):
+        return len(self._get_value(key, set()))
+
+    def _sscan(self, key, cursor, *options):
+        # 작은 SET 을 가진 Redis 와 같이 COUNT 와 관계없이 한 번에 모두 반환
+        return [b"0", sorted(self._get_value(key, set()))]
+
+    # LIST
+
+    def _rpush(self, key, *values):
+        items = self._container(key, deque)
+        items.extend(map(_encode, values))
+        return len(items)
+
+    def _lpush(self, key, *values):
+        items = self._container(key, deque)
+        items.extendleft(map(_encode, values))
+        return len(items)
+
+    def _lrange(self, key, start, stop):
+        items = list(self._get_value(key, []))
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(items)
+        return items[start:stop + 1]
+
+    def _ltrim(self, key, start, stop):
+        items = self._get_value(key)
+        if items is not None:
+            kept = deque(self._lrange(key, start, stop))
+            if kept:
+                self.data[_encode(key)] = kept
+            else:
+                self._del(key)
+        return b"OK"
+
+    def _lpop(self, key):
+        items = self._get_value(key)
+        if not items:
+            return None
+        value = items.popleft()
+        if not items:
+            self._del(key)
+        return value
+
+    def _llen(self, key):
+        return len(self._get_value(key, []))
+
+    # HASH
+
+    def _hset(self, key, *field_values):
+        fields = self._container(key, dict)
+        added = 0
+        for field, value in zip(field_values[::2], field_values[1::2]):
+            added += int(_encode(field) not in fields)
+            fields[_encode(field)] = _encode(value)
+        return added
+
+    def _hsetnx(self, key, field, value):
+        fields = self._container(key, dict)
+        if _encode(field) in fields:
+            return 0
+        fields[_encode(field)] = _encode(value)
+        return 1
+
+    def _hget(self, key, field):
+        return self._get_value(key, {}).get(_encode(field))
+
+    def _hmget(self, key, *fields):
+        values = self._get_value(key, {})
+        return [values.get(_encode(field)) for field in fields]
+
+    def _hexists(self, key, field):
+        return int(_encode(field) in self._get_value(key, {}))
+
+    def _hdel(self, key, *fields):
+        values = self._get_value(key, {})
+        return sum(1 for field in fields if values.pop(_encode(field), None) is not None)
+
+    def _hgetall(self, key):
+        return dict(self._get_value(key, {}))
+
+    def _hkeys(self, key):
+        return list(self._get_value(key, {}))
+
+    def _hvals(self, key):
+        return list(self._get_value(key, {}).values())
+
+    def _hscan(self, key, cursor, *options):
+        # 작은 HASH 를 가진 Redis 와 같이 COUNT 와 관계없이 한 번에 모두 반환
+        return [b"0", [item for pair in self._get_value(key, {}).items() for item in pair]]
+
+    def _hlen(self, key):
+        return len(self._get_value(key, {}))
+
+    # SORTED SET
+
+    def _zadd(self, key, *score_members):
+        scores = self._container(key, dict)
+        added = 0
+        for score, member in zip(score_members[::2], score_members[1::2]):
+            added += int(_encode(member) not in scores)
+            scores[_encode(member)] = float(score)
+        return added
+
+    def _zrem(self, key, *members):
+        scores = self._get_value(key, {})
+        return sum(1 for member in members if scores.pop(_encode(member), None) is not None)
+
+    def _zscore(self, key, member):
+        score = self._get_value(key, {}).get(_encode(member))
+        return None if score is None else _encode(score)
+
+    def _zrangebyscore(self, key, low, high, *options):
+        low, high = _score_bound(low), _score_bound(high)
+        members = [member for member, score in sorted(self._get_value(key, {}).items(), key=lambda item: (item[1], item[0]))
+                   if low <= score <= high]
+        if options and _encode(options[0]).upper() == b"LIMIT":
+            offset, count = int(options[1]), int(options[2])
+            members = members[offset:offset + count if count >= 0 else None]
+        return members
+
+    def _zcount(self, key, low, high):
+        low, high = _score_bound(low), _score_bound(high)
+        return sum(1 for score in self._get_value(key, {}).values() if low <= score <= high)
+
+    def _zrange(self, key, start, stop, *options):
+        scored = sorted(self._get_value(key, {}).items(), key=lambda item: (item[1], item[0]))
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(scored)
+        scored = scored[start:stop + 1]
+        if options and _encode(options[0]).upper() == b"WITHSCORES":
+            return [value for member, score in scored for value in (member, _encode(score))]
+        return [member for member, _ in scored]
+
+    # 스크립트
+
+    def _script_load(self, source):
+        source = _encode(source)
+        sha = hashlib.sha1(source).hexdigest()
+        self.scripts[sha] = source.decode()
+        return sha.encode()
+
+    def _evalsha(self, sha, numkeys, *keys_and_args):
+        sha = _encode(sha).decode()
+        if sha not in self.scripts:
+            raise NoScriptError("No matching script. Please use EVAL.")
+        if self._lua is None:
+            raise ResponseError("Lua scripts need the lupa package in the local harness")
+        numkeys = int(numkeys)
+        lua = self._lua
+        lua_globals = lua.globals()
+        lua_globals.KEYS = lua.table_from([_encode(key) for key in keys_and_args[:numkeys]])
+        lua_globals.ARGV = lua.table_from([_encode(arg) for arg in keys_and_args[numkeys:]])
+        lua_globals.redis = lua.table_from({b"call": lambda *args: self._lua_reply(self.execute(args))})
+        lua_globals.cjson = lua.table_from({
+            b"decode": lambda data: lua.table_from(_json_to_lua(json.loads(_encode(data).decode()))),
+            b"encode": lambda table: json.dumps(_lua_to_json(table)).encode(),
+        })
+        return self._redis_reply(lua.execute(self.scripts[sha]))
+
+    def _lua_reply(self, value):
+        """Redis 응답을 Lua 값으로 (nil 은 false, 배열은 table)"""
+        if value is None:
+            return False
+        if isinstance(value, (list, set)):
+            return self._lua.table_from([self._lua_reply(item) for item in value])
+        return value
+
+    def _redis_reply(self, value):
+        """Lua 반환값을 Redis 응답으로 (number 는 정수, false 는 nil)"""
+        if lupa.lua_type(value) == "table":
+            return [self._redis_reply(value[index]) for index in range(1, len(value) + 1)]
+        if value is False or value is None:
+            return None
+        if value is True:
+            return 1
+        if isinstance(value, float):
+            return int(value)
+        if isinstance(value, str):
+            return value.encode()
+        return value
+
+
+def _json_to_lua(value):
+    """json.loads 결과의 문자열을 Lua 로 넘길 bytes 로"""
+    if isinstance(value, dict):
+        return {_json_to_lua(key): _json_to_lua(item) for key, item in value.items()}
+    if isinstance(value, str):
+        return value.encode()
+    return value
+
+
+def _lua_to_json(table):
+    return {_encode(key).decode(): item.decode() if isinstance(item, bytes) else item for key, item in table.items()}
+
+
+def _score_bound(value):
+    value = _encode(value).decode()
+    if value in ("-inf", "+inf", "inf"):
+        return float(value)
+    return float(value)
+
+
+class _Commands:
+    """redis-py-cluster 와 같은 이름의 명령 메서드 (실행은 execute_command 에 위임)"""
+
+    def get(self, key):
+        return self.execute_command("GET", key)
+
+    def set(self, key, value, ex=None):
+        if ex is not None:
+            return self.execute_command("SET", key, value, "EX", ex)
+        return self.execute_command("SET", key, value)
+
+    def incr(self, key, amount=1):
+        return self.execute_command("INCRBY", key, amount)
+
+    def incrby(self, key, amount=1):
+        return self.execute_command("INCRBY", key, amount)
+
+    def decrby(self, key, amount=1):
+        return self.execute_command("DECRBY", key, amount)
+
+    def delete(self, *keys):
+        return self.execute_command("DEL", *keys)
+
+    def exists(self, *keys):
+        return self.execute_command("EXISTS", *keys)
+
+    def expire(self, key, seconds):
+        return self.execute_command("EXPIRE", key, seconds)
+
+    def expireat(self, key, when):
+        return self.execute_command("EXPIREAT", key, when)
+
+    def setbit(self, key, offset, value):
+        return self.execute_command("SETBIT", key, offset, int(value))
+
+    def getbit(self, key, offset):
+        return self.execute_command("GETBIT", key, offset)
+
+    def sadd(self, key, *members):
+        return self.execute_command("SADD", key, *members)
+
+    def srem(self, key, *members):
+        return self.execute_command("SREM", key, *members)
+
+    def sismember(self, key, member):
+        return self.execute_command("SISMEMBER", key, member)
+
+    def smembers(self, key):
+        return self.execute_command("SMEMBERS", key)
+
+    def scard(self, key):
+        return self.execute_command("SCARD", key)
+
+    def sscan_iter(self, key, match=None, count=None):
+        _, members = self.execute_command("SSCAN", key, 0)
+        yield from members
+
+    def rpush(self, key, *values):
+        return self.execute_command("RPUSH", key, *values)
+
+    def lpop(self, key):
+        return self.execute_command("LPOP", key)
+
+    def lpush(self, key, *values):
+        return self.execute_command("LPUSH", key, *values)
+
+    def lrange(self, key, start, end):
+        return self.execute_command("LRANGE", key, start, end)
+
+    def ltrim(self, key, start, end):
+        return self.execute_command("LTRIM", key, start, end)
+
+    def llen(self, key):
+        return self.execute_command("LLEN", key)
+
+    def hset(self, key, field, value):
+        return self.execute_command("HSET", key, field, value)
+
+    def hsetnx(self, key, field, value):
+        return self.execute_command("HSETNX", key, field, value)
+
+    def hget(self, key, field):
+        return self.execute_command("HGET", key, field)
+
+    def hmget(self, key, *fields):
+        return self.execute_command("HMGET", key, *fields)
+
+    def hexists(self, key, field):
+        return self.execute_command("HEXISTS", key, field)
+
+    def hdel(self, key, *fields):
+        return self.execute_command("HDEL", key, *fields)
+
+    def hgetall(self, key):
+        return self.execute_command("HGETALL", key)
+
+    def hlen(self, key):
+        return self.execute_command("HLEN", key)
+
+    def hscan(self, key, cursor=0, match=None, count=None):
+        cursor, flat = self.execute_command("HSCAN", key, cursor)
+        return int(cursor), dict(zip(flat[::2], flat[1::2]))
+
+    def pttl(self, key):
+        return self.execute_command("PTTL", key)
+
+    def zadd(self, key, mapping):
+        score_members = [item for member, score in mapping.items() for item in (score, member)]
+        return self.execute_command("ZADD", key, *score_members)
+
+    def zrem(self, key, *members):
+        return self.execute_command("ZREM", key, *members)
+
+    def zcount(self, key, low, high):
+        return self.execute_command("ZCOUNT", key, low, high)
+
+    def zrange(self, key, start, end, withscores=False):
+        if withscores:
+            flat = self.execute_command("ZRANGE", key, start, end, "WITHSCORES")
+            return [(member, float(score)) for member, score in zip(flat[::2], flat[1::2])]
+        return self.execute_command("ZRANGE", key, start, end)
+
+    def zscore(self, key, member):
+        score = self.execute_command("ZSCORE", key, member)
+        return None if score is None else float(score)
+
+    def zrangebyscore(self, key, low, high, start=None, num=None):
+        if start is not None and num is not None:
+            return self.execute_command("ZRANGEBYSCORE", key, low, high, "LIMIT", start, num)
+        return self.execute_command("ZRANGEBYSCORE", key, low, high)
+
+    def evalsha(self, sha, numkeys, *keys_and_args):
+        return self.execute_command("EVALSHA", sha, numkeys, *keys_and_args)
+
+
+class LocalRedisCluster(_Commands):
+    """
+    프로세스 내 Redis Cluster. 단일 명령마다 왕복 1회(rtt 초)를 흉내 내고,
+    파이프라인은 노드별로 묶어 노드당 왕복 1회로 센다. 여러 키 명령은 같은 슬롯이어야 한다(CROSSSLOT).
+    commands / round_trips 로 실행한 명령 수와 왕복 수를 확인할 수 있다.
+    """
+
+    def __init__(self, nodes=3, rtt=0.0):
+        self.nodes = [LocalRedisNode(f"127.0.0.1:{7000 + index}") for index in range(nodes)]
+        self.rtt = rtt
+        self.commands = Counter()
+        self.round_trips = 0
+        self._stats_lock = threading.Lock()
+        self.connection_pool = _LocalConnectionPool(self)
+
+    def node_for_slot(self, slot):
+        return self.nodes[slot * len(self.nodes) // SLOTS]
+
+    def route(self, args):
+        """명령이 실행될 노드 (키가 없는 SCRIPT LOAD 등은 None = 모든 노드)"""
+        command = str(args[0]).upper()
+        if command == "EVALSHA":
+            keys = args[3:3 + int(args[2])]
+        elif command in ("MGET", "DEL", "EXISTS"):
+            keys = args[1:]
+        elif command == "SCRIPT LOAD":
+            return None
+        else:
+            keys = args[1:2]
+        slots = {keyslot(_encode(key)) for key in keys}
+        if len(slots) > 1:
+            raise ResponseError("CROSSSLOT Keys in request don't hash to the same slot")
+        return self.node_for_slot(slots.pop() if slots else 0)
+
+    def execute_command(self, *args):
+        node = self.route(args)
+        self._account([args], 1)
+        if node is None:
+            return [target.execute(args) for target in self.nodes][0]
+        return node.execute(args)
+
+    def _account(self, commands, round_trips):
+        if self.rtt:
+            time.sleep(self.rtt * round_trips)
+        with self._stats_lock:
+            self.round_trips += round_trips
+            for args in commands:
+                self.commands[str(args[0]).upper()] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.commands = Counter()
+            self.round_trips = 0
+
+    def script_load(self, source):
+        return self.execute_command("SCRIPT LOAD", source).decode()
+
+    def register_script(self, source):
+        return Script(self, source)
+
+    def pipeline(self, transaction=None):
+        return LocalPipeline(self)
+
+    def scan_iter(self, match="*", count=10):
+        for node in self.nodes:
+            cursor = 0
+            while True:
+                cursor, keys = node.execute(("SCAN", cursor, "MATCH", match, "COUNT", count))
+                self._account([("SCAN",)], 1)
+                yield from keys
+                cursor = int(cursor)
+                if cursor == 0:
+                    break
+
+    def ping(self):
+        return True
+
+
+class LocalPipeline(_Commands):
+    """명령을 쌓았다가 노드별로 묶어 실행 (ClusterPipeline 과 같이 순서대로 결과 반환)"""
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.queue = []
+
+    def execute_command(self, *args):
+        self.queue.append(args)
+        return self
+
+    def execute(self, raise_on_error=True):
+        queue, self.queue = self.queue, []
+        routed = []
+        for args in queue:
+            try:
+                routed.append(self.cluster.route(args))
+            except ResponseError as e:
+                routed.append(e)
+        self.cluster._account(queue, len({id(node) for node in routed if not isinstance(node, Exception)}))
+
+        results = []
+        for args, node in zip(queue, routed):
+            try:
+                if isinstance(node, Exception):
+                    raise node
+                if node is None:
+                    results.append([target.execute(args) for target in self.cluster.nodes][0])
+                else:
+                    results.append(node.execute(args))
+            except ResponseError as e:
+                if raise_on_error:
+                    raise
+                results.append(e)
+        return results
+
+
+# ClusterPipeline 이 막아 둔 명령 (evalsha, mget 등) 은 대체 파이프라인에서도 같은 예외로 막는다
+BLOCKED_PIPELINE_COMMANDS = sorted(
+    name for name, attr in vars(ClusterPipeline).items()
+    if getattr(attr, "__qualname__", "").startswith("block_pipeline_command")
+)
+
+
+def _blocked_pipeline_command(name):
+    def inner(self, *args, **kwargs):
+        raise RedisClusterException(
+            f"ERROR: Calling pipelined function {name} is blocked when running redis in cluster mode...")
+    return inner
+
+
+for _name in BLOCKED_PIPELINE_COMMANDS:
+    setattr(LocalPipeline, _name, _blocked_pipeline_command(_name))
+
+
+def _pipeline_delete(self, *keys):
+    # ClusterPipeline.delete 는 키 하나만 받는다
+    if len(keys) != 1:
+        raise RedisClusterException("deleting multiple keys is not implemented in pipeline command")
+    return self.execute_command("DEL", keys[0])
+
+
+LocalPipeline.delete = _pipeline_delete
+
+
+class _LocalConnectionPool:
+    """export.iter_master_keys 가 쓰는 connection_pool.nodes / get_connection_by_node 대용"""
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.nodes = _LocalNodeManager(cluster)
+
+    def get_encoder(self):
+        return Encoder("utf-8", "strict", False)
+
+    def get_connection_by_node(self, node):
+        return _LocalConnection(self.cluster, self.cluster.nodes[node["index"]])
+
+    def release(self, connection):
+        pass
+
+
+class _LocalNodeManager:
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def all_masters(self):
+        return [{"name": node.name, "index": index, "server_type": "master"}
+                for index, node in enumerate(self.cluster.nodes)]
+
+    def keyslot(self, key):
+        return keyslot(_encode(key))
+
+    @property
+    def slots(self):
+        return _LocalSlots(self.cluster)
+
+
+class _LocalSlots:
+    """NodeManager.slots 대용 (slot -> [마스터 노드 정보])"""
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    def __getitem__(self, slot):
+        return [{"name": self.cluster.node_for_slot(slot).name, "server_type": "master"}]
+
+
+class _LocalConnection:
+
+    def __init__(self, cluster, node):
+        self.cluster = cluster
+        self.node = node
+        self._response = None
+
+    def send_command(self, *args):
+        self.cluster._account([args], 1)
+        self._response = self.node.execute(args)
+
+    def read_response(self):
+        return self._response
+
+    def disconnect(self):
+        pass
+
+
+class LocalSQS:
+    """send_message_batch 만 구현한 SQS 대용. 받은 메시지는 drain_records() 로 꺼낸다."""
+
+    def __init__(self):
+        self.messages = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._lock:
+            self.requests += 1
+            self.messages.extend(Entries)
+        return {"Successful": [{"Id": entry["Id"], "MessageId": str(uuid.uuid4())} for entry in Entries]}
+
+    def drain_records(self, batch_size=10):
+        """쌓인 메시지를 Lambda SQS 이벤트 Records 묶음으로 반환"""
+        with self._lock:
+            messages, self.messages = self.messages, []
+        records = [{
+            "messageId": f"msg-{next(self._ids)}",
+            "receiptHandle": "local-receipt-handle",
+            "body": entry["MessageBody"],
+        } for entry in messages]
+        return [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+
+
+class SQLiteConnection:
+    """
+    coupon_expired_db 가 쓰는 pymysql 연결 기능만 흉내 낸 SQLite 연결.
+    오류는 pymysql.MySQLError 로 바꿔 올려 Lambda 의 오류 처리 경로를 그대로 탄다.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.open = True
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level="DEFERRED")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS coupon (coupon_id VARCHAR(64) PRIMARY KEY, member_id VARCHAR(64) NOT NULL)"
+        )
+        self._connection.commit()
+
+    def cursor(self):
+        return _SQLiteCursor(self)
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._connection.rollback()
+
+    def ping(self, reconnect=True):
+        return True
+
+    def close(self):
+        self.open = False
+
+    def count_coupons(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM coupon").fetchone()[0]
+
+
+class _SQLiteCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def execute(self, sql, params=()):
+        sql = sql.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+        with self.connection._lock:
+            try:
+                self._cursor = self.connection._connection.execute(sql, tuple(params))
+            except sqlite3.Error as e:
+                raise pymysql.MySQLError(str(e))
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor = None
+
+
+def coupon_records(cluster):
+    """클러스터에 저장된 쿠폰 정보 {coupon_id: member_id} (하네스 검증용, 통계에 넣지 않음)"""
+    records = {}
+    for node in cluster.nodes:
+        with node.lock:
+            for key in list(node.data):
+                if not key.startswith(b"coupon:"):
+                    continue
+                value = node._get_value(key)
+                if value is None:
+                    continue
+                records[key.decode()[len("coupon:"):]] = codec.decode(value).get("member_id")
+    return records
@@ -0,0 +1,108 @@
+"""
+토큰 풀(tokens) 재고 모드 벤치마크 - 미리 발급 속도와 발급 처리량 (counter 모드 대비)
+
+    python benchmarks/token_pool_bench.py --tokens 1000000 --requests 20000
+    BENCH_REDIS_HOST=127.0.0.1 python benchmarks/token_pool_bench.py --tokens 5000000
+
+- mint   : token_pool.mint_tokens 로 토큰 --tokens 개를 미리 발급하는 시간 (초당 토큰 수)
+- issue  : 재고보다 많은 --requests 명이 한 번씩 발급을 요청할 때 초당 처리 수 / 요청당 평균, p99 지연
+           single 은 요청마다 EVALSHA 한 번, batch 는 --batch 개씩 EVALSHA 파이프라인 (SQS 배치 모드)
+- issued : 실제 발급 수 (재고를 넘지 않아야 함)
+BENCH_REDIS_HOST 가 없으면 benchmarks/standins.py 의 프로세스 내 클러스터로 측정한다 (--rtt 로 왕복 지연을 흉내).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from coupon_core import dedup, expiry, issuance, metrics, token_pool  # noqa: E402
+
+BENCH_TAG = "bench"
+
+
+def connect(rtt):
+    if os.environ.get("BENCH_REDIS_HOST"):
+        import redis
+        return redis.Redis(host=os.environ["BENCH_REDIS_HOST"], port=int(os.environ.get("BENCH_REDIS_PORT", "6379")))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import standins
+    return standins.LocalRedisCluster(nodes=3, rtt=rtt)
+
+
+def reset(client):
+    client.delete(BENCH_TAG, token_pool.pool_key(BENCH_TAG), dedup.get_dedup_index(dedup.DEDUP_SET).key(BENCH_TAG, ""),
+                  issuance.member_coupons_key(BENCH_TAG))
+
+
+def issue_requests(count):
+    expiry_timestamp = expiry.expiry_timestamp_for_today("Asia/Seoul")
+    issued_at = expiry.current_timestamp("Asia/Seoul")
+    return [(str(member_id), {"member_id": str(member_id), "used": False, "issued_at": issued_at,
+                              "timezone": "Asia/Seoul"}, expiry_timestamp)
+            for member_id in range(1, count + 1)]
+
+
+def run_issue(client, mode, stock, requests, batch):
+    """재고 stock 개로 requests 를 발급하고 (초당 처리 수, 평균 ms, p99 ms, 발급 수) 반환"""
+    reset(client)
+    if mode == issuance.INVENTORY_TOKENS:
+        token_pool.mint_tokens(client, BENCH_TAG, stock, replace=True)
+    else:
+        client.set(BENCH_TAG, stock)
+
+    timings = []
+    issued = 0
+    started = time.perf_counter()
+    for start in range(0, len(requests), batch):
+        chunk = requests[start:start + batch]
+        call_started = time.perf_counter()
+        if batch == 1:
+            member_id, coupon_data, expiry_timestamp = chunk[0]
+            if mode == issuance.INVENTORY_TOKENS:
+                results = [token_pool.issue_coupon(client, BENCH_TAG, member_id, coupon_data, expiry_timestamp)]
+            else:
+                results = [issuance.issue_coupon_script(client, BENCH_TAG, member_id, coupon_data, expiry_timestamp)]
+        elif mode == issuance.INVENTORY_TOKENS:
+            results = token_pool.issue_coupons_batch(client, BENCH_TAG, chunk)
+        else:
+            results = issuance.issue_coupons_script_batch(client, BENCH_TAG, chunk)
+        timings.append((time.perf_counter() - call_started) * 1000 / len(chunk))
+        issued += sum(1 for result in results if not isinstance(result, Exception) and result[0] == issuance.ISSUED)
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return len(requests) / elapsed, sum(timings) / len(timings), timings[max(int(len(timings) * 0.99) - 1, 0)], issued
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1000000, help="미리 발급 측정 토큰 수")
+    parser.add_argument("--requests", type=int, default=20000, help="발급 요청 수 (회원 수)")
+    parser.add_argument("--stock", type=int, default=0, help="발급 측정 재고 (기본: 요청의 절반)")
+    parser.add_argument("--batch", type=int, default=10, help="batch 측정의 파이프라인 크기")
+    parser.add_argument("--rtt", type=float, default=0.0, help="로컬 클러스터의 왕복 지연(초)")
+    args = parser.parse_args()
+    metrics.collector.enabled = False
+    client = connect(args.rtt)
+
+    reset(client)
+    for id_format in ("uuid", "ulid"):
+        started = time.perf_counter()
+        token_pool.mint_tokens(client, BENCH_TAG, args.tokens, replace=True, id_format=id_format)
+        elapsed = time.perf_counter() - started
+        print(f"mint   {id_format:5s} tokens={args.tokens} {elapsed:6.2f}s {args.tokens / elapsed:10.0f} tokens/s")
+
+    requests = issue_requests(args.requests)
+    stock = args.stock or args.requests // 2
+    for batch in (1, args.batch):
+        for mode in (issuance.INVENTORY_COUNTER, issuance.INVENTORY_TOKENS):
+            throughput, mean_ms, p99_ms, issued = run_issue(client, mode, stock, requests, batch)
+            print(f"issue  {mode:7s} batch={batch:<3d} {throughput:9.0f} req/s mean={mean_ms:.3f}ms "
+                  f"p99={p99_ms:.3f}ms issued={issued}/{stock}")
+    reset(client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# 저장소 루트를 sys.path 에 올려 각 Lambda 테스트에서 coupon_core (Lambda Layer) 를 import 할 수 있게 한다.
@@ -0,0 +1 @@
+"""쿠폰 Lambda 공용 모듈 (Lambda Layer 로 배포)"""
@@ -0,0 +1,83 @@
+import pymysql
+
+from coupon_core import metrics
+
+# 다중 행 INSERT 한 번에 묶을 최대 행 수
+INSERT_CHUNK_SIZE = 500
+
+# 레코드별 처리 결과
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+
+def write_coupons(connection, coupons, chunk_size=INSERT_CHUNK_SIZE):
+    """
+    (coupon_id, member_id) 목록을 청크마다 SELECT 한 번 + 다중 행 INSERT IGNORE 한 번으로
+    하나의 트랜잭션에 저장. {coupon_id: inserted / duplicate / failed} 를 반환.
+    coupon 테이블의 coupon_id 에 PK 또는 UNIQUE 인덱스가 있다고 가정한다.
+    """
+    outcomes = {}
+    rows = []
+    for coupon_id, member_id in coupons:
+        if coupon_id in outcomes:
+            # 같은 배치 안에서 중복된 coupon_id 는 첫 번째만 저장
+            continue
+        outcomes[coupon_id] = INSERTED
+        rows.append((coupon_id, member_id))
+
+    try:
+        with metrics.timer("db_write"), connection.cursor() as cursor:
+            if not _write_chunks(cursor, rows, outcomes, chunk_size):
+                # SELECT 와 INSERT 사이에 다른 작업자가 같은 쿠폰을 저장해 INSERT IGNORE 가 일부 행을 버렸다.
+                # 어느 행인지 알 수 없으므로 되돌리고 행마다 INSERT IGNORE 해 영향받은 행 수로 구분한다 (드문 경로)
+                connection.rollback()
+                metrics.increment("db_insert_races")
+                _write_rows(cursor, rows, outcomes)
+        connection.commit()
+    except pymysql.MySQLError as e:
+        print(f"Aurora batch write failed, rolled back {len(rows)} coupons: {e}")
+        try:
+            connection.rollback()
+        except pymysql.MySQLError:
+            pass
+        for coupon_id, _ in rows:
+            outcomes[coupon_id] = FAILED
+
+    return outcomes
+
+
+def _write_chunks(cursor, rows, outcomes, chunk_size):
+    """청크별 SELECT + 다중 행 INSERT IGNORE. INSERT 의 영향받은 행 수가 넣은 행 수와 다르면 False"""
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        existing = existing_coupon_ids(cursor, [coupon_id for coupon_id, _ in chunk])
+        new_rows = [row for row in chunk if str(row[0]) not in existing]
+
+        if new_rows:
+            placeholders = ", ".join(["(%s, %s)"] * len(new_rows))
+            params = [value for row in new_rows for value in row]
+            inserted = cursor.execute(f"INSERT IGNORE INTO coupon (coupon_id, member_id) VALUES {placeholders}",
+                                      params)
+            if inserted != len(new_rows):
+                return False
+
+        for coupon_id, _ in chunk:
+            if str(coupon_id) in existing:
+                outcomes[coupon_id] = DUPLICATE
+    return True
+
+
+def _write_rows(cursor, rows, outcomes):
+    """행마다 INSERT IGNORE 하고 영향받은 행이 없으면 duplicate"""
+    for coupon_id, member_id in rows:
+        inserted = cursor.execute("INSERT IGNORE INTO coupon (coupon_id, member_id) VALUES (%s, %s)",
+                                  (coupon_id, member_id))
+        outcomes[coupon_id] = INSERTED if inserted else DUPLICATE
+
+
+def existing_coupon_ids(cursor, coupon_ids):
+    """이미 저장된 coupon_id 집합 (SELECT 한 번)"""
+    placeholders = ", ".join(["%s"] * len(coupon_ids))
+    cursor.execute(f"SELECT coupon_id FROM coupon WHERE coupon_id IN ({placeholders})", coupon_ids)
+    return {str(row[0]) for row in cursor.fetchall()}
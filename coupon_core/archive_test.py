@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import MagicMock
+
+import pymysql
+
+from coupon_core import archive
+
+
+def make_connection(existing_per_chunk, lost=()):
+    """
+    청크마다 existing_per_chunk 의 행이 이미 있는 연결. INSERT 는 넣은 행 수를 돌려주고,
+    lost 에 있는 coupon_id 는 다른 작업자가 먼저 저장한 것처럼 무시한다.
+    """
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = existing_per_chunk
+
+    def execute(sql, params=()):
+        if sql.startswith("INSERT"):
+            return sum(1 for coupon_id in list(params)[::2] if coupon_id not in lost)
+        return len(params)
+
+    cursor.execute.side_effect = execute
+    return connection, cursor
+
+
+class TestWriteCoupons(unittest.TestCase):
+
+    def test_one_select_and_insert_per_chunk_in_single_transaction(self):
+        connection, cursor = make_connection([[("online-2",)], []])
+        coupons = [("online-1", "user1"), ("online-2", "user2"), ("online-3", "user3")]
+
+        outcomes = archive.write_coupons(connection, coupons, chunk_size=2)
+
+        self.assertEqual(outcomes, {
+            "online-1": archive.INSERTED,
+            "online-2": archive.DUPLICATE,
+            "online-3": archive.INSERTED,
+        })
+        # 청크 2개 x (SELECT 1 + INSERT 1)
+        self.assertEqual(cursor.execute.call_count, 4)
+        first_insert_sql, first_insert_params = cursor.execute.call_args_list[1][0]
+        self.assertTrue(first_insert_sql.startswith("INSERT IGNORE INTO coupon"))
+        self.assertEqual(first_insert_params, ["online-1", "user1"])
+        connection.commit.assert_called_once()
+
+    def test_rows_dropped_by_concurrent_writer_are_reported_duplicate(self):
+        connection, cursor = make_connection([[]], lost={"online-2"})
+        coupons = [("online-1", "user1"), ("online-2", "user2")]
+
+        outcomes = archive.write_coupons(connection, coupons)
+
+        # 다중 행 INSERT 가 한 행을 덜 넣었으므로 되돌리고 행마다 다시 넣는다
+        self.assertEqual(outcomes, {"online-1": archive.INSERTED, "online-2": archive.DUPLICATE})
+        connection.rollback.assert_called_once()
+        self.assertEqual([call[0][1] for call in cursor.execute.call_args_list[2:]],
+                         [("online-1", "user1"), ("online-2", "user2")])
+        connection.commit.assert_called_once()
+
+    def test_rolls_back_and_reports_failed(self):
+        connection, cursor = make_connection([[]])
+        cursor.execute.side_effect = [None, pymysql.err.OperationalError(1205, "Lock wait timeout")]
+
+        outcomes = archive.write_coupons(connection, [("online-1", "user1"), ("online-1", "user1")])
+
+        self.assertEqual(outcomes, {"online-1": archive.FAILED})
+        connection.rollback.assert_called_once()
+        connection.commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
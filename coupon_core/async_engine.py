@@ -0,0 +1,81 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 한 호출 안에서 동시에 처리하는 레코드 수
+ASYNC_CONCURRENCY = int(os.environ.get("COUPON_ASYNC_CONCURRENCY", "16"))
+
+# redis-py-cluster 는 asyncio 클라이언트가 없어 (redis<4 고정이라 redis.asyncio 도 쓸 수 없음)
+# 공유 RedisCluster 클라이언트 호출을 스레드 풀에서 기다린다. 웜 컨테이너에서 재사용.
+_executor = None
+
+
+def member_key(record):
+    """같은 회원의 레코드는 순서대로 처리 (파싱할 수 없으면 messageId 단독으로 처리)"""
+    try:
+        return json.loads(record['body']).get("member_id") or record.get('messageId')
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return record.get('messageId')
+
+
+def process_records(records, process, key=member_key, concurrency=ASYNC_CONCURRENCY, return_exceptions=False):
+    """
+    records 를 최대 concurrency 개씩 동시에 process(record) 로 처리하고 같은 순서의 결과 목록을 반환.
+    key(record) 가 같은 레코드는 들어온 순서대로 하나씩 처리한다 (같은 회원의 재요청은 기존처럼 중복 응답).
+    process 에서 발생한 예외는 그대로 전달된다. return_exceptions 면 나머지 레코드를 끝까지 처리하고
+    실패한 레코드 자리에 예외를, 같은 key 의 뒤 레코드 자리에는 None (처리하지 않음) 을 둔다.
+    """
+    if not records:
+        return []
+    import asyncio  # 비동기 모드에서만 쓰므로 첫 사용 때 import (콜드 스타트 단축)
+    return asyncio.run(_process_records(records, process, key, concurrency, return_exceptions))
+
+
+def completed_results(ids, results):
+    """처리를 끝낸 (id, 결과) 목록 (예외 / 처리하지 않은 자리 제외, 원장 기록용)"""
+    return [(entry_id, result) for entry_id, result in zip(ids, results)
+            if result is not None and not isinstance(result, Exception)]
+
+
+def raise_first_error(results):
+    """return_exceptions 결과에 예외가 있으면 첫 예외를 다시 발생"""
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+async def _process_records(records, process, key, concurrency, return_exceptions):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    executor = _get_executor(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = [None] * len(records)
+
+    chains = {}
+    for position, record in enumerate(records):
+        chains.setdefault(key(record), []).append(position)
+
+    async def run_chain(positions):
+        for position in positions:
+            async with semaphore:
+                try:
+                    results[position] = await loop.run_in_executor(executor, process, records[position])
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    # 같은 회원의 뒤 요청은 순서를 지키도록 처리하지 않고 재전송에 맡긴다
+                    results[position] = e
+                    return
+
+    await asyncio.gather(*(run_chain(positions) for positions in chains.values()))
+    return results
+
+
+def _get_executor(concurrency):
+    global _executor
+    if _executor is None or _executor._max_workers < concurrency:
+        # 더 큰 풀로 바꿀 때 이전 풀의 스레드가 웜 컨테이너에 남지 않도록 닫는다 (진행 중인 작업은 끝까지 실행)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="coupon-issue")
+    return _executor
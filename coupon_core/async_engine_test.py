@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+import unittest
+
+from coupon_core import async_engine
+
+
+def record(message_id, member_id):
+    return {"messageId": message_id, "receiptHandle": "some-receipt-handle",
+            "body": json.dumps({"member_id": member_id})}
+
+
+class TestProcessRecords(unittest.TestCase):
+
+    def test_results_keep_record_order_and_member_order(self):
+        records = [record("m1", "user1"), record("m2", "user2"), record("m3", "user1"), record("m4", "user3")]
+        lock = threading.Lock()
+        seen = []
+
+        def process(item):
+            time.sleep(0.01 if item["messageId"] == "m1" else 0)
+            with lock:
+                seen.append(item["messageId"])
+            return item["messageId"]
+
+        results = async_engine.process_records(records, process, concurrency=4)
+
+        self.assertEqual(results, ["m1", "m2", "m3", "m4"])
+        # 같은 회원의 m3 는 m1 이 끝난 뒤에 처리
+        self.assertLess(seen.index("m1"), seen.index("m3"))
+
+    def test_concurrency_is_bounded(self):
+        records = [record(f"m{index}", f"user{index}") for index in range(8)]
+        lock = threading.Lock()
+        active = [0, 0]  # 현재, 최대
+
+        def process(item):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        async_engine.process_records(records, process, concurrency=2)
+
+        self.assertEqual(active[1], 2)
+
+    def test_return_exceptions_finishes_other_records(self):
+        records = [record("m1", "user1"), record("m2", "user2"), record("m3", "user1")]
+
+        def process(item):
+            if item["messageId"] == "m1":
+                raise RuntimeError("redis down")
+            return item["messageId"]
+
+        results = async_engine.process_records(records, process, concurrency=2, return_exceptions=True)
+
+        # 실패한 m1 뒤의 같은 회원 m3 는 처리하지 않는다
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1:], ["m2", None])
+        self.assertEqual(async_engine.completed_results(["m1", "m2", "m3"], results), [("m2", "m2")])
+        with self.assertRaises(RuntimeError):
+            async_engine.raise_first_error(results)
+
+    def test_growing_executor_shuts_down_previous(self):
+        async_engine._executor = None
+        self.addCleanup(setattr, async_engine, "_executor", None)
+        small = async_engine._get_executor(2)
+        self.assertIs(async_engine._get_executor(2), small)
+
+        large = async_engine._get_executor(4)
+
+        self.assertIsNot(large, small)
+        with self.assertRaises(RuntimeError):  # 닫힌 풀은 작업을 받지 않는다
+            small.submit(lambda: None)
+
+    def test_unparsable_record_is_processed_alone(self):
+        records = [{"messageId": "m1", "body": "not json"}, record("m2", "user2")]
+
+        self.assertEqual(async_engine.process_records(records, lambda item: item["messageId"]), ["m1", "m2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+
+from coupon_core import dedup, expiry, inventory, issuance, member_coupons, negative_cache, reservations, token_pool
+
+
+def batch_item_failures(message_ids):
+    """SQS 부분 배치 실패 응답 (ReportBatchItemFailures) 형식"""
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in message_ids]}
+
+
+def process_issue_records(redis_client, records, coupon_key, build_coupon_data, issue_response,
+                          shards=1, strategy=inventory.SHARD_STRATEGY_MEMBER, dedup_backend=dedup.DEDUP_SET,
+                          layout=issuance.RECORD_LAYOUT_CHANNEL, timezone=None,
+                          inventory_mode=issuance.INVENTORY_COUNTER, dedup_scope=dedup.DEDUP_SCOPE_CHANNEL):
+    """
+    event['Records'] 전체의 발급을 EVALSHA 파이프라인 한 번으로 처리 (shards > 1 이면 샤드 재고 사용).
+    dedup_backend 는 중복 체크 인덱스 구현 (set / bitmap / bloom), layout 은 쿠폰 정보 저장 위치 (channel / member).
+    - build_coupon_data(member_id, timezone, issue_time) -> (coupon_data, expiry_timestamp)
+      issue_time 은 expiry.issue_times 로 배치 전체를 한 번에 계산한 (issued_at, expiry_timestamp)
+    - issue_response(result, coupon_id) -> 기존 process_sqs_message 와 같은 응답 dict
+    timezone 을 주면 메시지의 타임존 대신 모든 회원에게 그 타임존을 쓴다 (캠페인 타임존 정책).
+    inventory_mode 가 tokens 면 미리 만들어 둔 토큰 풀에서 발급한다 (coupon_core.token_pool).
+    dedup_scope 가 global 이고 채널 재고면 전역 received_coupons 에 있는 회원을 먼저 거르고 발급한 회원을 기록한다.
+    소진된 채널 / 이미 발급받은 회원은 negative_cache 로 걸러 파이프라인에 넣지 않는다.
+    (messageId, 응답) 목록과 재전송이 필요한 messageId 목록을 반환.
+    """
+    member_coupons.check_layout(layout, shards)
+    if inventory_mode == issuance.INVENTORY_TOKENS:
+        token_pool.check_mode(layout, shards)
+    outcomes = []
+    failures = []
+    parsed = []
+
+    for record in records:
+        message_id = record['messageId']
+        try:
+            message = json.loads(record['body'])
+        except (json.JSONDecodeError, TypeError):
+            # 파싱할 수 없는 메시지는 실패로 보고해 DLQ 로 보낸다
+            failures.append(message_id)
+            continue
+
+        member_id = message.get("member_id")
+        member_timezone = timezone or message.get("timezone")
+        if not member_id:
+            outcomes.append((message_id, {"statusCode": 400, "body": "Invalid request: missing member_id"}))
+            continue
+
+        cached = negative_cache.cached_result(coupon_key, member_id)
+        if cached is not None:
+            outcomes.append((message_id, issue_response(cached, None)))
+            continue
+
+        parsed.append((message_id, member_id, member_timezone))
+
+    cross_channel = dedup.cross_channel(dedup_scope, coupon_key)
+    if cross_channel and parsed:
+        received = dedup.received_members(redis_client, [member_id for _, member_id, _ in parsed])
+        for message_id, member_id, _ in parsed:
+            if member_id in received:
+                negative_cache.remember(coupon_key, member_id, issuance.ALREADY_RECEIVED)
+                outcomes.append((message_id, issue_response(issuance.ALREADY_RECEIVED, None)))
+        parsed = [entry for entry in parsed if entry[1] not in received]
+
+    pending = []
+    issue_times = expiry.issue_times([member_timezone for _, _, member_timezone in parsed])
+    for (message_id, member_id, member_timezone), issue_time in zip(parsed, issue_times):
+        coupon_data, expiry_timestamp = build_coupon_data(member_id, member_timezone, issue_time)
+        pending.append((message_id, (member_id, coupon_data, expiry_timestamp)))
+
+    if not pending:
+        return outcomes, failures
+
+    try:
+        requests = [request for _, request in pending]
+        if inventory_mode == issuance.INVENTORY_TOKENS:
+            results = token_pool.issue_coupons_batch(redis_client, coupon_key, requests, dedup_backend)
+        elif shards > 1:
+            results = inventory.issue_coupons_sharded_batch(redis_client, coupon_key, requests, shards, strategy,
+                                                            dedup_backend)
+        elif layout == issuance.RECORD_LAYOUT_MEMBER:
+            results = member_coupons.issue_coupons_batch(redis_client, coupon_key, requests, dedup_backend)
+        else:
+            results = issuance.issue_coupons_script_batch(redis_client, coupon_key, requests, dedup_backend)
+    except Exception as e:
+        # 파이프라인 전체가 실패하면 남은 메시지를 모두 재전송 대상으로 보고
+        print(f"issue batch failed: {e}")
+        failures.extend(message_id for message_id, _ in pending)
+        return outcomes, failures
+
+    issued = []
+    for (message_id, (member_id, _, _)), result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"issue failed for message {message_id}: {result}")
+            failures.append(message_id)
+        else:
+            negative_cache.remember(coupon_key, member_id, result[0])
+            outcomes.append((message_id, issue_response(*result)))
+            if result[0] == issuance.ISSUED:
+                issued.append(member_id)
+    if cross_channel:
+        dedup.record_received(redis_client, issued)
+
+    return outcomes, failures
+
+
+def process_confirm_records(redis_client, confirms, confirm_response, dedup_backend=dedup.DEDUP_SET,
+                            inventory_mode=issuance.INVENTORY_COUNTER, dedup_scope=dedup.DEDUP_SCOPE_CHANNEL):
+    """
+    동기 발급 예약의 확정 메시지 (reservations.parse_confirm_records 결과) 를 reservations.confirm_batch 한 번으로 확정.
+    dedup_scope 가 global 이면 채널 재고에서 확정한 회원을 전역 received_coupons 에 기록한다.
+    - confirm_response(result, coupon_id) -> 응답 dict
+    (messageId, 응답) 목록과 재전송이 필요한 messageId 목록을 반환.
+    """
+    outcomes = []
+    failures = []
+    pending = []
+    for message_id, coupon_key, member_id in confirms:
+        if not member_id or not coupon_key:
+            outcomes.append((message_id, {"statusCode": 400, "body": "Invalid request: missing member_id"}))
+        else:
+            pending.append((message_id, (coupon_key, member_id)))
+    if not pending:
+        return outcomes, failures
+
+    try:
+        results = reservations.confirm_batch(redis_client, [request for _, request in pending], dedup_backend,
+                                             inventory_mode)
+    except Exception as e:
+        print(f"confirm batch failed: {e}")
+        failures.extend(message_id for message_id, _ in pending)
+        return outcomes, failures
+
+    confirmed = []
+    for (message_id, (coupon_key, member_id)), result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"confirm failed for message {message_id}: {result}")
+            failures.append(message_id)
+        else:
+            outcomes.append((message_id, confirm_response(*result)))
+            if result[1]:
+                negative_cache.remember(coupon_key, member_id, issuance.ISSUED)
+                if dedup.cross_channel(dedup_scope, coupon_key):
+                    confirmed.append(member_id)
+    dedup.record_received(redis_client, confirmed)
+    return outcomes, failures
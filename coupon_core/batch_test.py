@@ -0,0 +1,114 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from coupon_core import batch, dedup, issuance, negative_cache
+
+
+def build_coupon_data(member_id, timezone, issue_time=None):
+    return {"member_id": member_id}, 0
+
+
+def issue_response(result, coupon_id):
+    return {"statusCode": 200 if coupon_id else 400, "body": str(result)}
+
+
+def record(message_id, body):
+    return {"messageId": message_id, "receiptHandle": "some-receipt-handle", "body": body}
+
+
+def redis_client(received=()):
+    """전역 received_coupons 에 received 회원만 있는 클라이언트"""
+    client = MagicMock()
+    client.sismember.side_effect = lambda key, member_id: member_id in received
+    client.pipeline.return_value.execute.side_effect = lambda: [
+        call[0][1] in received for call in client.pipeline.return_value.sismember.call_args_list]
+    return client
+
+
+class TestProcessIssueRecords(unittest.TestCase):
+
+    def setUp(self):
+        negative_cache.cache.clear()
+
+    @patch('coupon_core.batch.issuance.issue_coupons_script_batch')
+    def test_reports_only_failed_messages(self, mock_issue_batch):
+        mock_issue_batch.return_value = [
+            (issuance.ISSUED, "{online}-1"),
+            ConnectionError("node down"),
+            (issuance.SOLD_OUT, None),
+        ]
+        records = [
+            record("m1", json.dumps({"member_id": "user1"})),
+            record("m2", json.dumps({"member_id": "user2"})),
+            record("m3", "not json"),
+            record("m4", json.dumps({"member_id": "user4"})),
+        ]
+
+        outcomes, failures = batch.process_issue_records(
+            redis_client(), records, "online", build_coupon_data, issue_response
+        )
+
+        # 파싱 실패와 Redis 오류만 재전송 대상
+        self.assertEqual(sorted(failures), ["m2", "m3"])
+        self.assertEqual(dict(outcomes)["m1"]["statusCode"], 200)
+        self.assertEqual(dict(outcomes)["m4"]["statusCode"], 400)
+        # 유효한 메시지는 파이프라인 한 번으로 전달
+        mock_issue_batch.assert_called_once()
+        self.assertEqual(len(mock_issue_batch.call_args[0][2]), 3)
+
+    @patch('coupon_core.batch.issuance.issue_coupons_script_batch')
+    def test_pipeline_error_fails_pending_messages(self, mock_issue_batch):
+        mock_issue_batch.side_effect = ConnectionError("cluster down")
+        records = [
+            record("m1", json.dumps({"member_id": "user1"})),
+            record("m2", json.dumps({})),
+        ]
+
+        outcomes, failures = batch.process_issue_records(
+            redis_client(), records, "online", build_coupon_data, issue_response
+        )
+
+        self.assertEqual(failures, ["m1"])
+        self.assertEqual(dict(outcomes)["m2"]["statusCode"], 400)
+
+    @patch('coupon_core.batch.issuance.issue_coupons_script_batch')
+    def test_global_scope_skips_members_received_on_other_channel(self, mock_issue_batch):
+        mock_issue_batch.return_value = [(issuance.ISSUED, "{online}-2")]
+        client = redis_client(received={"user1"})
+        records = [
+            record("m1", json.dumps({"member_id": "user1"})),
+            record("m2", json.dumps({"member_id": "user2"})),
+        ]
+
+        outcomes, failures = batch.process_issue_records(client, records, "online", build_coupon_data, issue_response,
+                                                         dedup_scope=dedup.DEDUP_SCOPE_GLOBAL)
+
+        self.assertEqual(failures, [])
+        self.assertEqual(dict(outcomes)["m1"]["body"], str(issuance.ALREADY_RECEIVED))
+        self.assertEqual([request[0] for request in mock_issue_batch.call_args[0][2]], ["user2"])
+        client.sadd.assert_called_once_with(dedup.GLOBAL_RECEIVED_KEY, "user2")
+
+        # 캠페인 재고는 전역 SET 을 보지 않는다
+        client = redis_client(received={"user1"})
+        mock_issue_batch.return_value = [(issuance.ISSUED, "{online.sale}-1"), (issuance.ISSUED, "{online.sale}-2")]
+        batch.process_issue_records(client, records, "online.sale", build_coupon_data, issue_response,
+                                    dedup_scope=dedup.DEDUP_SCOPE_GLOBAL)
+        client.sismember.assert_not_called()
+        client.sadd.assert_not_called()
+
+        # 기본 (channel) 범위는 채널 재고도 전역 SET 을 보지 않는다
+        client = redis_client(received={"user1"})
+        mock_issue_batch.return_value = [(issuance.ISSUED, "{online}-1"), (issuance.ISSUED, "{online}-2")]
+        batch.process_issue_records(client, records, "online", build_coupon_data, issue_response)
+        client.sismember.assert_not_called()
+
+    def test_batch_item_failures_shape(self):
+        self.assertEqual(
+            batch.batch_item_failures(["m1"]),
+            {"batchItemFailures": [{"itemIdentifier": "m1"}]},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
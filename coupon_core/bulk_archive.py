@@ -0,0 +1,194 @@
+import errno
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pymysql
+
+from coupon_core import export, expiry_index, metrics
+
+# 대량 보관 (하루 끝 일괄 만료용)
+# Redis 쿠폰을 gzip TSV 스풀 파일에 모아 LOAD DATA LOCAL INFILE 로 세션 임시 스테이징 테이블에 적재하고
+# INSERT IGNORE ... SELECT 한 번으로 coupon 테이블에 합친다. 커밋이 끝난 청크에서 이미 만료 시각이 지난 쿠폰 키만
+# Redis 에서 지우고 (아직 유효한 쿠폰은 TTL 로 만료되도록 둔다), 중간에 멈춰도 다시 실행하면 남은 쿠폰만 이어서 보관된다.
+
+# 한 번에 적재 / 커밋 / 삭제할 쿠폰 수 (스풀 파일 크기와 트랜잭션 크기를 제한)
+LOAD_CHUNK_ROWS = int(os.environ.get("COUPON_BULK_LOAD_ROWS", "200000"))
+# Redis 키 삭제 파이프라인 한 번에 묶을 키 수
+DELETE_CHUNK = 500
+# 스풀 파일 위치 (Lambda 는 /tmp)
+SPOOL_DIR = os.environ.get("COUPON_BULK_SPOOL_DIR", tempfile.gettempdir())
+
+# LOAD DATA 가 FIFO 를 열었는지 확인하는 간격(초)
+FIFO_POLL_SECONDS = 0.005
+
+STAGING_TABLE = "coupon_bulk_staging"
+LOAD_SQL = (
+    f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {STAGING_TABLE} CHARACTER SET utf8mb4 "
+    "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (coupon_id, member_id)"
+)
+MERGE_SQL = f"INSERT IGNORE INTO coupon (coupon_id, member_id) SELECT coupon_id, member_id FROM {STAGING_TABLE}"
+
+
+class Spool:
+    """(coupon_id, member_id) 를 gzip TSV 로 임시 파일에 쓰는 스풀 (LOAD DATA 기본 이스케이프 형식)"""
+
+    def __init__(self, directory=SPOOL_DIR):
+        handle, self.path = tempfile.mkstemp(prefix="coupon-bulk-", suffix=".tsv.gz", dir=directory)
+        os.close(handle)
+        # 압축률보다 속도 (쿠폰 ID 는 접두사가 반복되어 레벨 1 로도 충분히 줄어든다)
+        self._file = gzip.open(self.path, "wt", compresslevel=1, encoding="utf-8", newline="")
+        self.rows = 0
+
+    def write(self, coupon_id, member_id):
+        self._file.write(f"{_escape(coupon_id)}\t{_escape(member_id)}\n")
+        self.rows += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def archive_expired(redis_client, connection, source="index", tags=(), chunk_rows=LOAD_CHUNK_ROWS,
+                    now=None, window=expiry_index.EXPORT_WINDOW):
+    """
+    만료 대상 쿠폰을 청크 단위로 Aurora 에 일괄 적재하고, 커밋된 쿠폰 중 만료 시각이 now 이전인 쿠폰만 Redis 에서 삭제.
+    source 는 index (만료 순서 인덱스의 tags, now + window 안) / coupon_expired_read 와 같은 scan (전체 쿠폰).
+    scan 은 만료 시각을 모르므로 적재만 하고 삭제는 TTL 에 맡긴다.
+    {"loaded", "inserted", "deleted", "chunks"} 를 반환하며 Aurora 오류는 롤백 후 그대로 올린다
+    (실패한 청크의 쿠폰은 Redis 에 남아 다음 실행에서 다시 적재된다).
+    """
+    now = int(time.time()) if now is None else now
+    totals = {"loaded": 0, "inserted": 0, "deleted": 0, "chunks": 0}
+    spool = Spool()
+    entries = []
+    # 인덱스는 순위 구간으로 읽으므로 보관한 항목은 다 읽은 뒤에 제거한다 (export.iter_due_coupon_payloads 와 같음)
+    archived_index_entries = []
+    try:
+        for index_key, payload, expiry_timestamp in _iter_payloads(redis_client, source, tags, now, window):
+            if not payload.get('member_id'):
+                print(f"Invalid coupon data for {payload['coupon_id']}")
+                continue
+            spool.write(payload['coupon_id'], payload['member_id'])
+            entries.append((index_key, payload['coupon_id'], expiry_timestamp))
+            if spool.rows >= chunk_rows:
+                _archive_chunk(redis_client, connection, spool, entries, totals, now)
+                archived_index_entries.extend(entry[:2] for entry in entries if entry[0] is not None)
+                spool, entries = Spool(), []
+        if spool.rows:
+            _archive_chunk(redis_client, connection, spool, entries, totals, now)
+            archived_index_entries.extend(entry[:2] for entry in entries if entry[0] is not None)
+    finally:
+        spool.remove()
+        expiry_index.mark_exported(redis_client, archived_index_entries)
+    return totals
+
+
+def load_spool(connection, spool):
+    """스풀을 스테이징 테이블에 적재하고 coupon 에 합쳐 커밋. (적재 행 수, 새로 저장된 행 수)"""
+    spool.close()
+    try:
+        with metrics.timer("db_bulk_load"), connection.cursor() as cursor:
+            # 임시 테이블은 세션마다 따로라 동시에 도는 다른 호출과 겹치지 않는다
+            cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} LIKE coupon")
+            cursor.execute(f"DELETE FROM {STAGING_TABLE}")
+            loaded = load_file(cursor, spool.path)
+            inserted = cursor.execute(MERGE_SQL)
+        connection.commit()
+    except pymysql.MySQLError as e:
+        print(f"Aurora bulk load failed, rolled back {spool.rows} coupons: {e}")
+        try:
+            connection.rollback()
+        except pymysql.MySQLError:
+            pass
+        raise
+    return loaded, inserted
+
+
+def load_file(cursor, spool_path):
+    """
+    gzip 스풀을 압축을 풀면서 FIFO 로 흘려 LOAD DATA LOCAL INFILE 로 적재 (풀린 파일을 디스크에 쓰지 않음).
+    적재된 행 수를 반환.
+    """
+    fifo_dir = tempfile.mkdtemp(prefix="coupon-bulk-", dir=os.path.dirname(spool_path))
+    fifo_path = os.path.join(fifo_dir, "rows.tsv")
+    os.mkfifo(fifo_path)
+    done = threading.Event()
+    writer = threading.Thread(target=_inflate_into, args=(spool_path, fifo_path, done), daemon=True)
+    writer.start()
+    try:
+        return cursor.execute(LOAD_SQL, (fifo_path,))
+    finally:
+        # 서버가 파일을 요청하지 않고 실패했으면 쓰는 쪽은 읽는 쪽을 기다리다 여기서 멈춘다
+        done.set()
+        writer.join()
+        shutil.rmtree(fifo_dir, ignore_errors=True)
+
+
+def delete_coupons(redis_client, entries, chunk_size=DELETE_CHUNK):
+    """보관이 끝난 (인덱스 키, coupon_id) 의 쿠폰 키를 chunk_size 개씩 파이프라인으로 삭제. 지운 키 수"""
+    deleted = 0
+    for start in range(0, len(entries), chunk_size):
+        chunk = entries[start:start + chunk_size]
+        pipe = redis_client.pipeline()
+        for _, coupon_id in chunk:
+            pipe.delete(f"coupon:{coupon_id}")
+        with metrics.timer("redis_delete"):
+            deleted += sum(int(removed) for removed in pipe.execute())
+    return deleted
+
+
+def _archive_chunk(redis_client, connection, spool, entries, totals, now):
+    try:
+        loaded, inserted = load_spool(connection, spool)
+    finally:
+        spool.remove()
+    totals["loaded"] += loaded
+    totals["inserted"] += inserted
+    # 아직 만료되지 않은 쿠폰은 사용 중일 수 있으므로 남기고 TTL 이 지우게 한다
+    due = [(index_key, coupon_id) for index_key, coupon_id, expiry_timestamp in entries
+           if expiry_timestamp is not None and expiry_timestamp <= now]
+    totals["deleted"] += delete_coupons(redis_client, due)
+    totals["chunks"] += 1
+    print(f"Bulk archive chunk {totals['chunks']}: loaded={loaded} inserted={inserted}")
+
+
+def _iter_payloads(redis_client, source, tags, now, window):
+    """(인덱스 키 또는 None, 페이로드, 만료 시각 또는 None) 을 yield"""
+    if source == "index":
+        yield from export.iter_due_coupon_payloads(redis_client, tags, now, window, with_expiry=True)
+    else:
+        for payload in export.iter_coupon_payloads(redis_client):
+            yield None, payload, None
+
+
+def _inflate_into(spool_path, fifo_path, done):
+    # 읽는 쪽 (LOAD DATA) 이 FIFO 를 열 때까지 기다리되 적재가 끝나면 포기한다
+    while True:
+        try:
+            handle = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO or done.wait(FIFO_POLL_SECONDS):
+                return
+    os.set_blocking(handle, True)
+    try:
+        with open(handle, "wb") as target, gzip.open(spool_path, "rb") as source:
+            shutil.copyfileobj(source, target, 1 << 20)
+    except BrokenPipeError:
+        # 읽는 쪽이 중간에 실패해 파일을 닫음
+        pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pymysql
+
+from coupon_core import bulk_archive
+
+
+class TestBulkArchive(unittest.TestCase):
+
+    def test_load_file_streams_decompressed_rows_through_fifo(self):
+        spool = bulk_archive.Spool()
+        spool.write("{online}-1", "user1")
+        spool.write("{online}-2", "tab\tuser")
+        spool.close()
+        received = []
+
+        def execute(sql, params):
+            # pymysql 처럼 서버가 요청한 파일 이름을 열어 읽는다
+            with open(params[0], "rb") as infile:
+                received.append(infile.read())
+            return 2
+
+        cursor = MagicMock()
+        cursor.execute.side_effect = execute
+        try:
+            self.assertEqual(bulk_archive.load_file(cursor, spool.path), 2)
+        finally:
+            spool.remove()
+
+        self.assertEqual(received, [b"{online}-1\tuser1\n{online}-2\ttab\\tuser\n"])
+        self.assertTrue(cursor.execute.call_args[0][0].startswith("LOAD DATA LOCAL INFILE"))
+
+    def test_load_file_releases_writer_when_server_rejects(self):
+        spool = bulk_archive.Spool()
+        spool.write("{online}-1", "user1")
+        spool.close()
+        cursor = MagicMock()
+        cursor.execute.side_effect = pymysql.err.OperationalError(3948, "Loading local data is disabled")
+        try:
+            with self.assertRaises(pymysql.MySQLError):
+                bulk_archive.load_file(cursor, spool.path)
+        finally:
+            spool.remove()
+
+    @patch('coupon_core.bulk_archive.load_file', return_value=2)
+    @patch('coupon_core.bulk_archive.export.iter_due_coupon_payloads')
+    def test_deletes_only_due_keys_per_committed_chunk(self, mock_payloads, mock_load_file):
+        mock_payloads.return_value = iter([
+            ("expiring:{online}:0", {"coupon_id": "{online}-1", "member_id": "user1"}, 1000),
+            ("expiring:{online}:0", {"coupon_id": "{online}-2", "member_id": "user2"}, 5000),
+            ("expiring:{online}:0", {"coupon_id": "{online}-3", "member_id": "user3"}, 2000),
+        ])
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.return_value = [1]
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.execute.return_value = 2
+
+        totals = bulk_archive.archive_expired(redis_client, connection, chunk_rows=2, now=2000)
+
+        # 셋 다 적재하지만 아직 만료되지 않은 2 는 Redis 에 남긴다
+        self.assertEqual(totals["chunks"], 2)
+        self.assertEqual(connection.commit.call_count, 2)
+        self.assertEqual([call[0][0] for call in pipe.delete.call_args_list],
+                         ["coupon:{online}-1", "coupon:{online}-3"])
+        self.assertTrue(mock_payloads.call_args[1]["with_expiry"])
+
+    @patch('coupon_core.bulk_archive.load_file', return_value=1)
+    @patch('coupon_core.bulk_archive.export.iter_coupon_payloads')
+    def test_scan_source_leaves_keys_to_ttl(self, mock_payloads, mock_load_file):
+        mock_payloads.return_value = iter([{"coupon_id": "{online}-1", "member_id": "user1"}])
+        redis_client = MagicMock()
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value.execute.return_value = 1
+
+        totals = bulk_archive.archive_expired(redis_client, connection, source="scan")
+
+        self.assertEqual((totals["loaded"], totals["deleted"]), (1, 0))
+        redis_client.pipeline.return_value.delete.assert_not_called()
+
+    @patch('coupon_core.bulk_archive.load_file')
+    @patch('coupon_core.bulk_archive.export.iter_due_coupon_payloads')
+    def test_keeps_redis_keys_when_load_fails(self, mock_payloads, mock_load_file):
+        mock_payloads.return_value = iter([("expiring:{online}:0", {"coupon_id": "{online}-1", "member_id": "user1"},
+                                            0)])
+        mock_load_file.side_effect = pymysql.err.OperationalError(1205, "Lock wait timeout")
+        redis_client = MagicMock()
+        connection = MagicMock()
+
+        with self.assertRaises(pymysql.MySQLError):
+            bulk_archive.archive_expired(redis_client, connection)
+
+        connection.rollback.assert_called_once()
+        redis_client.pipeline.return_value.delete.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import json
+import os
+import re
+import threading
+import time
+
+from coupon_core import metrics
+
+# 캠페인 레지스트리
+# 캠페인마다 채널(online / offline), 재고, 발급 기간, 타임존 정책을 따로 둔다.
+#  - 재고 키 (coupon_key) : <채널>.<campaign_id> (예: online.summer26). 쿠폰 ID / 중복 체크 / 만료 인덱스의 해시 태그도 이 값
+#  - 설정 : campaign:{<coupon_key>} 에 JSON 으로 (재고 키와 같은 슬롯)
+#  - 목록 : campaign_registry SET (coupon_key), 만료 인덱스 내보내기에서 태그로 사용
+# campaign_id 가 없는 메시지는 기존 채널 재고 (online / offline) 로 발급한다.
+REGISTRY_KEY = "campaign_registry"
+
+# 캠페인을 등록 / 수정하면 coupon_init 이 올리는 버전 키. 발급 Lambda 는 이 간격(초)마다 한 번 GET 으로 확인하고
+# 값이 바뀌었으면 캐시한 캠페인 설정을 버린다 (새 캠페인 / 변경이 보이기까지 최대 이 간격)
+VERSION_KEY = "campaign_registry_version"
+VERSION_CHECK_INTERVAL = float(os.environ.get("COUPON_CAMPAIGN_CACHE_INTERVAL", "1"))
+
+# 기억해 둘 캠페인 수 상한 (없는 campaign_id 가 계속 들어와도 캐시가 무한히 커지지 않도록)
+MAX_CACHED_CAMPAIGNS = 10000
+
+# 일괄 등록 시 파이프라인 한 번에 묶을 캠페인 수 (슬롯 순으로 정렬해 묶으므로 보통 노드 한두 개만 거친다)
+REGISTER_CHUNK = 500
+
+# 타임존 정책: 빈 값이면 메시지의 회원 타임존, 타임존 이름이면 모든 회원에게 그 타임존
+TIMEZONE_MEMBER = ""
+
+CHANNELS = ("offline", "online")
+_CAMPAIGN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def coupon_key(channel, campaign_id):
+    """캠페인 재고 키 (쿠폰 ID 의 해시 태그)"""
+    return f"{channel}.{campaign_id}"
+
+
+def config_key(key):
+    return f"campaign:{{{key}}}"
+
+
+def build_campaign(spec):
+    """
+    coupon_init event 의 캠페인 정의를 저장 형식으로 검증 / 변환.
+    {"campaign_id", "channel", "quantity", "starts_at", "ends_at" (UNIX 초, 0 이면 제한 없음), "timezone"}
+    """
+    campaign_id = str(spec.get("campaign_id", ""))
+    if not _CAMPAIGN_ID_PATTERN.match(campaign_id):
+        raise ValueError(f"Invalid campaign_id: {campaign_id!r}")
+    channel = spec.get("channel")
+    if channel not in CHANNELS:
+        raise ValueError(f"Invalid channel for campaign {campaign_id}: {channel!r}")
+    quantity = int(spec.get("quantity", 0))
+    if quantity < 0:
+        raise ValueError(f"Invalid quantity for campaign {campaign_id}: {quantity}")
+    return {
+        "campaign_id": campaign_id,
+        "channel": channel,
+        "coupon_key": coupon_key(channel, campaign_id),
+        "quantity": quantity,
+        "starts_at": int(spec.get("starts_at", 0)),
+        "ends_at": int(spec.get("ends_at", 0)),
+        "timezone": spec.get("timezone", TIMEZONE_MEMBER) or TIMEZONE_MEMBER,
+    }
+
+
+def register_campaigns(redis_client, specs, chunk_size=REGISTER_CHUNK):
+    """
+    캠페인 설정 저장 + 재고 설정 (새로 만들거나 기존 캠페인을 재설정).
+    캠페인을 슬롯 순으로 정렬해 chunk_size 개씩 파이프라인으로 보내고, 목록 SET 과 버전 키는 마지막에 한 번씩 갱신.
+    등록한 캠페인 목록을 반환. 정의가 잘못된 캠페인이 하나라도 있으면 아무것도 쓰지 않고 ValueError.
+    """
+    campaigns = [build_campaign(spec) for spec in specs]
+    keyslot = redis_client.connection_pool.nodes.keyslot
+    campaigns.sort(key=lambda campaign: keyslot(campaign["coupon_key"]))
+
+    with metrics.timer("campaign_register"):
+        for start in range(0, len(campaigns), chunk_size):
+            pipe = redis_client.pipeline()
+            for campaign in campaigns[start:start + chunk_size]:
+                pipe.set(config_key(campaign["coupon_key"]), json.dumps(campaign))
+                pipe.set(campaign["coupon_key"], campaign["quantity"])
+            pipe.execute()
+        for start in range(0, len(campaigns), chunk_size):
+            redis_client.sadd(REGISTRY_KEY, *[campaign["coupon_key"] for campaign in campaigns[start:start + chunk_size]])
+    if campaigns:
+        bump_version(redis_client)
+    return campaigns
+
+
+def registered_keys(redis_client):
+    """등록된 캠페인 재고 키 목록"""
+    return sorted(key.decode() if isinstance(key, bytes) else key for key in redis_client.smembers(REGISTRY_KEY))
+
+
+def remaining_stock(redis_client, keys):
+    """캠페인별 남은 재고 {coupon_key: 수량} (파이프라인 한 번)"""
+    pipe = redis_client.pipeline()
+    for key in keys:
+        pipe.get(key)
+    return {key: int(value or 0) for key, value in zip(keys, pipe.execute())}
+
+
+def check_campaign(campaign, now=None):
+    """발급할 수 없으면 거절 사유, 발급 기간 안이면 None"""
+    if campaign is None:
+        return "Unknown campaign"
+    now = time.time() if now is None else now
+    if campaign["starts_at"] and now < campaign["starts_at"]:
+        return f"Campaign {campaign['campaign_id']} has not started"
+    if campaign["ends_at"] and now >= campaign["ends_at"]:
+        return f"Campaign {campaign['campaign_id']} has ended"
+    return None
+
+
+def campaign_timezone(campaign, member_timezone):
+    """타임존 정책에 따른 발급 / 만료 계산 타임존"""
+    return campaign["timezone"] or member_timezone
+
+
+class CampaignCache:
+    """
+    컨테이너 단위 캠페인 설정 캐시 (coupon_key -> 설정, 없는 캠페인은 None 으로 기억).
+    처음 보는 캠페인만 GET 한 번으로 읽고, 버전 키가 바뀌면 비운다 (메시지마다 Redis 를 읽지 않음).
+    """
+
+    def __init__(self, version_check_interval=VERSION_CHECK_INTERVAL, max_size=MAX_CACHED_CAMPAIGNS):
+        self.version_check_interval = version_check_interval
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._campaigns = {}
+        self._version = None
+        self._version_checked_at = None
+
+    def get(self, redis_client, key, now=None):
+        self.refresh(redis_client, now)
+        with self._lock:
+            if key in self._campaigns:
+                return self._campaigns[key]
+        value = redis_client.get(config_key(key))
+        campaign = json.loads(value) if value else None
+        with self._lock:
+            if len(self._campaigns) >= self.max_size:
+                self._campaigns.clear()
+            self._campaigns[key] = campaign
+        return campaign
+
+    def refresh(self, redis_client, now=None):
+        """확인 간격이 지났으면 버전 키를 읽어 바뀌었으면 캐시를 비움"""
+        now = time.monotonic() if now is None else now
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        version = redis_client.get(VERSION_KEY)
+        with self._lock:
+            if version != self._version:
+                self._campaigns.clear()
+                self._version = version
+            self._version_checked_at = now
+
+    def clear(self):
+        with self._lock:
+            self._campaigns.clear()
+            self._version = None
+            self._version_checked_at = None
+
+
+# 컨테이너 단위로 공유되는 기본 캐시
+cache = CampaignCache()
+
+
+def get_campaign(redis_client, channel, campaign_id):
+    """발급 Lambda 채널의 캠페인 설정 (없거나 다른 채널의 캠페인이면 None)"""
+    if not _CAMPAIGN_ID_PATTERN.match(str(campaign_id)):
+        return None
+    return cache.get(redis_client, coupon_key(channel, campaign_id))
+
+
+def bump_version(redis_client):
+    """캠페인을 등록 / 수정한 뒤 호출해 모든 컨테이너의 캠페인 캐시를 무효화"""
+    return redis_client.incr(VERSION_KEY)
+
+
+def group_records(redis_client, records, channel):
+    """
+    발급 배치의 SQS 레코드를 재고 키별로 나눔.
+    ({(coupon_key, 고정 타임존 또는 None): [레코드]}, [(messageId, 거절 사유)]) 를 반환.
+    campaign_id 가 없거나 본문을 파싱할 수 없는 레코드는 채널 재고 그룹 (channel, None) 에 둔다 (파싱 오류는 발급 단계에서 실패로 보고).
+    """
+    groups = {}
+    rejected = []
+    for record in records:
+        try:
+            campaign_id = json.loads(record['body']).get("campaign_id")
+        except (json.JSONDecodeError, TypeError, AttributeError):
+            campaign_id = None
+        if not campaign_id:
+            groups.setdefault((channel, None), []).append(record)
+            continue
+        campaign = get_campaign(redis_client, channel, campaign_id)
+        reason = check_campaign(campaign)
+        if reason:
+            rejected.append((record['messageId'], reason))
+            continue
+        groups.setdefault((campaign["coupon_key"], campaign["timezone"] or None), []).append(record)
+    return groups, rejected
@@ -0,0 +1,65 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from coupon_core import campaigns
+
+
+class TestCampaigns(unittest.TestCase):
+
+    def test_register_sorts_by_slot_and_chunks_pipelines(self):
+        redis_client = MagicMock()
+        redis_client.connection_pool.nodes.keyslot.side_effect = lambda key: {"online.b": 1, "online.a": 2,
+                                                                             "offline.c": 3}[key]
+        pipes = [MagicMock(), MagicMock()]
+        redis_client.pipeline.side_effect = pipes
+
+        registered = campaigns.register_campaigns(redis_client, [
+            {"campaign_id": "a", "channel": "online", "quantity": 10},
+            {"campaign_id": "b", "channel": "online", "quantity": 20, "timezone": "America/New_York"},
+            {"campaign_id": "c", "channel": "offline", "quantity": 30},
+        ], chunk_size=2)
+
+        self.assertEqual([campaign["coupon_key"] for campaign in registered], ["online.b", "online.a", "offline.c"])
+        self.assertEqual([call[0] for call in pipes[0].set.call_args_list][1], ("online.b", 20))
+        self.assertEqual(pipes[1].set.call_count, 2)
+        redis_client.incr.assert_called_once_with(campaigns.VERSION_KEY)
+
+    def test_invalid_campaign_rejects_whole_batch(self):
+        redis_client = MagicMock()
+        with self.assertRaises(ValueError):
+            campaigns.register_campaigns(redis_client, [
+                {"campaign_id": "ok", "channel": "online", "quantity": 1},
+                {"campaign_id": "no-dash", "channel": "online", "quantity": 1},
+            ])
+        redis_client.pipeline.assert_not_called()
+
+    def test_check_campaign_window(self):
+        campaign = campaigns.build_campaign({"campaign_id": "sale", "channel": "online", "quantity": 1,
+                                             "starts_at": 100, "ends_at": 200})
+
+        self.assertEqual(campaigns.check_campaign(campaign, now=99), "Campaign sale has not started")
+        self.assertIsNone(campaigns.check_campaign(campaign, now=100))
+        self.assertEqual(campaigns.check_campaign(campaign, now=200), "Campaign sale has ended")
+        self.assertEqual(campaigns.check_campaign(None), "Unknown campaign")
+
+    def test_cache_reads_each_campaign_once_per_version(self):
+        cache = campaigns.CampaignCache(version_check_interval=1)
+        campaign = campaigns.build_campaign({"campaign_id": "sale", "channel": "online", "quantity": 1})
+        values = {campaigns.VERSION_KEY: b"1", campaigns.config_key("online.sale"): json.dumps(campaign)}
+        redis_client = MagicMock()
+        redis_client.get.side_effect = values.get
+
+        self.assertEqual(cache.get(redis_client, "online.sale", now=100), campaign)
+        self.assertEqual(cache.get(redis_client, "online.sale", now=100.5), campaign)
+        self.assertIsNone(cache.get(redis_client, "online.missing", now=100.5))
+        self.assertEqual(redis_client.get.call_count, 3)  # 버전 1회 + 캠페인 2개
+
+        # 버전이 바뀌면 다시 읽는다
+        values[campaigns.VERSION_KEY] = b"2"
+        cache.get(redis_client, "online.sale", now=102)
+        self.assertEqual(redis_client.get.call_count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import os
+import time
+
+from rediscluster import RedisCluster
+
+from coupon_core import metrics, recorder
+
+# 유휴 시간이 이 값(초)을 넘은 연결은 재사용 전에 PING 으로 상태를 확인
+HEALTH_CHECK_INTERVAL = int(os.environ.get("COUPON_HEALTH_CHECK_INTERVAL", "30"))
+
+
+class ClientManager:
+    """
+    웜 컨테이너에서 RedisCluster / pymysql 연결을 재사용하기 위한 관리자.
+    첫 요청 시 연결을 만들고 이후 호출에서는 같은 객체를 돌려준다.
+    """
+
+    def __init__(self, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self._redis_clients = {}  # (host, port) -> [client, 마지막 사용 시각]
+        self._db_connections = {}  # (host, user, database, 옵션...) -> [connection, 마지막 사용 시각]
+        self.stats = {
+            "redis_new": 0,
+            "redis_reused": 0,
+            "redis_reconnects": 0,
+            "db_new": 0,
+            "db_reused": 0,
+            "db_reconnects": 0,
+            "moved_redirects": 0,
+            "slot_refreshes": 0,
+        }
+
+    def get_redis_client(self, host, port, **options):
+        """Redis 클러스터 클라이언트 (재사용, 오래 쉬었으면 PING 후 필요 시 재연결)"""
+        key = (host, port)
+        entry = self._redis_clients.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            client, last_used = entry
+            if now - last_used < self.health_check_interval or self._redis_alive(client):
+                entry[1] = now
+                self.stats["redis_reused"] += 1
+                return client
+            client.connection_pool.disconnect()
+            self.stats["redis_reconnects"] += 1
+            metrics.increment("redis_reconnects")
+
+        client = self._new_redis_client(host, port, **options)
+        self._redis_clients[key] = [client, now]
+        self.stats["redis_new"] += 1
+        metrics.increment("redis_new_connections")
+        return client
+
+    def get_db_connection(self, host, user, password, database, **options):
+        """Aurora MySQL 연결 (재사용, 오래 쉬었으면 ping 으로 재연결). options 가 다르면 별도 연결"""
+        key = (host, user, database) + tuple(sorted(options.items()))
+        entry = self._db_connections.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            connection, last_used = entry
+            if now - last_used < self.health_check_interval:
+                entry[1] = now
+                self.stats["db_reused"] += 1
+                return connection
+            try:
+                connection.ping(reconnect=True)
+                entry[1] = now
+                self.stats["db_reused"] += 1
+                return connection
+            except _pymysql().MySQLError:
+                self._close_quietly(connection)
+                self.stats["db_reconnects"] += 1
+                metrics.increment("db_reconnects")
+
+        connection = recorder.track_db(_pymysql().connect(host=host, user=user, password=password, database=database,
+                                                          **options))
+        self._db_connections[key] = [connection, now]
+        self.stats["db_new"] += 1
+        metrics.increment("db_new_connections")
+        return connection
+
+    def discard_db_connection(self, connection):
+        """오류가 난 연결은 버리고 다음 호출에서 새로 연결"""
+        for key, (cached, _) in list(self._db_connections.items()):
+            if cached is connection:
+                del self._db_connections[key]
+        self._close_quietly(connection)
+
+    def refresh_slots(self, client):
+        """슬롯 맵을 CLUSTER SLOTS 로 다시 읽음"""
+        client.connection_pool.nodes.initialize()
+
+    def _new_redis_client(self, host, port, **options):
+        # MOVED 를 한 번만 받아도 슬롯 맵 전체를 갱신하도록 reinitialize_steps=1
+        options.setdefault("reinitialize_steps", 1)
+        client = RedisCluster(host=host, port=port, **options)
+        self._track_redirects(client)
+        self._track_commands(client)
+        return recorder.track_redis(client)
+
+    def _track_redirects(self, client):
+        # MOVED 발생 / 슬롯 맵 갱신 횟수를 집계
+        nodes = client.connection_pool.nodes
+        initialize = nodes.initialize
+        increment_reinitialize_counter = nodes.increment_reinitialize_counter
+
+        def counted_initialize():
+            self.stats["slot_refreshes"] += 1
+            return initialize()
+
+        def counted_increment(ct=1, count=1):
+            self.stats["moved_redirects"] += ct
+            metrics.increment("moved_redirects", ct)
+            return increment_reinitialize_counter(ct, count)
+
+        nodes.initialize = counted_initialize
+        nodes.increment_reinitialize_counter = counted_increment
+
+    def _track_commands(self, client):
+        # 단일 명령 / 파이프라인 명령 수와 왕복(호출) 수를 지표로 집계
+        execute_command = client.execute_command
+        pipeline = client.pipeline
+
+        def counted_execute_command(*args, **kwargs):
+            metrics.increment("redis_commands")
+            metrics.increment("redis_calls")
+            return execute_command(*args, **kwargs)
+
+        def counted_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            def counted_execute(*execute_args, **execute_kwargs):
+                metrics.increment("redis_commands", len(pipe))
+                metrics.increment("redis_calls")
+                return execute(*execute_args, **execute_kwargs)
+
+            pipe.execute = counted_execute
+            return pipe
+
+        client.execute_command = counted_execute_command
+        client.pipeline = counted_pipeline
+
+    def _redis_alive(self, client):
+        try:
+            return bool(client.ping())
+        except Exception:
+            return False
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def _pymysql():
+    # 발급 Lambda 는 Aurora 에 연결하지 않으므로 pymysql 은 첫 DB 연결 때 import (콜드 스타트 단축)
+    import pymysql
+    return pymysql
+
+
+def prewarm(connect, *warmups):
+    """
+    초기화 단계(모듈 로드)에서 connect() 로 연결을 만들고 warmups(client) 를 실행해 첫 호출 지연에서 뺀다.
+    실패하면 로그만 남기고 첫 호출에서 평소처럼 다시 연결한다.
+    """
+    try:
+        with metrics.timer("prewarm"):
+            client = connect()
+            for warmup in warmups:
+                warmup(client)
+    except Exception as e:
+        print(f"Prewarm failed, connecting on first invocation: {e}")
+
+
+# 컨테이너 단위로 공유되는 기본 관리자
+manager = ClientManager()
+
+
+def get_redis_client(host, port, **options):
+    with metrics.timer("redis_connect"):
+        return manager.get_redis_client(host, port, **options)
+
+
+def get_db_connection(host, user, password, database, **options):
+    with metrics.timer("db_connect"):
+        return manager.get_db_connection(host, user, password, database, **options)
+
+
+def discard_db_connection(connection):
+    manager.discard_db_connection(connection)
+
+
+def connection_stats():
+    """연결 재사용 / 신규 연결 / 재연결 / MOVED 집계"""
+    return dict(manager.stats)
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pymysql
+
+from coupon_core import clients
+
+
+class TestClientManager(unittest.TestCase):
+
+    @patch('coupon_core.clients.RedisCluster')
+    def test_redis_client_reused_across_calls(self, mock_redis_cluster):
+        manager = clients.ClientManager(health_check_interval=30)
+
+        first = manager.get_redis_client("redis-host", 6379, ssl=True)
+        second = manager.get_redis_client("redis-host", 6379, ssl=True)
+
+        self.assertIs(first, second)
+        mock_redis_cluster.assert_called_once()
+        self.assertEqual(manager.stats["redis_new"], 1)
+        self.assertEqual(manager.stats["redis_reused"], 1)
+
+    @patch('coupon_core.clients.RedisCluster')
+    def test_idle_redis_client_reconnects_when_ping_fails(self, mock_redis_cluster):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.ping.side_effect = ConnectionError("closed")
+        mock_redis_cluster.side_effect = [stale, fresh]
+        manager = clients.ClientManager(health_check_interval=0)
+
+        manager.get_redis_client("redis-host", 6379)
+        client = manager.get_redis_client("redis-host", 6379)
+
+        self.assertIs(client, fresh)
+        stale.connection_pool.disconnect.assert_called_once()
+        self.assertEqual(manager.stats["redis_reconnects"], 1)
+
+    @patch('coupon_core.clients.RedisCluster')
+    def test_moved_redirect_is_counted(self, mock_redis_cluster):
+        manager = clients.ClientManager()
+        client = manager.get_redis_client("redis-host", 6379)
+
+        client.connection_pool.nodes.increment_reinitialize_counter()
+        client.connection_pool.nodes.initialize()
+
+        self.assertEqual(manager.stats["moved_redirects"], 1)
+        self.assertEqual(manager.stats["slot_refreshes"], 1)
+
+    @patch('pymysql.connect')
+    def test_db_connection_reused_and_discarded(self, mock_connect):
+        first_connection, second_connection = MagicMock(), MagicMock()
+        mock_connect.side_effect = [first_connection, second_connection]
+        manager = clients.ClientManager(health_check_interval=30)
+
+        self.assertIs(manager.get_db_connection("rds", "admin", "pw", "event_db"), first_connection)
+        self.assertIs(manager.get_db_connection("rds", "admin", "pw", "event_db"), first_connection)
+        manager.discard_db_connection(first_connection)
+
+        self.assertIs(manager.get_db_connection("rds", "admin", "pw", "event_db"), second_connection)
+        first_connection.close.assert_called_once()
+        self.assertEqual(manager.stats["db_new"], 2)
+        self.assertEqual(manager.stats["db_reused"], 1)
+
+    @patch('pymysql.connect')
+    def test_idle_db_connection_reconnects_when_ping_fails(self, mock_connect):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.ping.side_effect = pymysql.err.OperationalError(2006, "MySQL server has gone away")
+        mock_connect.side_effect = [stale, fresh]
+        manager = clients.ClientManager(health_check_interval=0)
+
+        manager.get_db_connection("rds", "admin", "pw", "event_db")
+        connection = manager.get_db_connection("rds", "admin", "pw", "event_db")
+
+        self.assertIs(connection, fresh)
+        self.assertEqual(manager.stats["db_reconnects"], 1)
+
+    def test_prewarm_runs_warmups_and_swallows_connect_errors(self):
+        client = MagicMock()
+        warmup = MagicMock()
+        clients.prewarm(lambda: client, warmup)
+        warmup.assert_called_once_with(client)
+
+        failing = MagicMock(side_effect=ConnectionError("no route to host"))
+        clients.prewarm(failing, warmup)
+        self.assertEqual(warmup.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
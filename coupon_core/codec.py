@@ -0,0 +1,138 @@
+import json
+import os
+import struct
+from datetime import datetime, timezone as fixed_timezone
+
+from coupon_core import expiry
+
+# Redis 에 저장하는 쿠폰 정보 인코딩
+#  - json   : {"member_id", "used", "issued_at", "timezone"} JSON 문자열 (기존 방식)
+#  - packed : 고정 헤더 + member_id 바이너리 문자열 (필드 이름 / ISO 시각 문자열을 반복 저장하지 않음)
+# 읽을 때는 첫 바이트로 구분하므로 두 인코딩이 섞여 있어도 된다 (JSON 은 항상 '{' 로 시작)
+ENCODING_JSON = "json"
+ENCODING_PACKED = "packed"
+RECORD_ENCODING = os.environ.get("COUPON_RECORD_ENCODING", ENCODING_JSON)
+
+# packed 헤더: 버전(1), 플래그(1, bit0 = used), issued_at epoch 초(4), 타임존 ID(2)
+# 이어서 TIMEZONE_INLINE 이면 타임존 이름 길이(1) + 이름, 마지막으로 member_id (UTF-8)
+PACKED_VERSION = 1
+FLAG_USED = 1
+_HEADER = struct.Struct(">BBIH")
+
+TIMEZONE_NONE = 0  # 메시지에 타임존이 없던 쿠폰 (issued_at 은 기본 타임존)
+TIMEZONE_INLINE = 0xFFFF  # 표에 없는 타임존은 이름을 그대로 저장
+
+# 타임존 ID 표 (ID = 위치 + 1). 저장된 쿠폰이 읽히도록 순서를 바꾸지 말고 새 타임존은 끝에만 추가
+TIMEZONES = (
+    "Asia/Seoul",
+    "Asia/Tokyo",
+    "Asia/Shanghai",
+    "Asia/Singapore",
+    "Asia/Ho_Chi_Minh",
+    "America/New_York",
+    "America/Chicago",
+    "America/Denver",
+    "America/Los_Angeles",
+    "Europe/London",
+    "Europe/Paris",
+    "Europe/Berlin",
+    "Australia/Sydney",
+    "UTC",
+)
+_TIMEZONE_IDS = {name: position + 1 for position, name in enumerate(TIMEZONES)}
+
+_FIELDS = {"member_id", "used", "issued_at", "timezone"}
+
+# (타임존, issued_at 15분 버킷) -> 고정 UTC 오프셋 tz (pytz 변환은 느려 디코딩 때 버킷 단위로 재사용)
+OFFSET_BUCKET_SECONDS = 15 * 60
+_offsets = {}
+MAX_CACHED_OFFSETS = 4096
+
+
+def encode(coupon_data, encoding=None):
+    """
+    쿠폰 정보를 Redis 에 저장할 값으로.
+    packed 로 표현할 수 없는 쿠폰 (다른 필드가 있거나 issued_at 이 ISO 시각이 아닌 경우) 은 JSON 으로 저장한다.
+    packed 의 issued_at 은 초 단위로 저장된다.
+    """
+    if (encoding or RECORD_ENCODING) == ENCODING_PACKED:
+        packed = _pack(coupon_data)
+        if packed is not None:
+            return packed
+    return json.dumps(coupon_data)
+
+
+def decode(value):
+    """Redis 에 저장된 쿠폰 정보 (packed 또는 JSON) 를 dict 로"""
+    if isinstance(value, str):
+        value = value.encode()
+    if value[:1] == bytes((PACKED_VERSION,)):
+        return _unpack(value)
+    return json.loads(value)
+
+
+def _pack(coupon_data):
+    member_id = coupon_data.get("member_id")
+    timezone = coupon_data.get("timezone")
+    if set(coupon_data) != _FIELDS or not isinstance(member_id, str) or not isinstance(coupon_data["used"], bool):
+        return None
+    if timezone is not None and not isinstance(timezone, str):
+        return None
+    try:
+        issued_at = int(datetime.fromisoformat(coupon_data["issued_at"]).timestamp())
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= issued_at < 1 << 32:
+        return None
+
+    if timezone is None:
+        timezone_id, inline = TIMEZONE_NONE, b""
+    elif timezone in _TIMEZONE_IDS:
+        timezone_id, inline = _TIMEZONE_IDS[timezone], b""
+    else:
+        name = timezone.encode()
+        if len(name) > 255:
+            return None
+        timezone_id, inline = TIMEZONE_INLINE, bytes((len(name),)) + name
+
+    flags = FLAG_USED if coupon_data["used"] else 0
+    return _HEADER.pack(PACKED_VERSION, flags, issued_at, timezone_id) + inline + member_id.encode()
+
+
+def _unpack(value):
+    try:
+        return _unpack_fields(value)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"invalid packed coupon record: {e}")
+
+
+def _unpack_fields(value):
+    _, flags, issued_at, timezone_id = _HEADER.unpack_from(value)
+    offset = _HEADER.size
+    if timezone_id == TIMEZONE_NONE:
+        timezone = None
+    elif timezone_id == TIMEZONE_INLINE:
+        length = value[offset]
+        timezone = value[offset + 1:offset + 1 + length].decode()
+        offset += 1 + length
+    else:
+        timezone = TIMEZONES[timezone_id - 1]
+
+    return {
+        "member_id": value[offset:].decode(),
+        "used": bool(flags & FLAG_USED),
+        "issued_at": datetime.fromtimestamp(issued_at, _offset_zone(timezone, issued_at)).isoformat(),
+        "timezone": timezone,
+    }
+
+
+def _offset_zone(timezone, issued_at):
+    """issued_at 시점의 타임존 UTC 오프셋 (서머타임 전환 시각은 UTC 기준 15분 단위라 버킷 안에서 같다)"""
+    key = (timezone, issued_at // OFFSET_BUCKET_SECONDS)
+    zone = _offsets.get(key)
+    if zone is None:
+        offset = datetime.fromtimestamp(issued_at, expiry.resolve_timezone(timezone)).utcoffset()
+        if len(_offsets) >= MAX_CACHED_OFFSETS:
+            _offsets.clear()
+        zone = _offsets[key] = fixed_timezone(offset)
+    return zone
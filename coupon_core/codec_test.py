@@ -0,0 +1,39 @@
+import json
+import unittest
+
+from coupon_core import codec
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_packed_round_trip(self):
+        coupon_data = {"member_id": "100001", "used": False, "issued_at": "2025-02-24T10:00:00+09:00",
+                       "timezone": "Asia/Seoul"}
+
+        value = codec.encode(coupon_data, codec.ENCODING_PACKED)
+
+        self.assertLess(len(value), 20)
+        self.assertEqual(codec.decode(value), coupon_data)
+
+    def test_unknown_and_missing_timezone(self):
+        for timezone, issued_at in (("Pacific/Auckland", "2025-02-24T14:00:00+13:00"),
+                                    (None, "2025-02-24T10:00:00+09:00")):
+            coupon_data = {"member_id": "m1", "used": True, "issued_at": issued_at, "timezone": timezone}
+            self.assertEqual(codec.decode(codec.encode(coupon_data, codec.ENCODING_PACKED)), coupon_data)
+
+    def test_reads_legacy_json_and_falls_back_for_other_records(self):
+        legacy = {"member_id": "m1", "used": False, "issued_at": "2025-02-24T10:00:00.123456+09:00",
+                  "timezone": "Asia/Seoul"}
+        self.assertEqual(codec.decode(json.dumps(legacy).encode()), legacy)
+
+        # packed 로 표현할 수 없는 필드가 있으면 JSON 으로 저장
+        other = dict(legacy, coupon_id="online-1")
+        self.assertEqual(json.loads(codec.encode(other, codec.ENCODING_PACKED)), other)
+
+    def test_corrupt_packed_value_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            codec.decode(b"\x01\x00")
+
+
+if __name__ == '__main__':
+    unittest.main()
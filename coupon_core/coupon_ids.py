@@ -0,0 +1,99 @@
+import base64
+import os
+import re
+import time
+import uuid
+
+# 쿠폰 ID 뒷부분 (채널 / 샤드 해시 태그 뒤) 생성 방식
+#  - uuid : uuid4 36자 (기존 방식)
+#  - ulid : 밀리초 시각 48비트 + 난수 80비트를 Crockford base32 26자로. 시각 순으로 정렬되고,
+#           컨테이너끼리 조율하지 않아도 같은 밀리초 안의 충돌 확률이 2^-80 수준이다
+ID_FORMAT_UUID = "uuid"
+ID_FORMAT_ULID = "ulid"
+ID_FORMAT = os.environ.get("COUPON_ID_FORMAT", ID_FORMAT_UUID)
+
+ULID_LENGTH = 26
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_CROCKFORD_VALUES = {char: value for value, char in enumerate(_CROCKFORD)}
+# RFC 4648 base32 -> Crockford base32 (대량 생성에서 난수 80비트를 b32encode 한 번으로 바꾼다)
+_BASE32_TO_CROCKFORD = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", _CROCKFORD.encode())
+
+# 쿠폰 ID 형식
+#  - legacy        : online-<id>
+#  - script        : {online}-<id>
+#  - 샤드 재고     : {online:3}-<id>
+#  - member 레이아웃 : {12345}:online-<id> (마이그레이션된 ID 는 {12345}:{online}-<id> 등)
+#  - 캠페인        : {online.summer26}-<id> (coupon_core.campaigns 의 재고 키)
+_ID_PATTERN = re.compile(
+    r"^(?:\{(?P<member_id>[^}]*)\}:)?\{?(?P<channel>offline|online)(?:\.(?P<campaign_id>[A-Za-z0-9_]+))?"
+    r"(?::(?P<shard>\d+))?\}?-(?P<suffix>.+)$"
+)
+
+
+def new_id(id_format=None):
+    """쿠폰 ID 뒷부분 생성"""
+    if (id_format or ID_FORMAT) == ID_FORMAT_ULID:
+        return new_ulid()
+    return str(uuid.uuid4())
+
+
+def new_ulid(now_ms=None):
+    """시각 순으로 정렬되는 26자 ULID (앞 10자 = 밀리초 시각, 뒤 16자 = 난수)"""
+    if now_ms is None:
+        now_ms = time.time_ns() // 1000000
+    value = (now_ms & ((1 << 48) - 1)) << 80 | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(ULID_LENGTH):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def new_ids(count, id_format=None):
+    """
+    쿠폰 ID 뒷부분 count 개를 한 번에 생성 (토큰 풀 미리 발행용).
+    난수를 한 번에 읽어 나누므로 new_id 를 반복 호출하는 것보다 훨씬 빠르다.
+    ulid 는 모두 생성한 밀리초 시각을 공유한다 (토큰이면 발급 시각이 아니라 미리 발급한 시각).
+    """
+    if (id_format or ID_FORMAT) == ID_FORMAT_ULID:
+        prefix = new_ulid()[:10]
+        random_part = base64.b32encode(os.urandom(10 * count)).translate(_BASE32_TO_CROCKFORD).decode()
+        return [prefix + random_part[start:start + 16] for start in range(0, 16 * count, 16)]
+    # uuid4: 7번째 바이트 상위 4비트 버전(4), 9번째 바이트 상위 2비트 variant(10)
+    data = bytearray(os.urandom(16 * count))
+    data[6::16] = bytes(byte & 0x0F | 0x40 for byte in data[6::16])
+    data[8::16] = bytes(byte & 0x3F | 0x80 for byte in data[8::16])
+    hexed = data.hex()
+    return [f"{hexed[at:at + 8]}-{hexed[at + 8:at + 12]}-{hexed[at + 12:at + 16]}-{hexed[at + 16:at + 20]}-"
+            f"{hexed[at + 20:at + 32]}" for at in range(0, 32 * count, 32)]
+
+
+def ulid_timestamp(suffix):
+    """ULID 의 발급 시각 (UNIX 초, 소수점 밀리초). ULID 가 아니면 None"""
+    if len(suffix) != ULID_LENGTH:
+        return None
+    value = 0
+    for char in suffix[:10]:
+        digit = _CROCKFORD_VALUES.get(char)
+        if digit is None:
+            return None
+        value = value << 5 | digit
+    return value / 1000
+
+
+def parse_coupon_id(coupon_id):
+    """
+    쿠폰 ID 에서 채널, 캠페인, 재고 샤드, member 레이아웃의 회원, 발급 시각(ULID 인 경우)을 추출.
+    {"channel", "campaign_id", "shard", "member_id", "issued_at"} (없는 값은 None), 알 수 없는 형식이면 None.
+    """
+    match = _ID_PATTERN.match(coupon_id)
+    if match is None:
+        return None
+    shard = match.group("shard")
+    return {
+        "channel": match.group("channel"),
+        "campaign_id": match.group("campaign_id"),
+        "shard": int(shard) if shard is not None else None,
+        "member_id": match.group("member_id"),
+        "issued_at": ulid_timestamp(match.group("suffix")),
+    }
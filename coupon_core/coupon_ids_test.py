@@ -0,0 +1,41 @@
+import unittest
+
+from coupon_core import coupon_ids
+
+
+class TestCouponIds(unittest.TestCase):
+
+    def test_ulid_is_sortable_and_keeps_timestamp(self):
+        first = coupon_ids.new_ulid(1740358800000)
+        second = coupon_ids.new_ulid(1740358800001)
+
+        self.assertEqual(len(first), coupon_ids.ULID_LENGTH)
+        self.assertLess(first, second)
+        self.assertEqual(coupon_ids.ulid_timestamp(first), 1740358800.0)
+        self.assertEqual(len(coupon_ids.new_id(coupon_ids.ID_FORMAT_UUID)), 36)
+
+    def test_parse_coupon_id_formats(self):
+        suffix = coupon_ids.new_ulid(1740358800000)
+        cases = (
+            (f"online-{suffix}", ("online", None, None)),
+            (f"{{online}}-{suffix}", ("online", None, None)),
+            (f"{{offline:3}}-{suffix}", ("offline", 3, None)),
+            (f"{{12345}}:online-{suffix}", ("online", None, "12345")),
+            (f"{{12345}}:{{offline:2}}-{suffix}", ("offline", 2, "12345")),
+        )
+        for coupon_id, (channel, shard, member_id) in cases:
+            parsed = coupon_ids.parse_coupon_id(coupon_id)
+            self.assertEqual((parsed["channel"], parsed["shard"], parsed["member_id"]), (channel, shard, member_id))
+            self.assertEqual(parsed["issued_at"], 1740358800.0)
+
+        # uuid ID 는 발급 시각이 없고, 알 수 없는 형식은 None
+        self.assertIsNone(coupon_ids.parse_coupon_id("{online}-3f2a6c1e-8d1b-4c3e-9a55-2f1f6e7c9b10")["issued_at"])
+        self.assertIsNone(coupon_ids.parse_coupon_id("bench-1"))
+
+        # 캠페인 재고 키
+        parsed = coupon_ids.parse_coupon_id(f"{{online.summer_26}}-{suffix}")
+        self.assertEqual((parsed["channel"], parsed["campaign_id"]), ("online", "summer_26"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+import zlib
+
+# 중복 발급 방지 인덱스 구현
+#  - set    : 회원 ID SET (기존 방식, 재고 태그마다 키 하나로 재고 키와 같은 슬롯)
+#  - bitmap : 숫자 회원 ID 구간별 비트맵 (회원당 1비트, 구간마다 다른 슬롯)
+#  - bloom  : RedisBloom 필터 + 정확 확인 (필터 양성일 때만, channel 레이아웃은 채널 회원-쿠폰 HASH,
+#             member 레이아웃은 회원 슬롯의 받은 재고 키 SET). 필터는 재고 태그마다 하나로 재고 키와 같은 슬롯
+# 인덱스 키를 여러 슬롯에 나눠 한 채널의 중복 체크가 한 노드에 몰리지 않게 하는 것은 bitmap 뿐이다.
+# set / bloom 은 재고 차감과 같은 스크립트에서 원자적으로 확인 / 등록하도록 재고 키 슬롯에 두므로
+# 채널 재고를 나누려면 COUPON_STOCK_SHARDS 로 재고와 함께 샤드 태그 (<채널>:<샤드>) 에 나눈다.
+DEDUP_SET = "set"
+DEDUP_BITMAP = "bitmap"
+DEDUP_BLOOM = "bloom"
+
+# 비트맵 키 하나가 담당하는 회원 ID 구간 크기 (2^16 비트 = 8KB)
+BITMAP_RANGE = 1 << 16
+
+# 블룸 필터 오탐률 / 초기 용량 (샤드 하나 기준, 넘치면 RedisBloom 이 자동 확장)
+BLOOM_ERROR_RATE = 0.001
+BLOOM_CAPACITY = 1000000
+
+
+class SetDedupIndex:
+    """
+    회원 ID SET. 발급 스크립트에 끼워 넣을 Lua 조각과 단독 사용 API 를 함께 제공한다.
+    키는 재고 태그마다 하나 (received_coupons:{<tag>}) 로 재고 키와 같은 슬롯에 둔다.
+    Lua 조각에서 KEYS[2] 는 인덱스 키, KEYS[4] 는 회원별 쿠폰 HASH, ARGV[1] 은 member_id,
+    ARGV[#ARGV] 는 script_args() 로 덧붙인 인자다. lua_release 는 등록 취소 (발급 예약 해제용).
+    in_script 가 False 인 인덱스는 키가 재고 키와 다른 슬롯이라 스크립트 전에 claim_outside 로 등록한다.
+    """
+
+    name = DEDUP_SET
+    in_script = True
+    lua_check = "redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1"
+    lua_claim = "redis.call('SADD', KEYS[2], ARGV[1])"
+    lua_release = "redis.call('SREM', KEYS[2], ARGV[1])"
+
+    def key(self, tag, member_id):
+        return f"received_coupons:{{{tag}}}"
+
+    def script_key(self, tag, member_id, slot_key):
+        """스크립트의 KEYS[2] (스크립트 밖에서 등록하는 인덱스는 같은 슬롯의 slot_key 를 대신 넘김)"""
+        return self.key(tag, member_id)
+
+    def script_args(self, member_id):
+        return []
+
+    def fragments(self, member_layout=False):
+        """발급 스크립트에 넣을 (확인, 등록) Lua 조각"""
+        return self.lua_check, self.lua_claim
+
+    def home_shard(self, member_id, shards):
+        """회원의 인덱스 / 쿠폰 기록이 놓일 샤드"""
+        return zlib.crc32(str(member_id).encode()) % shards
+
+    def claim(self, redis_client, tag, member_id):
+        """처음 등록이면 True (확인과 등록이 명령 하나로 원자적)"""
+        return redis_client.sadd(self.key(tag, member_id), member_id) == 1
+
+    def queue_claim(self, pipe, tag, member_id):
+        """파이프라인에 등록 명령을 쌓음 (처음 등록이었는지는 first_claim 으로 판단)"""
+        pipe.sadd(self.key(tag, member_id), member_id)
+
+    def first_claim(self, reply):
+        return reply == 1
+
+    def contains(self, redis_client, tag, member_id):
+        return bool(redis_client.sismember(self.key(tag, member_id), member_id))
+
+    def release(self, redis_client, tag, member_id):
+        """발급하지 못한 등록을 되돌림"""
+        redis_client.srem(self.key(tag, member_id), member_id)
+
+
+class BitmapDedupIndex(SetDedupIndex):
+    """
+    숫자 회원 ID 를 BITMAP_RANGE 구간으로 나눈 비트맵. SETBIT 이 이전 비트를 돌려주므로
+    확인과 등록이 명령 하나로 끝난다. 회원 ID 가 촘촘할수록 SET 보다 훨씬 작다.
+    구간 번호를 해시 태그에 넣어 구간마다 다른 슬롯에 퍼지므로 발급 스크립트 밖에서
+    먼저 등록하고 (claim_outside), 발급하지 못하면 되돌린다 (release_outside). 스크립트 조각은 비어 있다.
+    """
+
+    name = DEDUP_BITMAP
+    in_script = False
+    lua_check = "false"
+    lua_claim = ""
+    lua_release = ""
+
+    def key(self, tag, member_id):
+        return f"received_bits:{{{tag}:{self._member_number(member_id) // BITMAP_RANGE}}}"
+
+    def script_key(self, tag, member_id, slot_key):
+        self._member_number(member_id)
+        return slot_key
+
+    def script_args(self, member_id):
+        return []
+
+    def offset(self, member_id):
+        return self._member_number(member_id) % BITMAP_RANGE
+
+    def home_shard(self, member_id, shards):
+        # 같은 구간의 회원은 같은 샤드에 모아 비트맵이 조밀하게 채워지도록 한다
+        return (self._member_number(member_id) // BITMAP_RANGE) % shards
+
+    def claim(self, redis_client, tag, member_id):
+        return redis_client.setbit(self.key(tag, member_id), self.offset(member_id), 1) == 0
+
+    def queue_claim(self, pipe, tag, member_id):
+        # SETBIT 은 이전 비트를 돌려주므로 처음 등록이면 0
+        pipe.setbit(self.key(tag, member_id), self.offset(member_id), 1)
+
+    def first_claim(self, reply):
+        return reply == 0
+
+    def contains(self, redis_client, tag, member_id):
+        return redis_client.getbit(self.key(tag, member_id), self.offset(member_id)) == 1
+
+    def release(self, redis_client, tag, member_id):
+        redis_client.setbit(self.key(tag, member_id), self.offset(member_id), 0)
+
+    def _member_number(self, member_id):
+        try:
+            number = int(member_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"bitmap dedup index requires numeric member_id: {member_id!r}")
+        if number < 0:
+            raise ValueError(f"bitmap dedup index requires non-negative member_id: {member_id!r}")
+        return number
+
+
+class BloomDedupIndex(SetDedupIndex):
+    """
+    RedisBloom 필터. 필터에 없으면 확실히 처음이고, 있다고 나오면(오탐 가능) 정확히 확인한다.
+    channel 레이아웃은 같은 슬롯의 채널 회원-쿠폰 HASH (발급 시 쿠폰 ID 로 덮어씀) 로 확인하고,
+    member 레이아웃은 채널 HASH 를 쓰지 않으므로 채널 슬롯에는 필터만 두고 회원 슬롯의
+    received_key SET 으로 확인 / 등록한다 (coupon_core.member_coupons). 블룸 필터는 삭제가 안 되므로
+    등록 취소는 정확 확인 쪽에서만 지우고, 필터에 남은 회원은 다음 요청에서 정확 확인으로 걸러진다.
+    """
+
+    name = DEDUP_BLOOM
+    lua_check = ("(redis.call('BF.EXISTS', KEYS[2], ARGV[1]) == 1"
+                 " and redis.call('HEXISTS', KEYS[4], ARGV[1]) == 1)")
+    # 다른 샤드 재고로 발급하는 동안에도 정확 확인이 되도록 HASH 에 pending 을 먼저 기록
+    lua_claim = ("redis.call('BF.ADD', KEYS[2], ARGV[1]);"
+                 " redis.call('HSETNX', KEYS[4], ARGV[1], 'pending')")
+    lua_release = "redis.call('HDEL', KEYS[4], ARGV[1])"
+    # member 레이아웃: 필터 양성이면 0 (정확 확인 필요) 을 돌려주고 필터에만 등록
+    lua_filter_check = "redis.call('BF.EXISTS', KEYS[2], ARGV[1]) == 1"
+    lua_filter_claim = "redis.call('BF.ADD', KEYS[2], ARGV[1])"
+
+    def key(self, tag, member_id):
+        return f"received_bloom:{{{tag}}}"
+
+    def member_coupons_key(self, tag):
+        return f"member_coupons:{{{tag}}}"
+
+    def received_key(self, member_id):
+        """member 레이아웃의 정확 확인 키: 회원이 받은 재고 키 SET (회원 슬롯)"""
+        return f"member:{{{member_id}}}:received"
+
+    def fragments(self, member_layout=False):
+        if member_layout:
+            return self.lua_filter_check, self.lua_filter_claim
+        return self.lua_check, self.lua_claim
+
+    def reserve(self, redis_client, tag, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        """필터 생성 (이미 있으면 무시). 만들지 않으면 BF.ADD 가 기본 설정으로 만든다."""
+        try:
+            redis_client.execute_command("BF.RESERVE", self.key(tag, None), error_rate, capacity)
+        except Exception as e:
+            if "exists" not in str(e).lower():
+                raise
+
+    def claim(self, redis_client, tag, member_id):
+        # 정확한 판정은 HSETNX 가 하고, 필터는 이후 조회에서 HASH 확인을 건너뛰는 데 쓰인다
+        redis_client.execute_command("BF.ADD", self.key(tag, member_id), member_id)
+        return redis_client.hsetnx(self.member_coupons_key(tag), member_id, "pending") == 1
+
+    def queue_claim(self, pipe, tag, member_id):
+        pipe.execute_command("BF.ADD", self.key(tag, member_id), member_id)
+        pipe.hsetnx(self.member_coupons_key(tag), member_id, "pending")
+
+    def queue_member_claim(self, pipe, tag, member_id):
+        """member 레이아웃 등록 (필터 + 회원 슬롯 SET)"""
+        pipe.execute_command("BF.ADD", self.key(tag, member_id), member_id)
+        pipe.sadd(self.received_key(member_id), tag)
+
+    def contains(self, redis_client, tag, member_id):
+        if not redis_client.execute_command("BF.EXISTS", self.key(tag, member_id), member_id):
+            return False
+        return bool(redis_client.hexists(self.member_coupons_key(tag), member_id))
+
+    def release(self, redis_client, tag, member_id):
+        redis_client.hdel(self.member_coupons_key(tag), member_id)
+
+
+_indexes = {
+    DEDUP_SET: SetDedupIndex(),
+    DEDUP_BITMAP: BitmapDedupIndex(),
+    DEDUP_BLOOM: BloomDedupIndex(),
+}
+
+
+def get_dedup_index(name=DEDUP_SET):
+    try:
+        return _indexes[name]
+    except KeyError:
+        raise ValueError(f"Unknown dedup index: {name}")
+
+
+def claim_outside(redis_client, index, entries):
+    """
+    스크립트 밖에서 등록하는 인덱스 (in_script 가 False) 에 (tag, member_id) 목록을 먼저 등록하고
+    처음 등록됐는지 목록을 반환 (파이프라인 한 번, 키가 여러 슬롯이면 노드별로 나뉜다).
+    스크립트 안에서 확인하는 인덱스는 스크립트가 판단하므로 모두 True.
+    """
+    if index.in_script or not entries:
+        return [True] * len(entries)
+    pipe = redis_client.pipeline()
+    for tag, member_id in entries:
+        index.queue_claim(pipe, tag, member_id)
+    return [index.first_claim(reply) for reply in pipe.execute()]
+
+
+def release_outside(redis_client, index, entries):
+    """claim_outside 로 등록했지만 발급하지 못한 (tag, member_id) 를 되돌림"""
+    if index.in_script or not entries:
+        return
+    pipe = redis_client.pipeline()
+    for tag, member_id in entries:
+        index.release(pipe, tag, member_id)
+    pipe.execute()
+
+
+# 채널 간 중복 발급 체크 범위 (COUPON_DEDUP_SCOPE, 캠페인 재고는 항상 캠페인별)
+#  - channel : 기본값. 스크립트의 채널별 인덱스만 사용 (명령 한 번으로 원자적, 회원이 채널마다 한 장씩 받을 수 있음)
+#              legacy 경로에서 전환하기 전에 coupon_init 의 migrate_received_coupons 로 전역 이력을 채널별 인덱스에 복사한다
+#  - global  : 채널 재고(offline / online) 스크립트 발급 전에 전역 received_coupons SET 을 확인하고 발급 후 기록
+#              (legacy 경로와 같이 회원당 채널 통틀어 한 장, 발급 이력도 legacy 경로와 공유).
+#              채널 재고는 채널마다 다른 슬롯이라 전역 SET 을 스크립트 KEYS 에 함께 넣을 수 없어 확인 / 발급 / 기록이
+#              왕복 3번이고 원자적이지 않다 (같은 회원이 두 채널에 동시에 요청하면 둘 다 받을 수 있음)
+DEDUP_SCOPE_GLOBAL = "global"
+DEDUP_SCOPE_CHANNEL = "channel"
+
+# legacy 경로의 전역 발급 회원 SET / 채널 재고 키
+GLOBAL_RECEIVED_KEY = "received_coupons"
+CHANNEL_KEYS = ("offline", "online")
+
+# migrate_received_coupons 의 SSCAN / 파이프라인 크기
+MIGRATE_CHUNK = 1000
+
+
+def cross_channel(scope, coupon_key):
+    """coupon_key 발급에 전역 received_coupons 를 함께 확인 / 기록해야 하는지"""
+    if scope not in (DEDUP_SCOPE_GLOBAL, DEDUP_SCOPE_CHANNEL):
+        raise ValueError(f"Unknown dedup scope: {scope}")
+    return scope == DEDUP_SCOPE_GLOBAL and coupon_key in CHANNEL_KEYS
+
+
+def received_members(redis_client, member_ids):
+    """
+    전역 received_coupons 에 이미 있는 회원 집합.
+    키가 하나라 파이프라인이 노드 하나로 한 번에 간다. 확인과 기록 사이는 legacy 경로와 같이 원자적이지 않아
+    같은 회원이 두 채널에 동시에 요청하면 둘 다 발급될 수 있다 (같은 채널 안의 중복은 스크립트가 막는다).
+    """
+    if len(member_ids) == 1:
+        return set(member_ids) if redis_client.sismember(GLOBAL_RECEIVED_KEY, member_ids[0]) else set()
+    pipe = redis_client.pipeline()
+    for member_id in member_ids:
+        pipe.sismember(GLOBAL_RECEIVED_KEY, member_id)
+    return {member_id for member_id, received in zip(member_ids, pipe.execute()) if received}
+
+
+def record_received(redis_client, member_ids):
+    """발급한 회원을 전역 received_coupons 에 기록"""
+    if member_ids:
+        redis_client.sadd(GLOBAL_RECEIVED_KEY, *member_ids)
+
+
+def member_tag(index, coupon_key, member_id, shards=1):
+    """발급 경로가 member_id 의 중복 체크에 쓰는 태그 (샤드 재고는 inventory.shard_tag 와 같은 <coupon_key>:<home>)"""
+    if shards > 1:
+        return f"{coupon_key}:{index.home_shard(member_id, shards)}"
+    return coupon_key
+
+
+def migrate_received_coupons(redis_client, index, coupon_keys=CHANNEL_KEYS, chunk_size=MIGRATE_CHUNK,
+                             member_layout=False, shards=1):
+    """
+    전역 received_coupons 의 회원을 coupon_keys 채널별 중복 체크 인덱스에 복사 (이미 있으면 그대로).
+    COUPON_DEDUP_SCOPE 를 channel 로 바꾸거나 global 에서 스크립트 경로로 처음 전환하기 전에 실행한다.
+    shards 는 발급 Lambda 의 COUPON_STOCK_SHARDS (샤드 재고는 회원의 home_shard 태그 인덱스를 본다).
+    member_layout 이면 bloom 의 정확 확인 기록을 회원 슬롯에 남긴다.
+    인덱스가 받을 수 없는 회원 (bitmap 의 숫자가 아닌 ID) 은 건너뛴다. 복사한 회원 수 / 건너뛴 회원 수
+    """
+    counts = {"copied": 0, "skipped": 0}
+    chunk = []
+
+    def flush():
+        pipe = redis_client.pipeline()
+        for member_id in chunk:
+            for coupon_key in coupon_keys:
+                if member_layout and index.name == DEDUP_BLOOM:
+                    index.queue_member_claim(pipe, coupon_key, member_id)
+                else:
+                    index.queue_claim(pipe, member_tag(index, coupon_key, member_id, shards), member_id)
+        pipe.execute()
+        counts["copied"] += len(chunk)
+        chunk.clear()
+
+    for member_id in redis_client.sscan_iter(GLOBAL_RECEIVED_KEY, count=chunk_size):
+        member_id = member_id.decode() if isinstance(member_id, bytes) else member_id
+        try:
+            index.key(coupon_keys[0], member_id)
+        except ValueError:
+            counts["skipped"] += 1
+            continue
+        chunk.append(member_id)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return counts
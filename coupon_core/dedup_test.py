@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import MagicMock
+
+from rediscluster.nodemanager import NodeManager
+
+from coupon_core import dedup, inventory, issuance
+
+keyslot = NodeManager(startup_nodes=[{"host": "localhost", "port": 6379}]).keyslot
+
+
+class TestDedupIndex(unittest.TestCase):
+
+    def test_bitmap_key_and_offset(self):
+        index = dedup.get_dedup_index(dedup.DEDUP_BITMAP)
+        member_id = str(dedup.BITMAP_RANGE * 3 + 7)
+
+        self.assertEqual(index.key("online", member_id), "received_bits:{online:3}")
+        self.assertEqual(index.offset(member_id), 7)
+        self.assertEqual(index.home_shard(member_id, 2), 1)
+
+    def test_bitmap_ranges_spread_across_slots(self):
+        index = dedup.get_dedup_index(dedup.DEDUP_BITMAP)
+        keys = [index.key("online", str(dedup.BITMAP_RANGE * number)) for number in range(64)]
+
+        self.assertGreater(len({keyslot(key) for key in keys}), 32)
+        # 스크립트에는 비트맵 대신 재고 키 슬롯의 키가 들어간다
+        self.assertEqual(index.script_key("online", "1", "online"), "online")
+
+    def test_set_and_bloom_keys_stay_on_stock_slot(self):
+        # set / bloom 은 재고 태그마다 키 하나 (나누려면 재고 샤드 태그로)
+        for name in (dedup.DEDUP_SET, dedup.DEDUP_BLOOM):
+            index = dedup.get_dedup_index(name)
+            self.assertEqual({index.key("online", str(member)) for member in range(0, 10 ** 6, 997)},
+                             {index.key("online", "0")})
+            self.assertTrue(index.in_script)
+            self.assertEqual(keyslot(index.key("online", "1")), keyslot("online"))
+            self.assertEqual(len({keyslot(index.key(inventory.shard_tag("online", shard), "1"))
+                                  for shard in range(8)}), 8)
+
+    def test_bitmap_claims_outside_script(self):
+        redis_client = MagicMock()
+        index = dedup.get_dedup_index(dedup.DEDUP_BITMAP)
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.return_value = [0, 1]
+
+        claimed = dedup.claim_outside(redis_client, index, [("online", "1"), ("online", "70000")])
+
+        self.assertEqual(claimed, [True, False])
+        self.assertEqual([call[0] for call in pipe.setbit.call_args_list],
+                         [("received_bits:{online:0}", 1, 1),
+                          ("received_bits:{online:1}", 70000 - dedup.BITMAP_RANGE, 1)])
+        self.assertEqual(dedup.claim_outside(redis_client, dedup.get_dedup_index(dedup.DEDUP_SET), [("online", "1")]),
+                         [True])
+        self.assertEqual(redis_client.pipeline.call_count, 1)
+
+    def test_bitmap_rejects_non_numeric_member(self):
+        index = dedup.get_dedup_index(dedup.DEDUP_BITMAP)
+        with self.assertRaises(ValueError):
+            index.key("online", "user123")
+
+    def test_index_keys_share_slot_with_issue_keys(self):
+        for name in (dedup.DEDUP_SET, dedup.DEDUP_BITMAP, dedup.DEDUP_BLOOM):
+            index = dedup.get_dedup_index(name)
+            keys = issuance.issue_script_keys("online", issuance.new_coupon_id("online"), "123456", index)
+            self.assertEqual(len({keyslot(key) for key in keys}), 1)
+
+            _, _, _, keys, args = inventory._home_command("online", "123456", {}, 0, 8,
+                                                          inventory.SHARD_STRATEGY_MEMBER, index)
+            self.assertEqual(len({keyslot(key) for key in keys}), 1)
+            self.assertEqual(args[5:], index.script_args("123456"))
+
+    def test_migrate_received_coupons_copies_into_channel_indexes(self):
+        redis_client = MagicMock()
+        redis_client.sscan_iter.return_value = [b"1", b"2", b"user3"]
+        pipe = redis_client.pipeline.return_value
+
+        counts = dedup.migrate_received_coupons(redis_client, dedup.get_dedup_index(dedup.DEDUP_BITMAP),
+                                                ("offline", "online"), chunk_size=1)
+
+        # bitmap 이 받을 수 없는 ID 는 건너뛰고, 회원마다 두 채널에 등록
+        self.assertEqual(counts, {"copied": 2, "skipped": 1})
+        self.assertEqual([call[0] for call in pipe.setbit.call_args_list],
+                         [("received_bits:{offline:0}", 1, 1), ("received_bits:{online:0}", 1, 1),
+                          ("received_bits:{offline:0}", 2, 1), ("received_bits:{online:0}", 2, 1)])
+        self.assertEqual(pipe.execute.call_count, 2)
+
+    def test_migrate_received_coupons_uses_home_shard_tags(self):
+        redis_client = MagicMock()
+        redis_client.sscan_iter.return_value = [b"user1"]
+        pipe = redis_client.pipeline.return_value
+        index = dedup.get_dedup_index(dedup.DEDUP_SET)
+        home = index.home_shard("user1", 4)
+
+        dedup.migrate_received_coupons(redis_client, index, ("online",), shards=4)
+
+        # 발급 경로 (inventory.shard_tag) 와 같은 회원의 샤드 태그
+        pipe.sadd.assert_called_once_with(f"received_coupons:{{online:{home}}}", "user1")
+
+    def test_cross_channel_scope(self):
+        self.assertTrue(dedup.cross_channel(dedup.DEDUP_SCOPE_GLOBAL, "offline"))
+        self.assertFalse(dedup.cross_channel(dedup.DEDUP_SCOPE_GLOBAL, "online.sale"))
+        self.assertFalse(dedup.cross_channel(dedup.DEDUP_SCOPE_CHANNEL, "online"))
+        with self.assertRaises(ValueError):
+            dedup.cross_channel("everywhere", "online")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            dedup.get_dedup_index("hyperloglog")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+# 타임존이 없거나 잘못된 경우 사용하는 기본 타임존
+DEFAULT_TIMEZONE = "Asia/Seoul"
+
+# 기억해 둘 타임존 이름 수 상한 (잘못된 이름이 계속 들어와도 캐시가 무한히 커지지 않도록)
+MAX_CACHED_ZONES = 1024
+
+_zones = {}  # 타임존 이름 -> tz 객체 (잘못된 이름은 None 으로 기억해 예외 경로를 한 번만 탄다)
+_day_ends = {}  # tz 이름 -> (다음 자정 UNIX 시각, 오늘 23:59:59 UNIX 시각)
+
+
+def resolve_timezone(timezone):
+    """타임존 이름을 tz 객체로 (없거나 잘못된 이름은 기본 타임존)"""
+    if not timezone:
+        timezone = DEFAULT_TIMEZONE
+    try:
+        tz = _zones[timezone]
+    except KeyError:
+        try:
+            tz = pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError:
+            tz = None
+        if len(_zones) >= MAX_CACHED_ZONES:
+            _zones.clear()
+        _zones[timezone] = tz
+    if tz is None:
+        return resolve_timezone(DEFAULT_TIMEZONE)
+    return tz
+
+
+def current_timestamp(timezone=None, now=None):
+    """현재 시간을 타임존을 반영한 ISO 8601 문자열로 (예: 2025-02-24T10:00:00+09:00)"""
+    tz = resolve_timezone(timezone)
+    if now is None:
+        return datetime.now(tz).isoformat()
+    return datetime.fromtimestamp(now, tz).isoformat()
+
+
+def expiry_timestamp_for_today(timezone=None, now=None):
+    """
+    타임존 기준 오늘 23:59:59 의 UNIX 시각.
+    타임존별로 계산해 두고 현지 날짜가 바뀐 뒤(다음 자정 이후)에만 다시 계산한다.
+    """
+    tz = resolve_timezone(timezone)
+    if now is None:
+        now = time.time()
+    cached = _day_ends.get(tz.zone)
+    if cached is not None and now < cached[0]:
+        return cached[1]
+
+    local_now = datetime.fromtimestamp(now, tz)
+    midnight = datetime.combine(local_now.date(), datetime.min.time()) + timedelta(days=1)
+    next_midnight = int(tz.localize(midnight).timestamp())  # 타임존 적용
+    _day_ends[tz.zone] = (next_midnight, next_midnight - 1)
+    return next_midnight - 1
+
+
+def issue_times(timezones, now=None):
+    """
+    타임존 목록에 대해 (issued_at, expiry_timestamp) 목록을 같은 순서로 반환.
+    배치 안의 요청은 같은 시각으로 발급 처리하고, 같은 타임존은 한 번만 계산한다.
+    """
+    if now is None:
+        now = time.time()
+    computed = {}
+    times = []
+    for timezone in timezones:
+        pair = computed.get(timezone)
+        if pair is None:
+            pair = computed[timezone] = (current_timestamp(timezone, now), expiry_timestamp_for_today(timezone, now))
+        times.append(pair)
+    return times
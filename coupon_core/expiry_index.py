@@ -0,0 +1,95 @@
+import time
+
+# 만료 순서 인덱스: expiring:{태그}:<시간 버킷> SORTED SET (member = coupon_id, score = 만료 UNIX 시각)
+# 태그는 발급 경로의 해시 태그 (online / online:3) 와 같아 쿠폰 기록과 같은 슬롯에 놓인다
+BUCKET_SECONDS = 3600
+
+# 인덱스 키는 버킷 안 쿠폰의 만료 후 이 시간(초)이 지나면 Redis 가 지운다 (내보내기를 놓친 경우의 여유)
+INDEX_RETENTION = 24 * 60 * 60
+
+# 내보내기 한 번에 읽을 만료 구간 (현재 시각부터, 스케줄 지연을 감안해 실행 주기보다 길게)
+EXPORT_WINDOW = 2 * 60 * 60
+# 이전 실행에서 놓친 버킷을 다시 확인할 과거 구간
+EXPORT_LOOKBACK = BUCKET_SECONDS
+
+# ZRANGE 한 번에 읽을 항목 수
+PAGE_SIZE = 1000
+
+
+def index_key(tag, expiry_timestamp):
+    return bucket_key(tag, int(expiry_timestamp) // BUCKET_SECONDS)
+
+
+def bucket_key(tag, bucket):
+    return f"expiring:{{{tag}}}:{bucket}"
+
+
+def record(redis_client, tag, coupon_id, expiry_timestamp):
+    """인덱스에 쿠폰 등록 (Lua 스크립트를 쓰지 않는 legacy 경로용, ZADD + EXPIREAT 를 파이프라인 한 번으로)"""
+    pipe = redis_client.pipeline()
+    queue_record(pipe, tag, coupon_id, expiry_timestamp)
+    pipe.execute()
+
+
+def queue_record(pipe, tag, coupon_id, expiry_timestamp):
+    """인덱스 등록 명령을 파이프라인에 추가 (쿠폰 기록과 같은 파이프라인으로 보낼 때)"""
+    key = index_key(tag, expiry_timestamp)
+    pipe.zadd(key, {coupon_id: int(expiry_timestamp)})
+    pipe.expireat(key, int(expiry_timestamp) + INDEX_RETENTION)
+
+
+def export_tags(channels, shards=1):
+    """내보내기에서 확인할 태그 (단일 재고 경로 + 샤드 재고 경로)"""
+    tags = list(channels)
+    if shards > 1:
+        tags.extend(f"{channel}:{shard}" for channel in channels for shard in range(shards))
+    return tags
+
+
+def iter_due_entries(redis_client, tags, now=None, window=EXPORT_WINDOW, lookback=EXPORT_LOOKBACK,
+                     page_size=PAGE_SIZE, withscores=False):
+    """
+    만료 시각이 now + window 이전인 인덱스 항목을 (인덱스 키, coupon_id) 목록 페이지로 yield
+    (withscores 면 (인덱스 키, coupon_id, 만료 시각)).
+    대상 버킷의 ZCOUNT 를 파이프라인 한 번으로 확인하고, 항목이 있는 버킷만 순위 구간 ZRANGE 로 읽는다.
+    읽는 중 새로 등록된 항목으로 순위가 밀려 빠진 쿠폰은 구간이 겹치는 다음 실행에서 읽힌다.
+    """
+    if now is None:
+        now = int(time.time())
+    until = int(now) + window
+    buckets = range((int(now) - lookback) // BUCKET_SECONDS, until // BUCKET_SECONDS + 1)
+    keys = [bucket_key(tag, bucket) for tag in tags for bucket in buckets]
+
+    pipe = redis_client.pipeline()
+    for key in keys:
+        pipe.zcount(key, "-inf", until)
+    counts = pipe.execute()
+
+    for key, count in zip(keys, counts):
+        for start in range(0, int(count), page_size):
+            end = min(start + page_size, int(count)) - 1
+            if withscores:
+                scored = redis_client.zrange(key, start, end, withscores=True)
+                if scored:
+                    yield [(key, _decode(coupon_id), int(score)) for coupon_id, score in scored]
+                continue
+            coupon_ids = redis_client.zrange(key, start, end)
+            if coupon_ids:
+                yield [(key, _decode(coupon_id)) for coupon_id in coupon_ids]
+
+
+def mark_exported(redis_client, entries):
+    """내보낸 (또는 이미 만료된) 항목을 인덱스에서 제거 (키별 ZREM 을 파이프라인 한 번으로)"""
+    by_key = {}
+    for key, coupon_id in entries:
+        by_key.setdefault(key, []).append(coupon_id)
+    if not by_key:
+        return 0
+    pipe = redis_client.pipeline()
+    for key, coupon_ids in by_key.items():
+        pipe.zrem(key, *coupon_ids)
+    return sum(int(removed) for removed in pipe.execute())
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import MagicMock
+
+from coupon_core import expiry_index
+
+
+class TestExpiryIndex(unittest.TestCase):
+
+    def test_index_key_is_hour_bucket(self):
+        self.assertEqual(expiry_index.index_key("online", 7200), "expiring:{online}:2")
+        self.assertEqual(expiry_index.index_key("online:3", 10799), "expiring:{online:3}:2")
+
+    def test_export_tags_include_shards(self):
+        self.assertEqual(expiry_index.export_tags(("online",)), ["online"])
+        self.assertEqual(expiry_index.export_tags(("online",), 2), ["online", "online:0", "online:1"])
+
+    def test_due_entries_read_only_due_buckets(self):
+        redis_client = MagicMock()
+        redis_client.pipeline.return_value.execute.return_value = [0, 2, 0]
+        redis_client.zrange.return_value = [b"{online}-a", b"{online}-b"]
+
+        pages = list(expiry_index.iter_due_entries(redis_client, ["online"], now=7200, window=3600, lookback=3600))
+
+        # 지난 버킷 1 ~ 구간 끝 버킷 3 만 확인하고 항목이 있는 버킷만 ZRANGE
+        self.assertEqual([call[0][0] for call in redis_client.pipeline.return_value.zcount.call_args_list],
+                         ["expiring:{online}:1", "expiring:{online}:2", "expiring:{online}:3"])
+        redis_client.zrange.assert_called_once_with("expiring:{online}:2", 0, 1)
+        self.assertEqual(pages, [[("expiring:{online}:2", "{online}-a"), ("expiring:{online}:2", "{online}-b")]])
+
+
+if __name__ == '__main__':
+    unittest.main()
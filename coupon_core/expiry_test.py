@@ -0,0 +1,45 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pytz
+
+from coupon_core import expiry
+
+
+class TestExpiry(unittest.TestCase):
+
+    def setUp(self):
+        expiry._zones.clear()
+        expiry._day_ends.clear()
+
+    def test_unknown_timezone_is_resolved_once(self):
+        with patch('coupon_core.expiry.pytz.timezone', wraps=pytz.timezone) as mock_timezone:
+            for _ in range(3):
+                self.assertEqual(expiry.resolve_timezone("Mars/Base").zone, expiry.DEFAULT_TIMEZONE)
+        # 잘못된 이름 1회 + 기본 타임존 1회
+        self.assertEqual(mock_timezone.call_count, 2)
+
+    def test_expiry_is_end_of_local_day(self):
+        seoul = pytz.timezone("Asia/Seoul")
+        now = seoul.localize(datetime(2025, 2, 24, 10, 0, 0)).timestamp()
+        expected = int(seoul.localize(datetime(2025, 2, 24, 23, 59, 59)).timestamp())
+        self.assertEqual(expiry.expiry_timestamp_for_today("Asia/Seoul", now), expected)
+
+    def test_expiry_recomputed_after_day_rollover(self):
+        seoul = pytz.timezone("Asia/Seoul")
+        today = expiry.expiry_timestamp_for_today(None, seoul.localize(datetime(2025, 2, 24, 23, 0)).timestamp())
+        tomorrow = expiry.expiry_timestamp_for_today(None, seoul.localize(datetime(2025, 2, 25, 0, 0)).timestamp())
+        self.assertEqual(tomorrow - today, 24 * 60 * 60)
+
+    def test_issue_times_matches_single_calls(self):
+        now = 1740358800
+        times = expiry.issue_times(["Asia/Seoul", "America/New_York", "Asia/Seoul", "bad"], now)
+        self.assertEqual(times[0], times[2])
+        self.assertEqual(times[0], times[3])
+        self.assertEqual(times[1], (expiry.current_timestamp("America/New_York", now),
+                                    expiry.expiry_timestamp_for_today("America/New_York", now)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,249 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from coupon_core import codec, coupon_ids, expiry_index, metrics
+
+# SCAN 한 번에 노드가 훑을 키 개수 힌트
+SCAN_COUNT = 1000
+# MGET 한 번에 묶을 최대 키 개수 (같은 슬롯의 키만 묶는다)
+MGET_CHUNK = 100
+
+# 만료 내보내기 대상 쿠폰 키 접두사 (legacy ID / Lua 스크립트 경로의 해시 태그 ID)
+COUPON_KEY_PREFIXES = (
+    "coupon:offline-",
+    "coupon:online-",
+    "coupon:{offline}-",
+    "coupon:{online}-",
+    "coupon:{offline:",  # 샤드 재고 경로 (예: coupon:{offline:3}-<uuid>)
+    "coupon:{online:",
+    "coupon:{offline.",  # 캠페인 재고 (예: coupon:{online.summer26}-<uuid>)
+    "coupon:{online.",
+)
+# 파티션(마스터 노드)별 SCAN 체크포인트 HASH (field = 파티션 이름, value = {"cursor", "last_key", "done"} JSON)
+CHECKPOINT_KEY = "coupon_export_checkpoint"
+# 중단된 내보내기를 이어받을 수 있는 시간(초). 지나면 다음 실행은 처음부터 읽는다
+CHECKPOINT_TTL = 6 * 60 * 60
+
+# member 레이아웃 쿠폰 키 (예: coupon:{12345}:online-<uuid>, 마이그레이션된 coupon:{12345}:{online}-<uuid>)
+MEMBER_COUPON_KEY_PATTERN = re.compile(r"^coupon:\{[^}]*\}:\{?(offline|online)")
+
+
+def iter_master_keys(redis_client, match, count=SCAN_COUNT):
+    """
+    마스터 노드마다 SCAN MATCH/COUNT 커서를 돌며 키를 페이지 단위로 yield.
+    KEYS 와 달리 샤드를 막지 않고, 한 페이지 분량만 메모리에 둔다.
+    """
+    for node in list(redis_client.connection_pool.nodes.all_masters()):
+        cursor = 0
+        while True:
+            cursor, keys = scan_node(redis_client, node, cursor, match, count)
+            if keys:
+                yield keys
+            if cursor == 0:
+                break
+
+
+def scan_node(redis_client, node, cursor, match, count=SCAN_COUNT):
+    """특정 노드에 SCAN 한 번 (다음 커서, 키 목록)"""
+    pool = redis_client.connection_pool
+    connection = pool.get_connection_by_node(node)
+    try:
+        with metrics.timer("redis_scan"):
+            connection.send_command("SCAN", cursor, "MATCH", match, "COUNT", count)
+            next_cursor, keys = connection.read_response()
+    except Exception:
+        connection.disconnect()
+        raise
+    finally:
+        pool.release(connection)
+    return int(next_cursor), keys
+
+
+def fetch_values(redis_client, keys, chunk_size=MGET_CHUNK):
+    """
+    키를 슬롯별로 묶어 MGET 을 파이프라인으로 전송.
+    한 SCAN 페이지의 키는 같은 노드에 있으므로 보통 왕복 한 번으로 끝난다.
+    (키, 값) 목록을 반환.
+    """
+    keyslot = redis_client.connection_pool.nodes.keyslot
+    by_slot = {}
+    for key in keys:
+        by_slot.setdefault(keyslot(key), []).append(key)
+
+    chunks = []
+    pipe = redis_client.pipeline()
+    for slot_keys in by_slot.values():
+        for start in range(0, len(slot_keys), chunk_size):
+            chunk = slot_keys[start:start + chunk_size]
+            chunks.append(chunk)
+            pipe.execute_command("MGET", *chunk)
+
+    with metrics.timer("redis_mget"):
+        results = pipe.execute()
+    pairs = []
+    for chunk, values in zip(chunks, results):
+        pairs.extend(zip(chunk, values))
+    return pairs
+
+
+def build_payload(coupon_key, coupon_data):
+    """Redis 에 저장된 쿠폰 정보 (codec packed / JSON) 를 SQS 페이로드 형식으로 변환"""
+    coupon_info = codec.decode(coupon_data)
+    coupon_id = coupon_key.replace('coupon:', '', 1)  # 'coupon:' 접두사 제거
+    # 채널은 ID 에서, issued_at 이 없는 쿠폰은 ULID 의 발급 시각으로 채운다
+    parsed = coupon_ids.parse_coupon_id(coupon_id) or {}
+    issued_at = coupon_info.get('issued_at')
+    if not issued_at and parsed.get('issued_at') is not None:
+        issued_at = datetime.fromtimestamp(parsed['issued_at'], timezone.utc).isoformat()
+    return {
+        'coupon_id': coupon_id,
+        'member_id': coupon_info.get('member_id', ''),
+        'timezone': coupon_info.get('timezone', ''),
+        'used': coupon_info.get('used', ''),
+        'issued_at': issued_at or '',
+        'channel': parsed.get('channel', ''),
+        'campaign_id': parsed.get('campaign_id') or '',
+    }
+
+
+def iter_coupon_payloads(redis_client, prefixes=COUPON_KEY_PREFIXES, count=SCAN_COUNT, chunk_size=MGET_CHUNK):
+    """
+    만료 내보내기용 쿠폰 페이로드를 하나씩 yield (메모리 사용량은 SCAN 한 페이지로 고정).
+    모든 접두사를 SCAN 한 번으로 훑도록 MATCH 는 'coupon:*' 로 두고 접두사는 클라이언트에서 거른다.
+    """
+    for keys in iter_master_keys(redis_client, "coupon:*", count):
+        yield from iter_page_payloads(redis_client, keys, prefixes, chunk_size)
+
+
+def iter_page_payloads(redis_client, keys, prefixes=COUPON_KEY_PREFIXES, chunk_size=MGET_CHUNK):
+    """SCAN 한 페이지의 키 중 쿠폰 키만 MGET 으로 읽어 페이로드를 yield"""
+    keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+    keys = [key for key in keys if key.startswith(prefixes) or MEMBER_COUPON_KEY_PATTERN.match(key)]
+    if not keys:
+        return
+
+    for coupon_key, coupon_data in fetch_values(redis_client, keys, chunk_size):
+        if not coupon_data:
+            # SCAN 과 MGET 사이에 만료된 키
+            print(f"Coupon data not found for {coupon_key}")
+            continue
+        try:
+            yield build_payload(coupon_key, coupon_data)
+        except ValueError as e:  # JSON / packed 디코딩 오류
+            print(f"Decode error for {coupon_key}: {e}")
+
+
+def partition_name(node):
+    """파티션 = 마스터 노드 (host:port)"""
+    return node.get("name") or f"{node['host']}:{node['port']}"
+
+
+def load_checkpoints(redis_client):
+    """{파티션 이름: {"cursor", "last_key", "done"}}"""
+    return {
+        _text(partition): json.loads(value)
+        for partition, value in (redis_client.hgetall(CHECKPOINT_KEY) or {}).items()
+    }
+
+
+def save_checkpoint(redis_client, partition, cursor, last_key=None, done=False):
+    """파티션의 다음 SCAN 커서와 마지막으로 보낸 쿠폰 ID 를 저장 (CHECKPOINT_TTL 동안 이어받을 수 있음)"""
+    pipe = redis_client.pipeline()
+    pipe.hset(CHECKPOINT_KEY, partition, json.dumps({"cursor": cursor, "last_key": last_key, "done": done}))
+    pipe.expire(CHECKPOINT_KEY, CHECKPOINT_TTL)
+    pipe.execute()
+
+
+def pending_partitions(redis_client):
+    """
+    아직 끝나지 않은 (파티션 이름, 노드, 시작 커서) 목록.
+    체크포인트가 없거나 페일오버로 노드 이름이 바뀐 파티션은 커서 0 부터 다시 읽는다.
+    """
+    checkpoints = load_checkpoints(redis_client)
+    partitions = []
+    for node in redis_client.connection_pool.nodes.all_masters():
+        name = partition_name(node)
+        checkpoint = checkpoints.get(name, {})
+        if not checkpoint.get("done"):
+            partitions.append((name, node, int(checkpoint.get("cursor", 0))))
+    return partitions
+
+
+def export_partition(redis_client, partition, node, cursor, sender, should_stop=None,
+                     count=SCAN_COUNT, chunk_size=MGET_CHUNK):
+    """
+    한 파티션을 cursor 부터 SCAN 해 sender 로 보내고, 페이지를 다 보낸 뒤마다 다음 커서를 체크포인트에 저장.
+    should_stop() 이 참이면 다음 페이지를 읽기 전에 멈춘다. 파티션을 끝까지 읽었으면 True.
+    (저장 전에 중단되면 그 페이지는 다시 보내지만 SQS 중복 제거 ID 와 INSERT IGNORE 로 한 번만 저장된다)
+    """
+    last_key = None
+    while True:
+        if should_stop is not None and should_stop():
+            return False
+        cursor, keys = scan_node(redis_client, node, cursor, "coupon:*", count)
+        for payload in iter_page_payloads(redis_client, keys, chunk_size=chunk_size):
+            sender.add(payload)
+            last_key = payload['coupon_id']
+        sender.flush()
+        save_checkpoint(redis_client, partition, cursor, last_key, done=cursor == 0)
+        if cursor == 0:
+            return True
+
+
+def export_partitions(redis_client, make_sender, workers=1, should_stop=None, partitions=None):
+    """
+    체크포인트에서 이어 파티션별로 내보내기. workers 개 파티션을 스레드 풀에서 동시에 처리하고
+    파티션마다 make_sender() 로 만든 BatchSender 로 보낸다. partitions 를 주지 않으면 끝나지 않은 모든 파티션.
+    (보낸 수, 실패 수, 이번에 끝내지 못한 파티션 이름 목록) 을 반환하고, 모든 파티션이 끝났으면 체크포인트를 지운다.
+    """
+    if partitions is None:
+        partitions = pending_partitions(redis_client)
+    if not partitions:
+        return 0, 0, []
+
+    def run(partition):
+        name, node, cursor = partition
+        with make_sender() as sender:
+            finished = export_partition(redis_client, name, node, cursor, sender, should_stop)
+        return name, finished, sender.sent, len(sender.failed)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(partitions)))) as executor:
+        results = list(executor.map(run, partitions))
+
+    # 다른 호출이 맡은 파티션까지 모두 끝났으면 다음 실행은 처음부터
+    if not pending_partitions(redis_client):
+        redis_client.delete(CHECKPOINT_KEY)
+    remaining = [name for name, finished, _, _ in results if not finished]
+    return sum(result[2] for result in results), sum(result[3] for result in results), remaining
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def iter_due_coupon_payloads(redis_client, tags, now=None, window=expiry_index.EXPORT_WINDOW,
+                             lookback=expiry_index.EXPORT_LOOKBACK, chunk_size=MGET_CHUNK, with_expiry=False):
+    """
+    만료 순서 인덱스에서 곧 만료될 쿠폰만 읽어 (인덱스 키, 페이로드) 를 yield (with_expiry 면 만료 시각도 함께).
+    전체 키 공간을 SCAN 하지 않으므로 비용은 이번 구간에 만료되는 쿠폰 수에 비례한다.
+    쿠폰 정보가 이미 없는 항목은 다 읽은 뒤 인덱스에서 지우고, 나머지는 호출 측이 전송 후 mark_exported 로 지운다.
+    """
+    stale = []
+    for entries in expiry_index.iter_due_entries(redis_client, tags, now, window, lookback, withscores=with_expiry):
+        record_keys = {f"coupon:{entry[1]}": entry for entry in entries}
+        for coupon_key, coupon_data in fetch_values(redis_client, list(record_keys), chunk_size):
+            entry = record_keys[coupon_key]
+            if not coupon_data:
+                stale.append(entry[:2])
+                continue
+            try:
+                yield (entry[0], build_payload(coupon_key, coupon_data), *entry[2:])
+            except ValueError as e:  # JSON / packed 디코딩 오류
+                print(f"Decode error for {coupon_key}: {e}")
+
+    # 순위 구간으로 읽는 중에 지우면 뒤 페이지가 밀리므로 다 읽은 뒤에 지운다
+    if stale:
+        print(f"{len(stale)} indexed coupons already expired")
+        expiry_index.mark_exported(redis_client, stale)
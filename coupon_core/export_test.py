@@ -0,0 +1,98 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from rediscluster.nodemanager import NodeManager
+
+from coupon_core import export
+
+
+def make_redis_client(masters):
+    redis_client = MagicMock()
+    redis_client.connection_pool.nodes.all_masters.return_value = masters
+    redis_client.connection_pool.nodes.keyslot = NodeManager(startup_nodes=[{"host": "localhost", "port": 6379}]).keyslot
+    return redis_client
+
+
+class TestIterCouponPayloads(unittest.TestCase):
+
+    @patch('coupon_core.export.scan_node')
+    def test_streams_payloads_per_node_with_slot_grouped_mget(self, mock_scan_node):
+        node_a, node_b = {"name": "a"}, {"name": "b"}
+        # 노드 a 는 두 페이지, 노드 b 는 한 페이지
+        mock_scan_node.side_effect = [
+            (7, [b"coupon:{online}-1", b"coupon:{online}-2", b"other:key"]),
+            (0, [b"coupon:offline-3"]),
+            (0, [b"coupon:{online}-4"]),
+        ]
+        redis_client = make_redis_client([node_a, node_b])
+        pipe = redis_client.pipeline.return_value
+        coupon = json.dumps({"member_id": "user1", "used": False, "issued_at": "t", "timezone": "UTC"})
+        pipe.execute.side_effect = [[[coupon, None]], [[coupon]], [["not json"]]]
+
+        payloads = export.iter_coupon_payloads(redis_client)
+        first = next(payloads)
+
+        # 제너레이터이므로 첫 페이지만 읽은 상태
+        self.assertEqual(mock_scan_node.call_count, 1)
+        self.assertEqual(first["coupon_id"], "{online}-1")
+        self.assertEqual(first["member_id"], "user1")
+
+        rest = list(payloads)
+        self.assertEqual([payload["coupon_id"] for payload in rest], ["offline-3"])
+        # 같은 슬롯 키는 MGET 한 번으로 묶임
+        pipe.execute_command.assert_any_call("MGET", "coupon:{online}-1", "coupon:{online}-2")
+        self.assertEqual(mock_scan_node.call_args_list[1][0][2], 7)
+
+
+class TestExportPartitions(unittest.TestCase):
+
+    def make_sender(self):
+        sender = MagicMock(sent=0, failed=[])
+        sender.__enter__.return_value = sender
+        return sender
+
+    @patch('coupon_core.export.scan_node')
+    def test_resumes_from_checkpoint_and_clears_when_done(self, mock_scan_node):
+        node_a, node_b = {"name": "a:6379"}, {"name": "b:6379"}
+        redis_client = make_redis_client([node_a, node_b])
+        # a 는 이전 실행에서 끝났고 b 는 커서 7 에서 중단됨
+        redis_client.hgetall.side_effect = [
+            {b"a:6379": json.dumps({"cursor": 0, "last_key": "x", "done": True}),
+             b"b:6379": json.dumps({"cursor": 7, "last_key": "y", "done": False})},
+            {b"a:6379": json.dumps({"cursor": 0, "last_key": "x", "done": True}),
+             b"b:6379": json.dumps({"cursor": 0, "last_key": "{online}-4", "done": True})},
+        ]
+        mock_scan_node.return_value = (0, [b"coupon:{online}-4"])
+        pipe = redis_client.pipeline.return_value
+        coupon = json.dumps({"member_id": "user1", "used": False, "issued_at": "t", "timezone": "UTC"})
+        pipe.execute.side_effect = [[[coupon]], [1, 1]]
+        sender = self.make_sender()
+
+        sent, failed, remaining = export.export_partitions(redis_client, lambda: sender, workers=2)
+
+        mock_scan_node.assert_called_once_with(redis_client, node_b, 7, "coupon:*", export.SCAN_COUNT)
+        self.assertEqual(sender.add.call_args[0][0]["coupon_id"], "{online}-4")
+        pipe.hset.assert_called_once_with(export.CHECKPOINT_KEY, "b:6379", json.dumps(
+            {"cursor": 0, "last_key": "{online}-4", "done": True}))
+        redis_client.delete.assert_called_once_with(export.CHECKPOINT_KEY)
+        self.assertEqual(remaining, [])
+
+    @patch('coupon_core.export.scan_node')
+    def test_stops_before_deadline_and_keeps_checkpoint(self, mock_scan_node):
+        redis_client = make_redis_client([{"name": "a:6379"}])
+        redis_client.hgetall.return_value = {}
+        mock_scan_node.return_value = (12, [b"other:key"])
+        stops = iter([False, True])
+
+        _, _, remaining = export.export_partitions(redis_client, self.make_sender, should_stop=lambda: next(stops))
+
+        self.assertEqual(mock_scan_node.call_count, 1)
+        redis_client.pipeline.return_value.hset.assert_called_once_with(
+            export.CHECKPOINT_KEY, "a:6379", json.dumps({"cursor": 12, "last_key": None, "done": False}))
+        redis_client.delete.assert_not_called()
+        self.assertEqual(remaining, ["a:6379"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import zlib
+
+from coupon_core import export, metrics
+
+# SQS 재전송 멱등 원장
+# 처리를 끝낸 메시지의 결과(응답)를 idempotency:{<consumer>:<shard>}:<id> 키에 TTL 과 함께 저장하고,
+# 같은 id 가 다시 오면 재고 / DB 를 건드리지 않고 저장된 결과를 그대로 돌려준다.
+# id 는 SQS messageId (발급 Lambda) 또는 업무 키 coupon_id (coupon_expired_db, 내보내기가 같은 쿠폰을 다시 보낼 수 있음).
+LEDGER_ENABLED = os.environ.get("COUPON_IDEMPOTENCY_LEDGER", "false").lower() == "true"
+# 결과 보관 시간(초). SQS 재전송 / 가시성 제한 시간 초과로 다시 받을 수 있는 기간보다 길게
+LEDGER_TTL = int(os.environ.get("COUPON_IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+# consumer 마다 키를 나누는 해시 태그 수 (한 슬롯 / 한 노드에 몰리지 않게)
+LEDGER_SHARDS = int(os.environ.get("COUPON_IDEMPOTENCY_SHARDS", "16"))
+
+
+class Ledger:
+    """
+    consumer 별 처리 결과 원장.
+    lookup 은 배치의 id 를 샤드(슬롯)별 MGET 으로 묶어 파이프라인 한 번으로, record 는 SET EX 파이프라인 한 번으로 보낸다.
+    Redis 오류는 로그만 남기고 원장이 없는 것처럼 처리한다 (중복 발급 / INSERT IGNORE 가 마지막 방어선).
+    처리 중인 메시지를 먼저 점유하지는 않으므로 동시에 도는 두 번의 전달은 둘 다 원장에 없을 수 있다.
+    """
+
+    def __init__(self, consumer, shards=LEDGER_SHARDS, ttl=LEDGER_TTL, enabled=LEDGER_ENABLED):
+        self.consumer = consumer
+        self.shards = shards
+        self.ttl = ttl
+        self.enabled = enabled
+
+    def key(self, entry_id):
+        shard = zlib.crc32(str(entry_id).encode()) % self.shards
+        return f"idempotency:{{{self.consumer}:{shard}}}:{entry_id}"
+
+    def lookup(self, redis_client, entry_ids):
+        """이미 처리한 id 의 저장된 결과 {id: 결과}"""
+        if not self.enabled or not entry_ids:
+            return {}
+        ids_by_key = {self.key(entry_id): entry_id for entry_id in entry_ids if entry_id is not None}
+        if not ids_by_key:
+            return {}
+        try:
+            with metrics.timer("ledger_lookup"):
+                pairs = export.fetch_values(redis_client, list(ids_by_key))
+        except Exception as e:
+            print(f"Idempotency ledger lookup failed, processing all messages: {e}")
+            return {}
+        found = {ids_by_key[key]: json.loads(value) for key, value in pairs if value is not None}
+        metrics.increment("ledger_replays", len(found))
+        return found
+
+    def record(self, redis_client, results):
+        """(id, 결과) 목록을 원장에 저장. 결과는 JSON 으로 직렬화할 수 있어야 한다"""
+        results = [(entry_id, result) for entry_id, result in results if entry_id is not None]
+        if not self.enabled or not results:
+            return
+        pipe = redis_client.pipeline()
+        for entry_id, result in results:
+            pipe.execute_command("SET", self.key(entry_id), json.dumps(result), "EX", self.ttl)
+        try:
+            with metrics.timer("ledger_record"):
+                pipe.execute()
+        except Exception as e:
+            print(f"Idempotency ledger record failed for {len(results)} messages: {e}")
+
+
+def message_ids(records):
+    """SQS 레코드의 messageId 목록 (없으면 None, 원장에서 건너뜀)"""
+    return [record.get('messageId') for record in records]
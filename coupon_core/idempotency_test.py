@@ -0,0 +1,53 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from coupon_core import idempotency
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = idempotency.Ledger("coupon_issue_online", shards=4, ttl=60, enabled=True)
+        self.redis_client = MagicMock()
+        self.redis_client.connection_pool.nodes.keyslot.side_effect = lambda key: key.split("}")[0]
+        self.pipe = self.redis_client.pipeline.return_value
+
+    def test_keys_sharded_by_hash_tag(self):
+        keys = {self.ledger.key(f"message-{index}") for index in range(50)}
+        tags = {key.split("}")[0] for key in keys}
+
+        self.assertEqual(len(keys), 50)
+        self.assertEqual(tags, {f"idempotency:{{coupon_issue_online:{shard}" for shard in range(4)})
+
+    def test_lookup_returns_stored_results_in_one_pipeline(self):
+        response = {"statusCode": 200, "body": "online coupon granted successfully. Coupon ID: {online}-1"}
+
+        def execute():
+            commands = [call[0] for call in self.pipe.execute_command.call_args_list]
+            return [[json.dumps(response) if key.endswith(":message-1") else None for key in command[1:]]
+                    for command in commands]
+
+        self.pipe.execute.side_effect = execute
+
+        found = self.ledger.lookup(self.redis_client, ["message-1", "message-2", None])
+
+        self.assertEqual(found, {"message-1": response})
+        self.pipe.execute.assert_called_once()
+
+    def test_redis_errors_fail_open(self):
+        self.pipe.execute.side_effect = ConnectionError("cluster down")
+
+        self.assertEqual(self.ledger.lookup(self.redis_client, ["message-1"]), {})
+        self.ledger.record(self.redis_client, [("message-1", {"statusCode": 200})])
+
+    def test_disabled_ledger_skips_redis(self):
+        ledger = idempotency.Ledger("coupon_issue_online", enabled=False)
+
+        self.assertEqual(ledger.lookup(self.redis_client, ["message-1"]), {})
+        ledger.record(self.redis_client, [("message-1", {"statusCode": 200})])
+        self.redis_client.pipeline.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+import random
+import threading
+import time
+import zlib
+
+from coupon_core import codec, dedup, expiry_index, issuance, metrics, negative_cache
+
+# 발급 시 처음 시도할 재고 샤드 선택 방식
+SHARD_STRATEGY_MEMBER = "member"  # 회원 해시 샤드 (중복 체크 샤드와 같아 보통 스크립트 1회로 끝남)
+SHARD_STRATEGY_RANDOM = "random"  # 임의 샤드
+
+# 홈 샤드에 재고가 없어 다른 샤드에서 가져와야 하는 경우 (중복 체크 인덱스에는 이미 등록된 상태)
+NEEDS_FALLBACK = -2
+
+# 재고가 없다고 확인된 샤드는 이 시간(초) 동안 건너뛴다
+DRY_SHARD_TTL = 1.0
+
+# 홈 샤드 발급 스크립트
+# KEYS[1] 재고, KEYS[2] 중복 체크 인덱스, KEYS[3] 쿠폰 정보, KEYS[4] 회원별 쿠폰 HASH, KEYS[5] 만료 순서 인덱스
+# ARGV[1] member_id, ARGV[2] coupon_id, ARGV[3] 쿠폰 JSON, ARGV[4] 만료 시각, ARGV[5] 홈 샤드 재고 사용 여부
+# 이후 ARGV 는 중복 체크 인덱스가 덧붙이는 인자 (issuance.ISSUE_SCRIPT_TEMPLATE 참고)
+SHARD_ISSUE_SCRIPT_TEMPLATE = """
+if {check} then
+    return 0
+end
+if ARGV[5] == '1' then
+    local remaining = tonumber(redis.call('GET', KEYS[1]) or '0')
+    if remaining and remaining > 0 then
+        redis.call('DECRBY', KEYS[1], 1)
+        {claim}
+        redis.call('SET', KEYS[3], ARGV[3])
+        redis.call('EXPIREAT', KEYS[3], ARGV[4])
+        redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+        redis.call('ZADD', KEYS[5], ARGV[4], ARGV[2])
+        redis.call('EXPIREAT', KEYS[5], tonumber(ARGV[4]) + {retention})
+        return 1
+    end
+end
+{claim}
+return -2
+"""
+
+SHARD_ISSUE_SCRIPT = issuance.script_source(SHARD_ISSUE_SCRIPT_TEMPLATE, dedup.get_dedup_index(dedup.DEDUP_SET))
+
+# 다른 샤드에서 재고를 최대 ARGV[1] 개 가져옴 (가져간 개수 반환)
+TAKE_STOCK_SCRIPT = """
+local remaining = tonumber(redis.call('GET', KEYS[1]) or '0')
+if not remaining or remaining <= 0 then
+    return 0
+end
+local taken = math.min(remaining, tonumber(ARGV[1]))
+redis.call('DECRBY', KEYS[1], taken)
+return taken
+"""
+
+# 다른 샤드에서 가져온 재고로 홈 샤드에 쿠폰을 기록
+# KEYS[1] 쿠폰 정보, KEYS[2] 회원별 쿠폰 HASH, KEYS[3] 만료 순서 인덱스
+# ARGV[1] member_id, ARGV[2] coupon_id, ARGV[3] 쿠폰 JSON, ARGV[4] 만료 시각
+BIND_COUPON_SCRIPT = f"""
+redis.call('SET', KEYS[1], ARGV[3])
+redis.call('EXPIREAT', KEYS[1], ARGV[4])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[2])
+redis.call('EXPIREAT', KEYS[3], tonumber(ARGV[4]) + {expiry_index.INDEX_RETENTION})
+return 1
+"""
+
+# 비동기 엔진 / 스레드 워커가 함께 쓰므로 읽고 쓸 때 _dry_lock 을 잡는다
+_dry_shards = {}  # (coupon_key, shard) -> 재고 없음 확인 시각
+_dry_lock = threading.Lock()
+
+
+def check_issue_mode(issue_mode, shards):
+    """legacy 단건 경로는 단일 재고 키만 읽으므로 샤드 재고 (coupon_init 이 단일 키를 0 으로 둠) 에서는 거절"""
+    if issue_mode == issuance.ISSUE_MODE_LEGACY and shards > 1:
+        raise ValueError("sharded stock (shards>1) requires the script issue mode or batch mode")
+
+
+def shard_tag(coupon_key, shard):
+    """샤드 해시 태그 (예: online:3)"""
+    return f"{coupon_key}:{shard}"
+
+
+def stock_key(coupon_key, shard):
+    return f"stock:{{{shard_tag(coupon_key, shard)}}}"
+
+
+def member_shard(member_id, shards):
+    """회원이 항상 같은 샤드로 가도록 하는 해시 (중복 체크 / 쿠폰 기록 위치)"""
+    return zlib.crc32(str(member_id).encode()) % shards
+
+
+def split_quantity(quantity, shards):
+    """전체 수량을 샤드에 고르게 나눔 (나머지는 앞 샤드부터 1개씩)"""
+    base, extra = divmod(quantity, shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def initialize_stock(redis_client, coupon_key, quantity, shards):
+    """재고를 샤드 카운터에 나눠 설정 (파이프라인 한 번)"""
+    pipe = redis_client.pipeline()
+    for shard, shard_quantity in enumerate(split_quantity(quantity, shards)):
+        pipe.set(stock_key(coupon_key, shard), shard_quantity)
+    pipe.execute()
+    _clear_dry(coupon_key, shards)
+
+
+def shard_stock(redis_client, coupon_key, shards):
+    """샤드별 남은 재고 목록"""
+    pipe = redis_client.pipeline()
+    for shard in range(shards):
+        pipe.get(stock_key(coupon_key, shard))
+    return [int(value or 0) for value in pipe.execute()]
+
+
+def remaining_stock(redis_client, coupon_key, shards):
+    """전체 남은 재고 (샤드 합계)"""
+    return sum(shard_stock(redis_client, coupon_key, shards))
+
+
+def rebalance_stock(redis_client, coupon_key, shards):
+    """
+    샤드 간 재고를 고르게 재분배.
+    평균보다 많은 샤드에서 초과분만 원자적으로 가져와 부족한 샤드에 더하므로
+    발급 중에도 재고가 사라지거나 늘어나지 않는다. 재분배 후 샤드별 재고를 반환.
+    """
+    current = shard_stock(redis_client, coupon_key, shards)
+    targets = split_quantity(sum(current), shards)
+
+    take = issuance.get_script(redis_client, TAKE_STOCK_SCRIPT)
+    taken = 0
+    for shard, (amount, target) in enumerate(zip(current, targets)):
+        if amount > target:
+            taken += int(take(keys=[stock_key(coupon_key, shard)], args=[amount - target], client=redis_client))
+
+    pipe = redis_client.pipeline()
+    for shard, (amount, target) in enumerate(zip(current, targets)):
+        if amount < target and taken > 0:
+            give = min(target - amount, taken)
+            pipe.incrby(stock_key(coupon_key, shard), give)
+            taken -= give
+    if taken > 0:
+        # 가져오는 사이 발급으로 줄어든 만큼 남은 수량은 첫 샤드에 돌려놓는다
+        pipe.incrby(stock_key(coupon_key, 0), taken)
+    pipe.execute()
+
+    # 재고가 생긴 샤드가 소진 캐시에 가려지지 않게 한다
+    _clear_dry(coupon_key, shards)
+    negative_cache.bump_version(redis_client)
+    return shard_stock(redis_client, coupon_key, shards)
+
+
+def first_stock_shard(member_id, shards, strategy, index=None):
+    if strategy == SHARD_STRATEGY_RANDOM:
+        return random.randrange(shards)
+    if index is not None:
+        return index.home_shard(member_id, shards)
+    return member_shard(member_id, shards)
+
+
+def issue_coupon_sharded(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                         shards, strategy=SHARD_STRATEGY_MEMBER, dedup_backend=dedup.DEDUP_SET):
+    """
+    샤드된 재고에서 쿠폰 발급. 중복 체크 / 쿠폰 기록은 회원 해시 샤드(홈 샤드)에 두고,
+    홈 샤드 재고가 있으면 스크립트 1회, 없으면 다른 샤드에서 재고를 가져와 기록한다.
+    스크립트 밖에서 등록하는 인덱스 (bitmap) 는 먼저 등록한다. (결과 코드, coupon_id) 반환.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    command = _home_command(coupon_key, member_id, coupon_data, expiry_timestamp, shards, strategy, index)
+    home, _, _, keys, args = command
+    claim = [(shard_tag(coupon_key, home), member_id)]
+    if not dedup.claim_outside(redis_client, index, claim)[0]:
+        return issuance.ALREADY_RECEIVED, None
+    try:
+        with metrics.timer("issue_script"):
+            result = _shard_issue_script(redis_client, index)(keys=keys, args=args, client=redis_client)
+    except Exception:
+        dedup.release_outside(redis_client, index, claim)
+        raise
+    return _finish_issue(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                         shards, strategy, index, command, result)
+
+
+def issue_coupons_sharded_batch(redis_client, coupon_key, requests, shards, strategy=SHARD_STRATEGY_MEMBER,
+                                dedup_backend=dedup.DEDUP_SET):
+    """
+    여러 요청의 홈 샤드 스크립트를 파이프라인 한 번으로 보내고 (노드별 왕복 1회),
+    홈 샤드 재고가 없던 요청만 개별로 다른 샤드에서 재고를 가져온다.
+    requests 는 (member_id, coupon_data, expiry_timestamp) 목록, 결과는 (결과 코드, coupon_id) 또는 예외.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    script = _shard_issue_script(redis_client, index)
+    issued = [None] * len(requests)
+    commands = {}
+    for position, (member_id, coupon_data, expiry_timestamp) in enumerate(requests):
+        try:
+            commands[position] = _home_command(coupon_key, member_id, coupon_data, expiry_timestamp,
+                                               shards, strategy, index)
+        except ValueError as e:
+            # 인덱스가 받을 수 없는 member_id (예: bitmap 에 숫자가 아닌 ID) 는 해당 요청만 실패
+            issued[position] = e
+
+    claimed = dedup.claim_outside(redis_client, index, [(shard_tag(coupon_key, command[0]), requests[position][0])
+                                                        for position, command in commands.items()])
+    for position, first in zip(list(commands), claimed):
+        if not first:
+            issued[position] = (issuance.ALREADY_RECEIVED, None)
+            del commands[position]
+
+    pipeline_commands = [(keys, args) for _, _, _, keys, args in commands.values()]
+    with metrics.timer("issue_script"):
+        results = issuance.evalsha_pipeline(redis_client, script, pipeline_commands) if pipeline_commands else []
+
+    for (position, command), result in zip(commands.items(), results):
+        if isinstance(result, Exception):
+            issued[position] = result
+            dedup.release_outside(redis_client, index, [(shard_tag(coupon_key, command[0]), requests[position][0])])
+            continue
+        member_id, coupon_data, expiry_timestamp = requests[position]
+        try:
+            issued[position] = _finish_issue(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                                             shards, strategy, index, command, result)
+        except Exception as e:
+            issued[position] = e
+    return issued
+
+
+def _shard_issue_script(redis_client, index):
+    return issuance.get_script(redis_client, issuance.script_source(SHARD_ISSUE_SCRIPT_TEMPLATE, index))
+
+
+def _home_command(coupon_key, member_id, coupon_data, expiry_timestamp, shards, strategy, index=None):
+    """홈 샤드 스크립트 호출 정보 (home, coupon_id, 홈 재고 사용 여부, KEYS, ARGV)"""
+    index = index or dedup.get_dedup_index(dedup.DEDUP_SET)
+    home = index.home_shard(member_id, shards)
+    coupon_id = issuance.new_coupon_id(shard_tag(coupon_key, home))
+    use_home_stock = first_stock_shard(member_id, shards, strategy, index) == home and not _is_dry(coupon_key, home)
+    tag = shard_tag(coupon_key, home)
+    keys = [
+        stock_key(coupon_key, home),
+        index.script_key(tag, member_id, stock_key(coupon_key, home)),
+        issuance.coupon_record_key(coupon_id),
+        issuance.member_coupons_key(tag),
+        expiry_index.index_key(tag, expiry_timestamp),
+    ]
+    args = [member_id, coupon_id, codec.encode(coupon_data), expiry_timestamp, 1 if use_home_stock else 0,
+            *index.script_args(member_id)]
+    return home, coupon_id, use_home_stock, keys, args
+
+
+def _finish_issue(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, shards, strategy, index,
+                  command, result):
+    home, coupon_id, use_home_stock, _, _ = command
+    result = int(result)
+    if result == issuance.ISSUED:
+        return result, coupon_id
+    if result == issuance.ALREADY_RECEIVED:
+        return result, None
+
+    # NEEDS_FALLBACK: 중복 체크 등록은 끝났고 재고만 다른 샤드에서 가져오면 된다
+    if use_home_stock:
+        _mark_dry(coupon_key, home)
+    metrics.increment("stock_fallbacks")
+    try:
+        with metrics.timer("stock_fallback"):
+            return _issue_from_other_shards(redis_client, coupon_key, member_id, coupon_id, coupon_data,
+                                            expiry_timestamp, shards, strategy, index, home,
+                                            home if use_home_stock else None)
+    except Exception:
+        # 발급하지 못했으면 중복 체크 등록을 되돌려 재시도할 수 있게 한다
+        index.release(redis_client, shard_tag(coupon_key, home), member_id)
+        raise
+
+
+def _issue_from_other_shards(redis_client, coupon_key, member_id, coupon_id, coupon_data, expiry_timestamp,
+                             shards, strategy, index, home, tried_shard):
+    """
+    홈 샤드 스크립트에서 재고를 얻지 못한 경우 나머지 샤드에서 재고 1개를 가져와 홈 샤드에 기록.
+    모든 샤드가 소진이면 홈 샤드의 중복 체크 등록을 되돌린다.
+    """
+    take = issuance.get_script(redis_client, TAKE_STOCK_SCRIPT)
+    start = first_stock_shard(member_id, shards, strategy, index)
+    candidates = [(start + offset) % shards for offset in range(shards)]
+    candidates = [shard for shard in candidates if shard != tried_shard]
+    # 최근에 재고 없음으로 확인된 샤드는 마지막에 시도
+    candidates.sort(key=lambda shard: _is_dry(coupon_key, shard))
+
+    for shard in candidates:
+        if int(take(keys=[stock_key(coupon_key, shard)], args=[1], client=redis_client)) != 1:
+            _mark_dry(coupon_key, shard)
+            continue
+        try:
+            issuance.get_script(redis_client, BIND_COUPON_SCRIPT)(
+                keys=[
+                    issuance.coupon_record_key(coupon_id),
+                    issuance.member_coupons_key(shard_tag(coupon_key, home)),
+                    expiry_index.index_key(shard_tag(coupon_key, home), expiry_timestamp),
+                ],
+                args=[member_id, coupon_id, codec.encode(coupon_data), expiry_timestamp],
+                client=redis_client,
+            )
+        except Exception:
+            # 기록에 실패하면 가져온 재고를 돌려놓는다
+            redis_client.incrby(stock_key(coupon_key, shard), 1)
+            negative_cache.bump_version(redis_client)
+            raise
+        return issuance.ISSUED, coupon_id
+
+    index.release(redis_client, shard_tag(coupon_key, home), member_id)
+    return issuance.SOLD_OUT, None
+
+
+def _is_dry(coupon_key, shard):
+    with _dry_lock:
+        checked_at = _dry_shards.get((coupon_key, shard))
+    return checked_at is not None and time.monotonic() - checked_at < DRY_SHARD_TTL
+
+
+def _mark_dry(coupon_key, shard):
+    with _dry_lock:
+        _dry_shards[(coupon_key, shard)] = time.monotonic()
+
+
+def _clear_dry(coupon_key, shards):
+    with _dry_lock:
+        for shard in range(shards):
+            _dry_shards.pop((coupon_key, shard), None)
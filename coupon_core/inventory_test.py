@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import MagicMock
+
+from rediscluster.nodemanager import NodeManager
+
+from coupon_core import inventory, issuance, negative_cache
+
+keyslot = NodeManager(startup_nodes=[{"host": "localhost", "port": 6379}]).keyslot
+
+
+class TestShardedInventory(unittest.TestCase):
+
+    def test_split_quantity_keeps_total(self):
+        self.assertEqual(inventory.split_quantity(1000, 3), [334, 333, 333])
+        self.assertEqual(sum(inventory.split_quantity(7, 16)), 7)
+
+    def test_shards_spread_over_slots(self):
+        slots = {keyslot(inventory.stock_key("online", shard)) for shard in range(16)}
+        self.assertEqual(len(slots), 16)
+
+    def test_home_shard_keys_share_one_slot(self):
+        home = inventory.member_shard("user123", 8)
+        _, coupon_id, _, keys, _ = inventory._home_command("online", "user123", {}, 0, 8, inventory.SHARD_STRATEGY_MEMBER)
+
+        self.assertEqual(len({keyslot(key) for key in keys}), 1)
+        self.assertTrue(coupon_id.startswith("{online:%d}-" % home))
+        self.assertEqual(keys[1], issuance.received_coupons_key("online:%d" % home))
+
+    def test_legacy_issue_mode_rejects_sharded_stock(self):
+        with self.assertRaises(ValueError):
+            inventory.check_issue_mode(issuance.ISSUE_MODE_LEGACY, 4)
+        inventory.check_issue_mode(issuance.ISSUE_MODE_LEGACY, 1)
+        inventory.check_issue_mode(issuance.ISSUE_MODE_SCRIPT, 4)
+
+    def test_member_shard_is_stable(self):
+        self.assertEqual(inventory.member_shard("user123", 8), inventory.member_shard("user123", 8))
+        self.assertEqual(len({inventory.member_shard(f"user{index}", 8) for index in range(200)}), 8)
+
+
+
+class TestShardFallback(unittest.TestCase):
+
+    def setUp(self):
+        issuance._scripts.clear()
+        inventory._dry_shards.clear()
+        self.addCleanup(issuance._scripts.clear)
+        self.addCleanup(inventory._dry_shards.clear)
+        # 스크립트 소스별 mock (register_script 가 소스마다 다른 객체를 돌려준다)
+        self.scripts = {}
+        self.redis_client = MagicMock()
+        self.redis_client.register_script.side_effect = lambda source: self.scripts.setdefault(source, MagicMock())
+        self.member_id = "user123"
+        self.home = inventory.member_shard(self.member_id, 3)
+
+    def script(self, source):
+        return self.scripts.setdefault(source, MagicMock())
+
+    def issue_batch(self, home_result):
+        self.redis_client.pipeline.return_value.execute.return_value = [home_result]
+        return inventory.issue_coupons_sharded_batch(
+            self.redis_client, "online", [(self.member_id, {"member_id": self.member_id}, 1700000000)], 3)[0]
+
+    def test_dry_home_shard_takes_stock_from_another_shard(self):
+        take = self.script(inventory.TAKE_STOCK_SCRIPT)
+        take.side_effect = lambda keys, args, client: 1
+        bind = self.script(inventory.BIND_COUPON_SCRIPT)
+
+        result, coupon_id = self.issue_batch(inventory.NEEDS_FALLBACK)
+
+        self.assertEqual(result, issuance.ISSUED)
+        self.assertTrue(coupon_id.startswith("{online:%d}-" % self.home))
+        # 홈 샤드가 아닌 샤드에서 재고 1개, 기록은 홈 샤드 슬롯에
+        self.assertNotEqual(take.call_args[1]["keys"], [inventory.stock_key("online", self.home)])
+        self.assertEqual(take.call_args[1]["args"], [1])
+        self.assertEqual(bind.call_args[1]["keys"][1], issuance.member_coupons_key(f"online:{self.home}"))
+        self.assertTrue(inventory._is_dry("online", self.home))
+        self.redis_client.srem.assert_not_called()
+
+        # 재고 없음으로 표시된 홈 샤드는 다음 요청에서 홈 재고를 쓰지 않는다 (ARGV[5] = 0)
+        _, _, use_home_stock, _, args = inventory._home_command("online", self.member_id, {}, 0, 3,
+                                                                inventory.SHARD_STRATEGY_MEMBER)
+        self.assertFalse(use_home_stock)
+        self.assertEqual(args[4], 0)
+
+    def test_all_shards_empty_releases_dedup_claim(self):
+        take = self.script(inventory.TAKE_STOCK_SCRIPT)
+        take.side_effect = lambda keys, args, client: 0
+
+        result, coupon_id = self.issue_batch(inventory.NEEDS_FALLBACK)
+
+        self.assertEqual((result, coupon_id), (issuance.SOLD_OUT, None))
+        # 홈 샤드는 스크립트가 이미 확인했으므로 나머지 두 샤드만 시도
+        self.assertEqual(take.call_count, 2)
+        self.script(inventory.BIND_COUPON_SCRIPT).assert_not_called()
+        self.redis_client.srem.assert_called_once_with(
+            issuance.received_coupons_key(f"online:{self.home}"), self.member_id)
+        self.assertTrue(all(inventory._is_dry("online", shard) for shard in range(3)))
+
+    def test_bind_failure_returns_taken_stock(self):
+        self.script(inventory.TAKE_STOCK_SCRIPT).side_effect = lambda keys, args, client: 1
+        self.script(inventory.BIND_COUPON_SCRIPT).side_effect = ConnectionError("node down")
+
+        result = self.issue_batch(inventory.NEEDS_FALLBACK)
+
+        self.assertIsInstance(result, ConnectionError)
+        self.redis_client.incrby.assert_called_once()
+        self.redis_client.srem.assert_called_once()
+
+    def test_rebalance_moves_only_surplus_and_keeps_total(self):
+        pipe = self.redis_client.pipeline.return_value
+        pipe.execute.side_effect = [[b"10", b"0", b"2"], [], [b"4", b"4", b"4"]]
+        take = self.script(inventory.TAKE_STOCK_SCRIPT)
+        take.side_effect = lambda keys, args, client: args[0]
+
+        self.assertEqual(inventory.rebalance_stock(self.redis_client, "online", 3), [4, 4, 4])
+
+        take.assert_called_once_with(keys=[inventory.stock_key("online", 0)], args=[6], client=self.redis_client)
+        self.assertEqual([call[0] for call in pipe.incrby.call_args_list],
+                         [(inventory.stock_key("online", 1), 4), (inventory.stock_key("online", 2), 2)])
+        # 재고가 생긴 샤드가 다른 컨테이너의 소진 캐시에 가려지지 않게 버전을 올린다
+        self.redis_client.incr.assert_called_once_with(negative_cache.VERSION_KEY)
+
+    def test_rebalance_returns_leftover_when_issuance_races(self):
+        pipe = self.redis_client.pipeline.return_value
+        pipe.execute.side_effect = [[b"10", b"0", b"2"], [], [b"3", b"4", b"2"]]
+        # 재분배하는 사이 발급으로 shard 0 에서 1개만 가져옴 -> 가져온 만큼만 나눠 준다
+        self.script(inventory.TAKE_STOCK_SCRIPT).side_effect = lambda keys, args, client: 1
+
+        inventory.rebalance_stock(self.redis_client, "online", 3)
+
+        self.assertEqual([call[0] for call in pipe.incrby.call_args_list], [(inventory.stock_key("online", 1), 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
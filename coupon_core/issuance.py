@@ -0,0 +1,230 @@
+from redis.exceptions import NoScriptError
+
+from coupon_core import codec, coupon_ids, dedup, expiry_index, metrics
+
+# 발급 경로 선택
+#  - legacy : SISMEMBER / GET / DECRBY / SADD / SET / EXPIREAT / HSET 개별 호출
+#  - script : Lua 스크립트 한 번으로 원자적 발급
+ISSUE_MODE_LEGACY = "legacy"
+ISSUE_MODE_SCRIPT = "script"
+
+# 쿠폰 정보 저장 위치
+#  - channel : coupon:{online}-<uuid> 와 member_coupons:{online} HASH 를 재고 키와 같은 슬롯에 (스크립트 한 번으로 발급)
+#  - member  : coupon:{<member_id>}:online-<uuid> 와 회원별 쿠폰 HASH 를 {member_id} 슬롯에 (coupon_core.member_coupons)
+RECORD_LAYOUT_CHANNEL = "channel"
+RECORD_LAYOUT_MEMBER = "member"
+
+# 재고 방식
+#  - counter : 재고 카운터를 차감하고 발급 시 쿠폰 ID 생성
+#  - tokens  : coupon_init 이 미리 만들어 둔 쿠폰 ID 토큰을 꺼내 회원에게 묶음 (coupon_core.token_pool, 스크립트 경로)
+INVENTORY_COUNTER = "counter"
+INVENTORY_TOKENS = "tokens"
+
+# 스크립트 결과 코드
+ISSUED = 1
+ALREADY_RECEIVED = 0
+SOLD_OUT = -1
+
+# KEYS[1] 재고 카운터, KEYS[2] 중복 체크 인덱스, KEYS[3] 쿠폰 정보, KEYS[4] 회원별 쿠폰 HASH, KEYS[5] 만료 순서 인덱스
+# ARGV[1] member_id, ARGV[2] coupon_id, ARGV[3] 쿠폰 JSON, ARGV[4] 만료 시각 (UNIX timestamp)
+# 이후 ARGV 는 중복 체크 인덱스가 덧붙이는 인자 (dedup.script_args)
+# {check} / {claim} 에는 중복 체크 인덱스 구현의 Lua 조각이, {record} 에는 쿠폰 정보 저장 조각이 들어간다
+ISSUE_SCRIPT_TEMPLATE = """
+if {check} then
+    return 0
+end
+local remaining = tonumber(redis.call('GET', KEYS[1]) or '0')
+if not remaining or remaining <= 0 then
+    return -1
+end
+redis.call('DECRBY', KEYS[1], 1)
+{claim}
+{record}
+redis.call('ZADD', KEYS[5], ARGV[4], ARGV[2])
+redis.call('EXPIREAT', KEYS[5], tonumber(ARGV[4]) + {retention})
+return 1
+"""
+
+# channel 레이아웃의 쿠폰 정보 / 회원 인덱스 저장 (member 레이아웃은 발급 후 회원 슬롯에 따로 기록)
+CHANNEL_RECORD_LUA = """redis.call('SET', KEYS[3], ARGV[3])
+redis.call('EXPIREAT', KEYS[3], ARGV[4])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])"""
+
+
+def script_source(template, index, layout=RECORD_LAYOUT_CHANNEL, checked=True):
+    """
+    스크립트 템플릿에 중복 체크 인덱스의 Lua 조각, 쿠폰 정보 저장 조각, 만료 인덱스 보존 시간을 채움.
+    checked 가 False 면 확인 없이 등록만 한다 (이미 다른 곳에서 정확히 확인한 재시도용).
+    """
+    check, claim = index.fragments(layout == RECORD_LAYOUT_MEMBER)
+    record = CHANNEL_RECORD_LUA if layout == RECORD_LAYOUT_CHANNEL else ""
+    return template.format(check=check if checked else "false", claim=claim, record=record,
+                           retention=expiry_index.INDEX_RETENTION)
+
+
+# 기본(SET) 인덱스 발급 스크립트
+ISSUE_SCRIPT = script_source(ISSUE_SCRIPT_TEMPLATE, dedup.get_dedup_index(dedup.DEDUP_SET))
+
+_scripts = {}
+
+
+def received_coupons_key(coupon_key):
+    """채널별 발급 회원 SET 키 (재고 키와 같은 슬롯)"""
+    return f"received_coupons:{{{coupon_key}}}"
+
+
+def member_coupons_key(coupon_key):
+    """채널별 회원-쿠폰 HASH 키 (재고 키와 같은 슬롯)"""
+    return f"member_coupons:{{{coupon_key}}}"
+
+
+def new_coupon_id(coupon_key, member_id=None):
+    """
+    해시 태그를 포함한 쿠폰 ID 생성 (예: {online}-<uuid>, 뒷부분 형식은 coupon_ids.ID_FORMAT).
+    member_id 를 주면 member 레이아웃 ID (예: {12345}:online-<uuid>) 로 회원 슬롯에 놓인다.
+    """
+    if member_id is not None:
+        return f"{{{member_id}}}:{coupon_key}-{coupon_ids.new_id()}"
+    return f"{{{coupon_key}}}-{coupon_ids.new_id()}"
+
+
+def coupon_record_key(coupon_id):
+    return f"coupon:{coupon_id}"
+
+
+def issue_script_keys(coupon_key, coupon_id, member_id=None, index=None, expiry_timestamp=0,
+                      layout=RECORD_LAYOUT_CHANNEL):
+    """
+    스크립트에 넘길 키 목록.
+    재고 키 'online' 과 '{online}' 해시 태그는 같은 슬롯으로 매핑되므로
+    기존 재고 키를 그대로 쓰면서 클러스터에서 스크립트를 실행할 수 있다.
+    member 레이아웃의 쿠폰 정보 키와 스크립트 밖에서 등록하는 인덱스 키는 다른 슬롯이라
+    그 자리에는 쓰지 않는 재고 키를 넘긴다.
+    """
+    index = index or dedup.get_dedup_index(dedup.DEDUP_SET)
+    return [
+        coupon_key,
+        index.script_key(coupon_key, member_id, coupon_key),
+        coupon_record_key(coupon_id) if layout == RECORD_LAYOUT_CHANNEL else coupon_key,
+        member_coupons_key(coupon_key),
+        expiry_index.index_key(coupon_key, expiry_timestamp),
+    ]
+
+
+def issue_script_args(member_id, coupon_id, coupon_data, expiry_timestamp, index):
+    return [member_id, coupon_id, codec.encode(coupon_data), expiry_timestamp, *index.script_args(member_id)]
+
+
+def get_script(redis_client, source):
+    """스크립트 객체 (SHA 는 소스별로 컨테이너당 한 번만 계산)"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = redis_client.register_script(source)
+    return script
+
+
+def get_issue_script(redis_client, index=None, layout=RECORD_LAYOUT_CHANNEL, checked=True):
+    """중복 체크 인덱스와 쿠폰 정보 레이아웃에 맞는 발급 스크립트 객체"""
+    index = index or dedup.get_dedup_index(dedup.DEDUP_SET)
+    return get_script(redis_client, script_source(ISSUE_SCRIPT_TEMPLATE, index, layout, checked))
+
+
+def issue_coupon_script(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                        dedup_backend=dedup.DEDUP_SET, layout=RECORD_LAYOUT_CHANNEL, checked=True):
+    """
+    중복 체크, 재고 확인/차감, 쿠폰 저장, TTL, 회원 인덱스를 한 번의 EVALSHA 로 처리.
+    (결과 코드, coupon_id) 를 반환하며 발급되지 않은 경우 coupon_id 는 None.
+    스크립트 밖에서 등록하는 인덱스 (bitmap) 는 먼저 등록하고 발급하지 못하면 되돌린다.
+    member 레이아웃은 쿠폰 정보를 기록하지 않으므로 member_coupons.issue_coupon 을 통해 호출한다.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    coupon_id = new_coupon_id(coupon_key, member_id if layout == RECORD_LAYOUT_MEMBER else None)
+    keys = issue_script_keys(coupon_key, coupon_id, member_id, index, expiry_timestamp, layout)
+    claim = [(coupon_key, member_id)]
+    if not dedup.claim_outside(redis_client, index, claim)[0]:
+        return ALREADY_RECEIVED, None
+    try:
+        with metrics.timer("issue_script"):
+            result = int(get_issue_script(redis_client, index, layout, checked)(
+                keys=keys,
+                args=issue_script_args(member_id, coupon_id, coupon_data, expiry_timestamp, index),
+                client=redis_client,
+            ))
+    except Exception:
+        dedup.release_outside(redis_client, index, claim)
+        raise
+    if result == ISSUED:
+        return result, coupon_id
+    dedup.release_outside(redis_client, index, claim)
+    return result, None
+
+
+def issue_coupons_script_batch(redis_client, coupon_key, requests, dedup_backend=dedup.DEDUP_SET,
+                               layout=RECORD_LAYOUT_CHANNEL, checked=True):
+    """
+    여러 발급 요청을 EVALSHA 파이프라인으로 한 번에 전송 (노드별로 묶여 한 번씩 왕복).
+    requests 는 (member_id, coupon_data, expiry_timestamp) 목록이고,
+    결과는 같은 순서의 (결과 코드, coupon_id) 또는 해당 요청에서 발생한 예외.
+    스크립트 밖에서 등록하는 인덱스 (bitmap) 는 등록도 파이프라인 한 번으로 먼저 보낸다.
+    member 레이아웃은 member_coupons.issue_coupons_batch 를 통해 호출한다.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    script = get_issue_script(redis_client, index, layout, checked)
+    issued = [None] * len(requests)
+    commands = {}
+    for position, (member_id, coupon_data, expiry_timestamp) in enumerate(requests):
+        coupon_id = new_coupon_id(coupon_key, member_id if layout == RECORD_LAYOUT_MEMBER else None)
+        try:
+            keys = issue_script_keys(coupon_key, coupon_id, member_id, index, expiry_timestamp, layout)
+            args = issue_script_args(member_id, coupon_id, coupon_data, expiry_timestamp, index)
+        except ValueError as e:
+            # 인덱스가 받을 수 없는 member_id (예: bitmap 에 숫자가 아닌 ID) 는 해당 요청만 실패
+            issued[position] = e
+            continue
+        commands[position] = (coupon_id, keys, args)
+
+    claimed = dedup.claim_outside(redis_client, index, [(coupon_key, requests[position][0]) for position in commands])
+    for position, first in zip(list(commands), claimed):
+        if not first:
+            issued[position] = (ALREADY_RECEIVED, None)
+            del commands[position]
+
+    with metrics.timer("issue_script"):
+        results = evalsha_pipeline(redis_client, script, [(keys, args) for _, keys, args in commands.values()]) \
+            if commands else []
+    unclaimed = []
+    for (position, (coupon_id, _, _)), result in zip(commands.items(), results):
+        if isinstance(result, Exception):
+            issued[position] = result
+        elif int(result) == ISSUED:
+            issued[position] = (ISSUED, coupon_id)
+            continue
+        else:
+            issued[position] = (int(result), None)
+        unclaimed.append((coupon_key, requests[position][0]))
+    dedup.release_outside(redis_client, index, unclaimed)
+    return issued
+
+
+def evalsha_pipeline(redis_client, script, commands):
+    """
+    (keys, args) 목록을 EVALSHA 파이프라인으로 전송하고 결과(또는 예외)를 순서대로 반환.
+    스크립트가 없는 노드가 있으면 적재 후 NOSCRIPT 로 거절된 요청만 순서대로 다시 보낸다.
+    """
+    results = _execute_evalsha(redis_client, script.sha, commands)
+    retry = [index for index, result in enumerate(results) if isinstance(result, NoScriptError)]
+    if retry:
+        metrics.increment("script_reloads")
+        script.sha = redis_client.script_load(script.script)
+        for index, result in zip(retry, _execute_evalsha(redis_client, script.sha, [commands[i] for i in retry])):
+            results[index] = result
+    return results
+
+
+def _execute_evalsha(redis_client, sha, commands):
+    # redis-py-cluster 의 ClusterPipeline.evalsha 는 막혀 있어(RedisClusterException) 명령으로 직접 쌓는다.
+    # 파이프라인은 EVALSHA 를 numkeys 뒤의 키 슬롯으로 노드에 나눠 보낸다
+    pipe = redis_client.pipeline()
+    for keys, args in commands:
+        pipe.execute_command("EVALSHA", sha, len(keys), *keys, *args)
+    return pipe.execute(raise_on_error=False)
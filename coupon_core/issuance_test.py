@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import MagicMock
+
+from redis.exceptions import NoScriptError
+from rediscluster.crc import crc16
+from rediscluster.nodemanager import NodeManager
+from rediscluster.pipeline import ClusterPipeline
+
+from coupon_core import dedup, issuance
+
+
+def keyslot(key):
+    """Redis 클러스터 해시 슬롯 계산 (해시 태그 반영)"""
+    start = key.find("{")
+    if start > -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key.encode()) % 16384
+
+
+class TestIssueScriptKeys(unittest.TestCase):
+
+    def test_keys_share_one_slot(self):
+        for coupon_key in ("online", "offline"):
+            coupon_id = issuance.new_coupon_id(coupon_key)
+            keys = issuance.issue_script_keys(coupon_key, coupon_id)
+            self.assertEqual(len({keyslot(key) for key in keys}), 1)
+
+    def test_stock_key_is_unchanged(self):
+        # coupon_init 이 설정하는 기존 재고 키를 그대로 사용
+        keys = issuance.issue_script_keys("offline", issuance.new_coupon_id("offline"))
+        self.assertEqual(keys[0], "offline")
+
+
+class TestBitmapClaimOutsideScript(unittest.TestCase):
+
+    def setUp(self):
+        issuance._scripts.clear()
+        self.redis_client = MagicMock()
+        self.pipe = self.redis_client.pipeline.return_value
+        self.script = self.redis_client.register_script.return_value
+
+    def tearDown(self):
+        issuance._scripts.clear()
+
+    def test_claimed_member_skips_script(self):
+        self.pipe.execute.return_value = [1]
+
+        result = issuance.issue_coupon_script(self.redis_client, "online", "70000", {}, 1700000000, dedup.DEDUP_BITMAP)
+
+        self.assertEqual(result, (issuance.ALREADY_RECEIVED, None))
+        self.script.assert_not_called()
+
+    def test_sold_out_releases_claim(self):
+        self.pipe.execute.side_effect = [[0], []]
+        self.script.return_value = issuance.SOLD_OUT
+
+        result = issuance.issue_coupon_script(self.redis_client, "online", "70000", {}, 1700000000, dedup.DEDUP_BITMAP)
+
+        self.assertEqual(result, (issuance.SOLD_OUT, None))
+        offset = 70000 - dedup.BITMAP_RANGE
+        self.assertEqual([call[0] for call in self.pipe.setbit.call_args_list],
+                         [("received_bits:{online:1}", offset, 1), ("received_bits:{online:1}", offset, 0)])
+        # 스크립트에는 비트맵 대신 재고 키가 들어가 모든 키가 한 슬롯
+        keys = self.script.call_args[1]["keys"]
+        self.assertEqual(len({keyslot(key) for key in keys}), 1)
+
+
+class TestEvalshaPipeline(unittest.TestCase):
+
+    def cluster_pipeline(self, responses):
+        """
+        redis-py-cluster 의 실제 ClusterPipeline (명령 쌓기 / 슬롯 계산은 그대로, 전송만 가로챔).
+        보낸 명령의 (명령, 슬롯) 목록을 sent 에 남기고 responses 에서 차례로 결과를 꺼낸다.
+        """
+        pool = MagicMock()
+        pool.nodes.keyslot = NodeManager(startup_nodes=[{"host": "localhost", "port": 6379}]).keyslot
+        pipe = ClusterPipeline(connection_pool=pool)
+        sent = []
+
+        def send_cluster_commands(stack, raise_on_error=True, allow_redirections=True):
+            sent.append([(command.args[0], pipe._determine_slot(*command.args)) for command in stack])
+            return responses.pop(0)
+
+        pipe.send_cluster_commands = send_cluster_commands
+        return pipe, sent
+
+    def test_batch_queues_evalsha_on_cluster_pipeline(self):
+        pipe, sent = self.cluster_pipeline([[1, NoScriptError("NOSCRIPT")], [1]])
+        redis_client = MagicMock()
+        redis_client.pipeline.return_value = pipe
+        issuance._scripts.clear()
+        self.addCleanup(issuance._scripts.clear)
+
+        results = issuance.issue_coupons_script_batch(
+            redis_client, "online", [("1", {"member_id": "1"}, 1700000000), ("2", {"member_id": "2"}, 1700000000)])
+
+        # ClusterPipeline.evalsha 는 막혀 있으므로 EVALSHA 명령으로 쌓여 재고 키 슬롯으로 간다
+        self.assertEqual(sent[0], [("EVALSHA", keyslot("online"))] * 2)
+        # NOSCRIPT 로 거절된 요청만 스크립트를 올린 뒤 다시 보낸다
+        redis_client.script_load.assert_called_once()
+        self.assertEqual(sent[1], [("EVALSHA", keyslot("online"))])
+        self.assertEqual([result[0] for result in results], [issuance.ISSUED, issuance.ISSUED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,319 @@
+import re
+import time
+
+from coupon_core import codec, dedup, expiry_index, issuance, metrics, negative_cache
+
+# member 레이아웃: 회원의 쿠폰 목록과 쿠폰 정보를 {member_id} 해시 태그로 같은 슬롯에 둔다
+#  - member:{<member_id>}:coupons       HASH (coupon_id -> 만료 UNIX 시각), 가장 늦은 만료 시각에 EXPIREAT
+#  - coupon:{<member_id>}:online-<uuid>  쿠폰 JSON, 만료 시각에 EXPIREAT
+# 재고 차감은 채널 슬롯 스크립트가, 쿠폰 정보 기록은 회원 슬롯 스크립트가 맡는다 (발급당 EVALSHA 2회)
+# bloom 중복 체크는 채널 슬롯에 필터만 두고, 정확한 확인 / 등록은 회원 슬롯의 받은 재고 키 SET
+# (member:{<member_id>}:received, dedup.BloomDedupIndex.received_key) 에서 기록 스크립트가 함께 한다
+
+# 사용 처리 결과 코드
+REDEEMED = 1
+ALREADY_USED = 0
+NOT_FOUND = -1
+
+# 마이그레이션에서 HSCAN / 파이프라인 한 번에 옮길 항목 수
+MIGRATION_CHUNK_SIZE = 500
+
+# KEYS[1] 쿠폰 정보, KEYS[2] 회원별 쿠폰 HASH, (bloom) KEYS[3] 회원의 받은 재고 키 SET
+# ARGV[1] coupon_id, ARGV[2] 쿠폰 JSON, ARGV[3] 만료 시각, (bloom) ARGV[4] 재고 키
+# 기록하면 1, 이미 같은 재고 키 쿠폰을 받은 회원이면 기록하지 않고 0
+BIND_SCRIPT = """
+if KEYS[3] and redis.call('SADD', KEYS[3], ARGV[4]) == 0 then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('EXPIREAT', KEYS[1], ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+local latest = tonumber(ARGV[3])
+for _, expiry in ipairs(redis.call('HVALS', KEYS[2])) do
+    latest = math.max(latest, tonumber(expiry))
+end
+redis.call('EXPIREAT', KEYS[2], latest)
+return 1
+"""
+
+# KEYS[1] 회원별 쿠폰 HASH, KEYS[2..] 쿠폰 정보, ARGV[n] KEYS[n + 1] 의 coupon_id
+# 쿠폰 정보 키는 회원 HASH 와 같은 {member_id} 슬롯이라 KEYS 로 함께 넘긴다. 만료된 항목은 정리.
+LOOKUP_SCRIPT = """
+local coupons = {}
+for position, coupon_id in ipairs(ARGV) do
+    local data = redis.call('GET', KEYS[position + 1])
+    if data then
+        table.insert(coupons, coupon_id)
+        table.insert(coupons, data)
+    else
+        redis.call('HDEL', KEYS[1], coupon_id)
+    end
+end
+return coupons
+"""
+
+# KEYS[1] 회원별 쿠폰 HASH, KEYS[2] 쿠폰 정보, ARGV[1] coupon_id
+# 쿠폰 정보는 codec 의 packed (두 번째 바이트가 플래그, bit0 = used) 또는 JSON
+REDEEM_SCRIPT = f"""
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return -1
+end
+local data = redis.call('GET', KEYS[2])
+if not data then
+    return -1
+end
+if string.byte(data, 1) == {codec.PACKED_VERSION} then
+    local flags = string.byte(data, 2)
+    if flags % 2 == {codec.FLAG_USED} then
+        return 0
+    end
+    data = string.sub(data, 1, 1) .. string.char(flags + {codec.FLAG_USED}) .. string.sub(data, 3)
+else
+    local coupon = cjson.decode(data)
+    if coupon['used'] then
+        return 0
+    end
+    coupon['used'] = true
+    data = cjson.encode(coupon)
+end
+local ttl = redis.call('PTTL', KEYS[2])
+redis.call('SET', KEYS[2], data)
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return 1
+"""
+
+# 기존 쿠폰 ID 에서 채널 태그 추출 (online-<uuid> / {online}-<uuid> / {online:3}-<uuid>)
+_CHANNEL_PATTERN = re.compile(r"^\{?([A-Za-z]+)")
+
+
+def check_layout(layout, shards):
+    """member 레이아웃은 단일 재고 키에서만 지원 (샤드 재고의 다른 샤드 보충 경로는 채널 슬롯에 기록)"""
+    if layout == issuance.RECORD_LAYOUT_MEMBER and shards > 1:
+        raise ValueError("member record layout requires a single stock key (shards=1)")
+
+
+def member_coupons_key(member_id):
+    return f"member:{{{member_id}}}:coupons"
+
+
+def bind_command(member_id, coupon_id, coupon_data, expiry_timestamp, claim_key=None):
+    """BIND_SCRIPT 에 넘길 (keys, args). claim_key 를 주면 회원 슬롯의 받은 재고 키 SET 에 함께 등록"""
+    keys = [issuance.coupon_record_key(coupon_id), member_coupons_key(member_id)]
+    args = [coupon_id, codec.encode(coupon_data), int(expiry_timestamp)]
+    if claim_key is not None:
+        keys.append(dedup.get_dedup_index(dedup.DEDUP_BLOOM).received_key(member_id))
+        args.append(claim_key)
+    return keys, args
+
+
+def bind(redis_client, member_id, coupon_id, coupon_data, expiry_timestamp, claim_key=None):
+    """쿠폰 정보와 회원별 쿠폰 HASH 를 회원 슬롯에 기록 (EVALSHA 한 번). 기록했으면 True"""
+    keys, args = bind_command(member_id, coupon_id, coupon_data, expiry_timestamp, claim_key)
+    with metrics.timer("record_write"):
+        return int(issuance.get_script(redis_client, BIND_SCRIPT)(keys=keys, args=args, client=redis_client)) == 1
+
+
+def claims_in_member_slot(dedup_backend):
+    """중복 체크의 정확한 등록을 회원 슬롯 기록 스크립트가 하는지 (bloom)"""
+    return dedup_backend == dedup.DEDUP_BLOOM
+
+
+def issue_coupon(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, dedup_backend=dedup.DEDUP_SET):
+    """
+    채널 슬롯에서 중복 체크 / 재고 차감 / 만료 인덱스 등록 후 회원 슬롯에 쿠폰 정보를 기록.
+    (결과 코드, coupon_id) 를 반환하며 기록에 실패하면 차감을 되돌리고 예외를 전달한다.
+    bloom 은 필터 양성이면 회원 슬롯에서 정확히 확인해 처음인 회원만 필터 확인 없이 다시 발급하고,
+    기록 스크립트가 받은 재고 키를 등록하면서 동시에 들어온 중복 요청을 걸러 낸다.
+    """
+    claim_key = coupon_key if claims_in_member_slot(dedup_backend) else None
+    result, coupon_id = issuance.issue_coupon_script(redis_client, coupon_key, member_id, coupon_data,
+                                                     expiry_timestamp, dedup_backend, issuance.RECORD_LAYOUT_MEMBER)
+    if claim_key is not None and result == issuance.ALREADY_RECEIVED:
+        index = dedup.get_dedup_index(dedup_backend)
+        if redis_client.sismember(index.received_key(member_id), coupon_key):
+            return result, coupon_id
+        metrics.increment("bloom_false_positives")
+        result, coupon_id = issuance.issue_coupon_script(redis_client, coupon_key, member_id, coupon_data,
+                                                         expiry_timestamp, dedup_backend,
+                                                         issuance.RECORD_LAYOUT_MEMBER, checked=False)
+    if result != issuance.ISSUED:
+        return result, coupon_id
+    try:
+        bound = bind(redis_client, member_id, coupon_id, coupon_data, expiry_timestamp, claim_key)
+    except Exception:
+        _undo_issue(redis_client, coupon_key, dedup_backend, [(member_id, coupon_id, expiry_timestamp)])
+        raise
+    if not bound:
+        _undo_issue(redis_client, coupon_key, dedup_backend, [(member_id, coupon_id, expiry_timestamp)])
+        return issuance.ALREADY_RECEIVED, None
+    return result, coupon_id
+
+
+def issue_coupons_batch(redis_client, coupon_key, requests, dedup_backend=dedup.DEDUP_SET):
+    """
+    issuance.issue_coupons_script_batch 의 member 레이아웃 버전.
+    발급된 요청만 모아 회원 슬롯 기록을 파이프라인 한 번으로 보낸다 (배치당 왕복 2회).
+    bloom 필터 양성인 요청은 회원 슬롯 확인과 필터 확인 없는 재발급을 각각 파이프라인 한 번으로 보낸다.
+    """
+    claim_key = coupon_key if claims_in_member_slot(dedup_backend) else None
+    results = issuance.issue_coupons_script_batch(redis_client, coupon_key, requests, dedup_backend,
+                                                  issuance.RECORD_LAYOUT_MEMBER)
+    if claim_key is not None:
+        _recheck_filter_positives(redis_client, coupon_key, requests, dedup_backend, results)
+    issued = [position for position, result in enumerate(results)
+              if not isinstance(result, Exception) and result[0] == issuance.ISSUED]
+    if not issued:
+        return results
+
+    commands = []
+    for position in issued:
+        member_id, coupon_data, expiry_timestamp = requests[position]
+        commands.append(bind_command(member_id, results[position][1], coupon_data, expiry_timestamp, claim_key))
+    with metrics.timer("record_write"):
+        bound = issuance.evalsha_pipeline(redis_client, issuance.get_script(redis_client, BIND_SCRIPT), commands)
+
+    failed = []
+    for position, result in zip(issued, bound):
+        if isinstance(result, Exception) or int(result) != 1:
+            member_id, _, expiry_timestamp = requests[position]
+            failed.append((member_id, results[position][1], expiry_timestamp))
+            results[position] = result if isinstance(result, Exception) else (issuance.ALREADY_RECEIVED, None)
+    if failed:
+        _undo_issue(redis_client, coupon_key, dedup_backend, failed)
+    return results
+
+
+def _recheck_filter_positives(redis_client, coupon_key, requests, dedup_backend, results):
+    """bloom 필터 양성 요청을 회원 슬롯에서 확인해 처음인 회원만 필터 확인 없이 다시 발급 (results 를 고침)"""
+    positives = [position for position, result in enumerate(results)
+                 if not isinstance(result, Exception) and result[0] == issuance.ALREADY_RECEIVED]
+    if not positives:
+        return
+    index = dedup.get_dedup_index(dedup_backend)
+    pipe = redis_client.pipeline()
+    for position in positives:
+        pipe.sismember(index.received_key(requests[position][0]), coupon_key)
+    retry = [position for position, received in zip(positives, pipe.execute()) if not received]
+    if not retry:
+        return
+    metrics.increment("bloom_false_positives", len(retry))
+    reissued = issuance.issue_coupons_script_batch(redis_client, coupon_key, [requests[position] for position in retry],
+                                                   dedup_backend, issuance.RECORD_LAYOUT_MEMBER, checked=False)
+    for position, result in zip(retry, reissued):
+        results[position] = result
+
+
+def _undo_issue(redis_client, coupon_key, dedup_backend, issued):
+    """회원 슬롯 기록에 실패한 발급의 재고 / 중복 체크 / 만료 인덱스를 되돌려 재시도할 수 있게 한다"""
+    index = dedup.get_dedup_index(dedup_backend)
+    for member_id, coupon_id, expiry_timestamp in issued:
+        # bloom 의 정확한 등록은 기록 스크립트에서만 일어나므로 되돌릴 것이 없다 (필터는 지울 수 없음)
+        if not claims_in_member_slot(dedup_backend):
+            index.release(redis_client, coupon_key, member_id)
+        redis_client.incrby(coupon_key, 1)
+        redis_client.zrem(expiry_index.index_key(coupon_key, expiry_timestamp), coupon_id)
+    # 되돌린 재고가 소진 캐시에 가려지지 않게 한다
+    if issued:
+        negative_cache.bump_version(redis_client)
+
+
+def lookup_coupons(redis_client, member_id):
+    """
+    회원의 유효한 쿠폰 전체 ({coupon_id: 쿠폰 정보}).
+    HKEYS 로 쿠폰 ID 를 읽고 쿠폰 정보 키를 KEYS 로 넘겨 EVALSHA 한 번에 읽는다 (회원 슬롯에서 왕복 2회).
+    """
+    key = member_coupons_key(member_id)
+    coupon_ids = [_decode(coupon_id) for coupon_id in redis_client.hkeys(key)]
+    if not coupon_ids:
+        return {}
+    flat = issuance.get_script(redis_client, LOOKUP_SCRIPT)(
+        keys=[key, *[issuance.coupon_record_key(coupon_id) for coupon_id in coupon_ids]], args=coupon_ids,
+        client=redis_client,
+    )
+    coupons = {}
+    for coupon_id, data in zip(flat[::2], flat[1::2]):
+        coupon_id = coupon_id.decode() if isinstance(coupon_id, bytes) else coupon_id
+        coupons[coupon_id] = codec.decode(data)
+    return coupons
+
+
+def redeem_coupon(redis_client, member_id, coupon_id):
+    """회원의 쿠폰 하나를 원자적으로 사용 처리 (REDEEMED / ALREADY_USED / NOT_FOUND)"""
+    if not coupon_id.startswith(f"{{{member_id}}}:"):
+        return NOT_FOUND  # 다른 회원의 쿠폰 (다른 슬롯이라 스크립트로 보낼 수 없음)
+    return int(issuance.get_script(redis_client, REDEEM_SCRIPT)(
+        keys=[member_coupons_key(member_id), issuance.coupon_record_key(coupon_id)],
+        args=[coupon_id],
+        client=redis_client,
+    ))
+
+
+def migrate_member_coupons(redis_client, source_key="member_coupons", chunk_size=MIGRATION_CHUNK_SIZE, now=None):
+    """
+    기존 회원-쿠폰 HASH (member_id -> coupon_id) 를 HSCAN 으로 chunk_size 씩 읽어 member 레이아웃으로 옮긴다.
+    청크마다 GET/PTTL, 기록 + 만료 인덱스 등록, 기존 키 삭제를 각각 파이프라인 한 번으로 보낸다.
+    새 쿠폰 ID 는 {member_id}:<기존 ID> 이고, 기존 쿠폰 정보와 HASH 항목은 옮긴 뒤 지운다
+    (중간에 멈춰도 다시 실행하면 남은 항목부터 이어서 옮긴다). {"migrated": n, "expired": n} 를 반환.
+    """
+    counts = {"migrated": 0, "expired": 0}
+    bind_script = issuance.get_script(redis_client, BIND_SCRIPT)
+    cursor = 0
+    while True:
+        cursor, entries = redis_client.hscan(source_key, cursor, count=chunk_size)
+        if entries:
+            _migrate_chunk(redis_client, bind_script, source_key, entries, counts, now)
+        if int(cursor) == 0:
+            return counts
+
+
+def _migrate_chunk(redis_client, bind_script, source_key, entries, counts, now=None):
+    now = int(time.time()) if now is None else now
+    entries = [(_decode(member_id), _decode(coupon_id)) for member_id, coupon_id in entries.items()]
+
+    pipe = redis_client.pipeline()
+    for _, coupon_id in entries:
+        pipe.get(issuance.coupon_record_key(coupon_id))
+        pipe.pttl(issuance.coupon_record_key(coupon_id))
+    values = pipe.execute()
+
+    commands = []
+    index_entries = []
+    for (member_id, coupon_id), data, ttl in zip(entries, values[::2], values[1::2]):
+        if data is None:
+            counts["expired"] += 1
+            continue
+        # TTL 이 없는 쿠폰은 인덱스 보존 시간 뒤를 만료 시각으로 본다
+        expiry_timestamp = now + (int(ttl) + 999) // 1000 if int(ttl) > 0 else now + expiry_index.INDEX_RETENTION
+        new_id = f"{{{member_id}}}:{coupon_id}"
+        commands.append(([issuance.coupon_record_key(new_id), member_coupons_key(member_id)],
+                         [new_id, _decode(data), expiry_timestamp]))
+        index_entries.append((_channel_tag(coupon_id), new_id, expiry_timestamp))
+
+    if commands:
+        for result in issuance.evalsha_pipeline(redis_client, bind_script, commands):
+            if isinstance(result, Exception):
+                raise result
+        pipe = redis_client.pipeline()
+        for tag, new_id, expiry_timestamp in index_entries:
+            pipe.zadd(expiry_index.index_key(tag, expiry_timestamp), {new_id: expiry_timestamp})
+            pipe.expireat(expiry_index.index_key(tag, expiry_timestamp), expiry_timestamp + expiry_index.INDEX_RETENTION)
+        pipe.execute()
+        counts["migrated"] += len(commands)
+
+    # 옮긴 뒤 기존 쿠폰 정보와 HASH 항목 삭제 (다른 슬롯이라 파이프라인으로 묶어 보냄)
+    pipe = redis_client.pipeline()
+    for _, coupon_id in entries:
+        pipe.delete(issuance.coupon_record_key(coupon_id))
+    pipe.hdel(source_key, *[member_id for member_id, _ in entries])
+    pipe.execute()
+
+
+def _channel_tag(coupon_id):
+    match = _CHANNEL_PATTERN.match(coupon_id)
+    return match.group(1) if match else coupon_id
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
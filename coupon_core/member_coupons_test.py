@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from coupon_core import dedup, issuance, member_coupons
+
+
+class TestMemberCoupons(unittest.TestCase):
+
+    def test_keys_share_member_slot(self):
+        coupon_id = issuance.new_coupon_id("online", "12345")
+        keys, _ = member_coupons.bind_command("12345", coupon_id, {"member_id": "12345"}, 1700000000)
+
+        self.assertTrue(coupon_id.startswith("{12345}:online-"))
+        self.assertEqual(keys, [f"coupon:{coupon_id}", "member:{12345}:coupons"])
+
+    def test_lookup_passes_record_keys(self):
+        issuance._scripts.clear()
+        self.addCleanup(issuance._scripts.clear)
+        redis_client = MagicMock()
+        redis_client.hkeys.return_value = [b"{12345}:online-abc", b"{12345}:online-def"]
+        script = redis_client.register_script.return_value
+        script.return_value = [b"{12345}:online-abc", b'{"member_id": "12345"}']
+
+        coupons = member_coupons.lookup_coupons(redis_client, "12345")
+
+        # 스크립트가 읽는 쿠폰 정보 키는 모두 KEYS 로 넘긴다 (만료된 def 는 스크립트가 HASH 에서 정리)
+        self.assertEqual(coupons, {"{12345}:online-abc": {"member_id": "12345"}})
+        self.assertEqual(script.call_args[1]["keys"], ["member:{12345}:coupons", "coupon:{12345}:online-abc",
+                                                       "coupon:{12345}:online-def"])
+        self.assertEqual(script.call_args[1]["args"], ["{12345}:online-abc", "{12345}:online-def"])
+
+        redis_client.hkeys.return_value = []
+        self.assertEqual(member_coupons.lookup_coupons(redis_client, "12345"), {})
+        self.assertEqual(script.call_count, 1)
+
+    def test_redeem_rejects_other_members_coupon_without_redis(self):
+        redis_client = MagicMock()
+
+        result = member_coupons.redeem_coupon(redis_client, "12345", "{67890}:online-abc")
+
+        self.assertEqual(result, member_coupons.NOT_FOUND)
+        redis_client.register_script.assert_not_called()
+
+    @patch('coupon_core.member_coupons.bind')
+    @patch('coupon_core.member_coupons.issuance.issue_coupon_script')
+    def test_failed_bind_returns_stock(self, mock_issue, mock_bind):
+        mock_issue.return_value = (issuance.ISSUED, "{12345}:online-abc")
+        mock_bind.side_effect = ConnectionError("node down")
+        redis_client = MagicMock()
+
+        with self.assertRaises(ConnectionError):
+            member_coupons.issue_coupon(redis_client, "online", "12345", {}, 1700000000)
+
+        # 재고 / 중복 체크 / 만료 인덱스를 되돌려 재시도할 수 있게 한다
+        redis_client.incrby.assert_called_once_with("online", 1)
+        redis_client.srem.assert_called_once_with("received_coupons:{online}", "12345")
+        redis_client.zrem.assert_called_once()
+
+    @patch('coupon_core.member_coupons.bind')
+    @patch('coupon_core.member_coupons.issuance.issue_coupon_script')
+    def test_bloom_positive_checks_member_slot(self, mock_issue, mock_bind):
+        mock_issue.side_effect = [(issuance.ALREADY_RECEIVED, None), (issuance.ISSUED, "{12345}:online-abc")]
+        mock_bind.return_value = True
+        redis_client = MagicMock()
+        redis_client.sismember.return_value = False
+
+        result = member_coupons.issue_coupon(redis_client, "online", "12345", {}, 1700000000, dedup.DEDUP_BLOOM)
+
+        # 필터 오탐: 회원 슬롯에 없으면 필터 확인 없이 다시 발급하고 기록 스크립트가 받은 재고 키를 등록
+        self.assertEqual(result, (issuance.ISSUED, "{12345}:online-abc"))
+        redis_client.sismember.assert_called_once_with("member:{12345}:received", "online")
+        self.assertFalse(mock_issue.call_args[1]["checked"])
+        self.assertEqual(mock_bind.call_args[0][-1], "online")
+        redis_client.hsetnx.assert_not_called()
+
+        redis_client.sismember.return_value = True
+        mock_issue.side_effect = [(issuance.ALREADY_RECEIVED, None)]
+        result = member_coupons.issue_coupon(redis_client, "online", "12345", {}, 1700000000, dedup.DEDUP_BLOOM)
+        self.assertEqual(result, (issuance.ALREADY_RECEIVED, None))
+
+    @patch('coupon_core.member_coupons.bind')
+    @patch('coupon_core.member_coupons.issuance.issue_coupon_script')
+    def test_bloom_raced_bind_returns_stock(self, mock_issue, mock_bind):
+        mock_issue.return_value = (issuance.ISSUED, "{12345}:online-abc")
+        mock_bind.return_value = False
+        redis_client = MagicMock()
+
+        result = member_coupons.issue_coupon(redis_client, "online", "12345", {}, 1700000000, dedup.DEDUP_BLOOM)
+
+        # 동시에 들어온 같은 회원 요청이 먼저 기록했으면 재고만 되돌린다
+        self.assertEqual(result, (issuance.ALREADY_RECEIVED, None))
+        redis_client.incrby.assert_called_once_with("online", 1)
+        redis_client.hdel.assert_not_called()
+
+    def test_bloom_member_layout_script_skips_channel_hash(self):
+        index = dedup.get_dedup_index(dedup.DEDUP_BLOOM)
+        source = issuance.script_source(issuance.ISSUE_SCRIPT_TEMPLATE, index, issuance.RECORD_LAYOUT_MEMBER)
+
+        self.assertNotIn("KEYS[4]", source)
+        self.assertIn("BF.ADD", source)
+
+    def test_member_layout_requires_single_stock_key(self):
+        with self.assertRaises(ValueError):
+            member_coupons.check_layout(issuance.RECORD_LAYOUT_MEMBER, 4)
+        member_coupons.check_layout(issuance.RECORD_LAYOUT_CHANNEL, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
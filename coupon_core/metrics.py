@@ -0,0 +1,135 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from coupon_core import recorder
+
+# CloudWatch 지표 네임스페이스 / 호출마다 EMF 로그 한 줄 출력 여부
+NAMESPACE = os.environ.get("COUPON_METRICS_NAMESPACE", "Coupon")
+METRICS_ENABLED = os.environ.get("COUPON_METRICS", "true").lower() == "true"
+
+# 메시지별 디버그 로그를 남길 비율 (0 = 끄기, 1 = 모두)
+DEBUG_LOG_SAMPLE_RATE = float(os.environ.get("COUPON_DEBUG_LOG_SAMPLE_RATE", "0"))
+
+_loaded_at = time.monotonic()  # 컨테이너 초기화 시점 (첫 호출의 init_ms 계산용)
+
+
+class Metrics:
+    """
+    단계별 타이머와 카운터를 모아 호출이 끝날 때 CloudWatch EMF(Embedded Metric Format) JSON 한 줄로 출력.
+    SQS 전송 스레드에서도 기록하므로 락으로 보호한다.
+    """
+
+    def __init__(self, namespace=NAMESPACE, enabled=METRICS_ENABLED, sample_rate=DEBUG_LOG_SAMPLE_RATE):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._timers = {}  # 단계 -> [누적 ms, 횟수]
+        self._counters = {}
+        self._cold_start = True
+
+    @contextmanager
+    def timer(self, stage):
+        """with 블록 실행 시간을 단계별로 누적"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(stage, (time.perf_counter() - started) * 1000)
+
+    def record_time(self, stage, elapsed_ms):
+        with self._lock:
+            total = self._timers.setdefault(stage, [0.0, 0])
+            total[0] += elapsed_ms
+            total[1] += 1
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def debug(self, message, *args):
+        """샘플링된 메시지만 출력 (포맷팅도 샘플링된 경우에만)"""
+        if self.sample_rate and random.random() < self.sample_rate:
+            print(message % args if args else message)
+
+    @contextmanager
+    def invocation(self, function_name):
+        """핸들러 호출 한 번 (콜드 스타트 여부, 전체 시간 기록 후 flush)"""
+        if self._cold_start:
+            self._cold_start = False
+            self.increment("cold_start")
+            self.record_time("init", (time.monotonic() - _loaded_at) * 1000)
+        else:
+            self.increment("cold_start", 0)
+        try:
+            with self.timer("invocation"):
+                yield self
+        finally:
+            self.flush(function_name)
+
+    def snapshot(self):
+        """현재까지 모인 값 ({단계_ms / 단계_count / 카운터: 값})"""
+        with self._lock:
+            values = dict(self._counters)
+            for stage, (total_ms, count) in self._timers.items():
+                values[f"{stage}_ms"] = round(total_ms, 3)
+                values[f"{stage}_count"] = count
+        return values
+
+    def flush(self, function_name):
+        """EMF 한 줄 출력 후 초기화"""
+        values = self.snapshot()
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+        if not self.enabled or not values:
+            return values
+
+        definitions = [{"Name": name, "Unit": "Milliseconds" if name.endswith("_ms") else "Count"}
+                       for name in values]
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [["FunctionName"]],
+                    "Metrics": definitions,
+                }],
+            },
+            "FunctionName": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", function_name),
+        }
+        document.update(values)
+        print(json.dumps(document, separators=(",", ":")))
+        return values
+
+
+# 컨테이너 단위로 공유되는 기본 수집기
+collector = Metrics()
+
+
+def timer(stage):
+    return collector.timer(stage)
+
+
+def increment(name, value=1):
+    collector.increment(name, value)
+
+
+def debug(message, *args):
+    collector.debug(message, *args)
+
+
+def instrumented(function_name):
+    """lambda_handler 데코레이터: 호출마다 지표를 모아 EMF 로 한 번 출력 (COUPON_TRACE_DIR 이 있으면 명령 트레이스도)"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            with collector.invocation(function_name), recorder.invocation(function_name):
+                return handler(event, context)
+        return wrapper
+    return decorator
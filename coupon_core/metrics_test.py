@@ -0,0 +1,44 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from coupon_core import metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_invocation_flushes_one_emf_line(self):
+        collector = metrics.Metrics(namespace="CouponTest")
+
+        with patch('builtins.print') as mock_print:
+            with collector.invocation("coupon_issue_online"):
+                with collector.timer("dedup_check"):
+                    pass
+                with collector.timer("dedup_check"):
+                    pass
+                collector.increment("redis_commands", 3)
+
+        mock_print.assert_called_once()
+        document = json.loads(mock_print.call_args[0][0])
+        definition = document["_aws"]["CloudWatchMetrics"][0]
+        names = {metric["Name"]: metric["Unit"] for metric in definition["Metrics"]}
+
+        self.assertEqual(definition["Namespace"], "CouponTest")
+        self.assertEqual(document["FunctionName"], "coupon_issue_online")
+        self.assertEqual(document["dedup_check_count"], 2)
+        self.assertEqual(document["redis_commands"], 3)
+        self.assertEqual(document["cold_start"], 1)
+        self.assertEqual(names["dedup_check_ms"], "Milliseconds")
+        self.assertEqual(names["redis_commands"], "Count")
+        # 다음 호출은 빈 상태에서 시작하고 콜드 스타트가 아님
+        self.assertEqual(collector.flush("coupon_issue_online"), {})
+
+    def test_debug_log_is_sampled(self):
+        collector = metrics.Metrics(sample_rate=0)
+        with patch('builtins.print') as mock_print:
+            collector.debug("message %s", "m1")
+        mock_print.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from coupon_core import issuance, metrics
+
+# 컨테이너 단위 부정 캐시: 소진된 채널과 이미 발급받은 회원은 Redis 왕복 없이 거절
+NEGATIVE_CACHE_ENABLED = os.environ.get("COUPON_NEGATIVE_CACHE", "true").lower() == "true"
+SOLD_OUT_TTL = float(os.environ.get("COUPON_SOLD_OUT_CACHE_TTL", "5"))  # 소진 채널 캐시 유지 시간(초)
+MEMBER_TTL = float(os.environ.get("COUPON_MEMBER_CACHE_TTL", "300"))  # 발급 회원 캐시 유지 시간(초)
+MEMBER_CACHE_SIZE = int(os.environ.get("COUPON_MEMBER_CACHE_SIZE", "100000"))  # 초과 시 오래 안 쓴 회원부터 제거
+
+# 재고를 다시 채우거나 (coupon_init) 되돌리면 (예약 해제, 샤드 재분배) 올리는 버전 키. 발급 Lambda 는 이 간격(초)마다 한 번 GET 으로 확인하고
+# 값이 바뀌었으면 캐시를 비운다 (재입고가 캐시에 가려지는 시간은 최대 이 간격)
+VERSION_KEY = "coupon_stock_version"
+VERSION_CHECK_INTERVAL = float(os.environ.get("COUPON_CACHE_VERSION_INTERVAL", "1"))
+
+
+class NegativeCache:
+    """
+    소진 채널 (coupon_key -> 기록 시각) 과 발급 회원 ((coupon_key, member_id) -> 기록 시각, LRU) 캐시.
+    Lambda 컨테이너는 호출 사이에 멈추므로 pub/sub 구독 대신 버전 키를 주기적으로 확인한다.
+    """
+
+    def __init__(self, enabled=NEGATIVE_CACHE_ENABLED, sold_out_ttl=SOLD_OUT_TTL, member_ttl=MEMBER_TTL,
+                 member_cache_size=MEMBER_CACHE_SIZE, version_check_interval=VERSION_CHECK_INTERVAL):
+        self.enabled = enabled
+        self.sold_out_ttl = sold_out_ttl
+        self.member_ttl = member_ttl
+        self.member_cache_size = member_cache_size
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._sold_out = {}
+        self._members = OrderedDict()
+        self._version = None
+        self._version_checked_at = None
+
+    def refresh(self, redis_client, now=None):
+        """확인 간격이 지났으면 버전 키를 읽어 재고가 다시 채워졌는지 확인 (바뀌었으면 캐시 비움)"""
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        version = redis_client.get(VERSION_KEY)
+        with self._lock:
+            if version != self._version:
+                self._sold_out.clear()
+                self._members.clear()
+                self._version = version
+            self._version_checked_at = now
+
+    def cached_result(self, coupon_key, member_id, now=None):
+        """캐시로 결정할 수 있으면 발급 결과 코드 (ALREADY_RECEIVED / SOLD_OUT), 아니면 None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            seen_at = self._members.get((coupon_key, member_id))
+            if seen_at is not None:
+                if now - seen_at < self.member_ttl:
+                    self._members.move_to_end((coupon_key, member_id))
+                    metrics.increment("negative_cache_hits")
+                    return issuance.ALREADY_RECEIVED
+                del self._members[(coupon_key, member_id)]
+
+            sold_out_at = self._sold_out.get(coupon_key)
+            if sold_out_at is not None:
+                if now - sold_out_at < self.sold_out_ttl:
+                    metrics.increment("negative_cache_hits")
+                    return issuance.SOLD_OUT
+                del self._sold_out[coupon_key]
+        return None
+
+    def remember(self, coupon_key, member_id, result, now=None):
+        """Redis 에서 확인한 발급 결과를 캐시에 반영 (발급 / 중복 -> 회원, 소진 -> 채널)"""
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if result in (issuance.ISSUED, issuance.ALREADY_RECEIVED):
+                self._members[(coupon_key, member_id)] = now
+                self._members.move_to_end((coupon_key, member_id))
+                while len(self._members) > self.member_cache_size:
+                    self._members.popitem(last=False)
+            elif result == issuance.SOLD_OUT:
+                self._sold_out[coupon_key] = now
+
+    def forget(self, coupon_key, member_id):
+        """회원 캐시에서 제거 (발급 예약이 풀려 다시 받을 수 있게 된 회원)"""
+        with self._lock:
+            self._members.pop((coupon_key, member_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._sold_out.clear()
+            self._members.clear()
+            self._version = None
+            self._version_checked_at = None
+
+
+# 컨테이너 단위로 공유되는 기본 캐시
+cache = NegativeCache()
+
+
+def refresh(redis_client):
+    cache.refresh(redis_client)
+
+
+def cached_result(coupon_key, member_id):
+    return cache.cached_result(coupon_key, member_id)
+
+
+def remember(coupon_key, member_id, result):
+    cache.remember(coupon_key, member_id, result)
+
+
+def forget(coupon_key, member_id):
+    cache.forget(coupon_key, member_id)
+
+
+def bump_version(redis_client):
+    """재고를 다시 채우거나 되돌린 뒤 (예약 해제, 샤드 재분배, 발급 실패 복구) 호출해 모든 컨테이너의 부정 캐시를 무효화"""
+    return redis_client.incr(VERSION_KEY)
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import MagicMock
+
+from coupon_core import issuance, negative_cache
+
+
+class TestNegativeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = negative_cache.NegativeCache(
+            enabled=True, sold_out_ttl=5, member_ttl=60, member_cache_size=2, version_check_interval=1
+        )
+
+    def test_sold_out_expires_after_ttl(self):
+        self.cache.remember("online", "user1", issuance.SOLD_OUT, now=100)
+
+        self.assertEqual(self.cache.cached_result("online", "user2", now=104), issuance.SOLD_OUT)
+        self.assertIsNone(self.cache.cached_result("offline", "user2", now=104))
+        self.assertIsNone(self.cache.cached_result("online", "user2", now=105))
+
+    def test_members_evicted_least_recently_used(self):
+        self.cache.remember("online", "user1", issuance.ISSUED, now=100)
+        self.cache.remember("online", "user2", issuance.ALREADY_RECEIVED, now=100)
+        self.cache.cached_result("online", "user1", now=101)  # user1 을 최근 사용으로
+        self.cache.remember("online", "user3", issuance.ISSUED, now=102)
+
+        self.assertEqual(self.cache.cached_result("online", "user1", now=103), issuance.ALREADY_RECEIVED)
+        self.assertIsNone(self.cache.cached_result("online", "user2", now=103))
+        self.assertEqual(self.cache.cached_result("online", "user3", now=103), issuance.ALREADY_RECEIVED)
+
+    def test_version_bump_clears_cache(self):
+        redis_client = MagicMock()
+        redis_client.get.return_value = b"1"
+        self.cache.refresh(redis_client, now=100)
+        self.cache.remember("online", "user1", issuance.SOLD_OUT, now=100)
+
+        # 확인 간격 안에서는 Redis 를 다시 읽지 않는다
+        redis_client.get.return_value = b"2"
+        self.cache.refresh(redis_client, now=100.5)
+        self.assertEqual(redis_client.get.call_count, 1)
+        self.assertEqual(self.cache.cached_result("online", "user1", now=100.5), issuance.SOLD_OUT)
+
+        self.cache.refresh(redis_client, now=101)
+        self.assertIsNone(self.cache.cached_result("online", "user1", now=101))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 호출 단위 명령 기록기
+# Redis 클러스터 / SQS / pymysql 클라이언트 호출을 (종류, 명령, 슬롯, 노드, 시간, 왕복 번호) 로 기록한다.
+# COUPON_TRACE_DIR 을 설정하면 clients / coupon_expired_read 가 만든 클라이언트를 기록하고
+# 핸들러 호출이 끝날 때마다 <함수 이름>-<시각>-<번호>.jsonl 트레이스를 이 디렉터리에 남긴다 (비우면 기록하지 않음).
+TRACE_DIR = os.environ.get("COUPON_TRACE_DIR", "")
+
+# 키 없이 모든 노드 / 임의 노드로 가는 명령
+KEYLESS_COMMANDS = {"SCRIPT LOAD", "SCRIPT EXISTS", "PING", "INFO", "CLUSTER SLOTS", "CLUSTER NODES"}
+# 인자 전체가 키인 명령
+MULTI_KEY_COMMANDS = {"MGET", "DEL", "UNLINK", "EXISTS", "TOUCH"}
+
+
+class Recorder:
+    """
+    클라이언트 인스턴스의 호출 메서드를 감싸 명령마다 한 항목씩 기록.
+    단일 명령은 왕복 1회, 파이프라인은 노드마다 왕복 1회로 센다 (redis-py-cluster 의 전송 단위와 같음).
+    여러 슬롯의 키를 한 명령 / 한 파이프라인에 담은 경우를 cross_slot 으로 센다.
+    """
+
+    def __init__(self, trace_dir=TRACE_DIR):
+        self.trace_dir = trace_dir
+        self.entries = []
+        self._lock = threading.Lock()
+        self._round_trips = 0
+        self._dumps = 0
+        self._patched = []  # (객체, 속성 이름, 원래 인스턴스 속성 또는 None)
+
+    # 클라이언트 감싸기
+
+    def wrap_redis(self, client):
+        """RedisCluster (또는 같은 인터페이스) 의 execute_command / pipeline / 노드 연결을 기록"""
+        nodes = client.connection_pool.nodes
+        execute_command = client.execute_command
+        pipeline = client.pipeline
+        get_connection_by_node = client.connection_pool.get_connection_by_node
+
+        def recording_execute_command(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return execute_command(*args, **kwargs)
+            finally:
+                self._record_redis([args], time.perf_counter() - started, nodes)
+
+        def recording_pipeline(*args, **kwargs):
+            return self._wrap_pipeline(pipeline(*args, **kwargs), nodes)
+
+        def recording_get_connection_by_node(node):
+            # SCAN 처럼 노드를 직접 지정해 보내는 명령
+            return self._wrap_node_connection(get_connection_by_node(node), node)
+
+        self._patch(client, "execute_command", recording_execute_command)
+        self._patch(client, "pipeline", recording_pipeline)
+        self._patch(client.connection_pool, "get_connection_by_node", recording_get_connection_by_node)
+        return client
+
+    def wrap_sqs(self, client):
+        """boto3 SQS 클라이언트의 send_message / send_message_batch 를 기록"""
+        for name, command in (("send_message", "SendMessage"), ("send_message_batch", "SendMessageBatch")):
+            if hasattr(client, name):
+                self._patch(client, name, self._timed("sqs", command, getattr(client, name)))
+        return client
+
+    def wrap_db(self, connection):
+        """pymysql 연결의 cursor().execute / commit / rollback 을 기록"""
+        cursor = connection.cursor
+
+        def recording_cursor(*args, **kwargs):
+            created = cursor(*args, **kwargs)
+            execute = created.execute
+
+            def recording_execute(sql, *params):
+                started = time.perf_counter()
+                try:
+                    return execute(sql, *params)
+                finally:
+                    self._add({"kind": "db", "command": sql.split(None, 1)[0].upper()},
+                              time.perf_counter() - started)
+
+            created.execute = recording_execute
+            return created
+
+        self._patch(connection, "cursor", recording_cursor)
+        self._patch(connection, "commit", self._timed("db", "COMMIT", connection.commit))
+        self._patch(connection, "rollback", self._timed("db", "ROLLBACK", connection.rollback))
+        return connection
+
+    def restore(self):
+        """감쌌던 메서드를 원래대로"""
+        for target, name, original in reversed(self._patched):
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self._patched = []
+
+    # 기록 확인
+
+    def reset(self):
+        with self._lock:
+            self.entries = []
+            self._round_trips = 0
+
+    def summary(self):
+        """Redis 명령 / 왕복 / cross_slot, SQS 요청, DB 문장 (COMMIT / ROLLBACK 포함) 수"""
+        with self._lock:
+            entries = list(self.entries)
+        redis = [entry for entry in entries if entry["kind"] == "redis"]
+        return {
+            "redis_commands": len(redis),
+            "redis_round_trips": len({entry["round_trip"] for entry in redis}),
+            "cross_slot": len({entry["round_trip_group"] for entry in redis if entry.get("cross_slot")}),
+            "sqs_requests": sum(1 for entry in entries if entry["kind"] == "sqs"),
+            "db_statements": sum(1 for entry in entries if entry["kind"] == "db"),
+        }
+
+    def dump(self, path):
+        """트레이스를 JSON Lines 로 (마지막 줄은 summary)"""
+        with self._lock:
+            entries = list(self.entries)
+        with open(path, "w") as trace:
+            for entry in entries:
+                trace.write(json.dumps(entry, default=str) + "\n")
+            trace.write(json.dumps({"summary": self.summary()}) + "\n")
+        return path
+
+    @contextmanager
+    def invocation(self, function_name):
+        """핸들러 호출 한 번의 트레이스 (trace_dir 이 없으면 아무것도 하지 않음)"""
+        if not self.trace_dir:
+            yield self
+            return
+        self.reset()
+        try:
+            yield self
+        finally:
+            self._dumps += 1
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self.dump(os.path.join(self.trace_dir, f"{function_name}-{int(time.time() * 1000)}-{self._dumps}.jsonl"))
+
+    # 내부
+
+    def _patch(self, target, name, replacement):
+        self._patched.append((target, name, vars(target).get(name) if hasattr(target, "__dict__") else None))
+        setattr(target, name, replacement)
+
+    def _timed(self, kind, command, method):
+        def recording(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._add({"kind": kind, "command": command}, time.perf_counter() - started)
+        return recording
+
+    def _wrap_pipeline(self, pipe, nodes):
+        queued = []
+        execute_command = pipe.execute_command
+        execute = pipe.execute
+
+        def recording_execute_command(*args, **kwargs):
+            queued.append(args)
+            return execute_command(*args, **kwargs)
+
+        def recording_execute(*args, **kwargs):
+            commands = list(queued)
+            queued.clear()
+            started = time.perf_counter()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                if commands:
+                    self._record_redis(commands, time.perf_counter() - started, nodes)
+
+        pipe.execute_command = recording_execute_command
+        pipe.execute = recording_execute
+        return pipe
+
+    def _wrap_node_connection(self, connection, node):
+        if getattr(connection, "_recorder", None) is self:
+            return connection
+        send_command = connection.send_command
+
+        def recording_send_command(*args, **kwargs):
+            self._add({"kind": "redis", "command": _command_name(args), "slot": None,
+                       "node": node.get("name"), "round_trip": self._next_round_trip()}, 0.0)
+            return send_command(*args, **kwargs)
+
+        connection.send_command = recording_send_command
+        connection._recorder = self
+        return connection
+
+    def _record_redis(self, commands, elapsed, nodes):
+        """명령 묶음 (단일 명령은 1개) 을 노드별 왕복으로 나눠 기록. 시간은 묶음 전체 시간을 명령 수로 나눈 값"""
+        located = [(args, _keys(args)) for args in commands]
+        slots = {}
+        for args, keys in located:
+            for key in keys:
+                slots.setdefault(key, nodes.keyslot(key))
+        group = self._next_round_trip()
+        cross_slot = len(set(slots.values())) > 1
+        round_trips = {}
+        for args, keys in located:
+            slot = slots[keys[0]] if keys else None
+            node = _node_name(nodes, slot)
+            if node not in round_trips:
+                round_trips[node] = group if not round_trips else self._next_round_trip()
+            entry = {"kind": "redis", "command": _command_name(args), "key": _text(keys[0]) if keys else None,
+                     "slot": slot, "node": node, "round_trip": round_trips[node], "round_trip_group": group}
+            if cross_slot:
+                entry["cross_slot"] = True
+            self._add(entry, elapsed / len(located))
+
+    def _next_round_trip(self):
+        with self._lock:
+            self._round_trips += 1
+            return self._round_trips
+
+    def _add(self, entry, elapsed):
+        entry["ms"] = round(elapsed * 1000, 3)
+        with self._lock:
+            self.entries.append(entry)
+
+
+def _command_name(args):
+    return _text(args[0]).upper()
+
+
+def _keys(args):
+    command = _command_name(args)
+    if command in KEYLESS_COMMANDS:
+        return []
+    if command in ("EVALSHA", "EVAL"):
+        return list(args[3:3 + int(args[2])])
+    if command in MULTI_KEY_COMMANDS:
+        return list(args[1:])
+    return list(args[1:2])
+
+
+def _node_name(nodes, slot):
+    if slot is None:
+        return None
+    try:
+        return nodes.slots[slot][0]["name"]
+    except (AttributeError, KeyError, IndexError, TypeError):
+        return None
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+# 컨테이너 단위로 공유되는 기본 기록기 (COUPON_TRACE_DIR 이 있을 때만 클라이언트를 감싼다)
+recorder = Recorder()
+
+
+def track_redis(client):
+    return recorder.wrap_redis(client) if recorder.trace_dir else client
+
+
+def track_sqs(client):
+    return recorder.wrap_sqs(client) if recorder.trace_dir else client
+
+
+def track_db(connection):
+    return recorder.wrap_db(connection) if recorder.trace_dir else connection
+
+
+def invocation(function_name):
+    return recorder.invocation(function_name)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from coupon_core import recorder
+
+NODE_BY_SLOT = {1: "a:6379", 2: "a:6379", 3: "b:6379"}
+
+
+def make_redis_client():
+    client = MagicMock()
+    client.connection_pool.nodes.keyslot = lambda key: {"k1": 1, "k2": 2, "k3": 3}[key]
+    client.connection_pool.nodes.slots = {slot: [{"name": name}] for slot, name in NODE_BY_SLOT.items()}
+    return client
+
+
+class TestRecorder(unittest.TestCase):
+
+    def test_counts_round_trips_per_node_and_cross_slot(self):
+        client = make_redis_client()
+        calls = recorder.Recorder(trace_dir="")
+        calls.wrap_redis(client)
+
+        client.execute_command("GET", "k1")
+        pipe = client.pipeline()
+        pipe.execute_command("GET", "k1")
+        pipe.execute_command("GET", "k2")
+        pipe.execute_command("GET", "k3")
+        pipe.execute()
+
+        # 단일 명령 1회 + 파이프라인 (노드 a, b) 2회, 파이프라인은 슬롯 3개에 걸침
+        self.assertEqual(calls.summary(), {"redis_commands": 4, "redis_round_trips": 3, "cross_slot": 1,
+                                           "sqs_requests": 0, "db_statements": 0})
+        self.assertEqual([(entry["slot"], entry["node"]) for entry in calls.entries][:2], [(1, "a:6379"), (1, "a:6379")])
+
+        calls.restore()
+        self.assertNotIn("execute_command", vars(client))
+
+    def test_invocation_dumps_trace(self):
+        connection = MagicMock()
+        cursor = connection.cursor.return_value
+        cursor.__enter__.return_value = cursor  # pymysql 커서처럼 with 에서 자신을 돌려줌
+        with tempfile.TemporaryDirectory() as trace_dir:
+            calls = recorder.Recorder(trace_dir=trace_dir)
+            calls.wrap_db(connection)
+            with calls.invocation("coupon_expired_db"):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.commit()
+
+            [name] = os.listdir(trace_dir)
+            with open(os.path.join(trace_dir, name)) as trace:
+                lines = [json.loads(line) for line in trace]
+
+        self.assertTrue(name.startswith("coupon_expired_db-"))
+        self.assertEqual([line.get("command") for line in lines[:-1]], ["SELECT", "COMMIT"])
+        self.assertEqual(lines[-1]["summary"]["db_statements"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,353 @@
+import json
+import os
+import time
+
+from coupon_core import codec, dedup, expiry_index, issuance, metrics, negative_cache, token_pool
+
+# 동기 발급 예약 (coupon_issue_online 직접 호출, API 용)
+# reserve 는 스크립트 한 번에서 중복 체크 + 재고 차감(또는 토큰 꺼내기) 후 회원의 예약을 만들고 쿠폰 ID 를 바로 돌려준다.
+# 쿠폰 정보 / 회원 HASH / 만료 인덱스 기록(확정)은 클라이언트가 confirm 을 호출해야 하고, release 를 호출하거나
+# 예약 시간 안에 확정하지 않으면 예약을 풀어 재고를 되돌린다 (결과는 클라이언트의 confirm / release 가 정한다).
+# COUPON_RESERVATION_AUTO_CONFIRM=true 면 예약 스크립트가 모든 예약의 확정 메시지를 outbox 에 남기고, relay 가 SQS 로 보내
+# 발급 Lambda 의 SQS 경로가 확정한다 (클라이언트가 확정하지 않아도 relay 주기 안에 모든 예약이 확정된다).
+# 만료된 예약은 스케줄 relay (release_expired) 가 풀므로 relay 스케줄은 자동 확정 여부와 관계없이 필요하다.
+# 키는 모두 재고 키 슬롯 ({<coupon_key>}) 에 둔다
+#  - reservation:{<coupon_key>}:<member_id>  HASH (coupon_id, data, expiry, index)
+#  - reservations:{<coupon_key>}             ZSET (member_id -> 예약 만료 UNIX 밀리초)
+#  - reservation_outbox:{<coupon_key>}       LIST (확정 메시지 JSON, 자동 확정일 때만)
+
+# 예약 유지 시간(초). 확정 메시지 relay 주기보다 길게
+RESERVATION_TTL = int(os.environ.get("COUPON_RESERVATION_TTL", "300"))
+
+# true 면 모든 예약을 outbox -> relay -> SQS 경로로 자동 확정 (기본은 클라이언트의 confirm 호출로만 확정)
+RESERVATION_AUTO_CONFIRM = os.environ.get("COUPON_RESERVATION_AUTO_CONFIRM", "false").lower() == "true"
+
+# 만료된 예약을 한 번에 풀 최대 수 / outbox 에서 한 번에 꺼내 보낼 메시지 수
+SWEEP_LIMIT = 100
+RELAY_CHUNK = 1000
+
+# 확정 결과 코드 (확정되면 coupon_id)
+NOT_FOUND = -1
+EXPIRED = -2
+
+# 재고 차감 조각: coupon_id 를 정하고, 재고가 없으면 -1 반환
+COUNTER_TAKE_LUA = """local remaining = tonumber(redis.call('GET', KEYS[1]) or '0')
+if not remaining or remaining <= 0 then
+    return -1
+end
+redis.call('DECRBY', KEYS[1], 1)
+local coupon_id = ARGV[2]"""
+
+TOKEN_TAKE_LUA = """local token = redis.call('LPOP', KEYS[1])
+if not token then
+    return -1
+end
+local coupon_id = ARGV[2] .. token"""
+
+# 재고 반환 조각 (토큰은 쿠폰 ID 에서 접두사 ARGV[3] 를 떼어 풀 앞에 되돌림)
+COUNTER_GIVE_LUA = "redis.call('INCRBY', KEYS[1], 1)"
+
+TOKEN_GIVE_LUA = """local coupon_id = redis.call('HGET', KEYS[3], 'coupon_id')
+if coupon_id then
+    redis.call('LPUSH', KEYS[1], string.sub(coupon_id, #ARGV[3] + 1))
+end"""
+
+# KEYS[1] 재고 카운터 / 토큰 LIST, KEYS[2] 중복 체크 인덱스, KEYS[3] 예약 HASH, KEYS[4] 회원별 쿠폰 HASH,
+# KEYS[5] 예약 ZSET, KEYS[6] outbox
+# ARGV[1] member_id, ARGV[2] coupon_id (tokens 는 쿠폰 ID 접두사), ARGV[3] 쿠폰 JSON, ARGV[4] 만료 시각,
+# ARGV[5] 예약 만료 (밀리초), ARGV[6] 만료 순서 인덱스 키, ARGV[7] 자동 확정 ('1' 이면 outbox 에 확정 메시지),
+# 이후 ARGV 는 dedup.script_args
+# 예약되면 coupon_id, 이미 받은 (또는 예약한) 회원은 0, 재고가 없으면 -1 을 반환
+RESERVE_SCRIPT_TEMPLATE = """
+if {check} then
+    return 0
+end
+{take}
+{claim}
+redis.call('HSET', KEYS[3], 'coupon_id', coupon_id, 'data', ARGV[3], 'expiry', ARGV[4], 'index', ARGV[6])
+redis.call('EXPIREAT', KEYS[3], ARGV[4])
+redis.call('ZADD', KEYS[5], ARGV[5], ARGV[1])
+if ARGV[7] == '1' then
+    redis.call('RPUSH', KEYS[6], cjson.encode({{member_id = ARGV[1], coupon_id = coupon_id}}))
+end
+return coupon_id
+"""
+
+# KEYS[1] 예약 HASH, KEYS[2] 회원별 쿠폰 HASH, KEYS[3] 예약 ZSET, KEYS[4] 쿠폰 정보 키, KEYS[5] 만료 순서 인덱스
+# ARGV[1] member_id, ARGV[2] 현재 시각 (밀리초), ARGV[3] KEYS[4] / KEYS[5] 를 만든 coupon_id
+# 쿠폰 정보 / 인덱스 키는 먼저 읽은 예약 HASH 로 만들어 KEYS 로 넘긴다 (예약이 그 사이 바뀌었으면 쓰지 않고 -1).
+# 확정되면 (이미 확정된 경우 포함) coupon_id, 예약이 없으면 -1, 예약 시간이 지났으면 -2 를 반환
+CONFIRM_SCRIPT = f"""
+local hold = redis.call('ZSCORE', KEYS[3], ARGV[1])
+if not hold then
+    local issued = redis.call('HGET', KEYS[2], ARGV[1])
+    if issued and issued ~= 'pending' then
+        return issued
+    end
+    return {NOT_FOUND}
+end
+local coupon_id = redis.call('HGET', KEYS[1], 'coupon_id')
+if tonumber(hold) <= tonumber(ARGV[2]) or not coupon_id then
+    return {EXPIRED}
+end
+if coupon_id ~= ARGV[3] then
+    return {NOT_FOUND}
+end
+local expiry = redis.call('HGET', KEYS[1], 'expiry')
+redis.call('SET', KEYS[4], redis.call('HGET', KEYS[1], 'data'))
+redis.call('EXPIREAT', KEYS[4], expiry)
+redis.call('HSET', KEYS[2], ARGV[1], coupon_id)
+redis.call('ZADD', KEYS[5], expiry, coupon_id)
+redis.call('EXPIREAT', KEYS[5], tonumber(expiry) + {expiry_index.INDEX_RETENTION})
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('DEL', KEYS[1])
+return coupon_id
+"""
+
+# KEYS 는 RESERVE 와 같음 (KEYS[6] 제외), ARGV[1] member_id, ARGV[2] 현재 시각 (밀리초, 0 이면 만료와 관계없이 해제),
+# ARGV[3] 쿠폰 ID 접두사, 이후 ARGV 는 dedup.script_args. 해제하면 1, 해제할 예약이 없으면 0
+RELEASE_SCRIPT_TEMPLATE = """
+local hold = redis.call('ZSCORE', KEYS[5], ARGV[1])
+if not hold or (tonumber(ARGV[2]) > 0 and tonumber(hold) > tonumber(ARGV[2])) then
+    return 0
+end
+{give}
+{release}
+redis.call('ZREM', KEYS[5], ARGV[1])
+redis.call('DEL', KEYS[3])
+return 1
+"""
+
+
+def check_mode(layout, shards):
+    """예약은 channel 레이아웃의 단일 재고 키에서만 지원"""
+    if layout == issuance.RECORD_LAYOUT_MEMBER:
+        raise ValueError("coupon reservations require the channel record layout")
+    if shards > 1:
+        raise ValueError("coupon reservations require a single stock key (shards=1)")
+
+
+def reservation_key(coupon_key, member_id):
+    return f"reservation:{{{coupon_key}}}:{member_id}"
+
+
+def reservations_key(coupon_key):
+    return f"reservations:{{{coupon_key}}}"
+
+
+def outbox_key(coupon_key):
+    return f"reservation_outbox:{{{coupon_key}}}"
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def _stock_key(coupon_key, inventory_mode):
+    if inventory_mode == issuance.INVENTORY_TOKENS:
+        return token_pool.pool_key(coupon_key)
+    return coupon_key
+
+
+def _script_keys(coupon_key, member_id, index, inventory_mode):
+    return [
+        _stock_key(coupon_key, inventory_mode),
+        index.script_key(coupon_key, member_id, _stock_key(coupon_key, inventory_mode)),
+        reservation_key(coupon_key, member_id),
+        issuance.member_coupons_key(coupon_key),
+        reservations_key(coupon_key),
+    ]
+
+
+def get_reserve_script(redis_client, index, inventory_mode=issuance.INVENTORY_COUNTER):
+    take = TOKEN_TAKE_LUA if inventory_mode == issuance.INVENTORY_TOKENS else COUNTER_TAKE_LUA
+    return issuance.get_script(redis_client, RESERVE_SCRIPT_TEMPLATE.format(
+        check=index.lua_check, claim=index.lua_claim, take=take))
+
+
+def get_release_script(redis_client, index, inventory_mode=issuance.INVENTORY_COUNTER):
+    give = TOKEN_GIVE_LUA if inventory_mode == issuance.INVENTORY_TOKENS else COUNTER_GIVE_LUA
+    return issuance.get_script(redis_client, RELEASE_SCRIPT_TEMPLATE.format(give=give, release=index.lua_release))
+
+
+def reserve(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, dedup_backend=dedup.DEDUP_SET,
+            inventory_mode=issuance.INVENTORY_COUNTER, ttl=RESERVATION_TTL, now=None,
+            auto_confirm=RESERVATION_AUTO_CONFIRM):
+    """
+    중복 체크, 재고 차감, 예약 기록 (auto_confirm 이면 확정 메시지 outbox 등록까지) 을 한 번의 EVALSHA 로 처리.
+    (결과 코드, coupon_id, 예약 만료 밀리초) 를 반환. 재고가 없으면 만료된 예약을 풀고 한 번 더 시도한다.
+    스크립트 밖에서 등록하는 인덱스 (bitmap) 는 먼저 등록하고 예약하지 못하면 되돌린다.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    now = now_ms() if now is None else now
+    reserved_until = now + ttl * 1000
+    if inventory_mode == issuance.INVENTORY_TOKENS:
+        coupon_id = token_pool.coupon_id_prefix(coupon_key)
+    else:
+        coupon_id = issuance.new_coupon_id(coupon_key)
+    keys = _script_keys(coupon_key, member_id, index, inventory_mode) + [outbox_key(coupon_key)]
+    args = [member_id, coupon_id, codec.encode(coupon_data), expiry_timestamp, reserved_until,
+            expiry_index.index_key(coupon_key, expiry_timestamp), "1" if auto_confirm else "0",
+            *index.script_args(member_id)]
+    script = get_reserve_script(redis_client, index, inventory_mode)
+    claim = [(coupon_key, member_id)]
+    if not dedup.claim_outside(redis_client, index, claim)[0]:
+        metrics.increment("reservations_rejected")
+        return issuance.ALREADY_RECEIVED, None, None
+
+    try:
+        with metrics.timer("reserve_script"):
+            result, coupon_id = token_pool.issue_result(script(keys=keys, args=args, client=redis_client))
+        if result == issuance.SOLD_OUT and release_expired(redis_client, coupon_key, dedup_backend, inventory_mode,
+                                                           now):
+            with metrics.timer("reserve_script"):
+                result, coupon_id = token_pool.issue_result(script(keys=keys, args=args, client=redis_client))
+    except Exception:
+        dedup.release_outside(redis_client, index, claim)
+        raise
+    if result != issuance.ISSUED:
+        dedup.release_outside(redis_client, index, claim)
+    metrics.increment("reservations" if result == issuance.ISSUED else "reservations_rejected")
+    return result, coupon_id, reserved_until if coupon_id else None
+
+
+def confirm_result(result):
+    """확정 스크립트 결과를 (결과 코드, coupon_id) 로"""
+    if isinstance(result, (bytes, str)):
+        return issuance.ISSUED, result.decode() if isinstance(result, bytes) else result
+    return int(result), None
+
+
+def confirm_batch(redis_client, requests, dedup_backend=dedup.DEDUP_SET, inventory_mode=issuance.INVENTORY_COUNTER,
+                  now=None):
+    """
+    (coupon_key, member_id) 목록의 예약을 HMGET 파이프라인 (쿠폰 정보 / 인덱스 키를 만들 coupon_id, 인덱스 키) 과
+    EVALSHA 파이프라인, 두 번으로 확정. 스크립트가 쓰는 키는 모두 KEYS 로 넘긴다.
+    결과는 같은 순서의 (결과 코드, coupon_id) 또는 예외. 예약 시간이 지난 예약은 풀어 재고를 되돌린다.
+    """
+    if not requests:
+        return []
+    now = now_ms() if now is None else now
+    script = issuance.get_script(redis_client, CONFIRM_SCRIPT)
+    pipe = redis_client.pipeline()
+    for coupon_key, member_id in requests:
+        pipe.hmget(reservation_key(coupon_key, member_id), "coupon_id", "index")
+    held = pipe.execute()
+    commands = [_confirm_command(coupon_key, member_id, now, *fields)
+                for (coupon_key, member_id), fields in zip(requests, held)]
+    with metrics.timer("confirm_script"):
+        results = issuance.evalsha_pipeline(redis_client, script, commands)
+    confirmed = [result if isinstance(result, Exception) else confirm_result(result) for result in results]
+
+    expired = [request for request, result in zip(requests, confirmed)
+               if not isinstance(result, Exception) and result[0] == EXPIRED]
+    if expired:
+        _release_many(redis_client, expired, dedup_backend, inventory_mode, now)
+    metrics.increment("reservations_expired", len(expired))
+    return confirmed
+
+
+def _confirm_command(coupon_key, member_id, now, coupon_id, index_key):
+    # 예약이 없으면 쿠폰 정보 / 인덱스 자리에 예약 HASH 키를 넘긴다 (스크립트가 쓰지 않고 결과 코드만 반환)
+    key = reservation_key(coupon_key, member_id)
+    if not coupon_id or not index_key:
+        return ([key, issuance.member_coupons_key(coupon_key), reservations_key(coupon_key), key, key],
+                [member_id, now, ""])
+    coupon_id = _decode(coupon_id)
+    return ([key, issuance.member_coupons_key(coupon_key), reservations_key(coupon_key),
+             issuance.coupon_record_key(coupon_id), _decode(index_key)], [member_id, now, coupon_id])
+
+
+def confirm(redis_client, coupon_key, member_id, dedup_backend=dedup.DEDUP_SET,
+            inventory_mode=issuance.INVENTORY_COUNTER, now=None):
+    """예약 하나를 확정하고 (결과 코드, coupon_id) 를 반환"""
+    result = confirm_batch(redis_client, [(coupon_key, member_id)], dedup_backend, inventory_mode, now)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def release(redis_client, coupon_key, member_id, dedup_backend=dedup.DEDUP_SET,
+            inventory_mode=issuance.INVENTORY_COUNTER):
+    """확정 전 예약을 취소하고 재고를 되돌림. 취소했으면 True"""
+    return bool(_release_many(redis_client, [(coupon_key, member_id)], dedup_backend, inventory_mode, 0))
+
+
+def release_expired(redis_client, coupon_key, dedup_backend=dedup.DEDUP_SET,
+                    inventory_mode=issuance.INVENTORY_COUNTER, now=None, limit=SWEEP_LIMIT):
+    """예약 시간이 지난 예약을 최대 limit 개 풀고 되돌린 수를 반환 (확정과 겹쳐도 스크립트가 다시 확인)"""
+    now = now_ms() if now is None else now
+    members = redis_client.zrangebyscore(reservations_key(coupon_key), "-inf", now, start=0, num=limit)
+    if not members:
+        return 0
+    return _release_many(redis_client, [(coupon_key, _decode(member_id)) for member_id in members],
+                         dedup_backend, inventory_mode, now)
+
+
+def _release_many(redis_client, reservations, dedup_backend, inventory_mode, now):
+    index = dedup.get_dedup_index(dedup_backend)
+    commands = [(_script_keys(coupon_key, member_id, index, inventory_mode),
+                 [member_id, now, token_pool.coupon_id_prefix(coupon_key), *index.script_args(member_id)])
+                for coupon_key, member_id in reservations]
+    with metrics.timer("release_script"):
+        results = issuance.evalsha_pipeline(redis_client, get_release_script(redis_client, index, inventory_mode),
+                                            commands)
+    released = [reservation for reservation, result in zip(reservations, results)
+                if not isinstance(result, Exception) and int(result) == 1]
+    dedup.release_outside(redis_client, index, released)
+    # 이 컨테이너가 중복으로 캐시해 둔 회원은 다시 예약할 수 있게 지우고, 되돌린 재고가 다른 컨테이너의
+    # 소진 캐시에 가려지지 않게 버전을 올린다
+    for coupon_key, member_id in released:
+        negative_cache.forget(coupon_key, member_id)
+    if released:
+        negative_cache.bump_version(redis_client)
+    metrics.increment("reservations_released", len(released))
+    return len(released)
+
+
+def relay_outbox(redis_client, sender, coupon_key, chunk_size=RELAY_CHUNK):
+    """
+    outbox 의 확정 메시지 (자동 확정일 때만 쌓인다) 를 sqs_batch.BatchSender 로 보내고, 모두 보낸 만큼만 outbox 에서 지운다.
+    보내지 못한 메시지가 있으면 남겨 두어 다음 relay 에서 다시 보낸다 (확정은 여러 번 처리해도 같은 결과).
+    보낸 메시지 수를 반환.
+    """
+    key = outbox_key(coupon_key)
+    relayed = 0
+    while True:
+        entries = redis_client.lrange(key, 0, chunk_size - 1)
+        if not entries:
+            return relayed
+        failed = len(sender.failed)
+        for entry in entries:
+            sender.add(dict(json.loads(entry), action="confirm", coupon_key=coupon_key))
+        sender.flush()
+        if len(sender.failed) > failed:
+            return relayed
+        redis_client.ltrim(key, len(entries), -1)
+        relayed += len(entries)
+        if len(entries) < chunk_size:
+            return relayed
+
+
+def parse_confirm_records(records):
+    """
+    SQS 레코드 중 확정 메시지를 골라냄.
+    ([(messageId, coupon_key, member_id)], 나머지 레코드) 를 반환 (파싱할 수 없는 레코드는 나머지로).
+    """
+    confirms = []
+    others = []
+    for record in records:
+        try:
+            message = json.loads(record['body'])
+        except (json.JSONDecodeError, TypeError):
+            others.append(record)
+            continue
+        if isinstance(message, dict) and message.get("action") == "confirm":
+            confirms.append((record.get('messageId'), message.get("coupon_key"), message.get("member_id")))
+        else:
+            others.append(record)
+    return confirms, others
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
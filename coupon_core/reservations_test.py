@@ -0,0 +1,104 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from coupon_core import dedup, issuance, reservations
+
+
+class TestReservations(unittest.TestCase):
+
+    def setUp(self):
+        # 다른 테스트가 캐시한 스크립트 객체 대신 이 테스트의 mock 을 쓰도록 (끝나면 mock 도 비움)
+        issuance._scripts.clear()
+        self.addCleanup(issuance._scripts.clear)
+
+    def test_reserve_keys_share_stock_slot(self):
+        redis_client = MagicMock()
+        script = redis_client.register_script.return_value
+        script.return_value = b"{online.sale}-abc"
+
+        result = reservations.reserve(redis_client, "online.sale", "12345", {"member_id": "12345"}, 1700000000,
+                                      inventory_mode=issuance.INVENTORY_TOKENS, ttl=60, now=1000)
+
+        self.assertEqual(result, (issuance.ISSUED, "{online.sale}-abc", 61000))
+        keys = script.call_args[1]["keys"]
+        self.assertEqual(keys[0], "tokens:{online.sale}")
+        self.assertTrue(all("{online.sale}" in key for key in keys))
+        self.assertEqual(script.call_args[1]["args"][1], "{online.sale}-")
+
+    @patch('coupon_core.reservations.release_expired')
+    def test_sold_out_releases_expired_reservations_and_retries(self, mock_release_expired):
+        redis_client = MagicMock()
+        script = redis_client.register_script.return_value
+        script.side_effect = [issuance.SOLD_OUT, b"{online}-abc"]
+        mock_release_expired.return_value = 1
+
+        result, coupon_id, _ = reservations.reserve(redis_client, "online", "12345", {}, 1700000000, now=1000)
+
+        self.assertEqual((result, coupon_id), (issuance.ISSUED, "{online}-abc"))
+        mock_release_expired.assert_called_once_with(redis_client, "online", dedup.DEDUP_SET,
+                                                     issuance.INVENTORY_COUNTER, 1000)
+
+    def test_reserve_pushes_confirm_message_only_when_auto_confirm(self):
+        redis_client = MagicMock()
+        script = redis_client.register_script.return_value
+        script.return_value = b"{online}-abc"
+
+        reservations.reserve(redis_client, "online", "12345", {}, 1700000000, now=1000, auto_confirm=False)
+        self.assertEqual(script.call_args[1]["args"][6], "0")
+        reservations.reserve(redis_client, "online", "12345", {}, 1700000000, now=1000, auto_confirm=True)
+        self.assertEqual(script.call_args[1]["args"][6], "1")
+        self.assertIn("if ARGV[7] == '1' then", redis_client.register_script.call_args[0][0])
+
+    @patch('coupon_core.issuance.evalsha_pipeline')
+    def test_confirm_passes_every_written_key(self, mock_evalsha_pipeline):
+        redis_client = MagicMock()
+        redis_client.pipeline.return_value.execute.return_value = [
+            [b"{online}-abc", b"expiring:{online}:472222"], [None, None]]
+        mock_evalsha_pipeline.return_value = [b"{online}-abc", reservations.NOT_FOUND]
+
+        results = reservations.confirm_batch(redis_client, [("online", "1"), ("online", "2")], now=1000)
+
+        self.assertEqual(results, [(issuance.ISSUED, "{online}-abc"), (reservations.NOT_FOUND, None)])
+        self.assertNotIn("'coupon:' ..", reservations.CONFIRM_SCRIPT)
+        (keys, args), (missing_keys, missing_args) = mock_evalsha_pipeline.call_args[0][2]
+        self.assertEqual(keys[3:], ["coupon:{online}-abc", "expiring:{online}:472222"])
+        self.assertEqual(args, ["1", 1000, "{online}-abc"])
+        self.assertTrue(all("{online}" in key for key in keys))
+        # 예약이 없으면 쓰지 않을 자리에 예약 HASH 키를 넘긴다
+        self.assertEqual(missing_keys[3:], ["reservation:{online}:2"] * 2)
+        self.assertEqual(missing_args, ["2", 1000, ""])
+
+    def test_relay_keeps_outbox_until_all_messages_are_sent(self):
+        redis_client = MagicMock()
+        redis_client.lrange.return_value = [json.dumps({"member_id": "1", "coupon_id": "{online}-a"})]
+        sender = MagicMock(failed=[])
+
+        def flush():
+            sender.failed.append("entry")
+
+        sender.flush.side_effect = flush
+        self.assertEqual(reservations.relay_outbox(redis_client, sender, "online"), 0)
+        redis_client.ltrim.assert_not_called()
+
+        sender = MagicMock(failed=[])
+        self.assertEqual(reservations.relay_outbox(redis_client, sender, "online"), 1)
+        sender.add.assert_called_once_with({"member_id": "1", "coupon_id": "{online}-a", "action": "confirm",
+                                            "coupon_key": "online"})
+        redis_client.ltrim.assert_called_once_with("reservation_outbox:{online}", 1, -1)
+
+    def test_parse_confirm_records(self):
+        records = [
+            {"messageId": "1", "body": json.dumps({"action": "confirm", "coupon_key": "online", "member_id": "7"})},
+            {"messageId": "2", "body": json.dumps({"member_id": "8"})},
+            {"messageId": "3", "body": "not json"},
+        ]
+
+        confirms, others = reservations.parse_confirm_records(records)
+
+        self.assertEqual(confirms, [("1", "online", "7")])
+        self.assertEqual([record["messageId"] for record in others], ["2", "3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from coupon_core import metrics
+
+# SendMessageBatch 제한: 최대 10개 / 요청 전체 256KB
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+
+# 실패한 항목 재전송 횟수와 기본 대기 시간(초, 시도마다 2배)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.1
+
+
+def message_group_id(payload, message_groups):
+    """member_id (없으면 coupon_id) 해시로 FIFO 메시지 그룹을 분산"""
+    group_key = str(payload.get('member_id') or payload.get('coupon_id') or '')
+    return f"coupon-{zlib.crc32(group_key.encode()) % message_groups}"
+
+
+class BatchSender:
+    """
+    SQS FIFO 큐로 보낼 메시지를 10개 / 256KB 단위 send_message_batch 로 묶어
+    제한된 스레드 풀에서 병렬 전송. 실패한 항목만 다시 보낸다.
+
+        with BatchSender(sqs_client, queue_url) as sender:
+            for payload in payloads:
+                sender.add(payload)
+    """
+
+    def __init__(self, sqs_client, queue_url, message_groups=16, max_workers=4,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.message_groups = message_groups
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 대기 중인 배치 수를 제한해 메모리 사용량을 일정하게 유지
+        self._in_flight = threading.BoundedSemaphore(max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures = []
+        self._entries = []
+        self._entries_bytes = 0
+        self.sent = 0
+        self.failed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, payload):
+        """페이로드를 버퍼에 담고 배치가 차면 전송을 예약"""
+        body = json.dumps(payload)
+        entry = {
+            'MessageBody': body,
+            'MessageGroupId': message_group_id(payload, self.message_groups),
+            'MessageDeduplicationId': payload['coupon_id'],  # 중복 메시지를 피하기 위한 고유 ID
+        }
+        size = len(body.encode())
+        if self._entries and (len(self._entries) >= MAX_BATCH_ENTRIES
+                              or self._entries_bytes + size > MAX_BATCH_BYTES):
+            self._submit()
+        self._entries.append(entry)
+        self._entries_bytes += size
+
+    def flush(self):
+        """버퍼에 남은 메시지를 보내고 예약된 모든 배치가 끝날 때까지 대기"""
+        if self._entries:
+            self._submit()
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        return {"sent": self.sent, "failed": len(self.failed)}
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _submit(self):
+        entries = self._entries
+        self._entries = []
+        self._entries_bytes = 0
+        self._in_flight.acquire()
+        future = self._executor.submit(self._send_batch, entries)
+        future.add_done_callback(lambda _: self._in_flight.release())
+        self._futures.append(future)
+
+    def _send_batch(self, entries):
+        pending = {str(index): entry for index, entry in enumerate(entries)}
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timer("sqs_send"):
+                    response = self.sqs_client.send_message_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=[dict(entry, Id=entry_id) for entry_id, entry in pending.items()],
+                    )
+            except Exception as e:
+                # 요청 전체 실패 (스로틀링 등) 는 배치 그대로 재시도
+                print(f"SQS send_message_batch error (attempt {attempt + 1}): {e}")
+                response = {'Failed': [{'Id': entry_id, 'SenderFault': False, 'Message': str(e)}
+                                       for entry_id in pending]}
+
+            successful = len(response.get('Successful', []))
+            retry = {}
+            for failure in response.get('Failed', []):
+                entry = pending[failure['Id']]
+                if failure.get('SenderFault'):
+                    # 잘못된 요청은 다시 보내도 실패하므로 바로 실패 처리
+                    self._record_failure(entry, failure)
+                else:
+                    retry[failure['Id']] = entry
+
+            with self._lock:
+                self.sent += successful
+
+            if not retry:
+                return
+            pending = retry
+            metrics.increment("sqs_retries", len(retry))
+            if attempt < self.max_retries:
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+        for entry_id, entry in pending.items():
+            self._record_failure(entry, {'Id': entry_id, 'Message': 'retries exhausted'})
+
+    def _record_failure(self, entry, failure):
+        print(f"Error sending message to SQS: {failure.get('Message')} ({entry['MessageDeduplicationId']})")
+        metrics.increment("sqs_failed")
+        with self._lock:
+            self.failed.append(entry)
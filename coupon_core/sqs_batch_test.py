@@ -0,0 +1,90 @@
+import json
+import threading
+import unittest
+
+from coupon_core import sqs_batch
+from coupon_core.sqs_batch import BatchSender
+
+
+class LocalSQS:
+    """send_message_batch 만 흉내 내는 로컬 SQS. fail_once 에 든 coupon_id 는 첫 전송에서 실패시킨다."""
+
+    def __init__(self, fail_once=(), sender_fault=()):
+        self.fail_once = set(fail_once)
+        self.sender_fault = set(sender_fault)
+        self.batches = []
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        successful, failed = [], []
+        with self._lock:
+            self.batches.append(Entries)
+            for entry in Entries:
+                coupon_id = entry['MessageDeduplicationId']
+                if coupon_id in self.sender_fault:
+                    failed.append({'Id': entry['Id'], 'SenderFault': True, 'Code': 'InvalidParameterValue'})
+                elif coupon_id in self.fail_once:
+                    self.fail_once.discard(coupon_id)
+                    failed.append({'Id': entry['Id'], 'SenderFault': False, 'Code': 'InternalError'})
+                else:
+                    self.messages.append(entry)
+                    successful.append({'Id': entry['Id']})
+        return {'Successful': successful, 'Failed': failed}
+
+
+def payload(index, size=0):
+    return {'coupon_id': f"online-{index}", 'member_id': f"user{index}", 'padding': "x" * size}
+
+
+class TestBatchSender(unittest.TestCase):
+
+    def test_packs_ten_entries_per_batch(self):
+        sqs = LocalSQS()
+        with BatchSender(sqs, "queue-url", max_workers=3) as sender:
+            for index in range(25):
+                sender.add(payload(index))
+
+        self.assertEqual(sender.sent, 25)
+        self.assertEqual(sorted(len(entries) for entries in sqs.batches), [5, 10, 10])
+
+    def test_splits_batches_by_payload_size(self):
+        sqs = LocalSQS()
+        with BatchSender(sqs, "queue-url") as sender:
+            for index in range(4):
+                sender.add(payload(index, size=100 * 1024))
+
+        for entries in sqs.batches:
+            self.assertLessEqual(sum(len(entry['MessageBody']) for entry in entries), sqs_batch.MAX_BATCH_BYTES)
+        self.assertEqual(len(sqs.messages), 4)
+
+    def test_retries_only_failed_entries(self):
+        sqs = LocalSQS(fail_once={"online-3"}, sender_fault={"online-7"})
+        sender = BatchSender(sqs, "queue-url", retry_backoff=0)
+        for index in range(10):
+            sender.add(payload(index))
+        result = sender.flush()
+        sender.close()
+
+        self.assertEqual(result, {"sent": 9, "failed": 1})
+        self.assertEqual([entry['MessageDeduplicationId'] for entry in sqs.batches[1]], ["online-3"])
+
+    def test_spreads_message_groups(self):
+        sqs = LocalSQS()
+        with BatchSender(sqs, "queue-url", message_groups=8) as sender:
+            for index in range(200):
+                sender.add(payload(index))
+
+        groups = {entry['MessageGroupId'] for entry in sqs.messages}
+        self.assertEqual(len(groups), 8)
+        # 같은 회원은 항상 같은 그룹
+        self.assertEqual(
+            sqs_batch.message_group_id({'member_id': "user1", 'coupon_id': "a"}, 8),
+            sqs_batch.message_group_id({'member_id': "user1", 'coupon_id': "b"}, 8),
+        )
+        coupon_ids = {json.loads(entry['MessageBody'])['coupon_id'] for entry in sqs.messages}
+        self.assertEqual(len(coupon_ids), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
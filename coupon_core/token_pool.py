@@ -0,0 +1,167 @@
+from coupon_core import codec, coupon_ids, dedup, issuance, metrics
+
+# tokens 재고 모드: 판매 전에 coupon_init 이 쿠폰 ID 뒷부분(토큰)을 미리 만들어 재고 키 슬롯의 LIST 에 넣어 둔다
+#  - tokens:{<coupon_key>}  토큰 LIST (남은 재고 = 길이). 재고 키 / 중복 체크 / 회원 HASH 와 같은 슬롯
+# 발급은 스크립트 한 번에서 LPOP 한 토큰을 회원에게 묶는 것으로 끝난다 (남은 토큰보다 많이 발급될 수 없음).
+# 쿠폰 ID 는 카운터 모드와 같은 {<coupon_key>}-<토큰> 이라 만료 인덱스 / 내보내기 / 아카이브는 그대로 쓴다
+# (ulid 토큰의 시각은 발급 시각이 아니라 미리 발급한 시각, 발급 시각은 쿠폰 정보의 issued_at).
+# 샤드 재고와 member 레이아웃은 카운터 모드에서만 지원 (풀은 채널 / 캠페인마다 하나, 서로 다른 슬롯에 퍼진다).
+
+# 미리 발급 시 한 번에 만들어 파이프라인 한 번으로 보낼 토큰 수 / RPUSH 한 명령에 넣을 토큰 수
+MINT_CHUNK = 100000
+MINT_PUSH_SIZE = 1000
+
+# KEYS[1] 토큰 LIST, KEYS[2] 중복 체크 인덱스, KEYS[3] 사용하지 않음 (토큰 LIST), KEYS[4] 회원별 쿠폰 HASH,
+# KEYS[5] 만료 순서 인덱스
+# ARGV[1] member_id, ARGV[2] 쿠폰 ID 접두사 ({<coupon_key>}-), ARGV[3] 쿠폰 JSON, ARGV[4] 만료 시각
+# 이후 ARGV 는 중복 체크 인덱스가 덧붙이는 인자 (dedup.script_args)
+# 쿠폰 ID 는 꺼낸 토큰으로 정해지므로 쿠폰 정보 키 coupon:{<coupon_key>}-<토큰> 은 KEYS 로 넘길 수 없어 스크립트 안에서 만든다.
+# 접두사 ARGV[2] 의 해시 태그 {<coupon_key>} 가 토큰 LIST 와 같아 이 키는 항상 KEYS[1] 과 같은 슬롯 (같은 노드) 에 놓이고,
+# 클러스터는 선언된 KEYS 로 노드를 고르므로 다른 슬롯 접근이 생기지 않는다 (token_pool_test 가 슬롯을 확인).
+# 발급되면 쿠폰 ID 를, 이미 받은 회원은 0, 토큰이 없으면 -1 을 반환
+TOKEN_ISSUE_SCRIPT_TEMPLATE = """
+if {check} then
+    return 0
+end
+local token = redis.call('LPOP', KEYS[1])
+if not token then
+    return -1
+end
+{claim}
+local coupon_id = ARGV[2] .. token
+local record_key = 'coupon:' .. coupon_id
+redis.call('SET', record_key, ARGV[3])
+redis.call('EXPIREAT', record_key, ARGV[4])
+redis.call('HSET', KEYS[4], ARGV[1], coupon_id)
+redis.call('ZADD', KEYS[5], ARGV[4], coupon_id)
+redis.call('EXPIREAT', KEYS[5], tonumber(ARGV[4]) + {retention})
+return coupon_id
+"""
+
+
+def check_mode(layout, shards):
+    """tokens 모드는 channel 레이아웃의 단일 재고 키에서만 지원"""
+    if layout == issuance.RECORD_LAYOUT_MEMBER:
+        raise ValueError("tokens inventory mode requires the channel record layout")
+    if shards > 1:
+        raise ValueError("tokens inventory mode requires a single stock key (shards=1)")
+
+
+def pool_key(coupon_key):
+    """재고 키별 토큰 LIST 키 (재고 키와 같은 슬롯)"""
+    return f"tokens:{{{coupon_key}}}"
+
+
+def coupon_id_prefix(coupon_key):
+    return f"{{{coupon_key}}}-"
+
+
+def mint_tokens(redis_client, coupon_key, quantity, replace=False, id_format=None, chunk_size=MINT_CHUNK,
+                push_size=MINT_PUSH_SIZE):
+    """
+    토큰 quantity 개를 만들어 풀 뒤에 추가하고 풀 크기를 반환 (replace 면 남은 토큰을 지우고 새로 채움).
+    chunk_size 개씩 만들고 바로 RPUSH 파이프라인으로 보내므로 메모리는 청크 하나 크기로 유지된다.
+    토큰은 한 슬롯에 있어 청크마다 노드 한 곳과 한 번 왕복.
+    """
+    key = pool_key(coupon_key)
+    with metrics.timer("token_mint"):
+        if replace:
+            redis_client.delete(key)
+        for start in range(0, quantity, chunk_size):
+            tokens = coupon_ids.new_ids(min(chunk_size, quantity - start), id_format)
+            pipe = redis_client.pipeline()
+            for offset in range(0, len(tokens), push_size):
+                pipe.rpush(key, *tokens[offset:offset + push_size])
+            pipe.execute()
+    metrics.increment("tokens_minted", quantity)
+    return pool_size(redis_client, coupon_key)
+
+
+def pool_size(redis_client, coupon_key):
+    """남은 토큰 수"""
+    return int(redis_client.llen(pool_key(coupon_key)))
+
+
+def get_issue_script(redis_client, index=None):
+    index = index or dedup.get_dedup_index(dedup.DEDUP_SET)
+    return issuance.get_script(redis_client, issuance.script_source(TOKEN_ISSUE_SCRIPT_TEMPLATE, index))
+
+
+def issue_script_keys(coupon_key, member_id, index, expiry_timestamp):
+    keys = issuance.issue_script_keys(coupon_key, "", member_id, index, expiry_timestamp)
+    keys[0] = keys[2] = pool_key(coupon_key)
+    return keys
+
+
+def issue_script_args(coupon_key, member_id, coupon_data, expiry_timestamp, index):
+    return [member_id, coupon_id_prefix(coupon_key), codec.encode(coupon_data), expiry_timestamp,
+            *index.script_args(member_id)]
+
+
+def issue_result(result):
+    """스크립트 결과를 (결과 코드, coupon_id) 로"""
+    if isinstance(result, bytes):
+        return issuance.ISSUED, result.decode()
+    if isinstance(result, str):
+        return issuance.ISSUED, result
+    return int(result), None
+
+
+def issue_coupon(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, dedup_backend=dedup.DEDUP_SET):
+    """
+    중복 체크, 토큰 꺼내기, 쿠폰 저장, TTL, 회원 인덱스를 한 번의 EVALSHA 로 처리. (결과 코드, coupon_id) 를 반환.
+    스크립트 밖에서 등록하는 인덱스 (bitmap) 는 먼저 등록하고 발급하지 못하면 되돌린다.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    keys = issue_script_keys(coupon_key, member_id, index, expiry_timestamp)
+    claim = [(coupon_key, member_id)]
+    if not dedup.claim_outside(redis_client, index, claim)[0]:
+        return issuance.ALREADY_RECEIVED, None
+    try:
+        with metrics.timer("issue_script"):
+            result = issue_result(get_issue_script(redis_client, index)(
+                keys=keys,
+                args=issue_script_args(coupon_key, member_id, coupon_data, expiry_timestamp, index),
+                client=redis_client,
+            ))
+    except Exception:
+        dedup.release_outside(redis_client, index, claim)
+        raise
+    if result[0] != issuance.ISSUED:
+        dedup.release_outside(redis_client, index, claim)
+    return result
+
+
+def issue_coupons_batch(redis_client, coupon_key, requests, dedup_backend=dedup.DEDUP_SET):
+    """
+    issuance.issue_coupons_script_batch 의 tokens 모드 버전 (풀이 한 슬롯이라 배치당 왕복 1회).
+    requests 는 (member_id, coupon_data, expiry_timestamp) 목록, 결과는 같은 순서의 (결과 코드, coupon_id) 또는 예외.
+    """
+    index = dedup.get_dedup_index(dedup_backend)
+    script = get_issue_script(redis_client, index)
+    issued = [None] * len(requests)
+    commands = {}
+    for position, (member_id, coupon_data, expiry_timestamp) in enumerate(requests):
+        try:
+            keys = issue_script_keys(coupon_key, member_id, index, expiry_timestamp)
+            args = issue_script_args(coupon_key, member_id, coupon_data, expiry_timestamp, index)
+        except ValueError as e:
+            issued[position] = e
+            continue
+        commands[position] = (keys, args)
+
+    claimed = dedup.claim_outside(redis_client, index, [(coupon_key, requests[position][0]) for position in commands])
+    for position, first in zip(list(commands), claimed):
+        if not first:
+            issued[position] = (issuance.ALREADY_RECEIVED, None)
+            del commands[position]
+
+    with metrics.timer("issue_script"):
+        results = issuance.evalsha_pipeline(redis_client, script, list(commands.values())) if commands else []
+    unclaimed = []
+    for position, result in zip(commands, results):
+        issued[position] = result if isinstance(result, Exception) else issue_result(result)
+        if isinstance(result, Exception) or issued[position][0] != issuance.ISSUED:
+            unclaimed.append((coupon_key, requests[position][0]))
+    dedup.release_outside(redis_client, index, unclaimed)
+    return issued
@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import MagicMock
+
+from rediscluster.nodemanager import NodeManager
+from rediscluster.pipeline import ClusterPipeline
+
+from coupon_core import dedup, issuance, token_pool
+
+keyslot = NodeManager(startup_nodes=[{"host": "localhost", "port": 6379}]).keyslot
+
+
+class TestTokenPool(unittest.TestCase):
+
+    def test_mint_streams_chunks_through_pipelines(self):
+        redis_client = MagicMock()
+        pipes = [MagicMock(), MagicMock(), MagicMock()]
+        redis_client.pipeline.side_effect = pipes
+        redis_client.llen.return_value = 25
+
+        size = token_pool.mint_tokens(redis_client, "online", 25, replace=True, chunk_size=10, push_size=4)
+
+        self.assertEqual(size, 25)
+        redis_client.delete.assert_called_once_with("tokens:{online}")
+        self.assertEqual([pipe.rpush.call_count for pipe in pipes], [3, 3, 2])
+        pushed = [token for pipe in pipes for call in pipe.rpush.call_args_list for token in call[0][1:]]
+        self.assertEqual(len(set(pushed)), 25)
+
+    def test_script_keys_share_stock_slot(self):
+        for name in (dedup.DEDUP_SET, dedup.DEDUP_BITMAP, dedup.DEDUP_BLOOM):
+            keys = token_pool.issue_script_keys("online.sale", "12345", dedup.get_dedup_index(name), 1700000000)
+
+            self.assertEqual(keys[0], "tokens:{online.sale}")
+            self.assertEqual({keyslot(key) for key in keys}, {keyslot("{online.sale}")})
+
+    def test_record_key_built_in_script_shares_pool_slot(self):
+        # 스크립트가 접두사 + 토큰으로 만드는 쿠폰 정보 키는 선언된 토큰 LIST 와 같은 슬롯이어야 한다
+        for coupon_key in ("online", "offline", "online.sale"):
+            record_key = issuance.coupon_record_key(token_pool.coupon_id_prefix(coupon_key) + "01HZX3")
+            self.assertEqual(keyslot(record_key), keyslot(token_pool.pool_key(coupon_key)))
+
+    def test_batch_queues_evalsha_on_cluster_pipeline(self):
+        pool = MagicMock()
+        pool.nodes.keyslot = keyslot
+        pipe = ClusterPipeline(connection_pool=pool)
+        sent = []
+
+        def send_cluster_commands(stack, raise_on_error=True, allow_redirections=True):
+            sent.extend((command.args[0], pipe._determine_slot(*command.args)) for command in stack)
+            return [b"{online}-tok1", -1]
+
+        pipe.send_cluster_commands = send_cluster_commands
+        redis_client = MagicMock()
+        redis_client.pipeline.return_value = pipe
+        issuance._scripts.clear()
+        self.addCleanup(issuance._scripts.clear)
+
+        results = token_pool.issue_coupons_batch(
+            redis_client, "online", [("1", {"member_id": "1"}, 1700000000), ("2", {"member_id": "2"}, 1700000000)])
+
+        self.assertEqual(sent, [("EVALSHA", keyslot("tokens:{online}"))] * 2)
+        self.assertEqual(results, [(issuance.ISSUED, "{online}-tok1"), (issuance.SOLD_OUT, None)])
+
+    def test_sold_out_releases_bitmap_claim(self):
+        issuance._scripts.clear()
+        self.addCleanup(issuance._scripts.clear)
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.side_effect = [[0], []]
+        redis_client.register_script.return_value.return_value = -1
+
+        result = token_pool.issue_coupon(redis_client, "online", "7", {}, 1700000000, dedup.DEDUP_BITMAP)
+
+        self.assertEqual(result, (issuance.SOLD_OUT, None))
+        self.assertEqual([call[0] for call in pipe.setbit.call_args_list],
+                         [("received_bits:{online:0}", 7, 1), ("received_bits:{online:0}", 7, 0)])
+
+    def test_issue_result_maps_popped_token_to_coupon_id(self):
+        self.assertEqual(token_pool.issue_result(b"{online}-abc"), (issuance.ISSUED, "{online}-abc"))
+        self.assertEqual(token_pool.issue_result(-1), (issuance.SOLD_OUT, None))
+        self.assertEqual(token_pool.issue_result(0), (issuance.ALREADY_RECEIVED, None))
+
+    def test_tokens_mode_requires_single_channel_stock_key(self):
+        with self.assertRaises(ValueError):
+            token_pool.check_mode(issuance.RECORD_LAYOUT_CHANNEL, 4)
+        with self.assertRaises(ValueError):
+            token_pool.check_mode(issuance.RECORD_LAYOUT_MEMBER, 1)
+        token_pool.check_mode(issuance.RECORD_LAYOUT_CHANNEL, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
+import os
 import json
+import time
 import pytz
 import logging
-from rediscluster import RedisCluster
 import pymysql
 
+from coupon_core import archive, batch, bulk_archive, campaigns, clients, codec, expiry_index, idempotency, metrics
+
 # 로거 설정
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -13,15 +16,14 @@ redis_host = "REDIS_HOST"
 redis_port = 6379
 
 def get_redis_client():
-    """Redis 클러스터 연결"""
-    redis_client = RedisCluster(
-        host=redis_host,
-        port=redis_port,
+    """Redis 클러스터 연결 (웜 컨테이너에서 재사용)"""
+    return clients.get_redis_client(
+        redis_host,
+        redis_port,
         ssl=True,  # TLS 연결 활성화
         ssl_cert_reqs=None,
         skip_full_coverage_check=True
     )
-    return redis_client
 
 # Aurora MySQL 연결 설정
 rds_host = 'RDS_HOST'
@@ -29,13 +31,46 @@ username = 'admin'
 password = 'password'
 database = 'event_db'
 
+# 배치 모드: Records 전체를 청크별 다중 행 INSERT 로 한 트랜잭션에 저장하고 batchItemFailures 로 부분 실패 보고
+batch_mode = os.environ.get("COUPON_BATCH_MODE", "false").lower() == "true"
+insert_chunk_size = int(os.environ.get("COUPON_INSERT_CHUNK_SIZE", str(archive.INSERT_CHUNK_SIZE)))
+
+# 대량 보관 ({"action": "bulk_archive"} 로 직접 호출): SQS 를 거치지 않고 LOAD DATA 로 일괄 적재
+# index 소스는 발급 Lambda 의 COUPON_STOCK_SHARDS 와 같은 값으로 샤드별 인덱스를 확인
+stock_shards = int(os.environ.get("COUPON_STOCK_SHARDS", "1"))
+coupon_channels = ("offline", "online")
+
+# 멱등 원장 (COUPON_IDEMPOTENCY_LEDGER): 보관을 끝낸 coupon_id 의 응답을 저장해 두고
+# SQS 재전송이나 내보내기가 다시 보낸 쿠폰은 Aurora 를 거치지 않고 처음 응답을 그대로 돌려준다
+ledger = idempotency.Ledger("coupon_expired_db")
+
 def get_db_connection():
-    """Aurora MySQL 연결"""
-    connection = pymysql.connect(host=rds_host, user=username, password=password, database=database)
-    return connection
+    """Aurora MySQL 연결 (웜 컨테이너에서 재사용)"""
+    return clients.get_db_connection(rds_host, username, password, database)
+
+def get_bulk_db_connection():
+    """LOAD DATA LOCAL INFILE 을 허용한 Aurora MySQL 연결 (대량 보관 전용)"""
+    return clients.get_db_connection(rds_host, username, password, database, local_infile=True)
+
+def archive_response(coupon_id, outcome):
+    """보관 결과 (archive.INSERTED / DUPLICATE) 를 단건 처리와 같은 응답으로 (원장에 저장하는 값)"""
+    if outcome == archive.DUPLICATE:
+        return {"statusCode": 400, "body": json.dumps(f"Coupon {coupon_id} already issued.")}
+    return {"statusCode": 200, "body": json.dumps("Coupon processed successfully.")}
+
+def message_coupon_id(record):
+    """SQS 레코드 본문의 coupon_id (파싱할 수 없으면 None, 원장에서 건너뜀)"""
+    try:
+        return json.loads(record['body']).get('coupon_id')
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return None
 
-def process_sqs_message(message_body):
-    """SQS 메시지를 파싱하고 쿠폰을 발급"""
+def process_sqs_message(message_body, replayed=None):
+    """
+    SQS 메시지를 파싱하고 쿠폰을 발급.
+    replayed 는 호출한 쪽이 Records 전체의 coupon_id 를 ledger.lookup 으로 한 번에 조회한 결과
+    (주지 않으면 이 메시지만 조회하므로 여러 메시지를 처리할 때는 미리 조회해 넘긴다)
+    """
     redis_client = get_redis_client()
 
     # SQS에서 받은 메시지를 JSON으로 변환
@@ -57,57 +92,161 @@ def process_sqs_message(message_body):
 
     coupon_id = message.get("coupon_id")
 
-    # Redis에서 쿠폰 정보 조회
-    coupon_info = redis_client.hgetall(f"coupon:{coupon_id}")
-    if not coupon_info:
+    # 이미 보관한 쿠폰이면 처음 응답 그대로
+    if replayed is None:
+        replayed = ledger.lookup(redis_client, [coupon_id])
+    if coupon_id in replayed:
+        return replayed[coupon_id]
+
+    # Redis에서 쿠폰 정보 조회 (발급 Lambda 가 SET 으로 저장한 codec 값)
+    coupon_value = redis_client.get(f"coupon:{coupon_id}")
+    if not coupon_value:
         logger.warning(f"Coupon {coupon_id} not found in Redis.")
         return {"statusCode": 404, "body": json.dumps(f"Coupon {coupon_id} not found.")}
 
+    try:
+        coupon_info = codec.decode(coupon_value)
+    except ValueError:
+        coupon_info = {}
     issued_at = coupon_info.get("issued_at")
     if not issued_at:
         logger.warning(f"Invalid coupon data for {coupon_id} in Redis.")
         return {"statusCode": 404, "body": json.dumps(f"Invalid coupon data for {coupon_id}.")}
 
-    # Redis 쿠폰 데이터 삭제
-    redis_client.delete(f"coupon:{coupon_id}")
-    logger.info(f"Redis에서 쿠폰 {coupon_id} 삭제 완료")
-
-    # Aurora MySQL에 저장
+    # Aurora MySQL에 저장 (Redis 쿠폰은 커밋한 뒤에 삭제해 저장에 실패하면 다시 처리할 수 있게 둔다)
     connection = None
     try:
         connection = get_db_connection()
-        with connection.cursor() as cursor:
+        with metrics.timer("db_insert"), connection.cursor() as cursor:
             cursor.execute(
                 "SELECT COUNT(*) FROM coupon WHERE coupon_id = %s AND member_id = %s",
                 (coupon_id, member_id)
             )
             if cursor.fetchone()[0] > 0:
                 logger.info(f"Coupon {coupon_id} already issued to member {member_id}.")
-                return {"statusCode": 400, "body": json.dumps(f"Coupon {coupon_id} already issued.")}
-
-            cursor.execute(
-                "INSERT INTO coupon (coupon_id, member_id) VALUES (%s, %s)",
-                (coupon_id, member_id)
-            )
-            connection.commit()
-            logger.info(f"Coupon {coupon_id} successfully issued to member {member_id}.")
+                connection.rollback()  # 재사용 연결에 열린 트랜잭션을 남기지 않음
+                outcome = archive.DUPLICATE
+            else:
+                cursor.execute(
+                    "INSERT INTO coupon (coupon_id, member_id) VALUES (%s, %s)",
+                    (coupon_id, member_id)
+                )
+                connection.commit()
+                outcome = archive.INSERTED
+                logger.info(f"Coupon {coupon_id} successfully issued to member {member_id}.")
 
     except pymysql.MySQLError as e:
         logger.error(f"Aurora DB connection error: {str(e)}")
+        # 오류가 난 연결은 재사용하지 않는다
+        if connection:
+            clients.discard_db_connection(connection)
         return {"statusCode": 500, "body": json.dumps(f"Aurora DB error: {str(e)}")}
 
-    finally:
-        if connection:
-            connection.close()
-            logger.info("Aurora DB connection closed.")
+    # Redis 쿠폰 데이터 삭제
+    redis_client.delete(f"coupon:{coupon_id}")
+    logger.info(f"Redis에서 쿠폰 {coupon_id} 삭제 완료")
 
-    return {"statusCode": 200, "body": json.dumps("Coupon processed successfully.")}
+    response = archive_response(coupon_id, outcome)
+    ledger.record(redis_client, [(coupon_id, response)])
+    return response
+
+def process_sqs_batch(records):
+    """Records 전체를 Aurora 에 한 번에 저장하고 실패한 메시지만 재전송되도록 보고"""
+    message_coupons = []
+    failures = []
+    expires_at = {}
+    for record in records:
+        try:
+            message = json.loads(record['body'])
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON parsing error: {str(e)}")
+            failures.append(record['messageId'])
+            continue
+
+        coupon_id = message.get('coupon_id')
+        member_id = message.get('member_id')
+        if not coupon_id or not member_id:
+            logger.error(f"Invalid coupon message: {record['body']}")
+            failures.append(record['messageId'])
+            continue
+        message_coupons.append((record['messageId'], coupon_id, member_id))
+        expires_at[coupon_id] = message.get('expires_at')
+
+    # 이미 보관한 쿠폰 (재전송 / 내보내기 재전송) 은 Aurora 에 다시 쓰지 않는다
+    redis_client = get_redis_client()
+    replayed = ledger.lookup(redis_client, [coupon_id for _, coupon_id, _ in message_coupons])
+    if replayed:
+        metrics.increment("db_replayed", len(replayed))
+        message_coupons = [entry for entry in message_coupons if entry[1] not in replayed]
+
+    if message_coupons:
+        connection = get_db_connection()
+        outcomes = archive.write_coupons(
+            connection, [(coupon_id, member_id) for _, coupon_id, member_id in message_coupons], insert_chunk_size
+        )
+        if archive.FAILED in outcomes.values():
+            clients.discard_db_connection(connection)
+
+        counts = {}
+        for message_id, coupon_id, _ in message_coupons:
+            outcome = outcomes[coupon_id]
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == archive.FAILED:
+                failures.append(message_id)
+        logger.info(f"Aurora batch write: {counts}")
+        for outcome, count in counts.items():
+            metrics.increment(f"db_{outcome}", count)
+        archived = [(coupon_id, outcome) for coupon_id, outcome in outcomes.items() if outcome != archive.FAILED]
+        # 커밋(또는 이미 저장됨)을 확인한 쿠폰 중 만료 시각이 지난 쿠폰만 Redis 에서 삭제 (bulk_archive 와 같음).
+        # 아직 유효한 쿠폰과 만료 시각이 없는 scan 내보내기 쿠폰은 TTL 이 지운다 (실패한 쿠폰은 재전송으로 다시 처리)
+        now = int(time.time())
+        due = [(None, coupon_id) for coupon_id, _ in archived
+               if expires_at.get(coupon_id) is not None and int(expires_at[coupon_id]) <= now]
+        deleted = bulk_archive.delete_coupons(redis_client, due)
+        metrics.increment("redis_deleted", deleted)
+        ledger.record(redis_client, [(coupon_id, archive_response(coupon_id, outcome))
+                                     for coupon_id, outcome in archived])
+    metrics.increment("messages", len(records))
+    metrics.increment("failures", len(failures))
+
+    return batch.batch_item_failures(failures)
+
+def process_bulk_archive(event):
+    """만료 대상 쿠폰을 Redis 에서 스풀로 읽어 LOAD DATA 로 일괄 보관하고 보관된 쿠폰 중 만료 시각이 지난 키를 삭제"""
+    redis_client = get_redis_client()
+    source = event.get("source", "index")
+    # 채널 재고 + 등록된 캠페인 재고의 인덱스
+    tags = expiry_index.export_tags(coupon_channels, stock_shards) + campaigns.registered_keys(redis_client)
+    connection = get_bulk_db_connection()
+    try:
+        totals = bulk_archive.archive_expired(
+            redis_client, connection, source, tags,
+            chunk_rows=int(event.get("chunk_rows", bulk_archive.LOAD_CHUNK_ROWS)),
+            window=int(event.get("window", expiry_index.EXPORT_WINDOW)),
+        )
+    except pymysql.MySQLError as e:
+        logger.error(f"Aurora bulk archive error: {str(e)}")
+        clients.discard_db_connection(connection)
+        return {"statusCode": 500, "body": json.dumps(f"Aurora DB error: {str(e)}")}
+
+    logger.info(f"Bulk archive: {totals}, source: {source}")
+    metrics.increment("db_bulk_loaded", totals["loaded"])
+    metrics.increment("db_inserted", totals["inserted"])
+    return {"statusCode": 200, "body": json.dumps(totals)}
 
 # Lambda 함수 처리 (Records 기반)
+@metrics.instrumented("coupon_expired_db")
 def lambda_handler(event, context):
     """
     Lambda 함수 핸들러. SQS 메시지를 처리하여 Redis에 쿠폰 정보를 저장.
+    배치 모드에서는 Aurora 에 다중 행 INSERT 로 저장.
     """
+    if event.get("action") == "bulk_archive":
+        return process_bulk_archive(event)
+
+    if batch_mode:
+        return process_sqs_batch(event.get('Records', []))
+
     # Redis 클라이언트 생성
     redis_client = get_redis_client()
 
@@ -119,10 +258,14 @@ def lambda_handler(event, context):
             'body': json.dumps("No 'Records' found in event")
         }
 
+    # 이미 보관한 쿠폰 (원장에 있음) 은 다시 쓰지 않는다. 보관 후 지운 쿠폰 키가 재전송으로 되살아나지 않도록
+    # 레코드 전체를 한 번에 확인한다 (이 경로는 보관하지 않으므로 원장에 기록하지 않음)
+    archived = ledger.lookup(redis_client, [message_coupon_id(record) for record in event['Records']])
+
     for record in event['Records']:
         # SQS 메시지의 body를 파싱
         message_body = record['body']
-        logger.info(f"Received message body: {message_body}")
+        metrics.debug("Received message body: %s", message_body)
 
         try:
             # 메시지 본문을 JSON으로 파싱
@@ -134,6 +277,10 @@ def lambda_handler(event, context):
             timezone = message.get('timezone')
             issued_at = message.get('issued_at')
             used = message.get('used')
+            if coupon_id in archived:
+                metrics.debug("Coupon %s already archived, skipping", coupon_id)
+                metrics.increment("messages")
+                continue
 
             # Redis에 쿠폰 데이터 저장
             coupon_data = {
@@ -146,8 +293,9 @@ def lambda_handler(event, context):
             
             # Redis에서 'coupon:coupon_id' 키로 저장
             redis_key = f'coupon:{coupon_id}'
-            redis_client.set(redis_key, json.dumps(coupon_data))
-            logger.info(f"Coupon data saved to Redis: {coupon_data}")
+            redis_client.set(redis_key, codec.encode(coupon_data))
+            metrics.debug("Coupon data saved to Redis: %s", coupon_data)
+            metrics.increment("messages")
 
         except json.JSONDecodeError as e:
             logger.error(f"JSON parsing error: {str(e)}")
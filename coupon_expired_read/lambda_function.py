@@ -1,8 +1,10 @@
+import os
 import logging
 import boto3
 import json
-import redis
-from rediscluster import RedisCluster  # Redis 클러스터 사용
+
+from coupon_core import campaigns, clients, expiry_index, export, metrics, recorder
+from coupon_core.sqs_batch import BatchSender
 
 # 로거 설정
 logger = logging.getLogger()
@@ -13,45 +15,107 @@ redis_host = ""
 redis_port = 6379
 
 # SQS 클라이언트 설정
-sqs_client = boto3.client('sqs')
+sqs_client = recorder.track_sqs(boto3.client('sqs'))
+# 파티션 팬아웃 / 이어서 실행할 때 자기 자신을 비동기 호출 (대부분의 실행은 쓰지 않아 처음 필요할 때 생성)
+lambda_client = None
 
 # SQS 큐 URL 
 sqs_queue_url = 'https://sqs.ap-northeast-2.amazonaws.com/034362047320/coupon-redis-to-aurora-queue.fifo'
 
+# FIFO 메시지 그룹 수 (coupon_expired_db 소비자 병렬도) / 동시에 보내는 배치 수
+message_groups = int(os.environ.get("COUPON_EXPORT_MESSAGE_GROUPS", "16"))
+send_workers = int(os.environ.get("COUPON_EXPORT_SEND_WORKERS", "4"))
+
+# 내보내기 대상 조회 방식
+#  - scan  : 전체 키 공간을 SCAN 해 살아 있는 쿠폰을 모두 전송 (기존 방식)
+#  - index : 만료 순서 인덱스에서 EXPORT_WINDOW 안에 만료될 쿠폰만 읽고, 보낸 쿠폰은 인덱스에서 제거
+export_source = os.environ.get("COUPON_EXPORT_SOURCE", "scan")
+export_window = int(os.environ.get("COUPON_EXPORT_WINDOW", str(expiry_index.EXPORT_WINDOW)))
+# 발급 Lambda 의 COUPON_STOCK_SHARDS 와 같은 값 (샤드별 인덱스 키 확인)
+stock_shards = int(os.environ.get("COUPON_STOCK_SHARDS", "1"))
+coupon_channels = ("offline", "online")
+
+# scan 내보내기는 파티션(마스터 노드)별로 SCAN 커서를 Redis 에 체크포인트하며 진행
+#  - threads : 한 호출 안에서 COUPON_EXPORT_PARTITION_WORKERS 개 파티션을 동시에 처리 (기본 1 = 순서대로)
+#  - invoke  : 파티션마다 이 Lambda 를 비동기 호출 ({"partition": 이름}) 해 파티션 수만큼 병렬로 처리
+# 남은 실행 시간이 COUPON_EXPORT_TIME_MARGIN_MS 아래로 내려가면 멈추고 같은 이벤트로 자신을 다시 호출해 이어서 처리
+export_fanout = os.environ.get("COUPON_EXPORT_FANOUT", "threads")
+partition_workers = int(os.environ.get("COUPON_EXPORT_PARTITION_WORKERS", "1"))
+time_margin_ms = int(os.environ.get("COUPON_EXPORT_TIME_MARGIN_MS", "60000"))
+max_continuations = int(os.environ.get("COUPON_EXPORT_MAX_CONTINUATIONS", "10"))
+
 def get_redis_client():
-    """Redis 클러스터 연결"""
-    redis_client = RedisCluster(
-        host=redis_host,
-        port=redis_port,
+    """Redis 클러스터 연결 (웜 컨테이너에서 재사용)"""
+    return clients.get_redis_client(
+        redis_host,
+        redis_port,
         ssl=True,  # TLS 연결 활성화
         ssl_cert_reqs=None,
         skip_full_coverage_check=True
     )
-    return redis_client
 
 
-def send_sqs_message(payload):
+def export_due_coupons(redis_client):
     """
-    SQS 메시지 전송
+    만료 순서 인덱스에서 곧 만료될 쿠폰만 전송하고, 전송에 성공한 쿠폰을 인덱스에서 제거.
+    페이로드에 인덱스의 만료 시각 (expires_at) 을 실어 coupon_expired_db 가 만료된 쿠폰 키만 지우게 한다.
     """
-    try:
-        message_body = json.dumps(payload)
-
-        logger.info(f"MessageBody to be sent: {message_body}")  # MessageBody 값 출력
-
-        # SQS 메시지 전송
-        sqs_response = sqs_client.send_message(
-            QueueUrl=sqs_queue_url,
-            MessageBody=message_body,
-            MessageGroupId='default',  # FIFO 큐일 경우 필수
-            MessageDeduplicationId=payload['coupon_id']  # 중복 메시지를 피하기 위한 고유 ID
-        )
-        print(f"SQS Response: {sqs_response}")
-        logger.info(f"SQS message sent for coupon {payload['coupon_id']}, SQS Response: {sqs_response}")
-    except Exception as e:
-        logger.error(f"Error sending message to SQS: {e}")
-
-    
+    # 채널 재고 + 등록된 캠페인 재고의 인덱스
+    tags = expiry_index.export_tags(coupon_channels, stock_shards) + campaigns.registered_keys(redis_client)
+    entries = []
+    with BatchSender(sqs_client, sqs_queue_url, message_groups, send_workers) as sender:
+        for index_key, payload, expiry_timestamp in export.iter_due_coupon_payloads(
+                redis_client, tags, window=export_window, with_expiry=True):
+            payload['expires_at'] = expiry_timestamp
+            sender.add(payload)
+            entries.append((index_key, payload['coupon_id']))
+
+    # 전송에 실패한 쿠폰은 인덱스에 남겨 다음 실행에서 다시 보낸다
+    failed_ids = {entry['MessageDeduplicationId'] for entry in sender.failed}
+    exported = [(index_key, coupon_id) for index_key, coupon_id in entries if coupon_id not in failed_ids]
+    expiry_index.mark_exported(redis_client, exported)
+    return sender.sent, len(sender.failed)
+
+
+def new_sender():
+    return BatchSender(sqs_client, sqs_queue_url, message_groups, send_workers)
+
+
+def invoke_self(context, payload):
+    """이 Lambda 를 비동기로 다시 호출 (파티션 팬아웃 / 시간 초과 전 이어서 실행)"""
+    global lambda_client
+    if lambda_client is None:
+        lambda_client = boto3.client('lambda')
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(payload).encode(),
+    )
+
+
+def export_scan_partitions(redis_client, event, context):
+    """체크포인트에서 이어 파티션별로 SCAN 내보내기. 시간이 모자라 남은 파티션은 다음 호출로 넘긴다"""
+    partitions = export.pending_partitions(redis_client)
+    if event.get("partition"):
+        partitions = [partition for partition in partitions if partition[0] == event["partition"]]
+
+    should_stop = None
+    if context is not None:
+        should_stop = lambda: context.get_remaining_time_in_millis() < time_margin_ms  # noqa: E731
+
+    sent, failed, remaining = export.export_partitions(
+        redis_client, new_sender, partition_workers, should_stop, partitions)
+    if remaining:
+        continuation = int(event.get("continuation", 0)) + 1
+        if continuation > max_continuations:
+            logger.warning(f"Export stopped after {max_continuations} continuations, remaining: {remaining}")
+        else:
+            logger.info(f"Export continues in a new invocation ({continuation}), remaining: {remaining}")
+            invoke_self(context, dict(event, continuation=continuation))
+    return sent, failed
+
+
+@metrics.instrumented("coupon_expired_read")
 def lambda_handler(event, context):
     """
     Lambda 함수 핸들러. 1시간마다 Redis에서 데이터를 읽어 eventbridge_expired_coupons_lambda로 전달.
@@ -59,42 +123,31 @@ def lambda_handler(event, context):
     # Redis 클라이언트 생성
     redis_client = get_redis_client()
 
-    # Redis에서 모든 쿠폰 정보를 가져옴
-    coupon_keys = redis_client.keys('coupon:offline-*') + redis_client.keys('coupon:online-*')
-
-    if not coupon_keys:
+    event = event or {}
+    if export_source == "index":
+        sent, failed = export_due_coupons(redis_client)
+    elif export_fanout == "invoke" and context is not None and not event.get("partition"):
+        # 파티션마다 하위 호출을 예약하고 전송은 하위 호출이 맡는다
+        partitions = export.pending_partitions(redis_client)
+        for name, _, _ in partitions:
+            invoke_self(context, {"partition": name})
+        logger.info(f"Export partitions dispatched: {len(partitions)}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f'{len(partitions)} export partitions dispatched')
+        }
+    else:
+        # 노드별 SCAN + 슬롯별 MGET 파이프라인으로 쿠폰 정보를 가져와
+        # send_message_batch 로 묶어 여러 메시지 그룹에 병렬 전송
+        sent, failed = export_scan_partitions(redis_client, event, context)
+    logger.info(f"SQS messages sent: {sent}, failed: {failed}, source: {export_source}")
+    metrics.increment("exported", sent)
+    metrics.increment("export_failed", failed)
+
+    if not sent and not failed:
         print("No coupons found.")
         return
 
-    for coupon_key in coupon_keys:
-        coupon_data = redis_client.get(coupon_key)  # 쿠폰 데이터를 가져옴
-
-        if coupon_data:
-            try:
-                coupon_info = json.loads(coupon_data)  # JSON 파싱
-                # print(f"Parsed coupon info: {coupon_info}")  # 파싱된 쿠폰 정보 출력
-                
-                # 쿠폰 ID는 'coupon:' 접두사를 제거하여 처리
-                coupon_id = coupon_key.decode().replace('coupon:', '', 1)
-                # 필요한 페이로드 형식으로 정보 구성
-                payload = {
-                    'coupon_id': coupon_id,  # 쿠폰 ID
-                    'member_id': coupon_info.get('member_id', ''),  # 회원 ID
-                    'timezone': coupon_info.get('timezone', ''),  # 시간대
-                    'used': coupon_info.get('used', ''),  # 사용 여부
-                    'issued_at': coupon_info.get('issued_at', '')  # 발급일
-                }
-                # Lambda 호출 전에 페이로드 출력
-                print(f"Payload to Lambda: {payload}")
-                
-                # SQS로 메시지 전송
-                send_sqs_message(payload)
-
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error for {coupon_key}: {e}")
-        else:
-            print(f"Coupon data not found for {coupon_key}")
-
     return {
         'statusCode': 200,
         'body': json.dumps('All coupons processed and sent')
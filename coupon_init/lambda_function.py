@@ -1,36 +1,147 @@
-import redis
-from rediscluster import RedisCluster  # Redis 클러스터 사용
+import os
+
+from coupon_core import (campaigns, clients, dedup, inventory, issuance, member_coupons, metrics, negative_cache,
+                         token_pool)
 
 # Redis 클러스터 엔드포인트 설정
 redis_host = ""
 redis_port = 6379
 
+# 재고 샤드 수 (1 이면 기존 단일 키 'offline' / 'online')
+stock_shards = int(os.environ.get("COUPON_STOCK_SHARDS", "1"))
+
+# 채널 재고 초기 수량 (event 의 quantity 로 바꿀 수 있음)
+initial_quantity = int(os.environ.get("COUPON_INITIAL_QUANTITY", "1000"))
+
+coupon_keys = ("offline", "online")
+
 def get_redis_client():
-    """Redis 클러스터 연결"""
-    redis_client = RedisCluster(
-        host=redis_host,
-        port=redis_port,
+    """Redis 클러스터 연결 (웜 컨테이너에서 재사용)"""
+    return clients.get_redis_client(
+        redis_host,
+        redis_port,
         ssl=True,  # TLS 연결 활성화
         ssl_cert_reqs=None,
         skip_full_coverage_check=True
     )
-    return redis_client
 
-def initialize_coupons(redis_client):
-    """쿠폰 초기화 - offline과 online 쿠폰 각각 1000개 설정"""
-    initial_quantity = 1000  # 초기 쿠폰 수량
+def initialize_coupons(redis_client, shards=1, quantity=None):
+    """쿠폰 초기화 - offline과 online 쿠폰 각각 quantity 개 설정 (shards > 1 이면 샤드 카운터에 나눠 설정)"""
+    quantity = initial_quantity if quantity is None else quantity
+
+    if shards > 1:
+        for coupon_key in coupon_keys:
+            inventory.initialize_stock(redis_client, coupon_key, quantity, shards)
+            redis_client.set(coupon_key, 0)  # 단일 키 재고는 비워 두 경로에서 이중으로 발급되지 않게 함
+    else:
+        pipe = redis_client.pipeline()
+        for coupon_key in coupon_keys:
+            pipe.set(coupon_key, quantity)
+        pipe.execute()
+
+    # 발급 Lambda 컨테이너의 소진 / 발급 회원 캐시를 무효화 (재입고가 캐시에 가려지지 않게 재고 설정 뒤에 올림)
+    negative_cache.bump_version(redis_client)
+
+    print(f"Initialized coupons: offline={quantity}, online={quantity}, shards={shards}")
 
-    redis_client.set("offline", initial_quantity)
-    redis_client.set("online", initial_quantity)
+def initialize_campaigns(redis_client, specs):
+    """캠페인 일괄 생성 / 재설정 (설정 + 재고, 슬롯별로 묶은 파이프라인). 캠페인별 설정 수량"""
+    registered = campaigns.register_campaigns(redis_client, specs)
+    # 재설정한 캠페인의 소진 / 발급 회원 캐시도 무효화
+    negative_cache.bump_version(redis_client)
+    print(f"Initialized campaigns: {len(registered)}")
+    return {campaign["coupon_key"]: campaign["quantity"] for campaign in registered}
 
-    print(f"Initialized coupons: offline={initial_quantity}, online={initial_quantity}")
+def mint_token_pools(redis_client, pools, replace=True):
+    """
+    tokens 재고 모드의 토큰 풀 미리 발급. pools 는 {"channel", "campaign_id" (없으면 채널 재고), "quantity"} 목록.
+    replace 면 남은 토큰을 지우고 새로 채우고, 아니면 기존 풀 뒤에 추가 (재입고). 재고 키별 풀 크기
+    """
+    specs = []
+    for pool in pools:
+        channel = pool.get("channel")
+        if channel not in coupon_keys:
+            raise ValueError(f"Invalid channel: {channel!r}")
+        campaign_id = pool.get("campaign_id")
+        coupon_key = campaigns.coupon_key(channel, campaign_id) if campaign_id else channel
+        quantity = int(pool.get("quantity", initial_quantity))
+        if quantity < 0:
+            raise ValueError(f"Invalid quantity for {coupon_key}: {quantity}")
+        specs.append((coupon_key, quantity))
 
+    sizes = {coupon_key: token_pool.mint_tokens(redis_client, coupon_key, quantity, replace)
+             for coupon_key, quantity in specs}
+    # 소진으로 캐시된 풀도 다시 발급되도록 무효화
+    negative_cache.bump_version(redis_client)
+    print(f"Minted coupon tokens: {sizes}")
+    return sizes
+
+def remaining_coupons(redis_client, shards=1):
+    """채널별 남은 쿠폰 수 (샤드 합계)"""
+    if shards > 1:
+        return {coupon_key: inventory.remaining_stock(redis_client, coupon_key, shards) for coupon_key in coupon_keys}
+    return {coupon_key: int(redis_client.get(coupon_key) or 0) for coupon_key in coupon_keys}
+
+def remaining_campaign_coupons(redis_client):
+    """등록된 캠페인별 남은 쿠폰 수"""
+    return campaigns.remaining_stock(redis_client, campaigns.registered_keys(redis_client))
+
+def rebalance_coupons(redis_client, shards):
+    """채널별 샤드 재고를 고르게 재분배"""
+    return {coupon_key: inventory.rebalance_stock(redis_client, coupon_key, shards) for coupon_key in coupon_keys}
+
+@metrics.instrumented("coupon_init")
 def lambda_handler(event, context):
-    """Lambda 실행 시 쿠폰 개수 초기화"""
+    """
+    Lambda 실행 시 쿠폰 개수 초기화.
+    event 의 action 으로 'remaining' (남은 수량 조회), 'rebalance' (샤드 재분배),
+    'migrate_member_coupons' (기존 회원-쿠폰 HASH 를 회원별 레이아웃으로 이전, source 로 HASH 키 지정),
+    'campaigns' (campaigns 목록의 캠페인을 일괄 생성 / 재설정), 'campaign_remaining' (캠페인별 남은 수량),
+    'mint_tokens' (pools 목록의 토큰 풀 미리 발급, replace=false 면 추가),
+    'migrate_received_coupons' (전역 received_coupons 이력을 채널별 중복 체크 인덱스에 복사,
+    dedup_backend / record_layout / shards 로 발급 Lambda 의 COUPON_DEDUP_BACKEND / COUPON_RECORD_LAYOUT /
+    COUPON_STOCK_SHARDS 지정, shards 기본값은 이 Lambda 의 COUPON_STOCK_SHARDS)
+    도 실행할 수 있다.
+    """
     redis_client = get_redis_client()
-    initialize_coupons(redis_client)
+    event = event or {}
+    shards = int(event.get("shards", stock_shards))
+    action = event.get("action", "initialize")
+
+    if action == "remaining":
+        return {"statusCode": 200, "body": remaining_coupons(redis_client, shards)}
+    if action == "campaign_remaining":
+        return {"statusCode": 200, "body": remaining_campaign_coupons(redis_client)}
+    if action == "campaigns":
+        try:
+            return {"statusCode": 200, "body": initialize_campaigns(redis_client, event.get("campaigns", []))}
+        except ValueError as e:
+            return {"statusCode": 400, "body": str(e)}
+    if action == "mint_tokens":
+        try:
+            return {"statusCode": 200,
+                    "body": mint_token_pools(redis_client, event.get("pools", []), event.get("replace", True))}
+        except ValueError as e:
+            return {"statusCode": 400, "body": str(e)}
+    if action == "rebalance":
+        return {"statusCode": 200, "body": rebalance_coupons(redis_client, shards)}
+    if action == "migrate_member_coupons":
+        source_key = event.get("source", "member_coupons")
+        return {"statusCode": 200, "body": member_coupons.migrate_member_coupons(redis_client, source_key)}
+    if action == "migrate_received_coupons":
+        try:
+            index = dedup.get_dedup_index(event.get("dedup_backend", dedup.DEDUP_SET))
+        except ValueError as e:
+            return {"statusCode": 400, "body": str(e)}
+        member_layout = event.get("record_layout") == issuance.RECORD_LAYOUT_MEMBER
+        counts = dedup.migrate_received_coupons(redis_client, index, coupon_keys, member_layout=member_layout,
+                                                shards=shards)
+        print(f"Migrated received_coupons: {counts}")
+        return {"statusCode": 200, "body": counts}
+
+    initialize_coupons(redis_client, shards, event.get("quantity"))
     
     return {
         "statusCode": 200,
         "body": "Coupons initialized successfully"
-    }
\ No newline at end of file
+    }
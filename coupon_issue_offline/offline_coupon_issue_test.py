@@ -7,21 +7,17 @@ import re  # 정규 표현식 추가
 class TestCouponProcessor(unittest.TestCase):
 
     @patch('lambda_function.get_redis_client')  # get_redis_client를 모킹
-    @patch('lambda_function.sqs')  # sqs 클라이언트 모킹
-    def test_lambda_handler(self, mock_sqs, mock_get_redis_client):
+    def test_lambda_handler(self, mock_get_redis_client):
         # Mock Redis client
         mock_redis = MagicMock()
         mock_get_redis_client.return_value = mock_redis
 
-        # Mock SQS 클라이언트 메서드
-        mock_sqs.delete_message = MagicMock()
-
         # SQS 메시지 예시
         sample_event = {
             "Records": [
                 {
                     "receiptHandle": "some-receipt-handle",
-                    "body": '{"user_id": "user123"}'
+                    "body": '{"member_id": "user123"}'
                 }
             ]
         }
@@ -39,12 +35,6 @@ class TestCouponProcessor(unittest.TestCase):
         self.assertEqual(response["statusCode"], 200)
         # self.assertIn("Lambda execution completed", response["body"])
 
-        # SQS에서 메시지 삭제가 호출되었는지 확인
-        mock_sqs.delete_message.assert_called_once_with(
-            QueueUrl="",
-            ReceiptHandle="some-receipt-handle"
-        )
-
         # 쿠폰 차감 후 남은 수량 검증
         mock_redis.decrby.assert_called_once_with("offline", 1)  # 'offline' 키에서 차감
 
@@ -55,25 +45,21 @@ class TestCouponProcessor(unittest.TestCase):
         import re
 
         #실제 호출된 값이 "offline-"으로 시작하는지 확인
-        called_coupon_id = mock_redis.hset.call_args[0][2]  # 실제 호출된 쿠폰 ID
+        called_coupon_id = mock_redis.pipeline.return_value.hset.call_args[0][2]  # 실제 호출된 쿠폰 ID
         assert re.match(r"offline-.*", called_coupon_id)  # 정규식으로 확인
 
     @patch('lambda_function.get_redis_client')  # get_redis_client를 모킹
-    @patch('lambda_function.sqs')  # sqs 클라이언트 모킹
-    def test_user_has_already_received_coupon(self, mock_sqs, mock_get_redis_client):
+    def test_user_has_already_received_coupon(self, mock_get_redis_client):
         # Mock Redis client
         mock_redis = MagicMock()
         mock_get_redis_client.return_value = mock_redis
 
-        # Mock SQS 클라이언트 메서드
-        mock_sqs.delete_message = MagicMock()
-
         # SQS 메시지 예시
         sample_event = {
             "Records": [
                 {
                     "receiptHandle": "some-receipt-handle",
-                    "body": '{"user_id": "user123"}'
+                    "body": '{"member_id": "user123"}'
                 }
             ]
         }
@@ -88,6 +74,56 @@ class TestCouponProcessor(unittest.TestCase):
         # 결과 검증
         self.assertEqual(response["statusCode"], 400)
 
+    @patch('lambda_function.get_redis_client')  # get_redis_client를 모킹
+    def test_empty_records(self, mock_get_redis_client):
+        mock_redis = MagicMock()
+        mock_get_redis_client.return_value = mock_redis
+
+        # 레코드가 없으면 아무것도 처리하지 않고 200 응답
+        response = lambda_function.lambda_handler({"Records": []}, None)
+
+        self.assertEqual(response["statusCode"], 200)
+        mock_redis.decrby.assert_not_called()
+
+    @patch('lambda_function.process_sqs_message')
+    @patch('lambda_function.ledger')
+    @patch('lambda_function.async_mode', True)
+    @patch('lambda_function.issue_mode', 'script')
+    @patch('lambda_function.get_redis_client')  # get_redis_client를 모킹
+    def test_async_failure_records_finished_messages(self, mock_get_redis_client, mock_ledger,
+                                                     mock_process_sqs_message):
+        mock_ledger.lookup.return_value = {}
+
+        def process(message_body):
+            if json.loads(message_body)["member_id"] == "user1":
+                raise RuntimeError("redis down")
+            return {"statusCode": 200}
+
+        mock_process_sqs_message.side_effect = process
+        records = [{"messageId": f"m{index}", "receiptHandle": "h", "body": json.dumps({"member_id": f"user{index}"})}
+                   for index in range(3)]
+
+        with self.assertRaises(RuntimeError):
+            lambda_function.lambda_handler({"Records": records}, None)
+
+        # 재전송되어도 다시 발급하지 않도록 끝낸 메시지의 응답은 원장에 남는다
+        recorded = mock_ledger.record.call_args[0][1]
+        self.assertEqual([message_id for message_id, _ in recorded], ["m0", "m2"])
+
+    @patch('lambda_function.stock_shards', 4)
+    @patch('lambda_function.get_redis_client')  # get_redis_client를 모킹
+    def test_legacy_mode_rejects_sharded_stock(self, mock_get_redis_client):
+        mock_redis = MagicMock()
+        mock_get_redis_client.return_value = mock_redis
+        mock_redis.sismember.return_value = False
+        lambda_function.negative_cache.cache.clear()  # 앞 테스트가 캐시한 회원 / 소진 결과
+
+        # 샤드 재고에서 legacy 경로는 단일 키 (0) 를 읽어 모두 소진으로 보이므로 메시지를 실패시킨다
+        with self.assertRaises(ValueError):
+            lambda_function.lambda_handler({"Records": [{"receiptHandle": "h", "body": '{"member_id": "user123"}'}]},
+                                           None)
+        mock_redis.decrby.assert_not_called()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
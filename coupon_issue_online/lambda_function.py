@@ -1,56 +1,76 @@
-import redis
+import os
 import json
-import boto3
-import uuid
-import time
-from datetime import datetime, timedelta
-from rediscluster import RedisCluster 
-import pytz
+
+from coupon_core import (async_engine, batch, campaigns, clients, codec, coupon_ids, dedup, expiry, expiry_index,
+                         idempotency, inventory, issuance, member_coupons, metrics, negative_cache, recorder,
+                         reservations, token_pool)
+from coupon_core.sqs_batch import BatchSender
 
 # Redis 클러스터 엔드포인트 설정 
 redis_host = ""
 redis_port = 6379  # 기본 포트
 
-def get_current_timestamp(timezone=None):
-    """ 현재 시간을 타임존을 반영하여 ISO 8601 형식으로 반환 """
-    if timezone:
-        try:
-            tz = pytz.timezone(timezone)
-        except pytz.UnknownTimeZoneError:
-            tz = pytz.timezone('Asia/Seoul')  # 잘못된 값이 들어오면 기본값
-    else:
-        tz = pytz.timezone('Asia/Seoul')
+# 발급 경로 선택 (legacy / script) - p99 지연 비교용
+issue_mode = os.environ.get("COUPON_ISSUE_MODE", issuance.ISSUE_MODE_LEGACY)
 
-    now = datetime.now(tz)
-    return now.isoformat()  # ISO 8601 형식으로 반환 (예: 2025-02-24T10:00:00+09:00)
+# 배치 모드: Records 전체를 파이프라인 한 번으로 처리하고 batchItemFailures 로 부분 실패 보고
+# (이벤트 소스 매핑에 ReportBatchItemFailures 설정 필요, 항상 Lua 스크립트 경로 사용)
+batch_mode = os.environ.get("COUPON_BATCH_MODE", "false").lower() == "true"
 
-def get_expiry_timestamp_for_today(timezone):
-    # 기본 타임존을 'Asia/Seoul'로 설정
-    if timezone:
-        try:
-            tz = pytz.timezone(timezone)
-        except pytz.UnknownTimeZoneError:
-            tz = pytz.timezone('Asia/Seoul')  # 잘못된 값이 들어오면 기본값으로 설정
-    else:
-        tz = pytz.timezone('Asia/Seoul')
+# 재고 샤드 수 (coupon_init 의 shards 와 같아야 함, 1 이면 기존 단일 재고 키) / 처음 시도할 재고 샤드 선택 방식
+stock_shards = int(os.environ.get("COUPON_STOCK_SHARDS", "1"))
+shard_strategy = os.environ.get("COUPON_SHARD_STRATEGY", inventory.SHARD_STRATEGY_MEMBER)
+
+# 비동기 모드: 배치 모드가 아닐 때 Records 를 동시에 처리 (같은 회원은 순서대로, Lua 스크립트 경로에서만 사용)
+async_mode = os.environ.get("COUPON_ASYNC_MODE", "false").lower() == "true"
+async_concurrency = int(os.environ.get("COUPON_ASYNC_CONCURRENCY", str(async_engine.ASYNC_CONCURRENCY)))
+
+# 쿠폰 정보 저장 위치 (channel: 재고 키 슬롯 / member: 회원별 {member_id} 슬롯, 단일 재고 키에서만)
+record_layout = os.environ.get("COUPON_RECORD_LAYOUT", issuance.RECORD_LAYOUT_CHANNEL)
 
-    # 현재 시간 기준의 자정(23:59:59) 계산
-    now = datetime.now(tz)
-    midnight = datetime.combine(now.date(), datetime.min.time()) + timedelta(days=1)
-    midnight = tz.localize(midnight)  # 타임존 적용
-    expiry_timestamp = int(midnight.timestamp()) - 1  # 23:59:59 설정
+# 재고 방식 (counter: 재고 카운터 차감 / tokens: coupon_init 의 mint_tokens 로 미리 만든 쿠폰 ID 토큰 풀)
+# tokens 는 issue_mode 와 관계없이 Lua 스크립트 경로, 단일 재고 키 + channel 레이아웃에서만
+inventory_mode = os.environ.get("COUPON_INVENTORY_MODE", issuance.INVENTORY_COUNTER)
+
+# 중복 발급 체크 인덱스 (set / bitmap / bloom) - 스크립트 경로에서만 사용, 바꾸면 기존 발급 이력과 분리됨
+dedup_backend = os.environ.get("COUPON_DEDUP_BACKEND", dedup.DEDUP_SET)
+
+# 채널 간 중복 발급 체크 범위 (channel: 기본값, 채널별 인덱스만 / global: 전역 received_coupons 도 확인 / 기록해
+# 채널 통틀어 한 장, 스크립트 밖이라 왕복 3번이고 채널 간에는 원자적이지 않음)
+dedup_scope = os.environ.get("COUPON_DEDUP_SCOPE", dedup.DEDUP_SCOPE_CHANNEL)
+
+# 초기화 단계에서 Redis 연결(TLS, 슬롯 맵), 재고 버전 확인, 발급 스크립트, 기본 타임존 만료 시각을 미리 준비
+# (초기화 단계는 첫 메시지 지연에 들어가지 않는다. 연결할 수 없으면 첫 호출에서 평소처럼 연결)
+prewarm = os.environ.get("COUPON_PREWARM", "false").lower() == "true"
+
+# SQS 재전송 멱등 원장 (COUPON_IDEMPOTENCY_LEDGER): 처리한 messageId 의 응답을 저장해 두고
+# 같은 메시지가 다시 오면 재고 / 중복 체크 없이 처음 응답을 그대로 돌려준다
+ledger = idempotency.Ledger("coupon_issue_online")
+
+# 동기 발급 예약 (API 직접 호출 action=reserve / confirm / release, coupon_core.reservations)
+# 확정은 클라이언트의 confirm 호출로 한다. COUPON_RESERVATION_AUTO_CONFIRM=true 면 확정 메시지를 relay
+# (action=relay_reservations, 스케줄 호출) 가 이 큐(이 Lambda 의 이벤트 소스 FIFO 큐)로 보내고 SQS 경로가 확정한다.
+# SQS 클라이언트는 relay 할 때만 만든다 (발급 경로는 boto3 를 로드하지 않음)
+reservation_queue_url = os.environ.get("COUPON_RESERVATION_QUEUE_URL", "")
+sqs_client = None
+
+def get_current_timestamp(timezone=None):
+    """ 현재 시간을 타임존을 반영하여 ISO 8601 형식으로 반환 """
+    # 타임존 객체는 coupon_core.expiry 가 캐시 (잘못된 값이면 기본값 Asia/Seoul)
+    return expiry.current_timestamp(timezone)  # 예: 2025-02-24T10:00:00+09:00
 
-    return expiry_timestamp
+def get_expiry_timestamp_for_today(timezone):
+    # 타임존 기준 오늘 23:59:59 (타임존별로 계산해 두고 날짜가 바뀔 때만 다시 계산)
+    return expiry.expiry_timestamp_for_today(timezone)
 
 def get_redis_client():
-    # RedisCluster 클라이언트로 연결
-    redis_client = RedisCluster(
-        host=redis_host,
-        port=redis_port,
-        ssl=True, 
+    # RedisCluster 클라이언트 (웜 컨테이너에서 재사용)
+    return clients.get_redis_client(
+        redis_host,
+        redis_port,
+        ssl=True,
         skip_full_coverage_check=True
     )
-    return redis_client
 
 def has_received_coupon(redis_client, member_id):
     # 사용자가 이미 쿠폰을 받은 적 있는지 확인
@@ -58,13 +78,18 @@ def has_received_coupon(redis_client, member_id):
 
 def check_and_decrement_coupons(redis_client, coupon_key, member_id, timezone):
     # 쿠폰 개수를 확인하고 1개 차감
-    remaining_coupons = redis_client.get(coupon_key)
+    with metrics.timer("stock_check"):
+        remaining_coupons = redis_client.get(coupon_key)
     if remaining_coupons and int(remaining_coupons) > 0:
-        redis_client.decrby(coupon_key, 1)  # 원자적 감소
-        redis_client.sadd("received_coupons", member_id)  # 중복 체크를 위한 발급된 사용자 저장
+        with metrics.timer("decrement"):
+            redis_client.decrby(coupon_key, 1)  # 원자적 감소
+            redis_client.sadd("received_coupons", member_id)  # 중복 체크를 위한 발급된 사용자 저장
         
-        # 쿠폰 ID 생성
-        coupon_id = f"{coupon_key}-{str(uuid.uuid4())}"
+        # 쿠폰 ID 생성 (member 레이아웃은 회원 해시 태그 포함)
+        if record_layout == issuance.RECORD_LAYOUT_MEMBER:
+            coupon_id = issuance.new_coupon_id(coupon_key, member_id)
+        else:
+            coupon_id = f"{coupon_key}-{coupon_ids.new_id()}"
 
         # 만료 시간 계산 (오늘 자정 00:00)
         expiry_timestamp = get_expiry_timestamp_for_today(timezone)
@@ -79,12 +104,173 @@ def check_and_decrement_coupons(redis_client, coupon_key, member_id, timezone):
             "issued_at": issued_at, 
             "timezone": timezone
         }
-        redis_client.set(f"coupon:{coupon_id}", json.dumps(coupon_data))
-        redis_client.expireat(f"coupon:{coupon_id}", expiry_timestamp)  
-        redis_client.hset("member_coupons", member_id, coupon_id)
+        if record_layout == issuance.RECORD_LAYOUT_MEMBER:
+            member_coupons.bind(redis_client, member_id, coupon_id, coupon_data, expiry_timestamp)
+            expiry_index.record(redis_client, coupon_key, coupon_id, expiry_timestamp)
+            return coupon_id
+        with metrics.timer("record_write"):
+            # 쿠폰 정보 / 회원별 쿠폰 / 만료 내보내기용 인덱스를 파이프라인 한 번으로 기록
+            pipe = redis_client.pipeline()
+            pipe.set(f"coupon:{coupon_id}", codec.encode(coupon_data))
+            pipe.expireat(f"coupon:{coupon_id}", expiry_timestamp)
+            pipe.hset("member_coupons", member_id, coupon_id)
+            expiry_index.queue_record(pipe, coupon_key, coupon_id, expiry_timestamp)
+            pipe.execute()
         return coupon_id
     return None
 
+def build_coupon_data(member_id, timezone, issue_time=None):
+    # Redis 에 저장할 쿠폰 정보와 만료 시간 (오늘 자정)
+    # issue_time 은 배치에서 expiry.issue_times 로 한 번에 계산한 (issued_at, expiry_timestamp)
+    if issue_time is None:
+        issue_time = (get_current_timestamp(timezone), get_expiry_timestamp_for_today(timezone))
+    issued_at, expiry_timestamp = issue_time
+    coupon_data = {
+        "member_id": member_id,
+        "used": False,
+        "issued_at": issued_at,
+        "timezone": timezone
+    }
+    return coupon_data, expiry_timestamp
+
+def issue_result_response(result, coupon_id):
+    # Lua 스크립트 결과 코드를 응답으로 변환
+    if result == issuance.ALREADY_RECEIVED:
+        return {"statusCode": 400, "body": "User has already received a coupon"}
+    if coupon_id:
+        return {"statusCode": 200, "body": f"online coupon granted successfully. Coupon ID: {coupon_id}"}
+    return {"statusCode": 400, "body": "No online coupons remaining"}
+
+def issue_coupon_with_script(redis_client, coupon_key, member_id, timezone, shards=None):
+    # 채널 재고는 COUPON_DEDUP_SCOPE=global 이면 전역 received_coupons 를 발급 전에 확인하고 발급 후 기록
+    cross_channel = dedup.cross_channel(dedup_scope, coupon_key)
+    if cross_channel and dedup.received_members(redis_client, [member_id]):
+        return issuance.ALREADY_RECEIVED, None
+    result, coupon_id = run_issue_script(redis_client, coupon_key, member_id, timezone, shards)
+    if cross_channel and result == issuance.ISSUED:
+        dedup.record_received(redis_client, [member_id])
+    return result, coupon_id
+
+def run_issue_script(redis_client, coupon_key, member_id, timezone, shards=None):
+    # 중복 체크 ~ 회원 인덱스 저장까지 Lua 스크립트 한 번으로 처리
+    # shards 를 주지 않으면 채널 재고의 COUPON_STOCK_SHARDS (캠페인 재고는 단일 키라 1)
+    shards = stock_shards if shards is None else shards
+    coupon_data, expiry_timestamp = build_coupon_data(member_id, timezone)
+    member_coupons.check_layout(record_layout, shards)
+    if inventory_mode == issuance.INVENTORY_TOKENS:
+        token_pool.check_mode(record_layout, shards)
+        return token_pool.issue_coupon(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                                       dedup_backend)
+    if record_layout == issuance.RECORD_LAYOUT_MEMBER:
+        return member_coupons.issue_coupon(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                                           dedup_backend)
+    if shards > 1:
+        return inventory.issue_coupon_sharded(
+            redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, shards, shard_strategy,
+            dedup_backend
+        )
+    return issuance.issue_coupon_script(redis_client, coupon_key, member_id, coupon_data, expiry_timestamp,
+                                        dedup_backend)
+
+def reserve_response(result, coupon_id, reserved_until):
+    # 예약 결과를 API 응답으로 변환 (reserved_until 은 예약 만료 UNIX 시각)
+    if result == issuance.ALREADY_RECEIVED:
+        return {"statusCode": 400, "body": "User has already received a coupon"}
+    if coupon_id:
+        return {"statusCode": 200, "body": {"coupon_id": coupon_id, "reserved_until": reserved_until / 1000}}
+    return {"statusCode": 400, "body": "No online coupons remaining"}
+
+def confirm_response(result, coupon_id):
+    # 예약 확정 결과를 응답으로 변환
+    if coupon_id:
+        return {"statusCode": 200, "body": f"online coupon granted successfully. Coupon ID: {coupon_id}"}
+    if result == reservations.EXPIRED:
+        return {"statusCode": 410, "body": "Coupon reservation has expired"}
+    return {"statusCode": 404, "body": "No coupon reservation found"}
+
+def reservation_coupon_key(message):
+    # 예약한 재고 키 (직접 호출은 campaign_id, relay 가 보낸 확정 메시지는 coupon_key)
+    if message.get("campaign_id"):
+        return campaigns.coupon_key("online", message["campaign_id"])
+    return message.get("coupon_key") or "online"
+
+def reserve_coupon(redis_client, message):
+    # 동기 발급 예약: 스크립트 한 번으로 재고를 잡고 쿠폰 ID 를 바로 반환 (쿠폰 기록은 확정 단계에서)
+    member_id = message.get("member_id")
+    timezone = message.get("timezone")
+    coupon_key = "online"
+    if message.get("campaign_id"):
+        campaign = campaigns.get_campaign(redis_client, "online", message["campaign_id"])
+        rejected = campaigns.check_campaign(campaign)
+        if rejected:
+            return {"statusCode": 400, "body": rejected}
+        coupon_key = campaign["coupon_key"]
+        timezone = campaigns.campaign_timezone(campaign, timezone)
+    reservations.check_mode(record_layout, stock_shards if coupon_key == "online" else 1)
+
+    cached = negative_cache.cached_result(coupon_key, member_id)
+    if cached is not None:
+        return reserve_response(cached, None, None)
+    # 다른 채널에서 이미 받은 회원 (COUPON_DEDUP_SCOPE=global, 확정할 때 전역 SET 에 기록)
+    if dedup.cross_channel(dedup_scope, coupon_key) and dedup.received_members(redis_client, [member_id]):
+        negative_cache.remember(coupon_key, member_id, issuance.ALREADY_RECEIVED)
+        return reserve_response(issuance.ALREADY_RECEIVED, None, None)
+    coupon_data, expiry_timestamp = build_coupon_data(member_id, timezone)
+    result, coupon_id, reserved_until = reservations.reserve(
+        redis_client, coupon_key, member_id, coupon_data, expiry_timestamp, dedup_backend, inventory_mode
+    )
+    # 예약은 아직 발급이 아니므로 (취소 / 만료되면 다시 예약할 수 있다) 발급 회원으로 캐시하지 않는다. 확정할 때 캐시
+    if result != issuance.ISSUED:
+        negative_cache.remember(coupon_key, member_id, result)
+    return reserve_response(result, coupon_id, reserved_until)
+
+def confirm_reservation(redis_client, coupon_key, member_id):
+    # 예약 확정 (직접 호출 / SQS 단건 공용), 채널 재고는 확정한 회원을 전역 received_coupons 에 기록
+    result, coupon_id = reservations.confirm(redis_client, coupon_key, member_id, dedup_backend, inventory_mode)
+    if coupon_id:
+        negative_cache.remember(coupon_key, member_id, issuance.ISSUED)
+        if dedup.cross_channel(dedup_scope, coupon_key):
+            dedup.record_received(redis_client, [member_id])
+    return confirm_response(result, coupon_id)
+
+def relay_reservations(redis_client):
+    # 만료된 예약을 풀어 재고를 되돌리고 outbox 의 확정 메시지 (자동 확정일 때) 를 SQS 로 전달 (채널 재고 + 온라인 캠페인)
+    global sqs_client
+    if sqs_client is None:
+        import boto3
+        sqs_client = recorder.track_sqs(boto3.client('sqs'))
+    coupon_keys = ["online"] + [key for key in campaigns.registered_keys(redis_client) if key.startswith("online.")]
+    counts = {"released": 0, "relayed": 0}
+    with BatchSender(sqs_client, reservation_queue_url) as sender:
+        for coupon_key in coupon_keys:
+            while True:
+                released = reservations.release_expired(redis_client, coupon_key, dedup_backend, inventory_mode)
+                counts["released"] += released
+                if released < reservations.SWEEP_LIMIT:
+                    break
+            counts["relayed"] += reservations.relay_outbox(redis_client, sender, coupon_key)
+    counts["failed"] = len(sender.failed)
+    return counts
+
+def process_direct_invocation(redis_client, event):
+    # API 직접 호출 (SQS 를 거치지 않는 동기 발급 예약 / 확정 / 취소, 스케줄 relay)
+    action = event.get("action")
+    if action == "relay_reservations":
+        return {"statusCode": 200, "body": relay_reservations(redis_client)}
+    if action not in ("reserve", "confirm", "release"):
+        return {"statusCode": 400, "body": f"Unknown action: {action}"}
+    member_id = event.get("member_id")
+    if not member_id:
+        return {"statusCode": 400, "body": "Invalid request: missing member_id"}
+    if action == "reserve":
+        return reserve_coupon(redis_client, event)
+    coupon_key = reservation_coupon_key(event)
+    if action == "confirm":
+        return confirm_reservation(redis_client, coupon_key, member_id)
+    if reservations.release(redis_client, coupon_key, member_id, dedup_backend, inventory_mode):
+        return {"statusCode": 200, "body": "Coupon reservation released"}
+    return {"statusCode": 404, "body": "No coupon reservation found"}
+
 def process_sqs_message(message_body):
     # SQS 메시지를 파싱하고 쿠폰을 발급
     redis_client = get_redis_client()
@@ -98,25 +284,153 @@ def process_sqs_message(message_body):
     if not member_id:
         return {"statusCode": 400, "body": "Invalid request: missing member_id"}
 
+    # 동기 발급 예약의 확정 메시지 (relay 가 보냄)
+    if message.get("action") == "confirm":
+        return confirm_reservation(redis_client, reservation_coupon_key(message), member_id)
+
+    # 캠페인 메시지는 캠페인 재고 / 발급 기간 / 타임존 정책으로 발급 (설정은 컨테이너 캐시, coupon_core.campaigns)
+    # 캠페인 재고는 issue_mode 와 관계없이 Lua 스크립트 경로로 발급
+    campaign_id = message.get("campaign_id")
+    if campaign_id:
+        campaign = campaigns.get_campaign(redis_client, "online", campaign_id)
+        rejected = campaigns.check_campaign(campaign)
+        if rejected:
+            return {"statusCode": 400, "body": rejected}
+        coupon_key = campaign["coupon_key"]
+        cached = negative_cache.cached_result(coupon_key, member_id)
+        if cached is not None:
+            return issue_result_response(cached, None)
+        result, coupon_id = issue_coupon_with_script(
+            redis_client, coupon_key, member_id, campaigns.campaign_timezone(campaign, timezone), shards=1
+        )
+        negative_cache.remember(coupon_key, member_id, result)
+        return issue_result_response(result, coupon_id)
+
+    # 이미 소진된 채널 / 이미 발급받은 회원은 Redis 를 거치지 않고 거절 (coupon_core.negative_cache)
+    cached = negative_cache.cached_result("online", member_id)
+    if cached is not None:
+        return issue_result_response(cached, None)
+
+    if issue_mode == issuance.ISSUE_MODE_SCRIPT or inventory_mode == issuance.INVENTORY_TOKENS:
+        result, coupon_id = issue_coupon_with_script(redis_client, "online", member_id, timezone)
+        negative_cache.remember("online", member_id, result)
+        return issue_result_response(result, coupon_id)
+
+    # legacy 경로는 단일 재고 키만 읽으므로 샤드 재고면 모두 소진으로 보이기 전에 거절
+    inventory.check_issue_mode(issue_mode, stock_shards)
+
     # 쿠폰 중복 발급 방지
-    if has_received_coupon(redis_client, member_id):
+    with metrics.timer("dedup_check"):
+        received = has_received_coupon(redis_client, member_id)
+    if received:
+        negative_cache.remember("online", member_id, issuance.ALREADY_RECEIVED)
         return {"statusCode": 400, "body": "User has already received a coupon"}
 
     # 오프라인 쿠폰 발급
     coupon_id = check_and_decrement_coupons(redis_client, "online", member_id, timezone)
+    negative_cache.remember("online", member_id, issuance.ISSUED if coupon_id else issuance.SOLD_OUT)
     if coupon_id:
         return {"statusCode": 200, "body": f"online coupon granted successfully. Coupon ID: {coupon_id}"}
     else:
         return {"statusCode": 400, "body": "No online coupons remaining"}
 
-def lambda_handler(event, context):
-    print("Lambda 실행 - SQS 메시지 처리 시작")
+def process_sqs_batch(records, replayed=None):
+    # Records 전체를 한 번에 발급하고 실패한 메시지만 재전송되도록 보고
+    # replayed 는 원장에 처리 결과가 있는 메시지 {messageId: 응답} (다시 발급하지 않음)
+    redis_client = get_redis_client()
+    replayed = replayed or {}
+
+    # 동기 발급 예약의 확정 메시지는 따로 모아 파이프라인 한 번으로 확정
+    confirms, pending = reservations.parse_confirm_records(
+        [record for record in records if record.get('messageId') not in replayed]
+    )
+    outcomes, failures = batch.process_confirm_records(redis_client, confirms, confirm_response, dedup_backend,
+                                                       inventory_mode, dedup_scope)
 
-    for record in event.get('Records', []):
-        receipt_handle = record['receiptHandle']  # 메시지 삭제를 위한 핸들
-        message_body = record['body']  # 메시지 본문
+    # 캠페인 메시지는 캠페인 재고 키별로 나눠 발급 (캠페인 없는 메시지만 있으면 파이프라인 한 번)
+    groups, rejected = campaigns.group_records(redis_client, pending, "online")
+    outcomes.extend((message_id, {"statusCode": 400, "body": reason}) for message_id, reason in rejected)
+    for (coupon_key, timezone), group in groups.items():
+        # 샤드 재고는 채널 재고에서만 (캠페인 재고는 단일 키)
+        shards = stock_shards if coupon_key == "online" else 1
+        group_outcomes, group_failures = batch.process_issue_records(
+            redis_client, group, coupon_key, build_coupon_data, issue_result_response, shards, shard_strategy,
+            dedup_backend, record_layout, timezone, inventory_mode, dedup_scope
+        )
+        outcomes.extend(group_outcomes)
+        failures.extend(group_failures)
+    ledger.record(redis_client, outcomes)
 
-        response = process_sqs_message(message_body)
-        print(f"process_sqs_message response: {response}")
+    for message_id, response in outcomes:
+        metrics.debug("message %s response: %s", message_id, response)
+    metrics.increment("messages", len(records))
+    metrics.increment("failures", len(failures))
+    return batch.batch_item_failures(failures)
 
+def process_record(record):
+    # SQS 레코드 하나 처리 (동기 루프 / 비동기 엔진 공용)
+    receipt_handle = record['receiptHandle']  # 메시지 삭제를 위한 핸들
+    message_body = record['body']  # 메시지 본문
+    metrics.debug("message_body: %s", message_body)
+    with metrics.timer("message"):
+        response = process_sqs_message(message_body)
+    metrics.debug("process_sqs_message response: %s, issue_mode: %s", response, issue_mode)
+    metrics.increment("messages")
     return response
+
+@metrics.instrumented("coupon_issue_online")
+def lambda_handler(event, context):
+    # 단계별 시간 / Redis 명령 수 등은 호출이 끝날 때 EMF 로그 한 줄로 출력 (coupon_core.metrics)
+    # 재고가 다시 채워졌으면 부정 캐시를 비운다 (버전 키 확인은 간격마다 한 번)
+    redis_client = get_redis_client()
+    negative_cache.refresh(redis_client)
+    if "Records" not in event and event.get("action"):
+        return process_direct_invocation(redis_client, event)
+    records = event.get('Records', [])
+    # 재전송된 메시지 (원장을 끄면 항상 비어 있음)
+    replayed = ledger.lookup(redis_client, idempotency.message_ids(records))
+    if batch_mode:
+        return process_sqs_batch(records, replayed)
+
+    pending = [record for record in records if record.get('messageId') not in replayed]
+    responses = []
+    try:
+        # legacy 경로는 GET 후 DECRBY 라 동시에 처리하면 초과 발급 구간이 넓어지므로 순차 처리 유지
+        script_path = issue_mode == issuance.ISSUE_MODE_SCRIPT or inventory_mode == issuance.INVENTORY_TOKENS
+        if async_mode and script_path and len(pending) > 1:
+            responses = async_engine.process_records(pending, process_record, concurrency=async_concurrency,
+                                                     return_exceptions=True)
+        else:
+            for record in pending:
+                responses.append(process_record(record))
+    finally:
+        # 중간에 실패해도 끝낸 메시지의 응답은 남긴다 (비동기는 실패한 레코드가 있어도 나머지를 끝까지 처리)
+        ledger.record(redis_client, async_engine.completed_results(idempotency.message_ids(pending), responses))
+    async_engine.raise_first_error(responses)
+
+    # 응답은 기존과 같이 마지막 레코드의 응답 (레코드가 없으면 처리할 것이 없다는 응답)
+    if not records:
+        return {"statusCode": 200, "body": "No messages to process"}
+    if records[-1].get('messageId') in replayed:
+        return replayed[records[-1]['messageId']]
+    return responses[-1]
+
+
+def load_issue_script(redis_client):
+    """발급 스크립트(스크립트 모드 / tokens)와 동기 발급 예약 스크립트를 모든 노드에 미리 올려 첫 EVALSHA 의 NOSCRIPT 재시도를 없앤다"""
+    index = dedup.get_dedup_index(dedup_backend)
+    if inventory_mode == issuance.INVENTORY_TOKENS:
+        redis_client.script_load(token_pool.get_issue_script(redis_client, index).script)
+    elif issue_mode == issuance.ISSUE_MODE_SCRIPT:
+        redis_client.script_load(issuance.get_issue_script(redis_client, index, record_layout).script)
+    if record_layout == issuance.RECORD_LAYOUT_CHANNEL:
+        redis_client.script_load(reservations.get_reserve_script(redis_client, index, inventory_mode).script)
+
+
+if prewarm:
+    clients.prewarm(
+        get_redis_client,
+        negative_cache.refresh,
+        load_issue_script,
+        lambda redis_client: get_expiry_timestamp_for_today(None),
+    )